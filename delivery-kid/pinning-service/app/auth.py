@@ -3,8 +3,11 @@
 import hashlib
 import hmac
 import logging
+import threading
 import time
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Optional
 
 from eth_account.messages import encode_defunct
@@ -15,6 +18,16 @@ from .config import get_settings, Settings
 
 logger = logging.getLogger(__name__)
 
+# Successful signature recoveries, (signature, timestamp) -> (address, expires
+# at). A wallet signs once and replays the signature on every poll and range
+# request for up to max_timestamp_drift_seconds; secp256k1 recovery costs
+# ~11 ms (benchmarks/bench_auth.py: ~89 req/s uncached), a lookup well
+# under a microsecond. Failures aren't cached.
+RECOVERY_CACHE_SIZE = 4096
+RECOVERY_CACHE_TTL = 3600
+_recovery_cache: OrderedDict[tuple[str, int], tuple[str, float]] = OrderedDict()
+_recovery_lock = threading.Lock()
+
 
 def create_upload_token(api_key: str, username: str, timestamp: int, action: str = "upload") -> str:
     """Create an HMAC token for wiki-authenticated users.
@@ -29,6 +42,48 @@ def create_upload_token(api_key: str, username: str, timestamp: int, action: str
     return hmac.new(api_key.encode(), message.encode(), hashlib.sha256).hexdigest()
 
 
+UPLOAD_TOKEN_ACTIONS = ("upload", "finalize")
+
+
+@lru_cache(maxsize=4)
+def _hmac_base(api_key: str) -> hmac.HMAC:
+    """Keyed HMAC state to ``copy()`` per message, so the key is only set up once."""
+    return hmac.new(api_key.encode(), digestmod=hashlib.sha256)
+
+
+def match_upload_token(
+    token: str, username: str, timestamp: int, settings: Settings,
+    actions: tuple[str, ...] = UPLOAD_TOKEN_ACTIONS,
+) -> Optional[str]:
+    """Which of ``actions`` an HMAC token was issued for, or None.
+
+    One freshness check and one keyed-HMAC setup however many actions are
+    tried; a token for a later action doesn't log a mismatch for an
+    earlier one.
+    """
+    if not settings.api_key:
+        logger.warning("HMAC verify failed: no api_key configured")
+        return None
+    now_ms = int(time.time() * 1000)
+    drift_ms = abs(now_ms - timestamp)
+    max_drift_ms = settings.max_timestamp_drift_seconds * 1000
+    if drift_ms > max_drift_ms:
+        logger.warning(
+            "HMAC verify failed: token expired. drift=%dms (max=%dms), "
+            "token_ts=%d, server_now=%d, user=%s",
+            drift_ms, max_drift_ms, timestamp, now_ms, username
+        )
+        return None
+    base = _hmac_base(settings.api_key)
+    for action in actions:
+        mac = base.copy()
+        mac.update(f"{action}:{username}:{timestamp}".encode())
+        if hmac.compare_digest(token.encode(), mac.hexdigest().encode()):
+            return action
+    logger.warning("HMAC verify failed: token mismatch for user=%s actions=%s", username, "/".join(actions))
+    return None
+
+
 def verify_upload_token(token: str, username: str, timestamp: int, settings: Settings, action: str = "upload") -> bool:
     """Verify an HMAC token.
 
@@ -39,25 +94,38 @@ def verify_upload_token(token: str, username: str, timestamp: int, settings: Set
         settings: App settings.
         action: Expected action prefix — "upload" or "finalize".
     """
+    return match_upload_token(token, username, timestamp, settings, actions=(action,)) == action
+
+
+STAGING_URL_GRANULARITY = 300  # expiries round up to this, so re-minted URLs stay cacheable
+
+
+def sign_staging_url(api_key: str, draft_id: str, expires: int) -> str:
+    """HMAC signature for a staged-file URL: any file of ``draft_id`` until ``expires``."""
+    message = f"staging:{draft_id}:{expires}"
+    return hmac.new(api_key.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def staging_url_query(draft_id: str, settings: Settings, ttl_seconds: Optional[int] = None) -> str:
+    """``expires=...&sig=...`` query string granting read access to a draft's staged files."""
+    ttl = ttl_seconds if ttl_seconds is not None else settings.staging_url_ttl_seconds
+    expires = -(-(int(time.time()) + ttl) // STAGING_URL_GRANULARITY) * STAGING_URL_GRANULARITY
+    return f"expires={expires}&sig={sign_staging_url(settings.api_key, draft_id, expires)}"
+
+
+def verify_staging_signature(draft_id: str, expires: str, sig: str, settings: Settings) -> bool:
+    """Verify a signed staging URL. Pure CPU: no draft.json read, no clock-drift window."""
     if not settings.api_key:
-        logger.warning("HMAC verify failed: no api_key configured")
         return False
-    expected = create_upload_token(settings.api_key, username, timestamp, action=action)
-    if not hmac.compare_digest(token, expected):
-        logger.warning("HMAC verify failed: token mismatch for user=%s action=%s", username, action)
+    try:
+        expires_at = int(expires)
+    except (ValueError, TypeError):
         return False
-    # Check timestamp freshness
-    now_ms = int(time.time() * 1000)
-    drift_ms = abs(now_ms - timestamp)
-    max_drift_ms = settings.max_timestamp_drift_seconds * 1000
-    if drift_ms > max_drift_ms:
-        logger.warning(
-            "HMAC verify failed: token expired. drift=%dms (max=%dms), "
-            "token_ts=%d, server_now=%d, user=%s, action=%s",
-            drift_ms, max_drift_ms, timestamp, now_ms, username, action
-        )
+    if expires_at < time.time():
         return False
-    return True
+    expected = sign_staging_url(settings.api_key, draft_id, expires_at)
+    # Bytes: compare_digest raises TypeError on a non-ASCII str
+    return hmac.compare_digest(sig.encode(), expected.encode())
 
 
 @dataclass
@@ -72,6 +140,34 @@ def create_auth_message(timestamp: int) -> str:
     return f"Authorize Blue Railroad pinning\nTimestamp: {timestamp}"
 
 
+def recover_address(signature: str, timestamp: int, settings: Settings) -> str:
+    """Address that signed the auth message for ``timestamp``, cached.
+
+    An entry lives for ``RECOVERY_CACHE_TTL`` at most, and never past the
+    point its timestamp falls out of the drift window. Raises whatever
+    ``Account.recover_message`` raises for a bad signature.
+    """
+    key = (signature, timestamp)
+    now = time.time()
+    with _recovery_lock:
+        cached = _recovery_cache.get(key)
+        if cached is not None:
+            if cached[1] > now:
+                _recovery_cache.move_to_end(key)
+                return cached[0]
+            del _recovery_cache[key]
+
+    message_hash = encode_defunct(text=create_auth_message(timestamp))
+    address = Account.recover_message(message_hash, signature=signature)
+
+    expires = min(now + RECOVERY_CACHE_TTL, timestamp / 1000 + settings.max_timestamp_drift_seconds)
+    with _recovery_lock:
+        _recovery_cache[key] = (address, expires)
+        while len(_recovery_cache) > RECOVERY_CACHE_SIZE:
+            _recovery_cache.popitem(last=False)
+    return address
+
+
 def verify_signature(signature: str, timestamp: int, settings: Settings) -> AuthResult:
     """
     Verify a signed authorization message.
@@ -94,16 +190,14 @@ def verify_signature(signature: str, timestamp: int, settings: Settings) -> Auth
             error=f"Timestamp too old or too far in future (drift: {drift_ms // 1000}s, max: {settings.max_timestamp_drift_seconds}s)"
         )
 
-    # Recover signer address from signature
-    message = create_auth_message(timestamp)
+    # Recover signer address from signature (cached for replays)
     try:
-        message_hash = encode_defunct(text=message)
-        address = Account.recover_message(message_hash, signature=signature)
+        address = recover_address(signature, timestamp, settings)
     except Exception as e:
         return AuthResult(valid=False, error=f"Invalid signature: {e}")
 
     # Check if address is authorized
-    authorized = settings.authorized_wallet_list
+    authorized = settings.authorized_wallet_set
     if not authorized:
         # Dev mode: empty list means allow all wallets
         return AuthResult(valid=True, address=address)
@@ -118,32 +212,75 @@ def verify_signature(signature: str, timestamp: int, settings: Settings) -> Auth
     return AuthResult(valid=True, address=address)
 
 
+@dataclass
+class AuthContext:
+    """What a request's auth headers prove, worked out once per request.
+
+    ``auth_context`` keeps it on ``request.state``, so ``require_auth``,
+    ``require_finalize_auth`` and ``has_finalize_token`` in one request
+    share a single HMAC check and at most one signature verification.
+    """
+    upload_token: bool = False  # X-Upload-Token was sent
+    upload_user: str = ""
+    upload_timestamp: Optional[int] = None  # None if X-Upload-Timestamp didn't parse
+    upload_action: Optional[str] = None  # "upload"/"finalize" if the token verified
+    wallet: Optional[AuthResult] = field(default=None, repr=False)  # on first use
+
+
+def auth_context(request: Request, settings: Settings) -> AuthContext:
+    """The request's AuthContext, built on first call."""
+    ctx = getattr(request.state, "auth", None)
+    if ctx is not None:
+        return ctx
+    ctx = AuthContext()
+    upload_token = request.headers.get("X-Upload-Token")
+    if upload_token:
+        ctx.upload_token = True
+        ctx.upload_user = request.headers.get("X-Upload-User", "")
+        try:
+            ctx.upload_timestamp = int(request.headers.get("X-Upload-Timestamp", ""))
+        except (ValueError, TypeError):
+            pass
+        else:
+            ctx.upload_action = match_upload_token(upload_token, ctx.upload_user, ctx.upload_timestamp, settings)
+    request.state.auth = ctx
+    return ctx
+
+
 def _verify_hmac_headers(request: Request, settings: Settings, action: str = "upload") -> str | None:
     """Verify HMAC upload/finalize token from request headers.
 
     Returns identity string on success, None if headers not present.
     Raises HTTPException on invalid token.
     """
-    upload_token = request.headers.get("X-Upload-Token")
-    if not upload_token:
+    ctx = auth_context(request, settings)
+    if not ctx.upload_token:
         return None
-
-    username = request.headers.get("X-Upload-User", "")
-    timestamp_str = request.headers.get("X-Upload-Timestamp", "")
-    try:
-        timestamp = int(timestamp_str)
-    except (ValueError, TypeError):
+    if ctx.upload_timestamp is None:
         raise HTTPException(
             status_code=401,
             detail={"error": "Invalid upload timestamp"}
         )
-
-    if not verify_upload_token(upload_token, username, timestamp, settings, action=action):
+    if ctx.upload_action != action:
         raise HTTPException(
             status_code=401,
             detail={"error": "Invalid or expired upload token"}
         )
-    return f"wiki:{username}"
+    return f"wiki:{ctx.upload_user}"
+
+
+def _verify_api_key(request: Request, settings: Settings, api_key: str) -> str:
+    if not settings.api_key:
+        raise HTTPException(
+            status_code=500,
+            detail={"error": "API key auth not configured on server"}
+        )
+    if api_key != settings.api_key:
+        raise HTTPException(
+            status_code=401,
+            detail={"error": "Invalid API key"}
+        )
+    return request.headers.get("X-Uploaded-By", "api-user")
 
 
 async def require_wallet_auth(
@@ -154,31 +291,34 @@ async def require_wallet_auth(
     FastAPI dependency that requires valid wallet signature.
     Returns the verified wallet address.
     """
-    signature = request.headers.get("X-Signature")
-    timestamp_str = request.headers.get("X-Timestamp")
+    ctx = auth_context(request, settings)
+    if ctx.wallet is None:
+        signature = request.headers.get("X-Signature")
+        timestamp_str = request.headers.get("X-Timestamp")
 
-    if not signature or not timestamp_str:
-        raise HTTPException(
-            status_code=401,
-            detail={
-                "error": "Missing authentication headers",
-                "required": ["X-Signature", "X-Timestamp"]
-            }
-        )
+        if not signature or not timestamp_str:
+            raise HTTPException(
+                status_code=401,
+                detail={
+                    "error": "Missing authentication headers",
+                    "required": ["X-Signature", "X-Timestamp"]
+                }
+            )
 
-    try:
-        timestamp = int(timestamp_str)
-    except ValueError:
-        raise HTTPException(
-            status_code=401,
-            detail={"error": "Invalid timestamp format"}
-        )
+        try:
+            timestamp = int(timestamp_str)
+        except ValueError:
+            raise HTTPException(
+                status_code=401,
+                detail={"error": "Invalid timestamp format"}
+            )
 
-    result = verify_signature(signature, timestamp, settings)
-    if not result.valid:
-        raise HTTPException(status_code=401, detail={"error": result.error})
+        ctx.wallet = verify_signature(signature, timestamp, settings)
 
-    return result.address
+    if not ctx.wallet.valid:
+        raise HTTPException(status_code=401, detail={"error": ctx.wallet.error})
+
+    return ctx.wallet.address
 
 
 async def require_auth(
@@ -197,36 +337,18 @@ async def require_auth(
     """
     # 1. HMAC token (wiki-issued — accept either upload or finalize prefix,
     #    both prove the user is authenticated via the wiki)
-    upload_token = request.headers.get("X-Upload-Token")
-    if upload_token:
-        username = request.headers.get("X-Upload-User", "")
-        timestamp_str = request.headers.get("X-Upload-Timestamp", "")
-        try:
-            timestamp = int(timestamp_str)
-        except (ValueError, TypeError):
+    ctx = auth_context(request, settings)
+    if ctx.upload_token:
+        if ctx.upload_timestamp is None:
             raise HTTPException(status_code=401, detail={"error": "Invalid upload timestamp"})
-
-        if verify_upload_token(upload_token, username, timestamp, settings, action="upload"):
-            return f"wiki:{username}"
-        if verify_upload_token(upload_token, username, timestamp, settings, action="finalize"):
-            return f"wiki:{username}"
-
+        if ctx.upload_action is not None:
+            return f"wiki:{ctx.upload_user}"
         raise HTTPException(status_code=401, detail={"error": "Invalid or expired token"})
 
     # 2. API key (server-to-server)
     api_key = request.headers.get("X-API-Key")
     if api_key:
-        if not settings.api_key:
-            raise HTTPException(
-                status_code=500,
-                detail={"error": "API key auth not configured on server"}
-            )
-        if api_key != settings.api_key:
-            raise HTTPException(
-                status_code=401,
-                detail={"error": "Invalid API key"}
-            )
-        return request.headers.get("X-Uploaded-By", "api-user")
+        return _verify_api_key(request, settings, api_key)
 
     # 3. Wallet signature
     return await require_wallet_auth(request, settings)
@@ -239,16 +361,7 @@ def has_finalize_token(request: Request, settings: Settings) -> bool:
     Use this to grant elevated access (e.g. viewing other users' drafts)
     without requiring finalize auth.
     """
-    upload_token = request.headers.get("X-Upload-Token")
-    if not upload_token:
-        return False
-    username = request.headers.get("X-Upload-User", "")
-    timestamp_str = request.headers.get("X-Upload-Timestamp", "")
-    try:
-        timestamp = int(timestamp_str)
-    except (ValueError, TypeError):
-        return False
-    return verify_upload_token(upload_token, username, timestamp, settings, action="finalize")
+    return auth_context(request, settings).upload_action == "finalize"
 
 
 async def require_finalize_auth(
@@ -271,17 +384,7 @@ async def require_finalize_auth(
     # 2. API key (server-to-server — always allowed to finalize)
     api_key = request.headers.get("X-API-Key")
     if api_key:
-        if not settings.api_key:
-            raise HTTPException(
-                status_code=500,
-                detail={"error": "API key auth not configured on server"}
-            )
-        if api_key != settings.api_key:
-            raise HTTPException(
-                status_code=401,
-                detail={"error": "Invalid API key"}
-            )
-        return request.headers.get("X-Uploaded-By", "api-user")
+        return _verify_api_key(request, settings, api_key)
 
     # 3. Wallet signature
     return await require_wallet_auth(request, settings)
@@ -1,8 +1,9 @@
 """Configuration settings loaded from environment variables."""
 
 import os
+from pathlib import Path
 from pydantic_settings import BaseSettings
-from functools import lru_cache
+from functools import cached_property, lru_cache
 
 
 class Settings(BaseSettings):
@@ -23,15 +24,29 @@ class Settings(BaseSettings):
     # Seeding directory for BitTorrent (persistent, on storage box)
     seeding_dir: str = "/staging/seeding"
 
+    # Local-disk directory for SQLite state (job store, task queue). SQLite's
+    # WAL mode doesn't work over CIFS, so production points this off the
+    # storage box. Empty means "use staging_dir".
+    state_dir: str = ""
+
     # Authorized wallets (comma-separated)
     authorized_wallets: str = ""
 
     # Coconut.co cloud transcoding
     coconut_api_key: str = ""
+    webhook_workers: int = 2  # Concurrent Coconut output download/pin workers
+
+    # Local ffmpeg jobs (album track encodes) run at once across all requests; 0 = one per core
+    transcode_concurrency: int = 0
+    # Local HLS transcode cache under staging/.transcode-cache (LRU); 0 = disabled
+    transcode_cache_size_gb: float = 20
+    # Workers draining the finalize task queue (tasks.db in state_dir)
+    task_workers: int = 2
 
     # Auth settings
     max_timestamp_drift_seconds: int = 30 * 24 * 3600  # 30 days — tokens are checked on draft pages that may be revisited long after creation
     api_key: str = ""  # Shared API key for server-to-server auth (e.g., from PickiPedia)
+    staging_url_ttl_seconds: int = 6 * 3600  # Lifetime of signed /staging URLs (expires=&sig=)
 
     # Upload limits
     max_file_size_mb: int = 50000  # 50GB - effectively no limit for albums
@@ -39,7 +54,7 @@ class Settings(BaseSettings):
 
     # Draft settings
     # draft_ttl_hours removed — drafts persist until explicitly finalized or deleted
-    max_staging_size_gb: int = 10  # Maximum total size of staging directory
+    max_staging_size_gb: int = 10  # Staging quota (excl. seeding/); uploads over it get 507. 0 = unlimited
 
     # CORS
     cors_origins: list[str] = [
@@ -52,12 +67,20 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
 
+    @property
+    def state_path(self) -> Path:
+        """Directory for SQLite state: state_dir, or staging_dir when unset."""
+        return Path(self.state_dir or self.staging_dir)
+
     @property
     def authorized_wallet_list(self) -> list[str]:
         """Parse comma-separated wallet addresses into a list."""
-        if not self.authorized_wallets:
-            return []
-        return [w.strip().lower() for w in self.authorized_wallets.split(",") if w.strip()]
+        return sorted(self.authorized_wallet_set)
+
+    @cached_property
+    def authorized_wallet_set(self) -> frozenset[str]:
+        """Lowercased authorized wallets, parsed once per Settings instance."""
+        return frozenset(w.strip().lower() for w in self.authorized_wallets.split(",") if w.strip())
 
 
 @lru_cache
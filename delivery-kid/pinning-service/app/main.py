@@ -9,8 +9,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
-from .routes import health, albums, drafts, content, enrich, torrent, coconut, staging
+from .routes import health, albums, drafts, draft_index, content, enrich, torrent, coconut, staging, tasks
+from .services.draft_index import init_draft_index
+from .services.staging_space import init_staging_space
+from .services.task_queue import init_task_queue, stop_task_queue
 from .services.seeder import init_seeder, stop_seeder
+from .services.trash import init_trash, stop_trash
+from .services.transcode_cache import init_transcode_cache
+from .services.transcode_scheduler import init_transcode_scheduler
+from .services.webhook_queue import init_webhook_queue, stop_webhook_queue
 
 # Configure logging
 logging.basicConfig(
@@ -26,11 +33,15 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for startup/shutdown tasks.
 
     On startup:
-    - Run initial cleanup of orphaned drafts
-    - Start periodic orphan cleanup background task
+    - Start the BitTorrent seeder
+    - Start the trash reaper (deferred staging deletes)
+    - Start the Coconut webhook worker pool and resume interrupted jobs
+    - Start the finalize task workers and resume interrupted tasks
+    - Build the drafts index and the staging space accountant (in the
+      background — both walk the storage box)
 
     On shutdown:
-    - Cancel background cleanup task
+    - Stop the task and webhook workers, the trash reaper and the seeder
     """
     settings = get_settings()
     staging_dir = Path(settings.staging_dir)
@@ -42,10 +53,44 @@ async def lifespan(app: FastAPI):
     # Start BitTorrent seeder
     init_seeder(settings.seeding_dir)
 
+    # Deletes rename into staging/.trash; the reaper removes them off-loop
+    init_trash(staging_dir)
+
+    # Shared cap on concurrent local ffmpeg jobs
+    init_transcode_scheduler(settings.transcode_concurrency)
+
+    # Reuse local HLS output for identical source + settings
+    init_transcode_cache(staging_dir, settings.transcode_cache_size_gb)
+
+    # Start Coconut webhook workers, then pick up anything a restart interrupted
+    init_webhook_queue(
+        lambda job_id: coconut.process_queued_job(job_id, settings),
+        workers=settings.webhook_workers,
+    )
+    resumed = coconut.requeue_interrupted_jobs(settings)
+    if resumed:
+        logger.info("Resumed %d interrupted Coconut jobs", resumed)
+
+    # Album/content finalize runs here, re-queueing what a restart interrupted
+    init_task_queue(settings.state_path / "tasks.db", workers=settings.task_workers)
+
+    # Drafts index for GET /drafts
+    index = init_draft_index(staging_dir)
+    index_build = asyncio.create_task(asyncio.to_thread(index.rebuild))
+
+    # Staging quota accounting (max_staging_size_gb)
+    space = init_staging_space(staging_dir, settings.max_staging_size_gb)
+    space_scan = asyncio.create_task(asyncio.to_thread(space.rebuild))
+
     logger.info("Delivery Kid pinning service started")
     yield
 
-    # Shutdown: stop seeder first
+    # Shutdown: stop background workers, then the seeder
+    index_build.cancel()
+    space_scan.cancel()
+    await stop_task_queue()
+    await stop_webhook_queue()
+    await stop_trash()
     stop_seeder()
     logger.info("Delivery Kid pinning service stopped")
 
@@ -73,11 +118,13 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(albums.router)
 app.include_router(drafts.router)
+app.include_router(draft_index.router)
 app.include_router(content.router)
 app.include_router(enrich.router)
 app.include_router(torrent.router)
 app.include_router(coconut.router)
 app.include_router(staging.router)
+app.include_router(tasks.router)
 
 
 @app.get("/")
@@ -25,6 +25,7 @@ class ContentFile(BaseModel):
     # Common
     size_bytes: int
     creation_time: Optional[str] = Field(default=None, description="ISO 8601 creation time from container metadata")
+    sha256: Optional[str] = Field(default=None, description="SHA-256 of the uploaded bytes, taken while saving")
 
 
 class ContentDraftState(BaseModel):
@@ -46,14 +47,11 @@ class ContentDraftState(BaseModel):
     #   finalized       — pin successful
     #   finalize_failed — finalize SSE errored; draft dir kept for forensics
     status: str = Field(default="uploaded", description="Draft lifecycle status")
-    # Upload-stage progress trail (init, file received, analyzed, errored).
-    upload_log: list[dict] = Field(default_factory=list,
-                                   description="Upload-stage progress entries: [{ts, phase, message, error?}]")
-    # Finalize-stage progress trail mirrored from the SSE generator so the
-    # AV1/Coconut/local-fallback decision and any failure are visible after
-    # the SSE connection closes.
-    finalize_log: list[dict] = Field(default_factory=list,
-                                     description="Finalize-stage progress entries: [{ts, stage, message, progress?, error?}]")
+    # Progress trails — upload_log (init/received/analyzed/errors),
+    # finalize_log (mirrored SSE frames, so the Coconut/local-fallback decision
+    # survives the SSE connection closing) and preview_log (Coconut webhook
+    # events) — live in the draft's append-only events.ndjson
+    # (services/draft_events.py), not in draft.json.
     # Preview transcoding (background, after upload)
     preview_token: str = Field(default_factory=lambda: secrets.token_urlsafe(32),
                                description="One-time token for Coconut to fetch source video from staging")
@@ -61,12 +59,6 @@ class ContentDraftState(BaseModel):
     preview_job_id: Optional[str] = Field(default=None, description="Coconut job ID for preview transcode")
     preview_cid: Optional[str] = Field(default=None, description="IPFS CID of AV1 HLS output")
     preview_mp4_cid: Optional[str] = Field(default=None, description="IPFS CID of 480p H.264 preview MP4")
-    # Progress trail captured from Coconut webhook events. Surfaced to the
-    # draft page by /draft-content so the user can see what's happening
-    # during transcoding instead of staring at "Preview is being transcoded..."
-    # for minutes. Capped at PREVIEW_LOG_MAX entries to keep draft.json small.
-    preview_log: list[dict] = Field(default_factory=list,
-                                    description="Recent progress entries: [{ts, message, progress?}]")
 
 
 class ContentDraftResponse(BaseModel):
@@ -77,13 +69,21 @@ class ContentDraftResponse(BaseModel):
     metadata: dict = Field(default_factory=dict)
     commit: str = Field(default="unknown", description="Git commit hash of the build that created this draft")
     status: str = Field(default="uploaded", description="Lifecycle status")
-    upload_log: list[dict] = Field(default_factory=list, description="Upload-stage progress entries")
-    finalize_log: list[dict] = Field(default_factory=list, description="Finalize-stage progress entries")
+    upload_log: list[dict] = Field(default_factory=list,
+                                   description="Upload-stage progress entries: [{ts, phase, message, error?}]")
+    finalize_log: list[dict] = Field(default_factory=list,
+                                     description="Finalize-stage progress entries: [{ts, stage, message, progress?, error?}]")
     preview_status: str = Field(default="none", description="none, pending, processing, ready, failed")
     preview_cid: Optional[str] = Field(default=None, description="IPFS CID of AV1 HLS output")
     preview_mp4_cid: Optional[str] = Field(default=None, description="IPFS CID of 480p preview MP4")
     preview_token: Optional[str] = Field(default=None, description="One-time token (returned only on init)")
     preview_log: list[dict] = Field(default_factory=list, description="Recent progress entries from Coconut webhook")
+    events: Optional[list[dict]] = Field(
+        default=None, description="Event-log entries after the requested cursor (only when ?cursor= is given)"
+    )
+    events_cursor: Optional[int] = Field(
+        default=None, description="Cursor to pass back as ?cursor= to fetch only newer entries"
+    )
 
 
 class ContentFinalizeRequest(BaseModel):
@@ -101,7 +101,8 @@ class ContentFinalizeRequest(BaseModel):
     transcoding_qualities: Optional[list[int]] = Field(
         default=None,
         description="Output video heights for HLS transcoding, e.g. [1080, 720, 480]. "
-                    "Default [720, 480]. Common values: 2160 (4K), 1080, 720, 480, 360."
+                    "Default [720, 480]. Common values: 2160 (4K), 1080, 720, 480, 360. "
+                    "Used by Coconut and by the local ffmpeg fallback (capped at the source height)."
     )
     trim_start_seconds: Optional[float] = Field(
         default=None, description="Start time in seconds for trimming the video"
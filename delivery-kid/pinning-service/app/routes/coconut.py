@@ -2,107 +2,126 @@
 
 POST /transcode-coconut  — submit a video for AV1 HLS transcoding
 POST /webhook/coconut     — receive completion/failure from Coconut
+                            (acknowledged immediately; outputs are downloaded
+                            and pinned by the webhook worker pool)
 GET  /job/{job_id}        — check job status
-GET  /jobs                — list recent jobs
+GET  /jobs                — list recent jobs (filters: status, owner, draft_id;
+                            pagination: limit, offset)
 """
 
-import json
+import asyncio
 import logging
 import time
 from datetime import datetime, timezone
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Request
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request
 from pydantic import BaseModel
 
 from ..auth import require_auth
 from ..config import get_settings, Settings
 from ..models.content import ContentDraftState
-from ..services import ipfs
+from ..services import draft_events, ipfs, staging_space
 from ..services.coconut import (
     submit_to_coconut,
     save_job,
     load_job,
+    update_job,
     list_jobs,
+    count_jobs,
+    find_jobs_by_status,
     process_completed_job,
 )
+from ..services.draft_store import SKIP, get_draft_manager
+from ..services.jobstore import JobStore
+from ..services.staging_space import StagingFull, StagingNotReady
+from ..services.webhook_queue import get_webhook_queue
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["coconut"])
 
 
-PREVIEW_LOG_MAX = 50
+async def _append_preview_log(staging_dir: Path, draft_id: str, message: str,
+                              progress: int | None = None,
+                              status: str | None = None) -> None:
+    """Append a single progress entry to a draft's preview log.
 
-
-def _append_preview_log(staging_dir: Path, draft_id: str, message: str,
-                        progress: int | None = None,
-                        status: str | None = None) -> None:
-    """Append a single progress entry to a draft's preview_log.
-
-    ``status`` (when non-None) updates ``preview_status`` in the same write —
-    saves a separate disk hit. The log is capped at PREVIEW_LOG_MAX entries.
+    The entry goes to the draft's event log; draft.json is only rewritten
+    when ``status`` (when non-None) changes ``preview_status``.
     """
-    draft_json = staging_dir / "drafts" / draft_id / "draft.json"
-    if not draft_json.exists():
+    manager = get_draft_manager(staging_dir)
+    draft_dir = manager.draft_dir(draft_id)
+    if not (draft_dir / "draft.json").exists():
         return
     try:
-        data = json.loads(draft_json.read_text())
-        log = data.get("preview_log") or []
-        entry = {
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "message": message,
-        }
+        entry = {"message": message}
         if progress is not None:
             entry["progress"] = progress
-        log.append(entry)
-        # Keep only the most recent N — drafts can in theory accumulate many
-        # progress events across retries and we don't want draft.json to bloat.
-        data["preview_log"] = log[-PREVIEW_LOG_MAX:]
+        draft_events.append_event(draft_dir, "preview", entry)
         if status is not None:
-            data["preview_status"] = status
-        draft_json.write_text(json.dumps(data, indent=2, default=str))
+            def set_status(data: dict):
+                if data.get("preview_status") == status:
+                    return SKIP
+                data["preview_status"] = status
+
+            await manager.update(draft_id, set_status)
     except Exception as e:
         logger.error("[%s] Failed to append preview log: %s", draft_id[:8], e)
 
 
-def _update_draft_preview(staging_dir: Path, job: dict) -> None:
+async def _update_draft_preview(staging_dir: Path, job: dict) -> None:
     """Update a content draft's preview state after Coconut webhook."""
     draft_id = job["draftId"]
-    draft_json = staging_dir / "drafts" / draft_id / "draft.json"
-    if not draft_json.exists():
-        logger.warning("[%s] Preview draft not found: %s", job["id"], draft_id)
-        return
+    manager = get_draft_manager(staging_dir)
+    if job["status"] == "complete" and job.get("hlsCid"):
+        fields = {"preview_status": "ready", "preview_cid": job["hlsCid"]}
+        # previewCid = 480p MP4 for the video player on the ReleaseDraft page
+        if job.get("previewCid"):
+            fields["preview_mp4_cid"] = job["previewCid"]
+        entry = {
+            "message": f"Transcode complete · HLS pinned ({job['hlsCid'][:12]}…)",
+            "progress": 100,
+        }
+    else:
+        fields = {"preview_status": "failed"}
+        err = job.get("error") or "Unknown error"
+        entry = {"message": f"Preview transcode failed: {err}"}
     try:
-        data = json.loads(draft_json.read_text())
-        log = data.get("preview_log") or []
-        if job["status"] == "complete" and job.get("hlsCid"):
-            data["preview_status"] = "ready"
-            data["preview_cid"] = job["hlsCid"]
-            # previewCid = 480p MP4 for the video player on the ReleaseDraft page
-            if job.get("previewCid"):
-                data["preview_mp4_cid"] = job["previewCid"]
-            log.append({
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "message": f"Transcode complete · HLS pinned ({job['hlsCid'][:12]}…)",
-                "progress": 100,
-            })
+        data = await manager.update(draft_id, lambda current: current.update(fields))
+        if data is None:
+            logger.warning("[%s] Preview draft not found: %s", job["id"], draft_id)
+            return
+        draft_events.append_event(manager.draft_dir(draft_id), "preview", entry)
+        if fields["preview_status"] == "ready":
             logger.info("[%s] Draft %s preview ready: hls=%s mp4=%s",
                         job["id"], draft_id[:8], job["hlsCid"], job.get("previewCid", "none"))
         else:
-            data["preview_status"] = "failed"
-            err = job.get("error") or "Unknown error"
-            log.append({
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "message": f"Preview transcode failed: {err}",
-            })
             logger.warning("[%s] Draft %s preview failed", job["id"], draft_id[:8])
-        data["preview_log"] = log[-PREVIEW_LOG_MAX:]
-        draft_json.write_text(json.dumps(data, indent=2, default=str))
     except Exception as e:
         logger.error("[%s] Failed to update draft preview state: %s", job["id"], e)
 
 
+def _download_progress_reporter(staging_dir: Path, job: dict, state_dir: Path):
+    """Build a download_hls_outputs callback that records per-variant progress.
+
+    Progress lands in ``job["downloadProgress"]`` (visible via GET /job/{id})
+    and, for preview jobs, in the draft's preview log.
+    """
+    async def report(variant: str, done: int, total: int) -> None:
+        progress = {"done": done, "total": total}
+        job.setdefault("downloadProgress", {})[variant] = progress
+        update_job(staging_dir, job["id"],
+                   lambda current: current.setdefault("downloadProgress", {}).update({variant: progress}),
+                   state_dir=state_dir)
+        if job.get("isPreview") and job.get("draftId"):
+            pct = (done * 100) // total if total else 100
+            await _append_preview_log(staging_dir, job["draftId"],
+                                      f"downloading {variant} · {done}/{total} segments",
+                                      progress=pct)
+    return report
+
+
 class TranscodeRequest(BaseModel):
     qualities: list[int] = [720, 480]
     keep_original: bool = False
@@ -141,7 +160,9 @@ async def transcode_coconut(
         video_path = video_dir / (video.filename or "video.mp4")
 
         content = await video.read()
-        video_path.write_bytes(content)
+        with staging_space.reserve(len(content)):
+            video_path.write_bytes(content)
+            staging_space.record_write(video_path, len(content))
 
         # Pin source to IPFS so Coconut can fetch it via gateway
         logger.info("[%s] Pinning source video to IPFS...", job_id)
@@ -183,11 +204,10 @@ async def transcode_coconut(
             "createdAt": datetime.now(timezone.utc).isoformat(),
             "identity": identity,
         }
-        save_job(staging_dir, job_id, job_state)
+        save_job(staging_dir, job_id, job_state, state_dir=settings.state_path)
 
         # Clean up temp video file (source is on IPFS now)
-        import shutil
-        shutil.rmtree(video_dir, ignore_errors=True)
+        staging_space.remove_tree(video_dir)
 
         return TranscodeResponse(
             jobId=job_id,
@@ -199,6 +219,12 @@ async def transcode_coconut(
 
     except HTTPException:
         raise
+    except StagingNotReady as e:
+        staging_space.remove_tree(video_dir)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except StagingFull as e:
+        staging_space.remove_tree(video_dir)
+        raise HTTPException(507, str(e))
     except Exception as e:
         logger.error("[%s] Error: %s", job_id, e)
         raise HTTPException(500, str(e))
@@ -206,18 +232,25 @@ async def transcode_coconut(
 
 @router.post("/webhook/coconut")
 async def webhook_coconut(request: Request, settings: Settings = Depends(get_settings)):
-    """Receive completion/failure webhook from Coconut.co."""
+    """Receive completion/failure webhook from Coconut.co.
+
+    Returns as soon as the event is recorded on the job. ``job.completed``
+    is handed to the webhook worker pool; repeats of an already-accepted
+    completion are acknowledged with ``duplicate: true`` and ignored.
+    """
     job_id = request.query_params.get("job_id")
     if not job_id:
         raise HTTPException(400, "Missing job_id")
 
+    event = await request.json()
+    event_type = event.get("event", "unknown")
+
+    # Load after reading the body: from here to save_job there is no await,
+    # so concurrent redeliveries can't both pass the duplicate check.
     staging_dir = Path(settings.staging_dir)
-    job = load_job(staging_dir, job_id)
+    job = load_job(staging_dir, job_id, state_dir=settings.state_path)
     if not job:
         raise HTTPException(404, "Job not found")
-
-    event = await request.json()
-    event_type = event.get("event", "unknown")
     logger.info("[%s] Coconut webhook: %s", job_id, event_type)
 
     # Capture progress/lifecycle events into the draft's preview_log so the
@@ -232,58 +265,138 @@ async def webhook_coconut(request: Request, settings: Settings = Depends(get_set
             msg = f"{stage}"
             if progress is not None:
                 msg += f" · {progress}%"
-            _append_preview_log(staging_dir_path, draft_id, msg,
-                                progress=progress, status="processing")
+            await _append_preview_log(staging_dir_path, draft_id, msg,
+                                      progress=progress, status="processing")
         elif event_type in ("output.completed", "output.transferred"):
             output = event.get("output") or {}
             label = output.get("key") or output.get("format") or "output"
-            _append_preview_log(staging_dir_path, draft_id,
-                                f"output ready: {label}")
+            await _append_preview_log(staging_dir_path, draft_id,
+                                      f"output ready: {label}")
         elif event_type == "output.failed":
             output = event.get("output") or {}
             label = output.get("key") or output.get("format") or "output"
-            _append_preview_log(staging_dir_path, draft_id,
-                                f"output failed: {label}")
+            await _append_preview_log(staging_dir_path, draft_id,
+                                      f"output failed: {label}")
+
+    if event_type == "job.completed":
+        # Idempotency: Coconut redelivers webhooks it thinks timed out. Once a
+        # completion has been recorded, later copies are acknowledged and
+        # dropped instead of triggering a second download. The check and the
+        # state change happen in one job-store transaction.
+        accepted = False
+
+        def accept(current: dict):
+            nonlocal accepted
+            if current.get("status") in COMPLETION_STATES:
+                return JobStore.SKIP
+            current["status"] = "received"
+            current["outputs"] = event.get("outputs", {})
+            current["receivedAt"] = datetime.now(timezone.utc).isoformat()
+            accepted = True
+
+        job = update_job(staging_dir, job_id, accept, state_dir=settings.state_path)
+        if not accepted:
+            logger.info("[%s] Duplicate job.completed ignored (status=%s)", job_id, job.get("status"))
+            return {"received": True, "duplicate": True}
+        _enqueue_job(job_id, settings)
+        return {"received": True, "queued": True}
+
+    if event_type == "job.failed":
+        failed = False
+
+        def fail(current: dict):
+            nonlocal failed
+            if current.get("status") in COMPLETION_STATES:
+                return JobStore.SKIP
+            current["status"] = "failed"
+            current["error"] = event.get("error", "Unknown error")
+            current["failedAt"] = datetime.now(timezone.utc).isoformat()
+            failed = True
+
+        job = update_job(staging_dir, job_id, fail, state_dir=settings.state_path)
+        if not failed:
+            return {"received": True, "duplicate": True}
+        logger.error("[%s] Coconut job failed: %s", job_id, event.get("error"))
+        if job.get("isPreview") and job.get("draftId"):
+            await _update_draft_preview(staging_dir, job)
 
-    try:
-        if event_type == "job.completed":
-            outputs = event.get("outputs", {})
-            hls_cid = await process_completed_job(
-                job=job,
-                outputs=outputs,
-                staging_dir=staging_dir,
-                ipfs_api_url=settings.ipfs_api_url,
-                pinata_jwt=settings.pinata_jwt,
-            )
-
-            if hls_cid:
-                job["status"] = "complete"
-                job["hlsCid"] = hls_cid
-                job["completedAt"] = datetime.now(timezone.utc).isoformat()
-                logger.info("[%s] Job complete! HLS CID: %s", job_id, hls_cid)
-            else:
-                job["status"] = "failed"
-                job["error"] = "Failed to pin HLS output to IPFS"
-
-        elif event_type == "job.failed":
-            logger.error("[%s] Coconut job failed: %s", job_id, event.get("error"))
-            job["status"] = "failed"
-            job["error"] = event.get("error", "Unknown error")
-            job["failedAt"] = datetime.now(timezone.utc).isoformat()
+    return {"received": True}
 
-        save_job(staging_dir, job_id, job)
 
-        # If this is a preview job, update the draft state
-        if job.get("isPreview") and job.get("draftId"):
-            _update_draft_preview(staging_dir, job)
-        return {"received": True}
+# Job states once a job.completed webhook has been accepted:
+#   received    — outputs recorded, waiting for a worker
+#   downloading — a worker is fetching + pinning outputs
+#   complete / failed — terminal
+COMPLETION_STATES = {"received", "downloading", "complete", "failed"}
+RESUMABLE_STATES = {"received", "downloading"}
+
+
+def _enqueue_job(job_id: str, settings: Settings) -> None:
+    """Hand a received job to the worker pool (or a one-off task if none is running)."""
+    queue = get_webhook_queue()
+    if queue is not None:
+        queue.enqueue(job_id)
+    else:
+        asyncio.create_task(process_queued_job(job_id, settings))
+
+
+async def process_queued_job(job_id: str, settings: Settings) -> None:
+    """Worker entry point: download + pin a completed Coconut job's outputs.
+
+    Safe to call more than once for the same job — anything already past
+    ``downloading`` is skipped, and a job interrupted mid-download (process
+    restart) simply starts its download again.
+    """
+    staging_dir = Path(settings.staging_dir)
+
+    def claim(current: dict):
+        if current.get("status") not in RESUMABLE_STATES:
+            return JobStore.SKIP
+        current["status"] = "downloading"
+        current["attempts"] = current.get("attempts", 0) + 1
+
+    job = update_job(staging_dir, job_id, claim, state_dir=settings.state_path)
+    if not job or job.get("status") != "downloading":
+        return
+
+    try:
+        hls_cid = await process_completed_job(
+            job=job,
+            outputs=job.get("outputs", {}),
+            staging_dir=staging_dir,
+            ipfs_api_url=settings.ipfs_api_url,
+            pinata_jwt=settings.pinata_jwt,
+            progress_callback=_download_progress_reporter(staging_dir, job, settings.state_path),
+        )
+
+        if hls_cid:
+            job["status"] = "complete"
+            job["hlsCid"] = hls_cid
+            job["completedAt"] = datetime.now(timezone.utc).isoformat()
+            logger.info("[%s] Job complete! HLS CID: %s", job_id, hls_cid)
+        else:
+            job["status"] = "failed"
+            job["error"] = "Failed to pin HLS output to IPFS"
 
     except Exception as e:
         logger.error("[%s] Webhook processing error: %s", job_id, e)
         job["status"] = "failed"
         job["error"] = str(e)
-        save_job(staging_dir, job_id, job)
-        raise HTTPException(500, str(e))
+
+    save_job(staging_dir, job_id, job, state_dir=settings.state_path)
+
+    # If this is a preview job, update the draft state
+    if job.get("isPreview") and job.get("draftId"):
+        await _update_draft_preview(staging_dir, job)
+
+
+def requeue_interrupted_jobs(settings: Settings) -> int:
+    """Re-enqueue jobs whose processing was cut short by a restart."""
+    jobs = find_jobs_by_status(Path(settings.staging_dir), RESUMABLE_STATES, state_dir=settings.state_path)
+    for job in jobs:
+        logger.info("[%s] Resuming interrupted job (status=%s)", job["id"], job["status"])
+        _enqueue_job(job["id"], settings)
+    return len(jobs)
 
 
 @router.get("/job/{job_id}")
@@ -292,7 +405,7 @@ async def get_job_status(
     settings: Settings = Depends(get_settings),
 ):
     """Get transcoding job status."""
-    job = load_job(Path(settings.staging_dir), job_id)
+    job = load_job(Path(settings.staging_dir), job_id, state_dir=settings.state_path)
     if not job:
         raise HTTPException(404, "Job not found")
     return job
@@ -300,9 +413,18 @@ async def get_job_status(
 
 @router.get("/jobs")
 async def get_jobs(
+    status: str | None = Query(None, description="Filter by job status"),
+    owner: str | None = Query(None, description="Filter by submitting identity"),
+    draft_id: str | None = Query(None, description="Filter by draft"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     identity: str = Depends(require_auth),
     settings: Settings = Depends(get_settings),
 ):
-    """List recent transcoding jobs."""
-    jobs = list_jobs(Path(settings.staging_dir))
-    return {"jobs": jobs}
+    """List recent transcoding jobs, newest first, with filters and pagination."""
+    staging_dir = Path(settings.staging_dir)
+    jobs = list_jobs(staging_dir, limit=limit, offset=offset,
+                     status=status, identity=owner, draft_id=draft_id, state_dir=settings.state_path)
+    total = count_jobs(staging_dir, status=status, identity=owner, draft_id=draft_id,
+                       state_dir=settings.state_path)
+    return {"jobs": jobs, "total": total, "limit": limit, "offset": offset}
@@ -1,26 +1,33 @@
 """General content draft routes — upload, review, transcode, pin any file type."""
 
 import asyncio
+import hashlib
 import json
 import logging
-import shutil
 import time
 import uuid
+from contextlib import aclosing
 from datetime import datetime, timezone
 from pathlib import Path
 from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, File, Header, Request, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, File, Header, Query, Request, UploadFile, HTTPException
 from sse_starlette.sse import EventSourceResponse
 
-from ..auth import require_auth, require_finalize_auth, has_finalize_token
+from ..auth import require_auth, require_finalize_auth, has_finalize_token, staging_url_query
 from ..config import get_settings, get_commit, Settings
 from ..models.content import (
     ContentFile, ContentDraftState, ContentDraftResponse, ContentFinalizeRequest
 )
-from ..services import analyze, ipfs, transcode
+from ..services import (
+    analyze, draft_events, ipfs, jit_hls, media_assets, staging_space, task_queue, transcode, trim,
+)
 from ..services.coconut import submit_to_coconut, save_job, load_job
-from ..services.fsutil import safe_rmtree
+from ..services.draft_store import (
+    SKIP, DraftStateWriter, get_draft_cache, get_draft_manager, update_draft_json, write_draft_state,
+)
+from ..services.fsutil import PlaceStats, place_file
+from ..services.staging_space import StagingFull, StagingNotReady
 
 logger = logging.getLogger(__name__)
 
@@ -31,67 +38,84 @@ ALLOWED_EXTENSIONS = (
     analyze.AUDIO_EXTENSIONS | analyze.VIDEO_EXTENSIONS | analyze.IMAGE_EXTENSIONS
 )
 
+# Coconut may queue a job for a while before it fetches the source
+COCONUT_SOURCE_URL_TTL = 24 * 3600
+
+# draft.json fields the upload handler writes; the rest belong to /init,
+# the preview submission and the Coconut webhook
+UPLOAD_FIELDS = {"status", "files", "preview_status"}
+
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
 
 def get_draft_dir(staging_dir: Path, draft_id: str) -> Path:
     return staging_dir / "drafts" / draft_id
 
 
-def load_draft_state(draft_dir: Path) -> ContentDraftState | None:
-    draft_json = draft_dir / "draft.json"
-    if not draft_json.exists():
+def _parse_draft_state(draft_dir: Path, data: dict) -> ContentDraftState | None:
+    # Only load content drafts, not album drafts
+    if data.get("draft_type") != "content":
         return None
+    if draft_events.has_legacy_logs(data):
+        _migrate_legacy_logs(draft_dir)
+        data = {k: v for k, v in data.items() if k not in draft_events.LEGACY_LOG_KEYS}
+    return ContentDraftState(**data)
+
+
+def _migrate_legacy_logs(draft_dir: Path) -> None:
+    """One-time move of an old draft.json's logs into events.ndjson, under the draft lock."""
+    def migrate(data: dict):
+        if not draft_events.has_legacy_logs(data):
+            return SKIP  # a concurrent load already migrated it
+        draft_events.migrate_legacy_logs(draft_dir, data)
+
+    update_draft_json(draft_dir, migrate)
+
+
+def load_draft_state(draft_dir: Path, readonly: bool = False) -> ContentDraftState | None:
+    """Load a content draft, served from the draft cache when unchanged.
+
+    Returns a private copy unless ``readonly`` — read-only callers (the
+    polling GET) get the shared cached instance and must not mutate it.
+    """
     try:
-        with open(draft_json) as f:
-            data = json.load(f)
-        # Only load content drafts, not album drafts
-        if data.get("draft_type") != "content":
-            return None
-        return ContentDraftState(**data)
+        state = get_draft_cache().load(draft_dir, _parse_draft_state)
     except (json.JSONDecodeError, ValueError):
         return None
+    if state is None or readonly:
+        return state
+    return state.model_copy(deep=True)
 
 
 def save_draft_state(draft_dir: Path, state: ContentDraftState) -> None:
-    draft_json = draft_dir / "draft.json"
-    with open(draft_json, "w") as f:
-        json.dump(state.model_dump(mode="json"), f, indent=2, default=str)
+    write_draft_state(draft_dir, state)
 
 
-# Caps on per-draft log lengths (keep draft.json small).
-UPLOAD_LOG_MAX = 100
-FINALIZE_LOG_MAX = 200
-
-
-def _append_upload_log(state: ContentDraftState, phase: str, message: str,
+def _append_upload_log(draft_dir: Path, phase: str, message: str,
                        error: str | None = None) -> None:
-    """Append an entry to state.upload_log in place. Caller is responsible for save_draft_state."""
-    entry = {
-        "ts": datetime.now(timezone.utc).isoformat(),
-        "phase": phase,
-        "message": message,
-    }
+    """Append an entry to the draft's upload log."""
+    entry = {"phase": phase, "message": message}
     if error:
         entry["error"] = error
-    state.upload_log.append(entry)
-    if len(state.upload_log) > UPLOAD_LOG_MAX:
-        state.upload_log = state.upload_log[-UPLOAD_LOG_MAX:]
+    draft_events.append_event(draft_dir, "upload", entry)
 
 
-def _append_finalize_log(state: ContentDraftState, stage: str, message: str,
+def _append_finalize_log(draft_dir: Path, stage: str, message: str,
                          progress: int | None = None, error: str | None = None) -> None:
-    """Append an entry to state.finalize_log in place."""
-    entry = {
-        "ts": datetime.now(timezone.utc).isoformat(),
-        "stage": stage,
-        "message": message,
-    }
+    """Append an entry to the draft's finalize log."""
+    entry = {"stage": stage, "message": message}
     if progress is not None:
         entry["progress"] = progress
     if error:
         entry["error"] = error
-    state.finalize_log.append(entry)
-    if len(state.finalize_log) > FINALIZE_LOG_MAX:
-        state.finalize_log = state.finalize_log[-FINALIZE_LOG_MAX:]
+    draft_events.append_event(draft_dir, "finalize", entry)
+
+
+def _append_preview_log(draft_dir: Path, message: str) -> None:
+    """Append an entry to the draft's preview log."""
+    draft_events.append_event(draft_dir, "preview", {"message": message})
 
 
 @router.post("/init", response_model=ContentDraftResponse)
@@ -120,15 +144,15 @@ async def init_content_draft(
         files=[],
         status="awaiting_upload",
     )
-    _append_upload_log(state, "init", "Draft initialised; awaiting upload.")
-    save_draft_state(draft_dir, state)
+    await asyncio.to_thread(save_draft_state, draft_dir, state)
+    _append_upload_log(draft_dir, "init", "Draft initialised; awaiting upload.")
 
     return ContentDraftResponse(
         draft_id=draft_id,
         files=[],
         commit=get_commit(),
         status=state.status,
-        upload_log=state.upload_log,
+        upload_log=draft_events.tail_events(draft_dir, {"upload": draft_events.DEFAULT_TAIL["upload"]})["upload"],
         preview_status=state.preview_status,
     )
 
@@ -178,7 +202,10 @@ async def create_content_draft(
             # logs) so the trail of attempts is visible.
             upload_dir = existing / "upload"
             if upload_dir.exists():
-                safe_rmtree(upload_dir)
+                staging_space.remove_tree(upload_dir)
+            jit_dir = existing / jit_hls.JIT_DIR
+            if jit_dir.exists():
+                staging_space.remove_tree(jit_dir)
     else:
         draft_id = str(uuid.uuid4())
 
@@ -192,10 +219,10 @@ async def create_content_draft(
     if prior is not None:
         state = prior
         if prior.status == "awaiting_upload":
-            _append_upload_log(state, "upload-start",
+            _append_upload_log(draft_dir, "upload-start",
                                f"Receiving {len(files) if files else 0} file(s)...")
         else:
-            _append_upload_log(state, "reupload-start",
+            _append_upload_log(draft_dir, "reupload-start",
                                f"Re-upload started ({len(files) if files else 0} file(s)).")
     else:
         state = ContentDraftState(
@@ -205,30 +232,36 @@ async def create_content_draft(
             uploaded_by=wallet_address,
             files=[],
         )
-        _append_upload_log(state, "upload-start",
+        _append_upload_log(draft_dir, "upload-start",
                            f"Receiving {len(files) if files else 0} file(s) (no /init).")
 
     state.status = "uploading"
-    save_draft_state(draft_dir, state)
+    # Only the upload's own fields are written back: a Coconut webhook for
+    # an earlier upload may be writing the preview fields meanwhile.
+    writer = DraftStateWriter(draft_dir, fields=UPLOAD_FIELDS)
+    if prior is None:
+        await asyncio.to_thread(save_draft_state, draft_dir, state)
+    else:
+        await writer.save(state, flush=True)
 
-    def fail(http_status: int, message: str) -> HTTPException:
+    async def fail(http_status: int, message: str, headers: dict | None = None) -> HTTPException:
         """Record an upload-stage failure into upload_log and return an HTTPException."""
         state.status = "upload_failed"
-        _append_upload_log(state, "error", message, error=message)
         try:
-            save_draft_state(draft_dir, state)
+            _append_upload_log(draft_dir, "error", message, error=message)
+            await writer.save(state, flush=True)
         except Exception:
-            logger.exception("[content:%s] Failed to persist upload_log on error", draft_id[:8])
-        return HTTPException(status_code=http_status, detail=message)
+            logger.exception("[content:%s] Failed to persist upload failure", draft_id[:8])
+        return HTTPException(status_code=http_status, detail=message, headers=headers)
 
     if not files:
-        raise fail(400, "No files provided")
+        raise await fail(400, "No files provided")
 
     # Validate file types
     for file in files:
         ext = Path(file.filename).suffix.lower()
         if ext not in ALLOWED_EXTENSIONS:
-            raise fail(
+            raise await fail(
                 400,
                 f"Invalid file type: {file.filename}. Allowed extensions: {sorted(ALLOWED_EXTENSIONS)}"
             )
@@ -237,21 +270,27 @@ async def create_content_draft(
     max_size = settings.max_file_size_mb * 1024 * 1024
     total_size = sum(file.size or 0 for file in files)
     if total_size > max_size:
-        raise fail(
+        raise await fail(
             400,
             f"Total upload size exceeds {settings.max_file_size_mb}MB limit"
         )
 
     try:
-        # Save uploaded files
-        for file in files:
-            file_path = upload_dir / file.filename
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            _append_upload_log(state, "received",
-                               f"Saved {file.filename} ({file_path.stat().st_size} bytes)")
-        save_draft_state(draft_dir, state)
+        # Save uploaded files. Their bytes are held against the staging
+        # quota first, so a full storage box rejects the upload up front.
+        # Each file is hashed as it is saved, so the transcode cache never
+        # has to read a (possibly 40 GB) source back over CIFS to key it.
+        hashes: dict[str, str] = {}
+        with staging_space.reserve(total_size):
+            for file in files:
+                file_path = upload_dir / file.filename
+                with open(file_path, "wb") as f:
+                    content = await file.read()
+                    f.write(content)
+                hashes[file.filename] = await asyncio.to_thread(_sha256_hex, content)
+                staging_space.record_write(file_path, len(content))
+                _append_upload_log(draft_dir, "received",
+                                   f"Saved {file.filename} ({file_path.stat().st_size} bytes)")
 
         # Analyze all media files
         analyses = await analyze.analyze_media_directory(upload_dir)
@@ -275,14 +314,15 @@ async def create_content_draft(
                     audio_codec=a.audio_codec,
                     size_bytes=a.size_bytes,
                     creation_time=a.creation_time,
+                    sha256=hashes.get(a.original_filename),
                 ))
             else:
-                _append_upload_log(state, "analyze-error",
+                _append_upload_log(draft_dir, "analyze-error",
                                    f"ffprobe failed on {a.original_filename}",
                                    error=a.error or "unknown")
 
         if not draft_files:
-            raise fail(400, "No valid media files found in upload")
+            raise await fail(400, "No valid media files found in upload")
 
         # Determine if this is a single-video upload that should get a preview
         video_files = [f for f in draft_files if f.media_type == "video"]
@@ -291,10 +331,11 @@ async def create_content_draft(
         state.files = draft_files
         state.status = "uploaded"
         state.preview_status = "pending" if should_preview else "none"
-        _append_upload_log(state, "analyzed",
+        _append_upload_log(draft_dir, "analyzed",
                            f"Analyzed {len(draft_files)} file(s); "
                            + ("preview pending." if should_preview else "no preview."))
-        save_draft_state(draft_dir, state)
+        await writer.save(state, flush=True)
+        media_assets.schedule(draft_id, draft_dir)
 
         # Kick off background preview transcoding for video uploads
         if should_preview:
@@ -307,22 +348,28 @@ async def create_content_draft(
             files=draft_files,
             commit=get_commit(),
             status=state.status,
-            upload_log=state.upload_log,
+            upload_log=draft_events.tail_events(draft_dir, {"upload": draft_events.DEFAULT_TAIL["upload"]})["upload"],
             preview_status=state.preview_status,
         )
 
     except HTTPException:
         raise
+    except StagingNotReady as e:
+        raise await fail(503, str(e), headers={"Retry-After": str(e.retry_after)})
+    except StagingFull as e:
+        raise await fail(507, str(e))
     except Exception as e:
         # Persistent record: keep draft_dir, log the failure, and surface it.
         logger.exception("[content:%s] Upload failed", draft_id[:8])
-        raise fail(500, f"Upload error: {e}")
+        raise await fail(500, f"Upload error: {e}")
 
 
 @router.get("/{draft_id}", response_model=ContentDraftResponse)
 async def get_content_draft(
     draft_id: str,
     request: Request,
+    tail: int | None = Query(None, ge=0, le=1000, description="Entries per log to return (default: 100/200/50)"),
+    cursor: int | None = Query(None, ge=0, description="Also return every event-log entry after this cursor"),
     wallet_address: str = Depends(require_auth),
     settings: Settings = Depends(get_settings)
 ):
@@ -330,11 +377,16 @@ async def get_content_draft(
 
     Accessible by the original uploader OR any user with finalize-release
     permission (indicated by a valid finalize-prefixed HMAC token).
+
+    ``upload_log``/``finalize_log``/``preview_log`` hold the last ``tail``
+    entries of each log. Pollers can instead pass the ``events_cursor`` from
+    their previous response as ``?cursor=`` and read just the new entries
+    from ``events``.
     """
     staging_dir = Path(settings.staging_dir)
     draft_dir = get_draft_dir(staging_dir, draft_id)
 
-    state = load_draft_state(draft_dir)
+    state = load_draft_state(draft_dir, readonly=True)
     if state is None:
         raise HTTPException(status_code=404, detail="Content draft not found")
 
@@ -342,18 +394,101 @@ async def get_content_draft(
     if not is_owner and not has_finalize_token(request, settings):
         raise HTTPException(status_code=403, detail="Not your draft")
 
+    limits = {name: tail for name in draft_events.LOG_NAMES} if tail is not None else None
+    logs = draft_events.tail_events(draft_dir, limits)
+    events, events_cursor = (None, None)
+    if cursor is not None:
+        events, events_cursor = draft_events.read_events(draft_dir, cursor)
+
     return ContentDraftResponse(
         draft_id=state.draft_id,
         files=state.files,
         metadata=state.metadata,
         commit=get_commit(),
         status=state.status,
-        upload_log=state.upload_log,
-        finalize_log=state.finalize_log,
+        upload_log=logs["upload"],
+        finalize_log=logs["finalize"],
         preview_status=state.preview_status,
         preview_cid=state.preview_cid,
         preview_mp4_cid=state.preview_mp4_cid,
-        preview_log=state.preview_log,
+        preview_log=logs["preview"],
+        events=events,
+        events_cursor=events_cursor,
+    )
+
+
+# Draft fields pushed as "status" events by the /events stream
+_STATUS_FIELDS = ("status", "preview_status", "preview_cid", "preview_mp4_cid")
+
+
+async def draft_events_generator(draft_dir: Path, cursor: int, request: Request):
+    """SSE generator for GET /draft-content/{id}/events.
+
+    Emits one frame per event-log entry (event name = the log it belongs to,
+    ``id`` = its cursor), plus a ``status`` frame whenever one of
+    _STATUS_FIELDS changes (always once on connect). Ends with ``gone`` once
+    the draft directory is deleted (finalized or removed).
+    """
+    last_status = None
+    with draft_events.watch(draft_dir) as changed:
+        while not await request.is_disconnected():
+            changed.clear()
+            entries, cursor = draft_events.read_events(draft_dir, cursor)
+            for entry in entries:
+                log = entry.pop("log", "upload")
+                yield {"event": log, "id": str(entry.pop("cursor")), "data": json.dumps(entry)}
+
+            state = load_draft_state(draft_dir, readonly=True)
+            if state is None:
+                yield {"event": "gone", "id": str(cursor), "data": json.dumps({"message": "Draft no longer exists"})}
+                return
+            status = {name: getattr(state, name) for name in _STATUS_FIELDS}
+            if status != last_status:
+                last_status = status
+                yield {"event": "status", "id": str(cursor), "data": json.dumps(status)}
+
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=draft_events.WATCH_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+@router.get("/{draft_id}/events")
+async def stream_content_draft_events(
+    draft_id: str,
+    request: Request,
+    cursor: int | None = Query(None, ge=0, description="Resume after this cursor (default: from the start)"),
+    last_event_id: str | None = Header(default=None, alias="Last-Event-ID"),
+    wallet_address: str = Depends(require_auth),
+    settings: Settings = Depends(get_settings)
+):
+    """Stream a draft's log entries and status changes via Server-Sent Events.
+
+    Replaces polling GET /draft-content/{id}. Same access rules. Without a
+    cursor the stream replays the full history first; reconnecting clients
+    resume via ``Last-Event-ID`` (sent automatically by EventSource) or
+    ``?cursor=``.
+    """
+    staging_dir = Path(settings.staging_dir)
+    draft_dir = get_draft_dir(staging_dir, draft_id)
+
+    state = load_draft_state(draft_dir, readonly=True)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Content draft not found")
+
+    is_owner = state.uploaded_by.lower() == wallet_address.lower()
+    if not is_owner and not has_finalize_token(request, settings):
+        raise HTTPException(status_code=403, detail="Not your draft")
+
+    if last_event_id is not None:
+        try:
+            cursor = max(0, int(last_event_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an event cursor")
+
+    return EventSourceResponse(
+        draft_events_generator(draft_dir, cursor or 0, request),
+        media_type="text/event-stream"
     )
 
 
@@ -371,7 +506,7 @@ async def delete_content_draft(
     staging_dir = Path(settings.staging_dir)
     draft_dir = get_draft_dir(staging_dir, draft_id)
 
-    state = load_draft_state(draft_dir)
+    state = load_draft_state(draft_dir, readonly=True)
     if state is None:
         raise HTTPException(status_code=404, detail="Content draft not found")
 
@@ -379,32 +514,41 @@ async def delete_content_draft(
     if not is_owner and not has_finalize_token(request, settings):
         raise HTTPException(status_code=403, detail="Not your draft")
 
-    safe_rmtree(draft_dir)
+    staging_space.remove_tree(draft_dir)
+    draft_events.notify(draft_dir)
     return {"message": "Draft deleted", "draft_id": draft_id}
 
 
+def _coconut_source_url(draft_id: str, filename: str, state: ContentDraftState, settings: Settings) -> str:
+    """Staging URL Coconut fetches a source from: signed, or via preview_token without an api_key."""
+    base_url = settings.ipfs_gateway_url.replace("ipfs.", "", 1)
+    if settings.api_key:
+        query = staging_url_query(draft_id, settings, ttl_seconds=COCONUT_SOURCE_URL_TTL)
+    else:
+        query = f"preview_token={state.preview_token}"
+    return f"{base_url}/staging/drafts/{draft_id}/{quote(filename)}?{query}"
+
+
 async def _submit_preview_transcode(
     draft_id: str, state: ContentDraftState, settings: Settings
 ) -> None:
     """Background task: submit video to Coconut for AV1 HLS preview.
 
-    Coconut fetches the source from our staging endpoint via preview_token,
+    Coconut fetches the source from our staging endpoint via a signed URL,
     transcodes to AV1 HLS, and delivers via webhook. The webhook handler
     pins the HLS output to IPFS and updates draft state with the CID.
     """
     staging_dir = Path(settings.staging_dir)
-    draft_dir = get_draft_dir(staging_dir, draft_id)
+    drafts = get_draft_manager(staging_dir)
+    draft_dir = drafts.draft_dir(draft_id)
 
     try:
         video_file = state.files[0]
 
         # Build the source URL: Coconut will fetch from our staging endpoint
-        # using the preview_token for auth (no IPFS pin of the original needed)
+        # (no IPFS pin of the original needed)
         base_url = settings.ipfs_gateway_url.replace("ipfs.", "", 1)
-        source_url = (
-            f"{base_url}/staging/drafts/{draft_id}/{quote(video_file.original_filename)}"
-            f"?preview_token={state.preview_token}"
-        )
+        source_url = _coconut_source_url(draft_id, video_file.original_filename, state, settings)
 
         # Build webhook URL — reuses existing /webhook/coconut handler
         job_id = f"preview-{draft_id[:12]}-{int(time.time())}"
@@ -431,27 +575,29 @@ async def _submit_preview_transcode(
             "createdAt": datetime.now(timezone.utc).isoformat(),
             "identity": state.uploaded_by,
         }
-        save_job(staging_dir, job_id, job_state)
+        save_job(staging_dir, job_id, job_state, state_dir=settings.state_path)
 
         # Update draft state — and seed the preview log so the page has
-        # something to show before the first webhook event arrives.
+        # something to show before the first webhook event arrives. Only the
+        # preview fields are touched: the webhook (or a re-upload) may have
+        # written draft.json since ``state`` was loaded.
+        def submitted(data: dict):
+            data["preview_job_id"] = job_id
+            # A fast webhook may already have moved it on — don't roll it back
+            if data.get("preview_status") == "pending":
+                data["preview_status"] = "processing"
+
         state.preview_status = "processing"
         state.preview_job_id = job_id
-        state.preview_log.append({
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "message": f"Submitted to Coconut (job {coconut_job_id})",
-        })
-        save_draft_state(draft_dir, state)
+        await drafts.update(draft_id, submitted)
+        _append_preview_log(draft_dir, f"Submitted to Coconut (job {coconut_job_id})")
 
     except Exception as e:
         logger.error("[preview:%s] Failed to submit preview: %s", draft_id[:8], e)
         try:
             state.preview_status = "failed"
-            state.preview_log.append({
-                "ts": datetime.now(timezone.utc).isoformat(),
-                "message": f"Failed to submit to Coconut: {e}",
-            })
-            save_draft_state(draft_dir, state)
+            await drafts.update(draft_id, lambda data: data.update(preview_status="failed"))
+            _append_preview_log(draft_dir, f"Failed to submit to Coconut: {e}")
         except Exception:
             pass
 
@@ -469,6 +615,23 @@ def _should_use_coconut(request: ContentFinalizeRequest, settings: Settings) ->
     return bool(settings.coconut_api_key)
 
 
+def _pin_metadata(request: ContentFinalizeRequest, state: ContentDraftState,
+                  transcode_metadata: dict | None) -> dict:
+    """metadata.json written into the pinned directory."""
+    metadata = {
+        "title": request.title,
+        "description": request.description,
+        "file_type": request.file_type,
+        "subsequent_to": request.subsequent_to,
+        "uploaded_by": state.uploaded_by,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **request.metadata,
+    }
+    if transcode_metadata:
+        metadata["transcode"] = transcode_metadata
+    return {k: v for k, v in metadata.items() if v is not None}
+
+
 def _should_transcode_video(request: ContentFinalizeRequest) -> bool:
     """Determine if video transcoding is requested."""
     if request.transcoding_strategy == "none":
@@ -492,28 +655,36 @@ async def finalize_sse_generator(
     Fast path: if preview transcoding already produced an HLS CID and no trim
     is requested, finalization is instant — just emit the existing CID.
 
+    Trim fast paths (see services/trim.py): with a ready preview, its
+    playlists are cut to the trim window and the segments re-linked by CID;
+    otherwise a source that's already H.264 is stream-copied locally.
+
     Slow path (trim requested or no preview): Coconut cloud transcoding first,
-    local ffmpeg fallback. Coconut fetches source from staging via preview_token.
+    local ffmpeg fallback. Coconut fetches source from staging via a signed URL.
 
-    Every SSE frame is mirrored into ``state.finalize_log`` and persisted, so
-    that after the SSE connection closes (or if the user reloads the page),
-    the ReleaseDraft page can show exactly which transcoding path ran and
-    where it ended up. On success the draft dir is deleted; on failure it is
+    Every SSE frame is appended to the draft's finalize log, so that after
+    the SSE connection closes (or if the user reloads the page), the
+    ReleaseDraft page can show exactly which transcoding path ran and where
+    it ended up. draft.json itself is only rewritten on status changes, via a
+    DraftStateWriter. On success the draft dir is deleted; on failure it is
     kept for forensics.
     """
+    # Finalize only owns ``status`` — the preview fields in ``state`` may be
+    # stale if a Coconut webhook lands mid-finalize.
+    writer = DraftStateWriter(draft_dir, fields={"status"})
+
     async def send_event(event: str, data: dict):
         # Mirror to persistent log before yielding the SSE frame.
         msg = data.get("message") or ""
         is_error = event == "error"
-        _append_finalize_log(
-            state,
-            stage=data.get("stage") or event,
-            message=msg,
-            progress=data.get("progress"),
-            error=msg if is_error else None,
-        )
         try:
-            save_draft_state(draft_dir, state)
+            _append_finalize_log(
+                draft_dir,
+                stage=data.get("stage") or event,
+                message=msg,
+                progress=data.get("progress"),
+                error=msg if is_error else None,
+            )
         except Exception:
             logger.exception("[content:%s] Failed to persist finalize_log entry", draft_id[:8])
         return {"event": event, "data": json.dumps(data)}
@@ -524,7 +695,7 @@ async def finalize_sse_generator(
     try:
         state.status = "finalizing"
         try:
-            save_draft_state(draft_dir, state)
+            await writer.save(state, flush=True)
         except Exception:
             logger.exception("[content:%s] Failed to persist finalizing status", draft_id[:8])
 
@@ -537,6 +708,7 @@ async def finalize_sse_generator(
             "message": "Preparing content...",
             "progress": 5
         })
+        placed = PlaceStats()
 
         # Preserve original file if requested
         if request.preserve_original:
@@ -545,8 +717,10 @@ async def finalize_sse_generator(
             for f in state.files:
                 src = upload_dir / f.original_filename
                 if src.exists():
-                    shutil.copy2(src, originals_dir / f.original_filename)
-            logger.info("[content:%s] Original files preserved to %s", draft_id[:8], originals_dir)
+                    place_file(src, originals_dir / f.original_filename, stats=placed)
+            staging_space.remeasure(originals_dir)
+            logger.info("[content:%s] Original files preserved to %s (%s)",
+                        draft_id[:8], originals_dir, placed.summary())
 
         video_files = [f for f in state.files if f.media_type == "video"]
         wants_transcode = len(state.files) == 1 and video_files and _should_transcode_video(request)
@@ -573,17 +747,60 @@ async def finalize_sse_generator(
             pin_success = True
             return
 
+        # === Trim fast path: cut the ready preview HLS by rewriting its playlists ===
+        if wants_transcode and state.preview_cid and has_trim:
+            yield await send_event("progress", {
+                "stage": "transcode",
+                "message": "Trimming the preview HLS (no re-encode)...",
+                "progress": 30
+            })
+            try:
+                links, files, transcode_metadata = await trim.plan_playlist_trim(
+                    state.preview_cid, request.trim_start_seconds, request.trim_end_seconds
+                )
+                files["metadata.json"] = json.dumps(
+                    _pin_metadata(request, state, transcode_metadata), indent=2
+                ).encode()
+                result = await ipfs.add_linked_directory(links, files)
+                if not result.success:
+                    raise RuntimeError(result.error)
+            except Exception as e:
+                logger.warning("[content:%s] Preview trim failed, transcoding instead: %s", draft_id[:8], e)
+                yield await send_event("progress", {
+                    "stage": "transcode",
+                    "message": f"Preview trim unavailable ({e}), transcoding instead...",
+                    "progress": 10
+                })
+            else:
+                actual = transcode_metadata["trim"]
+                state.status = "finalized"
+                yield await send_event("complete", {
+                    "cid": result.cid,
+                    "gateway_url": f"{settings.ipfs_gateway_url}/ipfs/{result.cid}",
+                    "pinata": result.pinata_success,
+                    "title": request.title,
+                    "file_type": request.file_type,
+                    "subsequent_to": request.subsequent_to,
+                    "trim": actual,
+                })
+                pin_success = True
+                return
+
+        # === Trim fast path: stream-copy a source that's already H.264 ===
+        # (single source-resolution rendition, so not when a ladder was asked for)
+        stream_copy = False
+        if wants_transcode and has_trim and not request.transcoding_qualities:
+            src_probe = await transcode.probe_video(upload_dir / video_files[0].original_filename)
+            stream_copy = trim.can_stream_copy(transcode.source_info_from_probe(src_probe))
+
         # === Coconut cloud transcoding (with trim, or no preview available) ===
-        if wants_transcode and _should_use_coconut(request, settings):
+        if wants_transcode and not stream_copy and _should_use_coconut(request, settings):
             video_file = video_files[0]
             src_path = upload_dir / video_file.original_filename
 
-            # Build source URL — Coconut fetches from staging via preview_token
+            # Build source URL — Coconut fetches from staging via a signed URL
             base_url = settings.ipfs_gateway_url.replace("ipfs.", "", 1)
-            source_url = (
-                f"{base_url}/staging/drafts/{draft_id}/{quote(video_file.original_filename)}"
-                f"?preview_token={state.preview_token}"
-            )
+            source_url = _coconut_source_url(draft_id, video_file.original_filename, state, settings)
 
             trim_msg = ""
             if has_trim:
@@ -622,7 +839,7 @@ async def finalize_sse_generator(
                     "createdAt": datetime.now(timezone.utc).isoformat(),
                     "identity": state.uploaded_by,
                 }
-                save_job(Path(settings.staging_dir), job_id, job_state)
+                save_job(Path(settings.staging_dir), job_id, job_state, state_dir=settings.state_path)
 
                 # Don't delete draft dir yet — source file still needed if Coconut
                 # hasn't fetched it. Draft TTL cleanup handles it.
@@ -657,18 +874,70 @@ async def finalize_sse_generator(
             video_file = video_files[0]
             src_path = upload_dir / video_file.original_filename
 
-            yield await send_event("progress", {
-                "stage": "transcode",
-                "message": f"Transcoding {video_file.original_filename} to HLS...",
-                "progress": 10
-            })
-
             hls_dir = output_dir / "hls"
-            result = await transcode.transcode_video_to_hls(
-                src_path, hls_dir,
-                trim_start=request.trim_start_seconds,
-                trim_end=request.trim_end_seconds,
-            )
+
+            def start_encode(copy: bool, feed: transcode.ProgressFeed) -> asyncio.Task:
+                if copy:
+                    return asyncio.create_task(trim.stream_copy_trim(
+                        src_path, hls_dir,
+                        trim_start=request.trim_start_seconds,
+                        trim_end=request.trim_end_seconds,
+                        progress_callback=feed.put,
+                    ))
+                return asyncio.create_task(transcode.transcode_video_to_hls(
+                    src_path, hls_dir,
+                    progress_callback=feed.put,
+                    trim_start=request.trim_start_seconds,
+                    trim_end=request.trim_end_seconds,
+                    duration=video_file.duration_seconds,
+                    qualities=request.transcoding_qualities or transcode.DEFAULT_HLS_QUALITIES,
+                    # Upload analysis already probed the source
+                    source_info={
+                        "duration_seconds": video_file.duration_seconds,
+                        "size_bytes": video_file.size_bytes,
+                        "format": video_file.format,
+                        "video_codec": video_file.video_codec,
+                        "width": video_file.width,
+                        "height": video_file.height,
+                        "audio_codec": video_file.audio_codec,
+                    },
+                    source_sha256=video_file.sha256,
+                ))
+
+            # A failed stream copy falls back to a full transcode
+            for copy in ((True, False) if stream_copy else (False,)):
+                label = "Cutting (stream copy)" if copy else "Transcoding to HLS"
+                yield await send_event("progress", {
+                    "stage": "transcode",
+                    "message": (f"Cutting {video_file.original_filename} without re-encoding..." if copy
+                                else f"Transcoding {video_file.original_filename} to HLS..."),
+                    "progress": 10
+                })
+
+                # Run the encode as a task so ffmpeg's progress can be streamed
+                # (percent + ETA against the duration analysis already found)
+                feed = transcode.ProgressFeed()
+                encode = start_encode(copy, feed)
+                async with aclosing(feed.follow(encode)) as reports:
+                    async for report in reports:
+                        yield await send_event("progress", {
+                            "stage": "transcode",
+                            "message": f"{label} · {report.describe()}",
+                            "progress": 10 + int((report.percent or 0) * 0.5),
+                            "eta_seconds": round(report.eta_seconds) if report.eta_seconds is not None else None,
+                            "speed": report.speed,
+                        })
+                result = await encode
+                if result.success or not copy:
+                    break
+                logger.warning("[content:%s] Stream copy failed, transcoding instead: %s",
+                               draft_id[:8], result.error)
+                yield await send_event("progress", {
+                    "stage": "transcode",
+                    "message": f"Stream copy failed ({result.error}), transcoding instead...",
+                    "progress": 10
+                })
+                staging_space.remove_tree(hls_dir)
 
             if not result.success:
                 state.status = "finalize_failed"
@@ -688,37 +957,32 @@ async def finalize_sse_generator(
             })
 
         else:
-            # No transcode needed — copy files to output and pin as-is
-            for f in state.files:
+            # No transcode needed — link files into output and pin as-is.
+            # No rename: on failure the upload stays put for a re-attempt.
+            for i, f in enumerate(state.files, start=1):
                 src = upload_dir / f.original_filename
                 if src.exists():
-                    shutil.copy2(src, output_dir / f.original_filename)
+                    place_file(src, output_dir / f.original_filename, stats=placed)
+                yield await send_event("progress", {
+                    "stage": "organize",
+                    "message": f"Staged {i}/{len(state.files)}: {f.original_filename}",
+                    "progress": 5 + int(15 * i / len(state.files)),
+                })
 
             pin_path = output_dir
             transcode_metadata = None
 
             yield await send_event("progress", {
                 "stage": "organize",
-                "message": "Files ready",
+                "message": f"Files ready ({placed.summary()})",
                 "progress": 20
             })
 
         # Write metadata.json into the pin directory
-        metadata = {
-            "title": request.title,
-            "description": request.description,
-            "file_type": request.file_type,
-            "subsequent_to": request.subsequent_to,
-            "uploaded_by": state.uploaded_by,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            **request.metadata,
-        }
-        if transcode_metadata:
-            metadata["transcode"] = transcode_metadata
-        metadata = {k: v for k, v in metadata.items() if v is not None}
-
         with open(pin_path / "metadata.json", "w") as f:
-            json.dump(metadata, f, indent=2)
+            json.dump(_pin_metadata(request, state, transcode_metadata), f, indent=2)
+        # Transcode/copy output landed inside the draft dir
+        staging_space.remeasure(draft_dir)
 
         yield await send_event("progress", {
             "stage": "ipfs",
@@ -752,6 +1016,7 @@ async def finalize_sse_generator(
             "title": request.title,
             "file_type": request.file_type,
             "subsequent_to": request.subsequent_to,
+            "bytes_saved": placed.bytes_saved,
         })
         pin_success = True
 
@@ -762,25 +1027,63 @@ async def finalize_sse_generator(
 
     finally:
         # Only wipe the draft dir on a fully successful pin. On failure we
-        # keep draft.json (with its finalize_log) so the ReleaseDraft page
+        # keep draft.json (and its finalize log) so the ReleaseDraft page
         # can show what went wrong, and the source bytes stay on disk for
         # ffprobe / re-attempt.
         if pin_success:
+            writer.discard()
             try:
-                if draft_dir.exists():
-                    safe_rmtree(draft_dir)
+                staging_space.remove_tree(draft_dir)
+                draft_events.notify(draft_dir)
             except Exception:
                 logger.exception("[content:%s] Failed to clean up draft dir", draft_id[:8])
         else:
             # Persist the final status (e.g. finalize_failed) so the page poll
             # picks it up after the SSE connection closes.
             try:
-                if draft_dir.exists():
-                    save_draft_state(draft_dir, state)
+                await writer.save(state, flush=True)
             except Exception:
                 logger.exception("[content:%s] Failed to persist final state", draft_id[:8])
 
 
+FINALIZE_TASK = "content-finalize"
+
+
+@task_queue.handler(FINALIZE_TASK)
+async def run_finalize_task(task: task_queue.Task, publish: task_queue.Publish) -> None:
+    """Task queue handler: run finalize_sse_generator and publish its frames.
+
+    An ``error`` frame fails the task with its message. A resumed task
+    just runs finalize again — placing files is idempotent and a finished
+    transcode comes back from the transcode cache.
+    """
+    settings = get_settings()
+    draft_id = task.payload["draft_id"]
+    draft_dir = get_draft_dir(Path(settings.staging_dir), draft_id)
+    state = load_draft_state(draft_dir)
+    if state is None:
+        publish({"event": "error", "data": json.dumps({"stage": "prepare", "message": "Content draft not found"})})
+        raise task_queue.TaskFailed("Content draft not found")
+    request = ContentFinalizeRequest(**task.payload["request"])
+    failure = None
+    try:
+        async with aclosing(finalize_sse_generator(draft_id, request, draft_dir, state, settings)) as frames:
+            async for frame in frames:
+                publish(frame)
+                failure = task_queue.error_message(frame) or failure
+    except asyncio.CancelledError:
+        # Shutdown leaves the draft "finalizing" for the resumed task; a
+        # user's cancel ends this attempt
+        if task.cancelled:
+            _append_finalize_log(draft_dir, stage="cancelled", message="Finalize cancelled",
+                                 error="Finalize cancelled")
+            state.status = "finalize_failed"
+            await DraftStateWriter(draft_dir, fields={"status"}).save(state, flush=True)
+        raise
+    if failure is not None:
+        raise task_queue.TaskFailed(failure)
+
+
 @router.post("/{draft_id}/finalize")
 async def finalize_content_draft(
     draft_id: str,
@@ -791,19 +1094,32 @@ async def finalize_content_draft(
     """
     Finalize a content draft — optionally transcode, then pin to IPFS.
 
-    Progress is streamed via Server-Sent Events.
+    The work runs as a background task (see GET /tasks/{id}), so it
+    survives the client disconnecting; this stream follows its progress
+    via Server-Sent Events. Finalizing a draft that is already being
+    finalized follows the existing task.
     """
     staging_dir = Path(settings.staging_dir)
     draft_dir = get_draft_dir(staging_dir, draft_id)
 
-    state = load_draft_state(draft_dir)
+    state = load_draft_state(draft_dir, readonly=True)
     if state is None:
         raise HTTPException(status_code=404, detail="Content draft not found")
 
     # No ownership check — require_finalize_auth already ensures
     # the user has finalize-release permission.
 
+    queue = task_queue.get_task_queue()
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Task queue not running")
+    task = queue.submit(
+        FINALIZE_TASK,
+        {"draft_id": draft_id, "request": request.model_dump()},
+        priority=task_queue.PRIORITY_INTERACTIVE,
+        draft_id=draft_id,
+    )
+
     return EventSourceResponse(
-        finalize_sse_generator(draft_id, request, draft_dir, state, settings),
+        queue.follow(task["id"]),
         media_type="text/event-stream"
     )
@@ -0,0 +1,50 @@
+"""Draft listing for audits and admin tooling.
+
+GET /drafts — every staging draft (content and album) from the in-memory
+              drafts index, with filters and pagination
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+
+from ..auth import require_finalize_auth
+from ..config import get_settings, Settings
+from ..services.draft_index import get_draft_index, init_draft_index
+
+router = APIRouter(tags=["drafts"])
+
+
+@router.get("/drafts")
+async def list_drafts(
+    status: str | None = Query(None, description="Filter by draft status (e.g. uploaded, finalize_failed)"),
+    owner: str | None = Query(None, description="Filter by uploader identity"),
+    draft_type: Literal["content", "album"] | None = Query(None),
+    has_draft_json: bool | None = Query(None, description="false lists stalled dirs with no draft.json"),
+    sort: Literal["updated", "created", "size"] = Query("updated"),
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    refresh: bool = Query(False, description="Rescan the staging dir first (picks up other workers' changes)"),
+    identity: str = Depends(require_finalize_auth),
+    settings: Settings = Depends(get_settings),
+):
+    """List staging drafts. Requires finalize permission (or the API key).
+
+    Each entry carries draft_id, status, owner, size_bytes, file_count,
+    created_at and updated_at (newest file mtime, epoch seconds).
+    """
+    index = get_draft_index() or init_draft_index(Path(settings.staging_dir))
+    if refresh or index.built_at is None:
+        await asyncio.to_thread(index.rebuild)
+    return await asyncio.to_thread(
+        index.query,
+        status=status,
+        owner=owner,
+        draft_type=draft_type,
+        has_draft_json=has_draft_json,
+        sort=sort,
+        limit=limit,
+        offset=offset,
+    )
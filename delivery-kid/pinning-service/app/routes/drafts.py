@@ -2,9 +2,10 @@
 
 import asyncio
 import json
-import shutil
 import uuid
+from contextlib import aclosing
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, File, Header, Request, UploadFile, HTTPException
@@ -13,8 +14,11 @@ from sse_starlette.sse import EventSourceResponse
 from ..auth import require_auth, require_finalize_auth, has_finalize_token
 from ..config import get_settings, get_commit, Settings
 from ..models.draft import DraftFile, DraftState, DraftResponse, FinalizeRequest
-from ..services import analyze, ipfs, transcode
-from ..services.fsutil import safe_rmtree
+from ..services import analyze, draft_events, ipfs, media_assets, staging_space, task_queue, transcode
+from ..services.draft_store import write_draft_state
+from ..services.fsutil import PlaceStats, place_file
+from ..services.staging_space import StagingFull, StagingNotReady
+from ..services.transcode_scheduler import TranscodeJob, get_transcode_scheduler
 
 router = APIRouter(prefix="/draft-album", tags=["drafts"])
 
@@ -39,9 +43,7 @@ def load_draft_state(draft_dir: Path) -> DraftState | None:
 
 def save_draft_state(draft_dir: Path, state: DraftState) -> None:
     """Save draft state to disk."""
-    draft_json = draft_dir / "draft.json"
-    with open(draft_json, "w") as f:
-        json.dump(state.model_dump(mode="json"), f, indent=2, default=str)
+    write_draft_state(draft_dir, state)
 
 
 @router.post("", response_model=DraftResponse)
@@ -100,7 +102,7 @@ async def create_draft(
             prior = load_draft_state(existing)
             if prior is not None and prior.uploaded_by.lower() != wallet_address.lower():
                 raise HTTPException(status_code=403, detail="You do not own this draft")
-            safe_rmtree(existing)
+            staging_space.remove_tree(existing)
     else:
         draft_id = str(uuid.uuid4())
 
@@ -109,12 +111,14 @@ async def create_draft(
     upload_dir.mkdir(parents=True, exist_ok=True)
 
     try:
-        # Save uploaded files
-        for file in files:
-            file_path = upload_dir / file.filename
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
+        # Save uploaded files, held against the staging quota up front
+        with staging_space.reserve(total_size):
+            for file in files:
+                file_path = upload_dir / file.filename
+                with open(file_path, "wb") as f:
+                    content = await file.read()
+                    f.write(content)
+                staging_space.record_write(file_path, len(content))
 
         # Analyze audio files
         analyses = await analyze.analyze_directory(upload_dir)
@@ -136,7 +140,7 @@ async def create_draft(
 
         if not draft_files:
             # Cleanup if no valid audio files
-            safe_rmtree(draft_dir)
+            staging_space.remove_tree(draft_dir)
             raise HTTPException(
                 status_code=400,
                 detail="No valid audio files found in upload"
@@ -151,7 +155,8 @@ async def create_draft(
             uploaded_by=wallet_address,
             files=draft_files
         )
-        save_draft_state(draft_dir, state)
+        await asyncio.to_thread(save_draft_state, draft_dir, state)
+        media_assets.schedule(draft_id, draft_dir)
 
         return DraftResponse(
             draft_id=draft_id,
@@ -161,10 +166,16 @@ async def create_draft(
 
     except HTTPException:
         raise
+    except StagingNotReady as e:
+        staging_space.remove_tree(draft_dir)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except StagingFull as e:
+        staging_space.remove_tree(draft_dir)
+        raise HTTPException(status_code=507, detail=str(e))
     except Exception as e:
         # Cleanup on error
         if draft_dir.exists():
-            safe_rmtree(draft_dir)
+            staging_space.remove_tree(draft_dir)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -222,11 +233,29 @@ async def delete_draft(
         raise HTTPException(status_code=403, detail="Not your draft")
 
     # Cleanup
-    safe_rmtree(draft_dir)
+    staging_space.remove_tree(draft_dir)
+    draft_events.notify(draft_dir)
 
     return {"message": "Draft deleted", "draft_id": draft_id}
 
 
+def _track_metadata(request: FinalizeRequest, stem: str, track_info) -> dict[str, str]:
+    """Vorbis tags for one track; ``stem`` is its "01-Title" output name."""
+    track_num, _, track_title = stem.partition("-")
+    metadata = {
+        "ARTIST": request.artist,
+        "ALBUM": request.album_title,
+        "TITLE": track_title,
+        "TRACKNUMBER": track_num,
+    }
+    if request.year:
+        metadata["DATE"] = request.year
+    # Add per-track custom tags
+    if track_info and track_info.tags:
+        metadata.update(track_info.tags)
+    return metadata
+
+
 async def finalize_sse_generator(
     draft_id: str,
     request: FinalizeRequest,
@@ -243,6 +272,7 @@ async def finalize_sse_generator(
     async def send_event(event: str, data: dict):
         return {"event": event, "data": json.dumps(data)}
 
+    interrupted = False
     try:
         upload_dir = draft_dir / "upload"
         album_dir = draft_dir / "album"
@@ -270,20 +300,13 @@ async def finalize_sse_generator(
             "progress": 10
         })
 
-        # Copy and rename files according to track order
-        # Also build mapping from new filename to track info for transcoding
-        has_flac = False  # True if user uploaded FLAC files (need FLAC→OGG)
-        has_wav = False   # True if user uploaded WAV files (need WAV→FLAC and WAV→OGG)
-        flac_to_track_info = {}  # Maps new FLAC filename -> FinalizeTrack
-        wav_to_convert = []  # List of (src_wav, dest_flac, dest_ogg, track_info) tuples
+        # Place files into the album according to track order. The draft
+        # dir is removed when we're done, so sources may be moved outright.
+        # Also queue the encodes each track needs
+        placed = PlaceStats()
+        jobs = []  # ffmpeg work, run concurrently below
         for idx, filename in enumerate(ordered_files, start=1):
             src_path = upload_dir / filename
-            if not src_path.exists():
-                yield await send_event("error", {
-                    "message": f"File not found: {filename}"
-                })
-                return
-
             ext = src_path.suffix.lower()
             track_num = f"{idx:02d}"
             track_info = track_map.get(filename)
@@ -292,155 +315,68 @@ async def finalize_sse_generator(
             # Sanitize title for filename
             safe_title = "".join(c if c.isalnum() or c in " -_" else "" for c in title)
             safe_title = safe_title.strip()[:50]  # Limit length
+            stem = f"{track_num}-{safe_title}"
 
+            # Where the source itself lands: cover art at the album root,
+            # other audio formats directly in the OGG dir. WAV stays in
+            # upload/ and is encoded from there.
             if ext == ".flac":
-                has_flac = True
-                dest_name = f"{track_num}-{safe_title}.flac"
-                shutil.copy2(src_path, flac_dir / dest_name)
-                flac_to_track_info[dest_name] = track_info
+                dest = flac_dir / f"{stem}.flac"
             elif ext == ".wav":
-                # WAV files: convert to FLAC (archive) and OGG (streaming) directly
-                has_wav = True
-                flac_dest = f"{track_num}-{safe_title}.flac"
-                ogg_dest = f"{track_num}-{safe_title}.ogg"
-                wav_to_convert.append((src_path, flac_dir / flac_dest, ogg_dir / ogg_dest, track_info))
+                dest = None
             elif ext in {".jpg", ".jpeg", ".png", ".webp"}:
-                # Cover art goes to album root
-                shutil.copy2(src_path, album_dir / "cover" + ext)
+                dest = album_dir / f"cover{ext}"
             else:
-                # Other audio formats go directly to OGG dir
-                dest_name = f"{track_num}-{safe_title}{ext}"
-                shutil.copy2(src_path, ogg_dir / dest_name)
+                dest = ogg_dir / f"{stem}{ext}"
 
-        # Convert WAV files to FLAC (archive) and OGG (streaming) directly
-        if wav_to_convert:
-            yield await send_event("progress", {
-                "stage": "wav_convert",
-                "message": "Converting WAV files...",
-                "progress": 10
-            })
-
-            for i, (wav_path, flac_path, ogg_path, track_info) in enumerate(wav_to_convert):
-                base_progress = 10 + int((i / len(wav_to_convert)) * 25)
-
-                # Extract track number from filename for metadata
-                track_num_str = flac_path.stem.split("-")[0] if "-" in flac_path.stem else str(i + 1)
-                track_title = "-".join(flac_path.stem.split("-")[1:]) if "-" in flac_path.stem else flac_path.stem
-
-                # Build metadata for this track
-                track_metadata = {
-                    "ARTIST": request.artist,
-                    "ALBUM": request.album_title,
-                    "TITLE": track_title,
-                    "TRACKNUMBER": track_num_str,
-                }
-                if request.year:
-                    track_metadata["DATE"] = request.year
-                if track_info and track_info.tags:
-                    track_metadata.update(track_info.tags)
-
-                # Convert WAV to FLAC (lossless archive)
-                yield await send_event("progress", {
-                    "stage": "wav_convert",
-                    "message": f"Converting {wav_path.name} to FLAC...",
-                    "progress": base_progress,
-                    "track": wav_path.name
-                })
-
-                flac_cmd = [
-                    "ffmpeg", "-y", "-i", str(wav_path),
-                    "-c:a", "flac",
-                    "-compression_level", "8",
-                    str(flac_path)
-                ]
-                proc = await asyncio.create_subprocess_exec(
-                    *flac_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                _, stderr = await proc.communicate()
-
-                if proc.returncode != 0:
-                    yield await send_event("warning", {
-                        "message": f"Failed to convert {wav_path.name} to FLAC: {stderr.decode()[:200]}"
-                    })
-
-                # Convert WAV to OGG directly (with metadata)
-                yield await send_event("progress", {
-                    "stage": "wav_convert",
-                    "message": f"Converting {wav_path.name} to OGG...",
-                    "progress": base_progress + 5,
-                    "track": wav_path.name
+            if src_path.exists():
+                if dest is not None:
+                    place_file(src_path, dest, allow_move=True, stats=placed)
+            elif dest is None or not dest.exists():
+                # (A resumed finalize finds files it already moved at ``dest``)
+                yield await send_event("error", {
+                    "message": f"File not found: {filename}"
                 })
+                return
 
-                ogg_cmd = ["ffmpeg", "-y", "-i", str(wav_path), "-c:a", "libvorbis", "-q:a", "6"]
-                for key, value in track_metadata.items():
-                    ogg_cmd.extend(["-metadata", f"{key}={value}"])
-                ogg_cmd.append(str(ogg_path))
-
-                proc = await asyncio.create_subprocess_exec(
-                    *ogg_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                _, stderr = await proc.communicate()
-
-                if proc.returncode != 0:
-                    yield await send_event("warning", {
-                        "message": f"Failed to convert {wav_path.name} to OGG: {stderr.decode()[:200]}"
-                    })
-
-        # Transcode FLAC files to OGG
-        if has_flac:
+            if ext == ".flac":
+                jobs.append(TranscodeJob(dest.name, partial(
+                    transcode.transcode_flac_to_ogg, dest, ogg_dir / f"{stem}.ogg",
+                    metadata=_track_metadata(request, stem, track_info),
+                ), kind="ogg"))
+            elif ext == ".wav":
+                # WAV files: FLAC (archive) and OGG (streaming) from one decode
+                jobs.append(TranscodeJob(src_path.name, partial(
+                    transcode.transcode_wav_to_flac_and_ogg,
+                    src_path, flac_dir / f"{stem}.flac", ogg_dir / f"{stem}.ogg",
+                    metadata=_track_metadata(request, stem, track_info),
+                ), kind="flac+ogg"))
+
+        # Encode every track at once (up to the scheduler's slot count),
+        # reporting each as it finishes
+        if jobs:
+            scheduler = get_transcode_scheduler()
             yield await send_event("progress", {
                 "stage": "transcode",
-                "message": "Transcoding FLAC to OGG...",
-                "progress": 20
+                "message": f"Encoding {len(jobs)} files ({scheduler.slots} at a time)...",
+                "progress": 10
             })
-
-            flac_files = sorted(flac_dir.glob("*.flac"))
-            total_flac = len(flac_files)
-
-            for i, flac_path in enumerate(flac_files):
-                ogg_name = flac_path.stem + ".ogg"
-                ogg_path = ogg_dir / ogg_name
-
-                # Skip if OGG already exists (e.g., from WAV→OGG conversion)
-                if ogg_path.exists():
-                    continue
-
-                # Extract track number and title from filename (format: "01-Title.flac")
-                track_num_str = flac_path.stem.split("-")[0] if "-" in flac_path.stem else str(i + 1)
-                track_title = "-".join(flac_path.stem.split("-")[1:]) if "-" in flac_path.stem else flac_path.stem
-
-                # Get per-track info for tags
-                this_track_info = flac_to_track_info.get(flac_path.name)
-
-                # Build metadata for this track
-                track_metadata = {
-                    "ARTIST": request.artist,
-                    "ALBUM": request.album_title,
-                    "TITLE": track_title,
-                    "TRACKNUMBER": track_num_str,
-                }
-                if request.year:
-                    track_metadata["DATE"] = request.year
-                # Add per-track custom tags
-                if this_track_info and this_track_info.tags:
-                    track_metadata.update(this_track_info.tags)
-
-                yield await send_event("progress", {
-                    "stage": "transcode",
-                    "message": f"Transcoding {flac_path.name}...",
-                    "progress": 20 + int((i / total_flac) * 40),
-                    "track": flac_path.name
-                })
-
-                result = await transcode.transcode_flac_to_ogg(flac_path, ogg_path, metadata=track_metadata)
-
-                if not result.success:
-                    yield await send_event("warning", {
-                        "message": f"Failed to transcode {flac_path.name}: {result.error}"
+            async with aclosing(scheduler.as_completed(jobs)) as results:
+                done = 0
+                async for job, result in results:
+                    done += 1
+                    target = job.kind.upper().replace("+", " and ")
+                    error = result if isinstance(result, Exception) else result.error
+                    if isinstance(result, Exception) or not result.success:
+                        yield await send_event("warning", {
+                            "message": f"Failed to convert {job.name} to {target}: {str(error)[:200]}"
+                        })
+                        continue
+                    yield await send_event("progress", {
+                        "stage": "transcode",
+                        "message": f"Converted {job.name} to {target} ({done}/{len(jobs)})",
+                        "progress": 10 + int(done / len(jobs) * 50),
+                        "track": job.name
                     })
 
         # Create metadata.json
@@ -473,6 +409,7 @@ async def finalize_sse_generator(
             "progress": 70
         })
 
+        staging_space.remeasure(draft_dir)
         result = await ipfs.add_directory(album_dir)
 
         if not result.success:
@@ -499,19 +436,54 @@ async def finalize_sse_generator(
             "tracks": [
                 {"track_number": i + 1, "title": t.title, "filename": t.filename}
                 for i, t in enumerate(request.tracks)
-            ]
+            ],
+            "bytes_saved": placed.bytes_saved,
         })
 
+    except asyncio.CancelledError:
+        # Cancelled or shut down: keep the draft so it can be finalized again
+        interrupted = True
+        raise
+
     except Exception as e:
         yield await send_event("error", {"message": str(e)})
 
     finally:
         # Cleanup draft directory after finalization
-        try:
-            if draft_dir.exists():
-                safe_rmtree(draft_dir)
-        except Exception:
-            pass
+        if not interrupted:
+            try:
+                staging_space.remove_tree(draft_dir)
+                draft_events.notify(draft_dir)
+            except Exception:
+                pass
+
+
+FINALIZE_TASK = "album-finalize"
+
+
+@task_queue.handler(FINALIZE_TASK)
+async def run_finalize_task(task: task_queue.Task, publish: task_queue.Publish) -> None:
+    """Task queue handler: run finalize_sse_generator and publish its frames.
+
+    An ``error`` frame fails the task with its message. A resumed task
+    runs finalize again; tracks an earlier attempt already moved into the
+    album are picked up where they are.
+    """
+    settings = get_settings()
+    draft_id = task.payload["draft_id"]
+    draft_dir = get_draft_dir(Path(settings.staging_dir), draft_id)
+    state = load_draft_state(draft_dir)
+    if state is None:
+        publish({"event": "error", "data": json.dumps({"message": "Draft not found"})})
+        raise task_queue.TaskFailed("Draft not found")
+    request = FinalizeRequest(**task.payload["request"])
+    failure = None
+    async with aclosing(finalize_sse_generator(draft_id, request, draft_dir, state, settings)) as frames:
+        async for frame in frames:
+            publish(frame)
+            failure = task_queue.error_message(frame) or failure
+    if failure is not None:
+        raise task_queue.TaskFailed(failure)
 
 
 @router.post("/{draft_id}/finalize")
@@ -527,7 +499,8 @@ async def finalize_draft(
     Transcodes files to OGG, creates album structure with both FLAC and OGG,
     pins to IPFS, and returns the CID.
 
-    Progress is streamed via Server-Sent Events.
+    The work runs as a background task (see GET /tasks/{id}); progress is
+    streamed via Server-Sent Events.
     """
     staging_dir = Path(settings.staging_dir)
     draft_dir = get_draft_dir(staging_dir, draft_id)
@@ -548,7 +521,17 @@ async def finalize_draft(
                 detail=f"File not in draft: {track.filename}"
             )
 
+    queue = task_queue.get_task_queue()
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Task queue not running")
+    task = queue.submit(
+        FINALIZE_TASK,
+        {"draft_id": draft_id, "request": request.model_dump()},
+        priority=task_queue.PRIORITY_INTERACTIVE,
+        draft_id=draft_id,
+    )
+
     return EventSourceResponse(
-        finalize_sse_generator(draft_id, request, draft_dir, state, settings),
+        queue.follow(task["id"]),
         media_type="text/event-stream"
     )
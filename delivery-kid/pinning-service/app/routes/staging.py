@@ -4,23 +4,52 @@ Files are served from the staging directory at /drafts/{draft_id}/upload/{filena
 Requires a valid upload token (any logged-in wiki user). Does NOT check draft
 ownership — the unguessable UUID is sufficient access control for preview.
 
-Supports HTTP range requests for video seeking via FastAPI's FileResponse.
+Range requests (video seeking) are served by RangedFileResponse, with
+ETag/Last-Modified revalidation and sendfile where the server supports it.
+
+/drafts/{draft_id}/assets serves the waveform peaks and thumbnail sprites
+precomputed after upload (see services/media_assets), so the page needn't
+download the media itself to draw them. /drafts/{draft_id}/{filename}/hls/
+packages a staged video as low-res HLS on demand (services/jit_hls), for
+playback before the preview transcode is done.
+
+GET /staging/usage reports staging space usage against the quota, plus the
+state of the trash reaper, the transcode cache, ffprobe runs per draft and
+on-the-fly HLS encodes.
 
 Auth can be provided via headers (standard require_auth flow) OR via query
 parameters (?token=...&user=...&timestamp=...) so that <video src="...">
-tags work without JavaScript fetch gymnastics.
+tags work without JavaScript fetch gymnastics. POST /drafts/{draft_id}/sign
+trades either for a short-lived signed query (?expires=...&sig=...), which
+is checked without touching the disk — use it for players, which issue
+dozens of range requests a minute.
 """
 
+import asyncio
+import hmac
+import json
 import mimetypes
+import os
+import stat
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 
-from ..auth import require_auth, verify_upload_token
+from ..auth import (
+    match_upload_token, require_auth, require_finalize_auth, staging_url_query, verify_staging_signature,
+)
 from ..config import get_settings, Settings
-from ..models.content import ContentDraftState
+from ..services import jit_hls, media_assets
+from ..services.analyze import VIDEO_EXTENSIONS, ProbeError, probe_stats
+from ..services.draft_store import get_draft_cache
+from ..services.ranged_file import RangedFileResponse
+from ..services.staging_space import StagingFull, StagingNotReady, get_staging_space
+from ..services.transcode_cache import get_transcode_cache
+from ..services.trash import get_trash
 
 router = APIRouter(prefix="/staging", tags=["staging"])
 
@@ -36,44 +65,46 @@ _MEDIA_TYPES = {
 for _ext, _mime in _MEDIA_TYPES.items():
     mimetypes.add_type(_mime, _ext)
 
+# Asset name in the URL -> its entry in the draft's asset index
+_ASSETS = {
+    "peaks": "waveform",
+    "thumbnails.jpg": "thumbnails",
+    "thumbnails.vtt": "thumbnails",
+}
+
+
+def _preview_token_of(draft_dir: Path, data: dict) -> Optional[str]:
+    return data.get("preview_token")
+
 
 def _check_preview_token(draft_id: str, preview_token: str, settings: Settings) -> bool:
-    """Validate a preview_token against the draft state on disk."""
-    import json
-    draft_json = Path(settings.staging_dir) / "drafts" / draft_id / "draft.json"
-    if not draft_json.exists():
-        return False
+    """Validate a preview_token against the draft state (via the draft cache)."""
+    draft_dir = Path(settings.staging_dir) / "drafts" / draft_id
     try:
-        data = json.loads(draft_json.read_text())
-        return data.get("preview_token") == preview_token and preview_token
+        expected = get_draft_cache().load(draft_dir, _preview_token_of)
     except (json.JSONDecodeError, OSError):
         return False
+    return bool(preview_token) and expected is not None and hmac.compare_digest(expected.encode(), preview_token.encode())
 
 
-
-@router.get("/drafts/{draft_id}/{filename}")
-async def get_staging_file(
+async def _authenticate(
     draft_id: str,
-    filename: str,
     request: Request,
-    token: Optional[str] = Query(None),
-    user: Optional[str] = Query(None),
-    timestamp: Optional[str] = Query(None),
-    preview_token: Optional[str] = Query(None),
-    settings: Settings = Depends(get_settings),
-):
-    """Serve a file from a staging draft for preview.
+    token: Optional[str],
+    user: Optional[str],
+    timestamp: Optional[str],
+    preview_token: Optional[str],
+    settings: Settings,
+    expires: Optional[str] = None,
+    sig: Optional[str] = None,
+) -> bool:
+    """Raise 401 unless the request is authenticated for ``draft_id``.
 
-    Used by the ReleaseDraft page to embed video/audio players.
-    Also used by Coconut to fetch source video for transcoding (via preview_token).
-
-    Auth: HMAC headers, HMAC query params, or preview_token query param.
+    Checks a signed URL first (no I/O), then preview_token (for Coconut),
+    headers and HMAC query params. Returns whether a signed URL was used.
     """
-    # Sanitize path components to prevent traversal
-    if ".." in draft_id or "/" in draft_id or ".." in filename or "/" in filename:
-        raise HTTPException(status_code=400, detail="Invalid path")
-
-    # Auth: preview_token (for Coconut), then headers, then HMAC query params
+    if expires and sig and verify_staging_signature(draft_id, expires, sig, settings):
+        return True
     authenticated = False
     if preview_token and _check_preview_token(draft_id, preview_token, settings):
         authenticated = True
@@ -88,28 +119,262 @@ async def get_staging_file(
             ts = int(timestamp)
         except (ValueError, TypeError):
             raise HTTPException(status_code=401, detail="Invalid timestamp")
-        if verify_upload_token(token, user, ts, settings, action="upload"):
-            authenticated = True
-        elif verify_upload_token(token, user, ts, settings, action="finalize"):
+        if match_upload_token(token, user, ts, settings) is not None:
             authenticated = True
     if not authenticated:
         raise HTTPException(status_code=401, detail="Authentication required")
+    return False
 
-    file_path = Path(settings.staging_dir) / "drafts" / draft_id / "upload" / filename
 
-    if not file_path.is_file():
+def _check_path(*parts: str) -> None:
+    if any(".." in part or "/" in part for part in parts):
+        raise HTTPException(status_code=400, detail="Invalid path")
+
+
+@lru_cache(maxsize=8)
+def _staging_root(staging_dir: str) -> Path:
+    return Path(staging_dir).resolve()
+
+
+def _stat_file(path: Path) -> Optional[os.stat_result]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def _cache_control(signed: bool, expires: Optional[str]) -> dict:
+    """Let browsers reuse bytes for as long as a signed URL lives; else revalidate."""
+    if signed:
+        return {"Cache-Control": f"private, max-age={max(0, int(expires) - int(time.time()))}"}
+    return {"Cache-Control": "private, no-cache"}
+
+
+@router.get("/usage")
+async def get_staging_usage(
+    identity: str = Depends(require_finalize_auth),
+):
+    """Staging space usage against ``max_staging_size_gb``.
+
+    Breaks bytes down by category (drafts, originals, job temp dirs, other)
+    and lists the largest entries. Figures come from the live accountant,
+    not a fresh scan. ``trash`` shows deletes still waiting for the reaper;
+    ``transcode_cache`` (capped separately, not counted in the quota) its
+    size and hit rate; ``probes`` the ffprobe runs per draft (each source
+    should be probed once); ``jit_hls`` on-the-fly segment encodes.
+    """
+    space = get_staging_space()
+    if space is None:
+        raise HTTPException(status_code=503, detail="Staging accounting not initialised")
+    usage = space.usage()
+    trash = get_trash()
+    usage["trash"] = trash.status() if trash is not None else None
+    cache = get_transcode_cache()
+    usage["transcode_cache"] = await asyncio.to_thread(cache.stats) if cache is not None else None
+    usage["probes"] = probe_stats()
+    usage["jit_hls"] = jit_hls.status()
+    return usage
+
+
+@router.post("/drafts/{draft_id}/sign")
+async def sign_draft_urls(
+    draft_id: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    user: Optional[str] = Query(None),
+    timestamp: Optional[str] = Query(None),
+    preview_token: Optional[str] = Query(None),
+    settings: Settings = Depends(get_settings),
+):
+    """A signed query string for the draft's staged files and assets.
+
+    Append it to any /staging/drafts/{draft_id}/... URL. Valid for
+    ``staging_url_ttl_seconds`` (expiry rounded up, so URLs minted close
+    together are identical and share the browser cache).
+    """
+    _check_path(draft_id)
+    await _authenticate(draft_id, request, token, user, timestamp, preview_token, settings)
+    if not settings.api_key:
+        raise HTTPException(status_code=503, detail="Signed URLs need api_key configured")
+    query = staging_url_query(draft_id, settings)
+    return {"query": query, "expires": int(query.split("&", 1)[0].split("=", 1)[1])}
+
+
+@router.get("/drafts/{draft_id}/assets")
+async def get_draft_assets(
+    draft_id: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    user: Optional[str] = Query(None),
+    timestamp: Optional[str] = Query(None),
+    preview_token: Optional[str] = Query(None),
+    expires: Optional[str] = Query(None),
+    sig: Optional[str] = Query(None),
+    settings: Settings = Depends(get_settings),
+):
+    """Index of a draft's precomputed waveform peaks and thumbnail sprites.
+
+    Empty until the background asset task has run. Each file's entry
+    describes its ``waveform`` (peak count, samples per peak) and
+    ``thumbnails`` (tile size and grid) for drawing them client-side.
+    """
+    _check_path(draft_id)
+    await _authenticate(draft_id, request, token, user, timestamp, preview_token, settings, expires, sig)
+    return media_assets.load_index(Path(settings.staging_dir) / "drafts" / draft_id)
+
+
+@router.get("/drafts/{draft_id}/assets/{filename}/{asset}")
+async def get_draft_asset(
+    draft_id: str,
+    filename: str,
+    asset: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    user: Optional[str] = Query(None),
+    timestamp: Optional[str] = Query(None),
+    preview_token: Optional[str] = Query(None),
+    expires: Optional[str] = Query(None),
+    sig: Optional[str] = Query(None),
+    settings: Settings = Depends(get_settings),
+):
+    """Serve one precomputed asset of a staged file.
+
+    ``peaks`` is raw int8 (min, max) pairs; ``thumbnails.jpg`` the sprite;
+    ``thumbnails.vtt`` its WebVTT index for a player's scrub previews. The
+    VTT links the sprite with this request's query string, so query-param
+    auth carries over.
+    """
+    _check_path(draft_id, filename)
+    if asset not in _ASSETS:
+        raise HTTPException(status_code=404, detail="Unknown asset")
+    signed = await _authenticate(draft_id, request, token, user, timestamp, preview_token, settings, expires, sig)
+
+    draft_dir = Path(settings.staging_dir) / "drafts" / draft_id
+    entry = media_assets.load_index(draft_dir)["files"].get(filename, {})
+    kind = _ASSETS[asset]
+    if kind not in entry:
+        raise HTTPException(status_code=404, detail="Asset not generated")
+    if asset == "thumbnails.vtt":
+        sprite_url = "thumbnails.jpg" + (f"?{request.url.query}" if request.url.query else "")
+        return Response(content=media_assets.build_vtt(entry[kind], sprite_url), media_type="text/vtt")
+
+    file_path = media_assets.assets_dir(draft_dir) / entry[kind]["file"]
+    st = _stat_file(file_path)
+    if st is None:
+        raise HTTPException(status_code=404, detail="Asset not generated")
+    media_type = "image/jpeg" if kind == "thumbnails" else "application/octet-stream"
+    return RangedFileResponse(file_path, st, media_type=media_type, headers=_cache_control(signed, expires))
+
+
+@router.get("/drafts/{draft_id}/{filename}/hls/{name}")
+async def get_jit_hls(
+    draft_id: str,
+    filename: str,
+    name: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    user: Optional[str] = Query(None),
+    timestamp: Optional[str] = Query(None),
+    preview_token: Optional[str] = Query(None),
+    expires: Optional[str] = Query(None),
+    sig: Optional[str] = Query(None),
+    settings: Settings = Depends(get_settings),
+):
+    """Play a staged video as HLS before its preview is ready.
+
+    ``index.m3u8`` is a VOD playlist over the whole source; each
+    ``seg_NNNNN.ts`` is cut (remuxed or encoded to 480p) the first time
+    it's asked for, then served from the draft's segment cache. Segment
+    URIs carry this request's query string, so query-param auth carries
+    over — prefer a signed URL (POST /sign).
+    """
+    _check_path(draft_id, filename)
+    index = None
+    if name != "index.m3u8":
+        index = jit_hls.segment_index(name)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Not found")
+    signed = await _authenticate(draft_id, request, token, user, timestamp, preview_token, settings, expires, sig)
+
+    if Path(filename).suffix.lower() not in VIDEO_EXTENSIONS:
+        raise HTTPException(status_code=404, detail="Not a video")
+    draft_dir = Path(settings.staging_dir) / "drafts" / draft_id
+    source = draft_dir / "upload" / filename
+    st = _stat_file(source)
+    if st is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    cache_dir = jit_hls.cache_dir_for(draft_dir, filename, st.st_size, st.st_mtime_ns)
+
+    try:
+        if index is None:
+            packaging = await jit_hls.plan(source, cache_dir)
+            return Response(
+                content=jit_hls.media_playlist(packaging["segments"], request.url.query),
+                media_type="application/vnd.apple.mpegurl",
+                headers=_cache_control(signed, expires),
+            )
+        path = await jit_hls.segment(source, cache_dir, index)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="No such segment")
+    except StagingNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except StagingFull as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except (ValueError, ProbeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="ffmpeg not available")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    seg_st = _stat_file(path)
+    if seg_st is None:
+        raise HTTPException(status_code=500, detail="Segment missing after encode")
+    return RangedFileResponse(path, seg_st, media_type="video/mp2t", headers=_cache_control(signed, expires))
+
+
+@router.get("/drafts/{draft_id}/{filename}")
+async def get_staging_file(
+    draft_id: str,
+    filename: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    user: Optional[str] = Query(None),
+    timestamp: Optional[str] = Query(None),
+    preview_token: Optional[str] = Query(None),
+    expires: Optional[str] = Query(None),
+    sig: Optional[str] = Query(None),
+    settings: Settings = Depends(get_settings),
+):
+    """Serve a file from a staging draft for preview.
+
+    Used by the ReleaseDraft page to embed video/audio players.
+    Also used by Coconut to fetch source video for transcoding (via a signed URL).
+
+    Auth: signed URL, preview_token, HMAC headers or HMAC query params.
+    """
+    # Sanitize path components to prevent traversal
+    _check_path(draft_id, filename)
+    signed = await _authenticate(draft_id, request, token, user, timestamp, preview_token, settings, expires, sig)
+
+    file_path = Path(settings.staging_dir) / "drafts" / draft_id / "upload" / filename
+    st = _stat_file(file_path)
+    if st is None:
         raise HTTPException(status_code=404, detail="File not found")
 
     # Verify the resolved path is still within staging (belt-and-suspenders)
     try:
-        file_path.resolve().relative_to(Path(settings.staging_dir).resolve())
+        file_path.resolve().relative_to(_staging_root(settings.staging_dir))
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid path")
 
     content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
 
-    return FileResponse(
-        path=file_path,
+    return RangedFileResponse(
+        file_path,
+        st,
         media_type=content_type,
+        headers=_cache_control(signed, expires),
         filename=filename,
     )
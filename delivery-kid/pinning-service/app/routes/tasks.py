@@ -0,0 +1,63 @@
+"""Background task status, progress and cancellation (album/content finalize)."""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sse_starlette.sse import EventSourceResponse
+
+from ..auth import require_finalize_auth
+from ..services.task_queue import TaskQueue, get_task_queue
+
+router = APIRouter(prefix="/tasks", tags=["tasks"])
+
+
+def _queue() -> TaskQueue:
+    queue = get_task_queue()
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Task queue not running")
+    return queue
+
+
+@router.get("")
+async def list_tasks(
+    status: str | None = Query(None, description="Filter by task status"),
+    limit: int = Query(50, ge=1, le=500),
+    identity: str = Depends(require_finalize_auth),
+):
+    """Running and queued tasks in run order, then the most recently finished."""
+    queue = _queue()
+    return {"tasks": queue.list(status=status, limit=limit), **queue.status()}
+
+
+@router.get("/{task_id}")
+async def get_task(
+    task_id: str,
+    identity: str = Depends(require_finalize_auth),
+):
+    """A task's status and its latest progress frame."""
+    task = _queue().get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    identity: str = Depends(require_finalize_auth),
+):
+    """Follow a task's progress via Server-Sent Events (replayed from the start)."""
+    queue = _queue()
+    if queue.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return EventSourceResponse(queue.follow(task_id), media_type="text/event-stream")
+
+
+@router.delete("/{task_id}")
+async def cancel_task(
+    task_id: str,
+    identity: str = Depends(require_finalize_auth),
+):
+    """Cancel a queued or running task. Finished tasks are returned unchanged."""
+    task = _queue().cancel(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
@@ -1,13 +1,105 @@
-"""Media file analysis using FFprobe."""
+"""Media file analysis using FFprobe.
+
+Every ffprobe run in the service goes through ``probe``, which remembers
+the result per file (by device, inode, size and mtime, so a hardlinked
+copy in a finalize output dir shares its source's entry). A source
+probed at upload isn't probed again at finalize or transcode time, and
+``probe_stats`` counts actual ffprobe runs per draft to keep it that way.
+"""
 
 import asyncio
 import json
+import logging
 import re
 import shutil
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE_SIZE = 512
+PROBE_RUNS_DRAFTS = 256  # drafts whose ffprobe runs are counted, most recently probed
+
+
+class ProbeError(Exception):
+    """ffprobe exited non-zero."""
+
+
+_probe_cache: OrderedDict[tuple, dict] = OrderedDict()
+_probe_lock = threading.Lock()
+_probe_runs: OrderedDict[str, int] = OrderedDict()  # draft id (or "other") -> ffprobe runs
+_probe_total = 0
+_probe_hits = 0
+
+
+def _draft_of(path: Path) -> str:
+    parts = path.parts
+    for i, part in enumerate(parts[:-1]):
+        if part == "drafts":
+            return parts[i + 1]
+    return "other"
+
+
+async def probe(file_path: Path) -> dict:
+    """``ffprobe -show_format -show_streams`` JSON for ``file_path``.
+
+    Runs ffprobe once per unchanged file; later calls return the remembered
+    result (treat it as read-only). Raises ProbeError if ffprobe fails and
+    json.JSONDecodeError if its output doesn't parse.
+    """
+    global _probe_hits, _probe_total
+    st = file_path.stat()
+    ident = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    with _probe_lock:
+        if ident in _probe_cache:
+            _probe_cache.move_to_end(ident)
+            _probe_hits += 1
+            return _probe_cache[ident]
+
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-v", "quiet",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        str(file_path),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    draft = _draft_of(file_path)
+    with _probe_lock:
+        _probe_total += 1
+        runs = _probe_runs.pop(draft, 0) + 1
+        _probe_runs[draft] = runs
+        while len(_probe_runs) > PROBE_RUNS_DRAFTS:
+            _probe_runs.popitem(last=False)
+    logger.debug("ffprobe %s (run %d for draft %s)", file_path.name, runs, draft)
+
+    if process.returncode != 0:
+        raise ProbeError(stderr.decode() if stderr else "FFprobe failed")
+    data = json.loads(stdout.decode())
+    with _probe_lock:
+        _probe_cache[ident] = data
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return data
+
+
+def probe_stats(top: int = 20) -> dict:
+    """ffprobe runs per recently probed draft (most first) and how many
+    probes the cache answered."""
+    with _probe_lock:
+        by_draft = sorted(_probe_runs.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "runs": _probe_total,
+            "cache_hits": _probe_hits,
+            "by_draft": dict(by_draft),
+        }
+
 
 @dataclass
 class AudioAnalysis:
@@ -112,30 +204,15 @@ async def analyze_audio_file(file_path: Path) -> AudioAnalysis:
         )
 
     try:
-        # Run ffprobe to get JSON output
-        process = await asyncio.create_subprocess_exec(
-            "ffprobe",
-            "-v", "quiet",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            str(file_path),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "FFprobe failed"
+        try:
+            data = await probe(file_path)
+        except ProbeError as e:
             return AudioAnalysis(
                 success=False,
                 original_filename=file_path.name,
-                error=error_msg
+                error=str(e)
             )
 
-        data = json.loads(stdout.decode())
-
         # Find audio stream
         audio_stream = None
         for stream in data.get("streams", []):
@@ -310,28 +387,14 @@ async def analyze_media_file(file_path: Path) -> MediaAnalysis:
         )
 
     try:
-        process = await asyncio.create_subprocess_exec(
-            "ffprobe",
-            "-v", "quiet",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            str(file_path),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "FFprobe failed"
+        try:
+            data = await probe(file_path)
+        except ProbeError as e:
             return MediaAnalysis(
                 success=False,
                 original_filename=file_path.name,
-                error=error_msg
+                error=str(e)
             )
-
-        data = json.loads(stdout.decode())
         format_info = data.get("format", {})
 
         # Find streams by type
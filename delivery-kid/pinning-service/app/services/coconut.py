@@ -4,54 +4,90 @@ Submits videos to Coconut for AV1+Opus HLS transcoding (royalty-free codecs),
 receives webhook on completion, downloads outputs, and pins to IPFS.
 """
 
+import asyncio
 import json
 import logging
-import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urljoin
 
 import httpx
 
-from . import ipfs
+from . import ipfs, staging_space
+from .jobstore import JobStore, get_job_store
 
 logger = logging.getLogger(__name__)
 
 COCONUT_API_URL = "https://api.coconut.co/v2/jobs"
 
+# HLS download tuning. A 4K ladder can reference thousands of segments, so
+# transfers run concurrently and stream straight to disk.
+SEGMENT_CONCURRENCY = 8
+SEGMENT_RETRIES = 4
+SEGMENT_BACKOFF_SECONDS = 0.5
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# async (variant, segments_done, segments_total) -> None
+DownloadProgressCallback = Callable[[str, int, int], Awaitable[None]]
+
 
 def _jobs_dir(staging_dir: Path) -> Path:
-    d = staging_dir / "jobs"
-    d.mkdir(parents=True, exist_ok=True)
-    return d
+    """Legacy per-file job directory, only read by the one-time import."""
+    return staging_dir / "jobs"
 
 
-def save_job(staging_dir: Path, job_id: str, data: dict) -> None:
-    path = _jobs_dir(staging_dir) / f"{job_id}.json"
-    path.write_text(json.dumps(data, indent=2, default=str))
+def _job_store(staging_dir: Path, state_dir: Optional[Path] = None) -> JobStore:
+    """The jobs.db store, in ``state_dir`` (Settings.state_path) or else staging_dir."""
+    db_path = (state_dir or staging_dir) / "jobs.db"
+    return get_job_store(db_path, legacy_jobs_dir=_jobs_dir(staging_dir))
 
 
-def load_job(staging_dir: Path, job_id: str) -> Optional[dict]:
-    path = _jobs_dir(staging_dir) / f"{job_id}.json"
-    if not path.exists():
-        return None
-    try:
-        return json.loads(path.read_text())
-    except (json.JSONDecodeError, OSError):
-        return None
+def save_job(staging_dir: Path, job_id: str, data: dict, state_dir: Optional[Path] = None) -> None:
+    _job_store(staging_dir, state_dir).put(job_id, data)
 
 
-def list_jobs(staging_dir: Path, limit: int = 50) -> list[dict]:
-    """List recent jobs, newest first."""
-    jobs_path = _jobs_dir(staging_dir)
-    jobs = []
-    for f in sorted(jobs_path.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
-        try:
-            jobs.append(json.loads(f.read_text()))
-        except (json.JSONDecodeError, OSError):
-            continue
-        if len(jobs) >= limit:
-            break
-    return jobs
+def load_job(staging_dir: Path, job_id: str, state_dir: Optional[Path] = None) -> Optional[dict]:
+    return _job_store(staging_dir, state_dir).get(job_id)
+
+
+def update_job(
+    staging_dir: Path, job_id: str, fn: Callable[[dict], Optional[dict]],
+    state_dir: Optional[Path] = None,
+) -> Optional[dict]:
+    """Atomically read-modify-write a job. See JobStore.update."""
+    return _job_store(staging_dir, state_dir).update(job_id, fn)
+
+
+def list_jobs(
+    staging_dir: Path,
+    limit: int = 50,
+    offset: int = 0,
+    status: Optional[str] = None,
+    identity: Optional[str] = None,
+    draft_id: Optional[str] = None,
+    state_dir: Optional[Path] = None,
+) -> list[dict]:
+    """List recent jobs, newest first, optionally filtered."""
+    return _job_store(staging_dir, state_dir).list(
+        status=status, identity=identity, draft_id=draft_id, limit=limit, offset=offset
+    )
+
+
+def count_jobs(
+    staging_dir: Path,
+    status: Optional[str] = None,
+    identity: Optional[str] = None,
+    draft_id: Optional[str] = None,
+    state_dir: Optional[Path] = None,
+) -> int:
+    return _job_store(staging_dir, state_dir).count(status=status, identity=identity, draft_id=draft_id)
+
+
+def find_jobs_by_status(
+    staging_dir: Path, statuses: set[str], state_dir: Optional[Path] = None
+) -> list[dict]:
+    """Return every job whose status is in ``statuses`` (oldest first)."""
+    return _job_store(staging_dir, state_dir).list(status=statuses, limit=-1, oldest_first=True)
 
 
 async def submit_to_coconut(
@@ -159,19 +195,140 @@ async def submit_to_coconut(
         return resp.json()
 
 
+class SegmentDownloadError(Exception):
+    """A playlist or segment could not be fetched intact after all retries."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+async def _fetch_to_file(
+    client: httpx.AsyncClient,
+    url: str,
+    path: Path,
+    retries: Optional[int] = None,
+    backoff: Optional[float] = None,
+) -> int:
+    """Stream ``url`` to ``path`` chunk by chunk, retrying with exponential backoff.
+
+    Writes go to a ``.part`` file that is renamed into place only once the
+    byte count matches Content-Length, so a truncated transfer never leaves
+    a plausible-looking segment behind. Returns the number of bytes written.
+    """
+    retries = SEGMENT_RETRIES if retries is None else retries
+    backoff = SEGMENT_BACKOFF_SECONDS if backoff is None else backoff
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".part")
+    last_error: Exception | None = None
+
+    for attempt in range(1, retries + 1):
+        try:
+            async with client.stream("GET", url) as resp:
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    raise SegmentDownloadError(f"HTTP {resp.status_code}")
+                if not resp.is_success:
+                    # 4xx won't get better on retry
+                    raise SegmentDownloadError(f"HTTP {resp.status_code}", retryable=False)
+
+                # Only compare lengths when the body isn't content-encoded —
+                # aiter_bytes() yields decoded bytes.
+                expected = None
+                if "content-encoding" not in resp.headers:
+                    try:
+                        expected = int(resp.headers.get("content-length", ""))
+                    except ValueError:
+                        expected = None
+
+                written = 0
+                with open(tmp_path, "wb") as f:
+                    async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+
+            if expected is not None and written != expected:
+                raise SegmentDownloadError(
+                    f"size mismatch: got {written} bytes, Content-Length {expected}"
+                )
+            try:
+                previous = path.stat().st_size
+            except FileNotFoundError:
+                previous = 0
+            tmp_path.replace(path)
+            staging_space.record_write(path, written - previous)
+            return written
+
+        except (httpx.TransportError, SegmentDownloadError) as e:
+            last_error = e
+            tmp_path.unlink(missing_ok=True)
+            if not getattr(e, "retryable", True) or attempt == retries:
+                break
+            delay = backoff * (2 ** (attempt - 1))
+            logger.warning("Download %s failed (attempt %d/%d): %s — retrying in %.1fs",
+                           url, attempt, retries, e, delay)
+            await asyncio.sleep(delay)
+
+    raise SegmentDownloadError(f"{url}: {last_error}", retryable=False)
+
+
+def _playlist_media_uris(playlist_text: str) -> list[str]:
+    """Return segment (and init segment) URIs referenced by a media playlist."""
+    uris = []
+    for line in playlist_text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-MAP:"):
+            # fMP4 init segment: #EXT-X-MAP:URI="init.mp4"
+            for attr in line[len("#EXT-X-MAP:"):].split(","):
+                key, _, value = attr.partition("=")
+                if key.strip() == "URI":
+                    uris.append(value.strip().strip('"'))
+        elif line and not line.startswith("#"):
+            if line.split("?", 1)[0].endswith((".ts", ".m4s", ".mp4")):
+                uris.append(line)
+    return uris
+
+
+def _local_segment_path(output_dir: Path, uri: str) -> Path:
+    """Map a playlist URI to a path under output_dir, refusing traversal."""
+    relative = uri.split("?", 1)[0]
+    if "://" in relative:
+        relative = relative.rsplit("/", 1)[-1]
+    path = (output_dir / relative).resolve()
+    path.relative_to(output_dir.resolve())  # raises ValueError on ../ escapes
+    return path
+
+
 async def download_hls_outputs(
     outputs: dict,
     hls_dir: Path,
-) -> None:
+    progress_callback: Optional[DownloadProgressCallback] = None,
+    concurrency: int = SEGMENT_CONCURRENCY,
+) -> dict:
     """Download HLS playlists and segments from Coconut output URLs.
 
+    Playlists are fetched first, then every segment across all variants is
+    streamed to disk with at most ``concurrency`` transfers in flight.
+    Individual segments are retried with backoff; if any still fails the
+    whole download raises SegmentDownloadError rather than pinning an HLS
+    tree with holes in it.
+
     Args:
         outputs: Dict of output key -> {url: ...} from Coconut webhook
         hls_dir: Local directory to write files into
+        progress_callback: Optional ``async (variant, done, total)`` called as
+            each variant crosses a 10% step (and on completion)
+        concurrency: Maximum simultaneous segment transfers
+
+    Returns:
+        Per-variant stats: ``{"720p": {"segments": n, "bytes": b}, ...}``
     """
     hls_dir.mkdir(parents=True, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    stats: dict[str, dict] = {}
 
     async with httpx.AsyncClient(timeout=120.0) as client:
+        # Playlists first — they tell us how many segments each variant has.
+        variant_segments: dict[str, list[tuple[str, Path]]] = {}
         for key, output in outputs.items():
             url = output.get("url")
             if not url:
@@ -181,47 +338,72 @@ async def download_hls_outputs(
                 local_path = hls_dir / "master.m3u8"
             elif key.startswith("hls_av1_"):
                 quality = key.replace("hls_av1_", "").replace("p", "")
-                quality_dir = hls_dir / f"{quality}p"
-                quality_dir.mkdir(parents=True, exist_ok=True)
-                local_path = quality_dir / "playlist.m3u8"
+                local_path = hls_dir / f"{quality}p" / "playlist.m3u8"
             else:
                 continue
 
-            # Download playlist
             logger.info("Downloading %s from %s", key, url)
-            resp = await client.get(url)
-            if not resp.is_success:
-                logger.warning("Failed to download %s: %s", key, resp.status_code)
+            try:
+                await _fetch_to_file(client, url, local_path)
+            except SegmentDownloadError as e:
+                logger.warning("Failed to download %s: %s", key, e)
                 continue
-            local_path.write_text(resp.text)
-
-            # Download segments referenced in playlist
-            if local_path.name.endswith(".m3u8") and key != "hls_master":
-                await _download_segments(client, resp.text, url, local_path.parent)
 
+            if key == "hls_master":
+                continue
 
-async def _download_segments(
-    client: httpx.AsyncClient,
-    playlist_text: str,
-    playlist_url: str,
-    output_dir: Path,
-) -> None:
-    """Download .ts/.m4s segments referenced in an HLS playlist."""
-    from urllib.parse import urljoin
+            variant = local_path.parent.name
+            segments = []
+            for uri in _playlist_media_uris(local_path.read_text()):
+                try:
+                    segment_path = _local_segment_path(local_path.parent, uri)
+                except ValueError:
+                    logger.warning("Skipping segment outside output dir: %s", uri)
+                    continue
+                segments.append((urljoin(url, uri), segment_path))
+            variant_segments[variant] = segments
+            stats[variant] = {"segments": len(segments), "bytes": 0}
+
+        done: dict[str, int] = {v: 0 for v in variant_segments}
+        reported_step: dict[str, int] = {v: -1 for v in variant_segments}
+
+        async def report(variant: str) -> None:
+            total = len(variant_segments[variant])
+            step = (done[variant] * 10) // total if total else 10
+            if progress_callback and step > reported_step[variant]:
+                reported_step[variant] = step
+                try:
+                    await progress_callback(variant, done[variant], total)
+                except Exception as e:
+                    logger.warning("Download progress callback failed: %s", e)
+
+        async def fetch_segment(variant: str, url: str, path: Path) -> None:
+            async with semaphore:
+                size = await _fetch_to_file(client, url, path)
+            stats[variant]["bytes"] += size
+            done[variant] += 1
+            await report(variant)
+
+        for variant in variant_segments:
+            await report(variant)
+
+        results = await asyncio.gather(
+            *[
+                fetch_segment(variant, url, path)
+                for variant, segments in variant_segments.items()
+                for url, path in segments
+            ],
+            return_exceptions=True,
+        )
 
-    for line in playlist_text.splitlines():
-        line = line.strip()
-        if line.endswith(".ts") or line.endswith(".m4s"):
-            segment_url = urljoin(playlist_url, line)
-            segment_path = output_dir / line
-            try:
-                resp = await client.get(segment_url)
-                if resp.is_success:
-                    segment_path.write_bytes(resp.content)
-                else:
-                    logger.warning("Failed to download segment %s: %s", line, resp.status_code)
-            except Exception as e:
-                logger.warning("Error downloading segment %s: %s", line, e)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        for failure in failures[:5]:
+            logger.warning("Segment download failed: %s", failure)
+        raise SegmentDownloadError(
+            f"{len(failures)} of {len(results)} segments failed to download"
+        )
+    return stats
 
 
 def _build_coconut_transcode_info(job: dict, outputs: dict, hls_dir: Path) -> dict:
@@ -278,18 +460,20 @@ async def process_completed_job(
     staging_dir: Path,
     ipfs_api_url: str,
     pinata_jwt: str = "",
+    progress_callback: Optional[DownloadProgressCallback] = None,
 ) -> Optional[str]:
     """Process a completed Coconut job: download HLS + preview, pin to IPFS.
 
     Returns the HLS directory CID, or None on failure.
     Also pins the preview MP4 if present and stores its CID in job["previewCid"].
+    ``progress_callback`` is forwarded to download_hls_outputs.
     """
     job_id = job["id"]
     hls_dir = staging_dir / f"hls-{job_id}"
 
     try:
         # Download all HLS outputs
-        await download_hls_outputs(outputs, hls_dir)
+        await download_hls_outputs(outputs, hls_dir, progress_callback=progress_callback)
 
         # Download preview MP4 if present
         preview_output = outputs.get("mp4_preview", {})
@@ -298,18 +482,18 @@ async def process_completed_job(
             preview_path = staging_dir / f"preview-{job_id}.mp4"
             try:
                 async with httpx.AsyncClient(timeout=120.0) as client:
-                    resp = await client.get(preview_url)
-                    if resp.is_success:
-                        preview_path.write_bytes(resp.content)
-                        logger.info("[%s] Preview MP4 downloaded (%d bytes)", job_id, len(resp.content))
-                        # Pin preview to IPFS
-                        preview_result = await ipfs.add_file(preview_path)
-                        if preview_result.success:
-                            job["previewCid"] = preview_result.cid
-                            logger.info("[%s] Preview pinned: %s", job_id, preview_result.cid)
-                        preview_path.unlink(missing_ok=True)
+                    size = await _fetch_to_file(client, preview_url, preview_path)
+                logger.info("[%s] Preview MP4 downloaded (%d bytes)", job_id, size)
+                # Pin preview to IPFS
+                preview_result = await ipfs.add_file(preview_path)
+                if preview_result.success:
+                    job["previewCid"] = preview_result.cid
+                    logger.info("[%s] Preview pinned: %s", job_id, preview_result.cid)
             except Exception as e:
                 logger.warning("[%s] Preview download/pin failed: %s", job_id, e)
+            finally:
+                preview_path.unlink(missing_ok=True)
+                staging_space.forget(preview_path)
 
         # Build and write transcode metadata before pinning
         transcode_info = _build_coconut_transcode_info(job, outputs, hls_dir)
@@ -339,5 +523,5 @@ async def process_completed_job(
         return None
 
     finally:
-        # Clean up temp directory
-        shutil.rmtree(hls_dir, ignore_errors=True)
+        # Clean up temp directory (deferred, via the trash)
+        staging_space.remove_tree(hls_dir)
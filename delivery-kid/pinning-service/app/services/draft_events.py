@@ -0,0 +1,231 @@
+"""Append-only per-draft event log (``events.ndjson``).
+
+upload_log, finalize_log and preview_log used to live inside draft.json,
+trimmed in Python, so every progress line rewrote and reparsed the whole
+document. They now live in one NDJSON file per draft: appending is a single
+``O_APPEND`` write, and draft.json only carries scalar state.
+
+Each line is ``{"log": "upload"|"finalize"|"preview", "ts": ..., ...}``.
+Positions in the file double as cursors: an entry's ``cursor`` is the byte
+offset just past its line, so "everything after cursor N" is one seek.
+
+Live subscribers (GET /draft-content/{id}/events) register a watch on the
+draft directory; every append and every draft.json write wakes them, and
+they read forward from their cursor. The wake-up is in-process only, so
+watchers also re-check on a timer to pick up writes from other workers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+EVENTS_FILE = "events.ndjson"
+LOG_NAMES = ("upload", "finalize", "preview")
+
+# Default number of entries per log returned by GET /draft-content/{id}
+# (the old in-document caps).
+DEFAULT_TAIL = {"upload": 100, "finalize": 200, "preview": 50}
+
+_TAIL_CHUNK = 64 * 1024
+
+# How often a watcher re-checks without a wake-up (writes from other workers)
+WATCH_POLL_SECONDS = 2.0
+
+
+def events_path(draft_dir: Path) -> Path:
+    return draft_dir / EVENTS_FILE
+
+
+def append_event(draft_dir: Path, log: str, entry: dict) -> Optional[int]:
+    """Append one entry to a draft's event log. Returns its cursor.
+
+    ``ts`` is filled in if missing. Returns None (and logs) if the draft
+    directory is gone — callers treat the log as best-effort.
+    """
+    if log not in LOG_NAMES:
+        raise ValueError(f"Unknown draft log: {log}")
+    record = {"log": log, "ts": entry.get("ts") or datetime.now(timezone.utc).isoformat()}
+    record.update({k: v for k, v in entry.items() if k != "ts"})
+    line = (json.dumps(record, default=str) + "\n").encode()
+    try:
+        fd = os.open(events_path(draft_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        logger.warning("Draft dir %s gone; dropping %s log entry", draft_dir.name[:8], log)
+        return None
+    try:
+        os.write(fd, line)
+        cursor = os.lseek(fd, 0, os.SEEK_CUR)
+    finally:
+        os.close(fd)
+    notify(draft_dir)
+    return cursor
+
+
+def _parse(raw: bytes) -> Optional[dict]:
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # Torn line (concurrent append in progress, or crash) — skip it
+        return None
+
+
+def read_events(draft_dir: Path, cursor: int = 0) -> tuple[list[dict], int]:
+    """Return complete entries after ``cursor`` and the cursor to resume from.
+
+    Each entry carries its own ``cursor``. A trailing line without its
+    newline yet is left for the next read.
+    """
+    path = events_path(draft_dir)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if cursor > size:
+                # File was replaced/truncated; start over
+                cursor = 0
+            f.seek(cursor)
+            data = f.read()
+    except FileNotFoundError:
+        return [], cursor
+
+    entries = []
+    pos = cursor
+    for raw in data.split(b"\n")[:-1]:
+        pos += len(raw) + 1
+        entry = _parse(raw)
+        if entry is not None:
+            entry["cursor"] = pos
+            entries.append(entry)
+    return entries, pos
+
+
+def tail_events(draft_dir: Path, limits: Optional[dict[str, int]] = None) -> dict[str, list[dict]]:
+    """Return the last N entries of each log, oldest first.
+
+    Reads the file backwards in chunks and stops as soon as every log has
+    its quota, so cost tracks N rather than the length of the history.
+    ``log`` is stripped so entries keep their historical shape.
+    """
+    limits = dict(DEFAULT_TAIL if limits is None else limits)
+    found: dict[str, list[dict]] = {name: [] for name in limits}
+    path = events_path(draft_dir)
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return found
+
+    def take(raw: bytes) -> None:
+        entry = _parse(raw)
+        if entry is None:
+            return
+        name = entry.pop("log", None)
+        if name in found and len(found[name]) < limits[name]:
+            found[name].append(entry)
+
+    with f:
+        pos = os.fstat(f.fileno()).st_size
+        carry = b""
+        while pos > 0 and any(len(found[n]) < limits[n] for n in found):
+            step = min(_TAIL_CHUNK, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + carry).split(b"\n")
+            # lines[0] may be the tail end of a line that starts earlier
+            carry = lines[0]
+            for raw in reversed(lines[1:]):
+                if raw:
+                    take(raw)
+        if pos == 0 and carry:
+            take(carry)
+
+    for entries in found.values():
+        entries.reverse()
+    return found
+
+
+LEGACY_LOG_KEYS = tuple(f"{name}_log" for name in LOG_NAMES)
+
+
+def has_legacy_logs(data: dict) -> bool:
+    """Whether a draft.json payload still carries in-document logs."""
+    return any(key in data for key in LEGACY_LOG_KEYS)
+
+
+def migrate_legacy_logs(draft_dir: Path, data: dict) -> None:
+    """Move in-document logs from an old draft.json into the event log.
+
+    The caller holds the draft's lock and writes ``data`` back, which
+    marks the draft migrated: the keys are popped either way. Entries are
+    only appended when the draft has no event log yet, so a crash between
+    the append and the rewrite doesn't duplicate them on the next try.
+    """
+    legacy = {name: data.pop(f"{name}_log", None) or [] for name in LOG_NAMES}
+    if not any(legacy.values()) or events_path(draft_dir).exists():
+        return
+    merged = [(entry.get("ts") or "", name, entry) for name, entries in legacy.items() for entry in entries]
+    merged.sort(key=lambda item: item[0])
+    for _, name, entry in merged:
+        append_event(draft_dir, name, entry)
+    logger.info("Migrated %d legacy log entries for draft %s", len(merged), draft_dir.name[:8])
+
+
+_watchers: dict[Path, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+_watchers_lock = threading.Lock()
+
+# Synchronous callbacks run on every notify (e.g. the drafts index)
+_listeners: list[Callable[[Path], None]] = []
+
+
+def add_listener(fn: Callable[[Path], None]) -> None:
+    """Call ``fn(draft_dir)`` whenever a draft changes. Must be cheap."""
+    _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[Path], None]) -> None:
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+@contextmanager
+def watch(draft_dir: Path) -> Iterator[asyncio.Event]:
+    """Yield an event that is set whenever the draft's log or state changes.
+
+    Must be entered on the event loop; ``notify`` may be called from any
+    thread (draft.json writes run in worker threads).
+    """
+    watcher = (asyncio.get_running_loop(), asyncio.Event())
+    with _watchers_lock:
+        _watchers.setdefault(draft_dir, set()).add(watcher)
+    try:
+        yield watcher[1]
+    finally:
+        with _watchers_lock:
+            watchers = _watchers.get(draft_dir)
+            if watchers is not None:
+                watchers.discard(watcher)
+                if not watchers:
+                    del _watchers[draft_dir]
+
+
+def notify(draft_dir: Path) -> None:
+    """Wake every watcher of ``draft_dir`` and run the listeners."""
+    for fn in list(_listeners):
+        try:
+            fn(draft_dir)
+        except Exception:
+            logger.exception("Draft change listener failed")
+    with _watchers_lock:
+        watchers = list(_watchers.get(draft_dir, ()))
+    for loop, event in watchers:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # Loop already closed — the watcher is on its way out
+            pass
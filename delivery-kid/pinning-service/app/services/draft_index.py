@@ -0,0 +1,190 @@
+"""In-memory index of staging drafts.
+
+Listing drafts used to mean walking ``staging/drafts/*`` over CIFS (the
+storage audit did it with find/du over SSH). The index holds one summary per
+draft directory — status, owner, size, file count, timestamps — built with a
+full scan at startup and kept current incrementally: every draft.json write,
+log append and deletion in this process marks the draft dirty (via the
+draft_events listener hook), and dirty drafts are re-scanned on the next
+query.
+
+Changes made by other workers aren't seen until a rebuild; GET /drafts
+accepts ``refresh=true`` for that.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from . import draft_events
+from .fsutil import tree_stats
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = {
+    "updated": lambda d: d.updated_at,
+    "created": lambda d: d.created_at or "",
+    "size": lambda d: d.size_bytes,
+}
+
+
+@dataclass
+class DraftSummary:
+    """One row of the drafts index."""
+    draft_id: str
+    has_draft_json: bool
+    file_count: int  # files under upload/
+    size_bytes: int  # whole draft directory
+    updated_at: float  # newest mtime in the tree (epoch seconds)
+    draft_type: Optional[str] = None
+    status: Optional[str] = None
+    owner: Optional[str] = None
+    preview_status: Optional[str] = None
+    created_at: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def scan_draft(draft_dir: Path) -> Optional[DraftSummary]:
+    """Build the summary for one draft directory, or None if it's gone."""
+    try:
+        dir_mtime = draft_dir.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    _, size, newest = tree_stats(draft_dir)
+    file_count, _, _ = tree_stats(draft_dir / "upload")
+    summary = DraftSummary(
+        draft_id=draft_dir.name,
+        has_draft_json=False,
+        file_count=file_count,
+        size_bytes=size,
+        updated_at=newest or dir_mtime,
+    )
+    try:
+        data = json.loads((draft_dir / "draft.json").read_text())
+    except FileNotFoundError:
+        return summary
+    except (json.JSONDecodeError, OSError):
+        logger.warning("Drafts index: unreadable draft.json in %s", draft_dir.name)
+        return summary
+    summary.has_draft_json = True
+    summary.draft_type = data.get("draft_type") or "album"
+    summary.status = data.get("status")
+    summary.owner = data.get("uploaded_by")
+    summary.preview_status = data.get("preview_status")
+    summary.created_at = data.get("created_at")
+    return summary
+
+
+class DraftIndex:
+    """Thread-safe draft_id -> DraftSummary table for one staging dir."""
+
+    def __init__(self, staging_dir: Path):
+        self.drafts_dir = staging_dir / "drafts"
+        self.built_at: Optional[float] = None
+        self._rows: dict[str, DraftSummary] = {}
+        self._dirty: set[str] = set()
+        self._lock = threading.Lock()
+
+    def rebuild(self) -> int:
+        """Full scan of the drafts directory. Returns the number of drafts."""
+        start = time.monotonic()
+        # Marks from here on may describe changes the scan has already passed
+        with self._lock:
+            covered = set(self._dirty)
+        rows = {}
+        try:
+            with os.scandir(self.drafts_dir) as it:
+                names = [e.name for e in it if e.is_dir() and not e.name.startswith(".")]
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            summary = scan_draft(self.drafts_dir / name)
+            if summary is not None:
+                rows[name] = summary
+        with self._lock:
+            self._rows = rows
+            self._dirty -= covered
+            self.built_at = time.time()
+        logger.info("Drafts index rebuilt: %d drafts in %.1fs", len(rows), time.monotonic() - start)
+        return len(rows)
+
+    def mark_dirty(self, draft_dir: Path) -> None:
+        """draft_events listener: re-scan ``draft_dir`` on the next query."""
+        if draft_dir.parent == self.drafts_dir:
+            with self._lock:
+                self._dirty.add(draft_dir.name)
+
+    def _refresh_dirty(self) -> None:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for name in dirty:
+            summary = scan_draft(self.drafts_dir / name)
+            with self._lock:
+                if summary is None:
+                    self._rows.pop(name, None)
+                else:
+                    self._rows[name] = summary
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        owner: Optional[str] = None,
+        draft_type: Optional[str] = None,
+        has_draft_json: Optional[bool] = None,
+        sort: str = "updated",
+        limit: int = 50,
+        offset: int = 0,
+    ) -> dict:
+        """Filter, sort (newest/largest first) and paginate the index."""
+        if self.built_at is None:
+            self.rebuild()
+        self._refresh_dirty()
+        with self._lock:
+            rows = list(self._rows.values())
+        if status:
+            rows = [r for r in rows if r.status == status]
+        if owner:
+            rows = [r for r in rows if (r.owner or "").lower() == owner.lower()]
+        if draft_type:
+            rows = [r for r in rows if r.draft_type == draft_type]
+        if has_draft_json is not None:
+            rows = [r for r in rows if r.has_draft_json == has_draft_json]
+        rows.sort(key=SORT_KEYS[sort], reverse=True)
+        return {
+            "drafts": [r.to_dict() for r in rows[offset:offset + limit]],
+            "total": len(rows),
+            "total_size_bytes": sum(r.size_bytes for r in rows),
+            "limit": limit,
+            "offset": offset,
+            "indexed_at": self.built_at,
+        }
+
+
+# Global index instance
+_index: Optional[DraftIndex] = None
+
+
+def get_draft_index() -> Optional[DraftIndex]:
+    """Get the global drafts index instance."""
+    return _index
+
+
+def init_draft_index(staging_dir: Path) -> DraftIndex:
+    """Create the global drafts index and hook it up to draft change events.
+
+    The initial scan is left to the caller (it can be slow over CIFS), or
+    happens on the first query.
+    """
+    global _index
+    if _index is not None:
+        draft_events.remove_listener(_index.mark_dirty)
+    _index = DraftIndex(staging_dir)
+    draft_events.add_listener(_index.mark_dirty)
+    return _index
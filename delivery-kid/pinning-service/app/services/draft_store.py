@@ -0,0 +1,361 @@
+"""Draft state persistence — atomic, coalesced draft.json writes.
+
+draft.json is the source of truth the ReleaseDraft page polls, and it lives
+on the CIFS-mounted storage box. Two problems this module addresses:
+
+- Torn writes: draft.json is replaced atomically (temp file + fsync + rename).
+- Write amplification: the finalize SSE generator persists state on every
+  frame. DraftStateWriter coalesces saves that land within a debounce
+  window into one write, while always flushing terminal statuses straight
+  away so the page never misses the final outcome.
+- Lost updates: the upload handler, the background preview submission and
+  the Coconut webhook all read-modify-write the same draft.json. Every
+  write goes through a per-draft lock — an asyncio lock for coroutines in
+  this process, a thread lock for the sync paths, and ``flock`` on a lock
+  file in the draft directory across uvicorn workers — via
+  DraftStateManager.update().
+- Repeated reads: the ReleaseDraft page polls GET /draft-content/{id} and
+  video players hit the staging routes with a range request per chunk.
+  DraftCache keeps parsed drafts in a bounded LRU, revalidated with a
+  single stat() and dropped whenever this process writes the draft.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+from . import draft_events
+from .fsutil import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# Saves within this window of the previous write are coalesced.
+DRAFT_WRITE_DEBOUNCE_SECONDS = 1.0
+
+# Statuses the page must see immediately — never deferred.
+TERMINAL_STATUSES = {"uploaded", "upload_failed", "finalized", "finalize_failed"}
+
+
+# Parsed drafts kept in memory (per process)
+DRAFT_CACHE_SIZE = 256
+
+LOCK_FILE = ".draft.lock"
+
+# Returned from an update() callback to abandon the write
+SKIP = object()
+
+
+class _DraftLock:
+    """The in-process half of a draft's lock."""
+
+    def __init__(self):
+        self.aio = asyncio.Lock()
+        self.thread = threading.Lock()
+
+
+# Entries disappear once no caller holds the lock
+_draft_locks: "weakref.WeakValueDictionary[Path, _DraftLock]" = weakref.WeakValueDictionary()
+_draft_locks_guard = threading.Lock()
+_flock_warned = False
+
+
+def _lock_for(draft_dir: Path) -> _DraftLock:
+    with _draft_locks_guard:
+        lock = _draft_locks.get(draft_dir)
+        if lock is None:
+            lock = _DraftLock()
+            _draft_locks[draft_dir] = lock
+        return lock
+
+
+@contextmanager
+def _file_lock(draft_dir: Path):
+    """Hold an exclusive ``flock`` on the draft's lock file.
+
+    Some CIFS mounts refuse ``flock``; we then fall back to the in-process
+    locks only (correct for a single worker) and warn once.
+    """
+    global _flock_warned
+    try:
+        fd = open(draft_dir / LOCK_FILE, "a")
+    except FileNotFoundError:
+        # Draft dir gone — nothing to lock, callers see a missing draft.json
+        yield
+        return
+    with fd:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError as e:
+            if not _flock_warned:
+                logger.warning("flock unavailable on %s (%s); draft locking is per-process only",
+                               draft_dir.parent, e)
+                _flock_warned = True
+        yield
+
+
+@contextmanager
+def locked_draft(draft_dir: Path):
+    """Hold a draft's thread + file lock (sync callers)."""
+    lock = _lock_for(draft_dir)
+    with lock.thread, _file_lock(draft_dir):
+        yield
+
+
+class DraftCache:
+    """Bounded LRU of parsed draft.json payloads, keyed by draft directory.
+
+    ``load(draft_dir, parse)`` returns ``parse(draft_dir, payload)``, re-reading
+    draft.json only when its (mtime, size, inode) signature has changed —
+    which also catches writes from other workers. Each parser gets its own
+    slot, so callers that want different views of the same draft (the full
+    model vs. just the preview token) don't evict each other. Values are
+    shared between callers; copy before mutating.
+    """
+
+    def __init__(self, maxsize: int = DRAFT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Path, dict[Callable, tuple[tuple, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, draft_dir: Path, parse: Callable[[Path, dict], Any]) -> Any:
+        """Return ``parse`` of the draft's payload, or None if it doesn't exist.
+
+        JSON and parse errors propagate and are not cached.
+        """
+        draft_json = draft_dir / "draft.json"
+        try:
+            st = os.stat(draft_json)
+        except FileNotFoundError:
+            self.invalidate(draft_dir)
+            return None
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            slots = self._entries.get(draft_dir)
+            cached = slots.get(parse) if slots else None
+            if cached is not None and cached[0] == signature:
+                self._entries.move_to_end(draft_dir)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        # Stat before read: if the file is replaced in between, the entry is
+        # stored under the old signature and simply misses next time.
+        try:
+            raw = draft_json.read_text()
+        except FileNotFoundError:
+            self.invalidate(draft_dir)
+            return None
+        value = parse(draft_dir, json.loads(raw))
+        if self.maxsize > 0:
+            with self._lock:
+                self._entries.setdefault(draft_dir, {})[parse] = (signature, value)
+                self._entries.move_to_end(draft_dir)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, draft_dir: Path) -> None:
+        with self._lock:
+            self._entries.pop(draft_dir, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
+
+
+_cache = DraftCache()
+
+
+def get_draft_cache() -> DraftCache:
+    """Get the process-wide draft cache."""
+    return _cache
+
+
+def write_draft_json(draft_dir: Path, data: dict) -> None:
+    """Atomically write a raw draft.json payload.
+
+    The caller must hold the draft's lock if it read the payload first.
+    """
+    atomic_write_text(draft_dir / "draft.json", json.dumps(data, indent=2, default=str))
+    _cache.invalidate(draft_dir)
+    draft_events.notify(draft_dir)
+
+
+def write_draft_state(draft_dir: Path, state: BaseModel) -> None:
+    """Atomically write a draft state model to draft.json."""
+    with locked_draft(draft_dir):
+        write_draft_json(draft_dir, state.model_dump(mode="json"))
+
+
+def update_draft_json(draft_dir: Path, fn: Callable[[dict], Optional[dict]]) -> Optional[dict]:
+    """Locked read-modify-write of draft.json (sync).
+
+    ``fn`` receives the current payload and may mutate it in place or return
+    a replacement; returning ``SKIP`` leaves the file untouched. Returns the
+    resulting payload, or None if the draft doesn't exist.
+    """
+    with locked_draft(draft_dir):
+        draft_json = draft_dir / "draft.json"
+        try:
+            data = json.loads(draft_json.read_text())
+        except FileNotFoundError:
+            return None
+        result = fn(data)
+        if result is SKIP:
+            return data
+        if result is not None:
+            data = result
+        write_draft_json(draft_dir, data)
+        return data
+
+
+class DraftStateManager:
+    """Transactional access to the drafts under ``staging/drafts``.
+
+    ``update()`` is the only way callers should modify an existing
+    draft.json. Coroutines queue on the draft's asyncio lock, so at most one
+    of them at a time occupies a worker thread waiting for the file lock.
+    """
+
+    def __init__(self, staging_dir: Path):
+        self.drafts_dir = staging_dir / "drafts"
+
+    def draft_dir(self, draft_id: str) -> Path:
+        return self.drafts_dir / draft_id
+
+    async def update(self, draft_id: str, fn: Callable[[dict], Optional[dict]]) -> Optional[dict]:
+        """Atomically read-modify-write a draft's draft.json.
+
+        See update_draft_json() for the ``fn`` contract. ``fn`` runs in a
+        worker thread, so it must not touch the event loop.
+        """
+        draft_dir = self.draft_dir(draft_id)
+        lock = _lock_for(draft_dir)
+        async with lock.aio:
+            return await asyncio.to_thread(update_draft_json, draft_dir, fn)
+
+    def update_sync(self, draft_id: str, fn: Callable[[dict], Optional[dict]]) -> Optional[dict]:
+        """Blocking update() for code that isn't running on the event loop."""
+        return update_draft_json(self.draft_dir(draft_id), fn)
+
+    async def read(self, draft_id: str) -> Optional[dict]:
+        """Read a draft's draft.json, or None if it doesn't exist."""
+        draft_json = self.draft_dir(draft_id) / "draft.json"
+        try:
+            return json.loads(await asyncio.to_thread(draft_json.read_text))
+        except FileNotFoundError:
+            return None
+
+
+_managers: dict[Path, DraftStateManager] = {}
+
+
+def get_draft_manager(staging_dir: Path) -> DraftStateManager:
+    """Return the (process-wide) draft manager for ``staging_dir``."""
+    manager = _managers.get(staging_dir)
+    if manager is None:
+        manager = _managers[staging_dir] = DraftStateManager(staging_dir)
+    return manager
+
+
+class DraftStateWriter:
+    """Coalescing draft.json writer for a single draft.
+
+    ``save()`` writes immediately if nothing has been written for
+    ``debounce`` seconds, or if the state is terminal. Otherwise it remembers
+    the state and schedules one trailing write at the end of the window, so
+    a burst of saves costs one write and the last state always lands.
+
+    With ``fields``, only those fields of the state are merged into the
+    on-disk draft (under its lock), so a long-lived holder of a stale state
+    object can't clobber fields other writers own — e.g. finalize only owns
+    ``status``, while the Coconut webhook owns the preview fields. A
+    ``fields`` writer needs an existing draft.json to merge into.
+
+    The state is serialised on the event loop; the locked write itself runs
+    in a worker thread, queued on the draft's asyncio lock like
+    DraftStateManager.update().
+    """
+
+    def __init__(self, draft_dir: Path, debounce: Optional[float] = None,
+                 fields: Optional[set[str]] = None):
+        self.draft_dir = draft_dir
+        self.fields = fields
+        self.debounce = DRAFT_WRITE_DEBOUNCE_SECONDS if debounce is None else debounce
+        self.writes = 0
+        self._pending: Optional[BaseModel] = None
+        self._last_write = float("-inf")
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def save(self, state: BaseModel, flush: bool = False) -> None:
+        """Persist ``state`` now or at the end of the current debounce window."""
+        self._pending = state
+        now = time.monotonic()
+        status = getattr(state, "status", None)
+        if flush or status in TERMINAL_STATUSES or now - self._last_write >= self.debounce:
+            await self.flush()
+            return
+        if self._timer is None:
+            delay = self.debounce - (now - self._last_write)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._flush_from_timer)
+
+    def _flush_from_timer(self) -> None:
+        self._timer = None
+        asyncio.ensure_future(self._deferred_flush())
+
+    async def _deferred_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Deferred draft.json write failed for %s", self.draft_dir.name[:8])
+
+    async def flush(self) -> None:
+        """Write any pending state now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        state, self._pending = self._pending, None
+        if state is None:
+            return
+        # Serialise now: the caller keeps mutating ``state`` while the write runs
+        payload = state.model_dump(mode="json", include=self.fields)
+        lock = _lock_for(self.draft_dir)  # keep it alive: _draft_locks holds it weakly
+        async with lock.aio:
+            written = await asyncio.to_thread(self._write, payload)
+        if written:
+            self._last_write = time.monotonic()
+            self.writes += 1
+
+    def _write(self, payload: dict) -> bool:
+        if not self.draft_dir.exists():
+            # Draft was cleaned up (e.g. successful finalize) — nothing to persist into
+            return False
+        if self.fields is None:
+            with locked_draft(self.draft_dir):
+                write_draft_json(self.draft_dir, payload)
+            return True
+        return update_draft_json(self.draft_dir, lambda data: data.update(payload)) is not None
+
+    def discard(self) -> None:
+        """Drop any pending write (the draft is about to be deleted)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = None
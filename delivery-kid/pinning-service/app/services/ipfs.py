@@ -1,6 +1,7 @@
 """IPFS pinning service - local kubo + Pinata backup."""
 
 import httpx
+import uuid
 from pathlib import Path
 from typing import Optional
 from dataclasses import dataclass
@@ -124,6 +125,64 @@ async def add_file(file_path: Path) -> PinResult:
         return PinResult(success=False, error=f"IPFS error: {e}")
 
 
+async def cat(ipfs_path: str, max_bytes: int = 10 * 1024 * 1024) -> bytes:
+    """Read a (small) file from IPFS, e.g. ``<cid>/master.m3u8``."""
+    settings = get_settings()
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        response = await client.post(
+            f"{settings.ipfs_api_url}/api/v0/cat",
+            params={"arg": ipfs_path, "length": max_bytes},
+        )
+    if response.status_code != 200:
+        raise RuntimeError(f"IPFS cat {ipfs_path} failed: {response.status_code} {response.text[:100]}")
+    return response.content
+
+
+async def add_linked_directory(links: dict[str, str], files: dict[str, bytes]) -> PinResult:
+    """Build and pin a directory from existing IPFS content plus new small files.
+
+    ``links`` maps paths in the new directory to IPFS paths
+    (``<cid>/720p/segment_003.ts``) that are linked in by CID — nothing is
+    downloaded or re-added. ``files`` maps paths to bytes written alongside
+    (playlists, metadata.json). The directory is assembled in MFS under a
+    scratch path that is removed afterwards.
+    """
+    settings = get_settings()
+    api = f"{settings.ipfs_api_url}/api/v0"
+    root = f"/delivery-kid-tmp/{uuid.uuid4().hex}"
+
+    try:
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            async def call(endpoint: str, params, **kwargs) -> httpx.Response:
+                response = await client.post(f"{api}/{endpoint}", params=params, **kwargs)
+                if response.status_code != 200:
+                    raise RuntimeError(f"IPFS {endpoint} failed: {response.status_code} {response.text[:100]}")
+                return response
+
+            await call("files/mkdir", {"arg": root, "parents": "true"})
+            try:
+                for dest, source in links.items():
+                    await call("files/cp", [("arg", f"/ipfs/{source}"), ("arg", f"{root}/{dest}"),
+                                            ("parents", "true")])
+                for dest, content in files.items():
+                    await call("files/write", {"arg": f"{root}/{dest}", "create": "true",
+                                               "parents": "true", "truncate": "true"},
+                               files={"file": (dest.rsplit("/", 1)[-1], content)})
+                stat = await call("files/stat", {"arg": root, "hash": "true"})
+                cid = stat.json()["Hash"]
+                await call("pin/add", {"arg": cid})
+            finally:
+                await client.post(f"{api}/files/rm", params={"arg": root, "recursive": "true", "force": "true"})
+
+        pinata_success = False
+        if settings.pinata_jwt:
+            pinata_success = await pin_to_pinata(cid)
+        return PinResult(success=True, cid=cid, pinata_success=pinata_success)
+
+    except Exception as e:
+        return PinResult(success=False, error=f"IPFS error: {e}")
+
+
 async def pin_to_pinata(cid: str) -> bool:
     """Pin an existing CID to Pinata for redundancy."""
     settings = get_settings()
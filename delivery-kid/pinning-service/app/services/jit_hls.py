@@ -0,0 +1,262 @@
+"""Just-in-time HLS for staged videos, playable before any preview exists.
+
+Until Coconut (or the local fallback) finishes the preview, the draft page
+could only play the raw upload — gigabytes for a 4K HEVC .mov, which most
+browsers can't decode anyway. Here each HLS segment is cut from the staged
+source when a player first asks for it:
+
+- ``remux``: an already browser-friendly, modest-bitrate source (see
+  ``trim.can_stream_copy``) is copied into MPEG-TS without re-encoding.
+  Segments start on keyframes, so the plan needs one keyframe scan.
+- ``transcode``: anything else is encoded to ``JIT_HEIGHT``p H.264/AAC in
+  fixed ``HLS_SEGMENT_SECONDS`` segments, each starting on its own
+  keyframe.
+
+Segments are cached under ``<draft>/jit-hls/<key>``, the key covering the
+source's size and mtime and the packaging settings. Concurrent requests
+for one segment (or one plan) share a single ffmpeg run (or probe), which
+carries on if the player gives up; the next segment is prefetched. Encodes
+run through a small scheduler of their own so playback doesn't queue
+behind album encodes, and each holds a staging reservation sized from its
+duration, so a scrubbing player can't fill the disk past the quota.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from . import analyze, staging_space, transcode, trim
+from .fsutil import atomic_write_text
+from .transcode import HLS_SEGMENT_SECONDS
+from .transcode_scheduler import TranscodeScheduler
+
+logger = logging.getLogger(__name__)
+
+JIT_DIR = "jit-hls"
+PLAN_FILE = "plan.json"
+JIT_VERSION = 1  # bump when the ffmpeg settings below change
+JIT_HEIGHT = 480
+JIT_REMUX_MAX_BITRATE = 4_000_000  # above this, a low-res encode beats copying
+JIT_TRANSCODE_MAX_BITRATE = 2_500_000  # 480p at CRF 28 plus 96k audio stays well under this
+RESERVE_HEADROOM = 1.5  # bitrate peaks and MPEG-TS overhead over the average
+JIT_SLOTS = 2
+PLAN_CACHE_SIZE = 64
+
+_scheduler = TranscodeScheduler(slots=JIT_SLOTS)
+_plans: OrderedDict[Path, dict] = OrderedDict()
+_inflight: dict[Path, asyncio.Task] = {}
+_planning: dict[Path, asyncio.Task] = {}
+
+
+def cache_dir_for(draft_dir: Path, filename: str, size: int, mtime_ns: int) -> Path:
+    key = hashlib.sha256(f"{filename}:{size}:{mtime_ns}:{JIT_VERSION}".encode()).hexdigest()[:16]
+    return draft_dir / JIT_DIR / key
+
+
+def segment_name(index: int) -> str:
+    return f"seg_{index:05d}.ts"
+
+
+def segment_index(name: str) -> Optional[int]:
+    """Index of a ``segment_name``, or None for anything else."""
+    if not (name.startswith("seg_") and name.endswith(".ts")):
+        return None
+    digits = name[len("seg_"):-len(".ts")]
+    return int(digits) if digits.isdigit() else None
+
+
+def fixed_segments(duration: float, seconds: float = HLS_SEGMENT_SECONDS) -> list[tuple[float, float]]:
+    count = max(1, math.ceil(duration / seconds))
+    return [(i * seconds, min(duration, (i + 1) * seconds)) for i in range(count)]
+
+
+def keyframe_segments(keyframes: list[float], duration: float,
+                      seconds: float = HLS_SEGMENT_SECONDS) -> list[tuple[float, float]]:
+    """Segments cut at the first keyframe at least ``seconds`` after each start."""
+    bounds = [0.0]
+    for kf in sorted(keyframes):
+        if kf - bounds[-1] >= seconds and kf < duration:
+            bounds.append(kf)
+    bounds.append(duration)
+    return list(zip(bounds, bounds[1:]))
+
+
+def media_playlist(segments: list[tuple[float, float]], query: str = "") -> str:
+    """VOD playlist; ``query`` (the request's auth) is appended to each segment URI."""
+    suffix = f"?{query}" if query else ""
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{math.ceil(max(end - start for start, end in segments))}",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for i, (start, end) in enumerate(segments):
+        lines += [f"#EXTINF:{end - start:.3f},", segment_name(i) + suffix]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+async def _keyframes(source: Path) -> list[float]:
+    """Video keyframe timestamps, from packet flags (no decoding)."""
+    proc = await asyncio.create_subprocess_exec(
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(source),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"Keyframe scan failed: {stderr.decode()[:200]}")
+    keyframes = []
+    for line in stdout.decode().splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            keyframes.append(float(pts))
+    return keyframes
+
+
+def _read_plan(plan_path: Path) -> Optional[dict]:
+    try:
+        return json.loads(plan_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_plan(plan_path: Path, result: dict) -> None:
+    plan_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(plan_path, json.dumps(result))
+
+
+async def _make_plan(source: Path, cache_dir: Path) -> dict:
+    plan_path = cache_dir / PLAN_FILE
+    result = await asyncio.to_thread(_read_plan, plan_path)
+    if result is None:
+        probe = await analyze.probe(source)
+        info = transcode.source_info_from_probe(probe)
+        duration = info.get("duration_seconds") or 0.0
+        if not duration or not info.get("video_codec"):
+            raise ValueError(f"{source.name} has no video to package")
+        bitrate = info.get("size_bytes", 0) * 8 / duration
+        offset = float(probe.get("format", {}).get("start_time") or 0)
+        if trim.can_stream_copy(info) and bitrate <= JIT_REMUX_MAX_BITRATE:
+            keyframes = [kf - offset for kf in await _keyframes(source)]
+            mode, segments = "remux", keyframe_segments(keyframes, duration)
+        else:
+            mode, segments = "transcode", fixed_segments(duration)
+        result = {"mode": mode, "segments": segments, "has_audio": "audio_codec" in info,
+                  "bitrate": bitrate}
+        await asyncio.to_thread(_write_plan, plan_path, result)
+        logger.info("JIT HLS for %s: %s, %d segments", source.name, mode, len(segments))
+    result["segments"] = [tuple(seg) for seg in result["segments"]]
+    _plans[cache_dir] = result
+    while len(_plans) > PLAN_CACHE_SIZE:
+        _plans.popitem(last=False)
+    return result
+
+
+def _planned(cache_dir: Path, task: asyncio.Task) -> None:
+    _planning.pop(cache_dir, None)
+    if not task.cancelled():
+        task.exception()  # retrieved here in case every waiter gave up
+
+
+async def plan(source: Path, cache_dir: Path) -> dict:
+    """How ``source`` is packaged: mode and segment boundaries (cached).
+
+    Concurrent callers for one ``cache_dir`` share a single probe.
+    """
+    if cache_dir in _plans:
+        _plans.move_to_end(cache_dir)
+        return _plans[cache_dir]
+    task = _planning.get(cache_dir)
+    if task is None:
+        task = asyncio.create_task(_make_plan(source, cache_dir))
+        _planning[cache_dir] = task
+        task.add_done_callback(lambda t: _planned(cache_dir, t))
+    return await asyncio.shield(task)
+
+
+def segment_estimate(packaging: dict, index: int) -> int:
+    """Bytes to reserve for segment ``index``: its duration at the mode's peak bitrate."""
+    start, end = packaging["segments"][index]
+    if packaging["mode"] == "remux":
+        bitrate = packaging.get("bitrate", JIT_REMUX_MAX_BITRATE)
+    else:
+        bitrate = JIT_TRANSCODE_MAX_BITRATE
+    return int(bitrate * (end - start) / 8 * RESERVE_HEADROOM)
+
+
+def segment_command(source: Path, output: Path, packaging: dict, index: int) -> list[str]:
+    start, end = packaging["segments"][index]
+    cmd = ["ffmpeg", "-v", "error", "-y", "-ss", f"{start:.6f}", "-i", str(source),
+           "-t", f"{end - start:.6f}", "-map", "0:v:0", "-map", "0:a:0?"]
+    if packaging["mode"] == "remux":
+        cmd += ["-c", "copy"]
+    else:
+        cmd += [
+            "-vf", f"scale=-2:'min({JIT_HEIGHT},ih)'",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "96k", "-ac", "2",
+        ]
+    # Keep timestamps continuous across separately cut segments
+    cmd += ["-output_ts_offset", f"{start:.6f}", "-muxdelay", "0", "-f", "mpegts", str(output)]
+    return cmd
+
+
+async def _produce(source: Path, output: Path, packaging: dict, index: int) -> Path:
+    tmp = output.with_name(output.name + ".tmp")
+    cmd = segment_command(source, tmp, packaging, index)
+    with staging_space.reserve(segment_estimate(packaging, index)):
+        returncode, stderr = await _scheduler.submit(lambda: transcode.run_ffmpeg(cmd))
+        if returncode != 0 or not tmp.exists():
+            tmp.unlink(missing_ok=True)
+            raise RuntimeError(f"Segment {index} of {source.name} failed: {stderr.decode(errors='replace')[:200]}")
+        tmp.replace(output)
+        staging_space.record_write(output, output.stat().st_size)
+    return output
+
+
+def _start(source: Path, cache_dir: Path, packaging: dict, index: int) -> Optional[asyncio.Task]:
+    """The (possibly already running) task producing segment ``index``; None if cached."""
+    output = cache_dir / segment_name(index)
+    if output in _inflight:
+        return _inflight[output]
+    if output.exists():
+        return None
+    task = asyncio.create_task(_produce(source, output, packaging, index))
+    _inflight[output] = task
+    task.add_done_callback(lambda t: _finished(output, t))
+    return task
+
+
+def _finished(output: Path, task: asyncio.Task) -> None:
+    _inflight.pop(output, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("JIT HLS: %s", task.exception())
+
+
+async def segment(source: Path, cache_dir: Path, index: int) -> Path:
+    """Path of segment ``index``, cutting it (and prefetching the next) if needed.
+
+    Raises IndexError for a segment past the end.
+    """
+    packaging = await plan(source, cache_dir)
+    if not 0 <= index < len(packaging["segments"]):
+        raise IndexError(index)
+    task = _start(source, cache_dir, packaging, index)
+    if index + 1 < len(packaging["segments"]):
+        _start(source, cache_dir, packaging, index + 1)
+    if task is not None:
+        # A player that gives up doesn't waste the encode: it lands in the cache
+        await asyncio.shield(task)
+    return cache_dir / segment_name(index)
+
+
+def status() -> dict:
+    return {"segments_in_flight": len(_inflight), **_scheduler.status()}
@@ -0,0 +1,244 @@
+"""SQLite-backed transcoding job store.
+
+Replaces one-JSON-file-per-job under ``staging/jobs``. Listing used to stat
+and parse every file ever written; here status, createdAt and identity are
+indexed columns and the full job dict rides along as a JSON blob.
+
+The database runs in WAL mode so readers never block the webhook workers.
+WAL needs shared memory, which SMB/CIFS mounts can't provide — point
+``STATE_DIR`` at local disk in production. If WAL can't be enabled we fall
+back to a rollback journal rather than refusing to start.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    status      TEXT,
+    created_at  TEXT NOT NULL,
+    identity    TEXT,
+    draft_id    TEXT,
+    updated_at  REAL NOT NULL,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_identity ON jobs (identity, created_at);
+CREATE INDEX IF NOT EXISTS jobs_draft ON jobs (draft_id);
+CREATE TABLE IF NOT EXISTS migrations (
+    name        TEXT PRIMARY KEY,
+    applied_at  TEXT NOT NULL
+);
+"""
+
+
+class JobStore:
+    """Thread-safe wrapper around a single SQLite connection."""
+
+    # Returned from an update() callback to abandon the write
+    SKIP = object()
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA busy_timeout = 5000")
+        mode = self._conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning("Job store %s: WAL unavailable (journal_mode=%s)", db_path, mode)
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _columns(job_id: str, data: dict, created_at: Optional[str] = None) -> tuple:
+        created = data.get("createdAt") or created_at or datetime.now(timezone.utc).isoformat()
+        return (
+            job_id,
+            data.get("status"),
+            created,
+            data.get("identity"),
+            data.get("draftId"),
+            time.time(),
+            json.dumps(data, default=str),
+        )
+
+    def _write(self, job_id: str, data: dict) -> None:
+        existing = self._conn.execute(
+            "SELECT created_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, created_at, identity, draft_id, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._columns(job_id, data, existing["created_at"] if existing else None),
+        )
+
+    def put(self, job_id: str, data: dict) -> None:
+        """Insert or replace a job."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(job_id, data)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def update(self, job_id: str, fn: Callable[[dict], Optional[dict]]) -> Optional[dict]:
+        """Atomically read-modify-write a job.
+
+        ``fn`` receives the current job dict and may mutate it in place or
+        return a replacement. Returning the sentinel ``JobStore.SKIP`` leaves
+        the row untouched. Returns the stored job, or None if it doesn't exist.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                job = json.loads(row["data"])
+                result = fn(job)
+                if result is JobStore.SKIP:
+                    self._conn.execute("ROLLBACK")
+                    return job
+                if result is not None:
+                    job = result
+                self._write(job_id, job)
+                self._conn.execute("COMMIT")
+                return job
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _filters(
+        status: Optional[set[str] | str],
+        identity: Optional[str],
+        draft_id: Optional[str],
+    ) -> tuple[str, list]:
+        clauses, params = [], []
+        if status:
+            statuses = [status] if isinstance(status, str) else sorted(status)
+            clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if identity:
+            clauses.append("identity = ?")
+            params.append(identity)
+        if draft_id:
+            clauses.append("draft_id = ?")
+            params.append(draft_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def list(
+        self,
+        status: Optional[set[str] | str] = None,
+        identity: Optional[str] = None,
+        draft_id: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+        oldest_first: bool = False,
+    ) -> list[dict]:
+        """List jobs matching the filters, newest first by createdAt."""
+        where, params = self._filters(status, identity, draft_id)
+        order = "ASC" if oldest_first else "DESC"
+        sql = (f"SELECT data FROM jobs {where} "
+               f"ORDER BY created_at {order}, updated_at {order} LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, limit, offset]).fetchall()
+        return [json.loads(r["data"]) for r in rows]
+
+    def count(
+        self,
+        status: Optional[set[str] | str] = None,
+        identity: Optional[str] = None,
+        draft_id: Optional[str] = None,
+    ) -> int:
+        where, params = self._filters(status, identity, draft_id)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()[0]
+
+    def import_json_dir(self, jobs_dir: Path) -> int:
+        """One-time migration of legacy ``jobs/*.json`` files.
+
+        Runs once per database (recorded in the migrations table). Jobs that
+        already exist in the database are left alone, so the import can't
+        clobber newer state. The JSON files are left in place.
+        """
+        name = "import-json-jobs"
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone()
+            if done:
+                return 0
+            imported = 0
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if jobs_dir.is_dir():
+                    for f in jobs_dir.glob("*.json"):
+                        try:
+                            data = json.loads(f.read_text())
+                        except (json.JSONDecodeError, OSError):
+                            logger.warning("Skipping unreadable job file %s", f)
+                            continue
+                        job_id = data.get("id") or f.stem
+                        mtime = datetime.fromtimestamp(f.stat().st_mtime, timezone.utc).isoformat()
+                        cur = self._conn.execute(
+                            "INSERT OR IGNORE INTO jobs "
+                            "(id, status, created_at, identity, draft_id, updated_at, data) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            self._columns(job_id, data, created_at=mtime),
+                        )
+                        imported += cur.rowcount
+                self._conn.execute(
+                    "INSERT INTO migrations (name, applied_at) VALUES (?, ?)",
+                    (name, datetime.now(timezone.utc).isoformat()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if imported:
+            logger.info("Imported %d legacy JSON jobs into %s", imported, self.db_path)
+        return imported
+
+
+_stores: dict[Path, JobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_job_store(db_path: Path, legacy_jobs_dir: Optional[Path] = None) -> JobStore:
+    """Return the (process-wide) store for ``db_path``, opening it on first use.
+
+    On first open the legacy JSON jobs directory is imported.
+    """
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = JobStore(db_path)
+            if legacy_jobs_dir is not None:
+                store.import_json_dir(legacy_jobs_dir)
+            _stores[db_path] = store
+        return store
@@ -0,0 +1,308 @@
+"""Preview assets: waveform peaks and thumbnail sprites for staged media.
+
+The ReleaseDraft page used to download a whole staged file just to draw
+a waveform or show scrub thumbnails. After upload analysis, a background
+task (``ASSETS_TASK``, at ``PRIORITY_BACKGROUND``) precomputes, per file:
+
+- ``<name>.peaks``: ``WAVEFORM_PEAKS`` interleaved int8 (min, max) pairs,
+  a few KB per track, from a mono 8 kHz decode.
+- ``<name>.sprite.jpg``: one keyframe every ``interval`` seconds, scaled to
+  ``THUMB_WIDTH`` and tiled ``THUMB_COLUMNS`` wide (video only). The WebVTT
+  index is rendered from the layout on request (``build_vtt``).
+
+Assets live in ``<draft>/assets``, described by ``index.json``. Entries are
+keyed on the source's size and mtime, so a re-run (restart, re-upload)
+only redoes files that changed.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import shutil
+import sys
+from array import array
+from pathlib import Path
+from typing import Optional
+
+from . import staging_space, task_queue
+from .fsutil import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+ASSETS_TASK = "media-assets"
+ASSETS_DIR = "assets"
+INDEX_FILE = "index.json"
+
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_PEAKS = 2000
+WAVEFORM_READ_BYTES = 64 * 1024
+
+THUMB_WIDTH = 160
+THUMB_COLUMNS = 10
+MAX_THUMBS = 100
+MIN_THUMB_INTERVAL = 2.0
+
+
+def assets_dir(draft_dir: Path) -> Path:
+    return draft_dir / ASSETS_DIR
+
+
+def load_index(draft_dir: Path) -> dict:
+    """The draft's asset index (empty if nothing has been generated yet)."""
+    try:
+        return json.loads((assets_dir(draft_dir) / INDEX_FILE).read_text())
+    except (OSError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+# --- Waveform ---
+
+class PeakAccumulator:
+    """Folds s16le samples into int8 (min, max) pairs, one per bucket."""
+
+    def __init__(self, samples_per_peak: int):
+        self.samples_per_peak = max(1, samples_per_peak)
+        self._peaks = array("b")
+        self._carry = b""
+        self._count = 0
+        self._lo = 0
+        self._hi = 0
+
+    def feed(self, data: bytes) -> None:
+        data = self._carry + data
+        usable = len(data) - len(data) % 2
+        self._carry = data[usable:]
+        samples = array("h", data[:usable])
+        if sys.byteorder == "big":
+            samples.byteswap()
+        i, n = 0, len(samples)
+        while i < n:
+            take = min(self.samples_per_peak - self._count, n - i)
+            chunk = samples[i:i + take]
+            lo, hi = min(chunk), max(chunk)
+            if self._count:
+                lo, hi = min(lo, self._lo), max(hi, self._hi)
+            self._lo, self._hi = lo, hi
+            self._count += take
+            i += take
+            if self._count == self.samples_per_peak:
+                self._flush()
+
+    def _flush(self) -> None:
+        self._peaks.append(self._lo >> 8)
+        self._peaks.append(self._hi >> 8)
+        self._count = 0
+
+    def finish(self) -> bytes:
+        if self._count:
+            self._flush()
+        return self._peaks.tobytes()
+
+
+async def compute_waveform(source: Path, output: Path, duration: float) -> dict:
+    """Decode ``source`` to mono PCM and write its peaks to ``output``."""
+    total = duration * WAVEFORM_SAMPLE_RATE
+    accumulator = PeakAccumulator(math.ceil(total / WAVEFORM_PEAKS) if total else WAVEFORM_SAMPLE_RATE)
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-v", "error", "-i", str(source),
+        "-vn", "-ac", "1", "-ar", str(WAVEFORM_SAMPLE_RATE), "-f", "s16le", "-",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stderr_task = asyncio.create_task(process.stderr.read())
+    try:
+        while chunk := await process.stdout.read(WAVEFORM_READ_BYTES):
+            accumulator.feed(chunk)
+        await process.wait()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    finally:
+        stderr = await stderr_task
+    if process.returncode != 0:
+        raise RuntimeError(f"Waveform decode failed: {stderr.decode(errors='replace')[:200]}")
+
+    peaks = accumulator.finish()
+    tmp = output.with_name(output.name + ".tmp")
+    tmp.write_bytes(peaks)
+    tmp.replace(output)
+    return {
+        "file": output.name,
+        "format": "int8-minmax",
+        "sample_rate": WAVEFORM_SAMPLE_RATE,
+        "samples_per_peak": accumulator.samples_per_peak,
+        "peaks": len(peaks) // 2,
+        "bytes": len(peaks),
+    }
+
+
+# --- Thumbnails ---
+
+def thumbnail_layout(duration: float, width: Optional[int], height: Optional[int]) -> dict:
+    """Interval, count and tiling of the sprite for a video."""
+    interval = max(MIN_THUMB_INTERVAL, duration / MAX_THUMBS)
+    count = max(1, math.ceil(duration / interval))
+    columns = min(THUMB_COLUMNS, count)
+    if width and height:
+        thumb_height = max(2, round(THUMB_WIDTH * height / width / 2) * 2)
+    else:
+        thumb_height = THUMB_WIDTH * 9 // 16
+    return {
+        "duration": duration,
+        "interval": interval,
+        "count": count,
+        "columns": columns,
+        "rows": math.ceil(count / columns),
+        "width": THUMB_WIDTH,
+        "height": thumb_height,
+    }
+
+
+def _vtt_time(t: float) -> str:
+    ms = round(t * 1000)
+    return f"{ms // 3_600_000:02d}:{ms // 60_000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def build_vtt(layout: dict, sprite_url: str) -> str:
+    """WebVTT cues pointing each interval at its tile (``#xywh=``) in the sprite."""
+    lines = ["WEBVTT", ""]
+    w, h = layout["width"], layout["height"]
+    for i in range(layout["count"]):
+        start = i * layout["interval"]
+        end = min(layout["duration"], start + layout["interval"])
+        x, y = i % layout["columns"] * w, i // layout["columns"] * h
+        lines += [f"{_vtt_time(start)} --> {_vtt_time(end)}", f"{sprite_url}#xywh={x},{y},{w},{h}", ""]
+    return "\n".join(lines)
+
+
+async def compute_thumbnails(source: Path, output: Path, layout: dict) -> dict:
+    """Tile keyframes of ``source`` into a JPEG sprite at ``output``.
+
+    Only keyframes are decoded, so each tile is the keyframe nearest its
+    cue — close enough for scrubbing and far cheaper than a full decode.
+    """
+    tmp = output.with_name(output.name + ".tmp.jpg")
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-v", "error", "-y", "-skip_frame", "nokey", "-i", str(source), "-an",
+        "-vf", (f"fps={1 / layout['interval']:.6f},"
+                f"scale={layout['width']}:{layout['height']},"
+                f"tile={layout['columns']}x{layout['rows']}"),
+        "-frames:v", "1", "-q:v", "5", str(tmp),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        tmp.unlink(missing_ok=True)
+        raise
+    if process.returncode != 0 or not tmp.exists():
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"Thumbnail sprite failed: {stderr.decode(errors='replace')[:200]}")
+    tmp.replace(output)
+    return {"file": output.name, "bytes": output.stat().st_size, **layout}
+
+
+# --- Generation ---
+
+def _media_files(draft_dir: Path) -> list[dict]:
+    """Files in the draft's state worth generating assets for."""
+    try:
+        data = json.loads((draft_dir / "draft.json").read_text())
+    except (OSError, json.JSONDecodeError):
+        return []
+    media = []
+    for f in data.get("files") or []:
+        # Album drafts only hold audio and don't record a media_type
+        media_type = f.get("media_type", "audio")
+        if media_type in ("audio", "video") and f.get("duration_seconds"):
+            media.append(f)
+    return media
+
+
+async def generate_assets(draft_dir: Path, files: list[dict]) -> dict:
+    """Generate missing or stale assets for ``files`` and rewrite the index.
+
+    A failure on one file is recorded in its entry and doesn't stop the
+    rest. If the draft is deleted meanwhile, generation stops and nothing
+    is written (the assets dir is never created without its draft).
+    """
+    out_dir = assets_dir(draft_dir)
+    try:
+        out_dir.mkdir(exist_ok=True)
+    except FileNotFoundError:
+        return {"files": {}}
+    previous = load_index(draft_dir)["files"]
+    index: dict = {"files": {}}
+    for f in files:
+        if not out_dir.exists():
+            return index
+        name = f["original_filename"]
+        source = draft_dir / "upload" / name
+        try:
+            st = source.stat()
+        except OSError:
+            continue
+        entry = previous.get(name)
+        if entry and entry.get("size_bytes") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+            index["files"][name] = entry
+            continue
+
+        entry = {"size_bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+        is_video = f.get("media_type") == "video"
+        duration = float(f["duration_seconds"])
+        try:
+            if not is_video or f.get("audio_codec"):
+                entry["waveform"] = await compute_waveform(source, out_dir / f"{name}.peaks", duration)
+            if is_video:
+                layout = thumbnail_layout(duration, f.get("width"), f.get("height"))
+                entry["thumbnails"] = await compute_thumbnails(source, out_dir / f"{name}.sprite.jpg", layout)
+        except (OSError, RuntimeError) as e:
+            logger.warning("Preview assets for %s failed: %s", source, e)
+            entry["error"] = str(e)
+        index["files"][name] = entry
+
+    for name in set(previous) - set(index["files"]):
+        for stale in (out_dir / f"{name}.peaks", out_dir / f"{name}.sprite.jpg"):
+            stale.unlink(missing_ok=True)
+    try:
+        atomic_write_text(out_dir / INDEX_FILE, json.dumps(index, indent=2))
+    except FileNotFoundError:
+        return index
+    staging_space.remeasure(out_dir)
+    return index
+
+
+@task_queue.handler(ASSETS_TASK)
+async def run_assets_task(task: task_queue.Task, publish: task_queue.Publish) -> None:
+    """Bring a draft's preview assets up to date with its current files.
+
+    The file list is read when the task runs, not when it was queued, so a
+    re-upload while the task waits is picked up; one during the run
+    triggers another pass.
+    """
+    draft_dir = Path(task.payload["draft_dir"])
+    if not shutil.which("ffmpeg"):
+        logger.warning("ffmpeg not found; no preview assets for %s", draft_dir.name)
+        return
+    while draft_dir.exists():
+        files = _media_files(draft_dir)
+        index = await generate_assets(draft_dir, files)
+        publish({"event": "complete", "data": json.dumps({"files": sorted(index["files"])})})
+        if _media_files(draft_dir) == files:
+            return
+
+
+def schedule(draft_id: str, draft_dir: Path) -> Optional[dict]:
+    """Queue asset generation for a freshly analysed draft (no-op without a queue)."""
+    queue = task_queue.get_task_queue()
+    if queue is None:
+        return None
+    return queue.submit(ASSETS_TASK, {"draft_dir": str(draft_dir)},
+                        priority=task_queue.PRIORITY_BACKGROUND, draft_id=draft_id)
@@ -0,0 +1,192 @@
+"""Range-aware file responses for staged media.
+
+A video player seeking through a staged upload issues a stream of
+``Range`` requests. Depending on the installed Starlette, ``FileResponse``
+either ignores ``Range`` or reads the range in 64 KB chunks (one thread
+hop each), re-stats the file the route already stat'ed, hashes an ETag per
+request and never answers 304. ``RangedFileResponse``:
+
+- reuses the route's ``stat_result``; the ETag is mtime_ns/size, no hashing;
+- answers ``If-None-Match`` / ``If-Modified-Since`` with 304 and honours
+  ``If-Range`` (a stale validator gets the whole file, not a wrong slice);
+- sends the body with the ASGI ``http.response.zerocopy`` extension
+  (sendfile) when the server offers it, ``http.response.pathsend`` for a
+  whole file, and otherwise 1 MiB ``os.pread`` chunks off the event loop;
+- stops reading once the client disconnects (players abandon open-ended
+  ranges constantly).
+
+Multi-range requests get the whole file (allowed by RFC 9110, and no
+player sends them).
+"""
+
+import asyncio
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Mapping, Optional
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+READ_CHUNK = 1024 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested range starts past the end of the file."""
+
+
+def etag_for(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """``(start, end)`` (end exclusive) of a single byte range.
+
+    None for a header to ignore — another unit, several ranges, or
+    malformed — meaning the whole file is sent. Raises RangeNotSatisfiable
+    for a range that starts past the end.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable
+            return max(0, size - suffix), size
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start < 0 or end <= start:
+        return None
+    return start, min(end, size)
+
+
+class RangedFileResponse(Response):
+    """Serve ``path`` (already stat'ed) with conditional and range support."""
+
+    def __init__(
+        self,
+        path: Path,
+        stat_result: os.stat_result,
+        media_type: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        filename: Optional[str] = None,
+    ):
+        self.path = path
+        self.stat_result = stat_result
+        self.status_code = 200
+        self.media_type = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+        self.background = None
+        self.init_headers(headers)
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault("etag", etag_for(stat_result))
+        self.headers.setdefault("last-modified", formatdate(stat_result.st_mtime, usegmt=True))
+        if filename is not None:
+            quoted = quote(filename)
+            self.headers.setdefault("content-disposition", (
+                f'attachment; filename="{filename}"' if quoted == filename
+                else f"attachment; filename*=utf-8''{quoted}"
+            ))
+
+    def _not_modified(self, request: Headers) -> bool:
+        if_none_match = request.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.headers["etag"] in tags
+        if_modified_since = request.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.stat_result.st_mtime) <= since
+        return False
+
+    def _range_applies(self, if_range: Optional[str]) -> bool:
+        if if_range is None:
+            return True
+        if if_range.startswith('"'):
+            return if_range == self.headers["etag"]  # strong comparison; W/ never matches
+        return if_range == self.headers["last-modified"]
+
+    async def _start(self, send: Send, status: int, drop: tuple[str, ...] = ()) -> None:
+        raw = [(k, v) for k, v in self.raw_headers if k.decode() not in drop]
+        await send({"type": "http.response.start", "status": status, "headers": raw})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request = Headers(scope=scope)
+        size = self.stat_result.st_size
+
+        if self._not_modified(request):
+            await self._start(send, 304, drop=("content-type", "content-length", "content-disposition"))
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        start, end, status = 0, size, 200
+        range_header = request.get("range")
+        if range_header and self._range_applies(request.get("if-range")):
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                await self._start(send, 416, drop=("content-type",))
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if byte_range is not None:
+                start, end, status = *byte_range, 206
+                self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+
+        self.headers["content-length"] = str(end - start)
+        await self._start(send, status)
+        if scope["method"].upper() == "HEAD" or end == start:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopy" in extensions:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopy", "file": file,
+                            "offset": start, "count": end - start})
+        elif "http.response.pathsend" in extensions and status == 200:
+            await send({"type": "http.response.pathsend", "path": str(Path(self.path).resolve())})
+        else:
+            await self._stream(receive, send, start, end)
+
+    async def _stream(self, receive: Receive, send: Send, start: int, end: int) -> None:
+        disconnected = asyncio.Event()
+
+        async def watch() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch())
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            offset = start
+            while offset < end and not disconnected.is_set():
+                chunk = await asyncio.to_thread(os.pread, fd, min(READ_CHUNK, end - offset), offset)
+                if not chunk:
+                    break  # truncated underneath us; the client sees a short body
+                offset += len(chunk)
+                try:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+                except OSError:
+                    return  # ASGI 2.4 servers raise once the client has gone
+            if offset < end and not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            os.close(fd)
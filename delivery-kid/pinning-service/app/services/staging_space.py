@@ -0,0 +1,304 @@
+"""Staging space accountant — enforces ``max_staging_size_gb``.
+
+Keeps a running byte count per top-level staging entry instead of running
+``du`` over the storage box:
+
+    drafts/<id>        → "drafts"
+    originals/<id>     → "originals"
+    hls-*, coconut-src-*, preview-*, enrich-*  → "jobs"
+    anything else      → "other"
+
+``seeding/`` is excluded — torrents are long-lived and managed by the seeder.
+
+The table is built by one scan at startup. After that, writers report what
+they add (``record_write``) and remove (``remove_tree``/``forget``), and code
+that lets an external tool (ffmpeg) fill a directory calls ``remeasure``
+on just that entry. Uploads ``reserve`` their bytes before writing
+anything, so two concurrent uploads can't both squeeze under the quota.
+Until the startup scan has finished, ``reserve`` refuses with a quota set
+(the totals are still incomplete), and changes reported during the scan
+are merged into its result rather than lost.
+
+Every module-level helper is a no-op until ``init_staging_space`` has run,
+so tests and scripts that don't set it up are unaffected.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from . import draft_events, trash
+from .fsutil import tree_stats
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIXES = ("hls-", "coconut-src-", "preview-", "enrich-")
+NESTED_DIRS = ("drafts", "originals")
+EXCLUDED = ("seeding",)
+
+
+class StagingFull(Exception):
+    """Raised by reserve() when a write would exceed the staging quota."""
+
+    def __init__(self, needed: int, available: int):
+        self.needed = needed
+        self.available = available
+        super().__init__(
+            f"Staging is full: need {needed / 1024**3:.2f} GB, "
+            f"{max(available, 0) / 1024**3:.2f} GB available"
+        )
+
+
+class StagingNotReady(StagingFull):
+    """Raised by reserve() while the startup scan is still measuring staging.
+
+    Routes catch it before StagingFull and answer 503 with ``Retry-After``:
+    the disk isn't full, the quota just can't be checked yet.
+    """
+
+    retry_after = 30  # seconds
+
+    def __init__(self, needed: int):
+        self.needed = needed
+        self.available = 0
+        Exception.__init__(self, "Staging usage is still being measured; try again shortly")
+
+
+class StagingSpace:
+    """Thread-safe byte accounting for one staging directory."""
+
+    def __init__(self, staging_dir: Path, quota_bytes: int):
+        self.staging_dir = staging_dir
+        self.quota_bytes = quota_bytes  # 0 = unlimited
+        self.built_at: Optional[float] = None
+        self._usage: dict[str, int] = {}
+        self._reserved = 0
+        # While a scan runs: key -> (absolute size or None, delta) reported meanwhile
+        self._changes: Optional[dict[str, tuple[Optional[int], int]]] = None
+        self._lock = threading.Lock()
+
+    def key_for(self, path: Path) -> Optional[str]:
+        """Map a path under staging to its accounting key (None = not tracked)."""
+        try:
+            parts = path.relative_to(self.staging_dir).parts
+        except ValueError:
+            return None
+        if not parts or parts[0] in EXCLUDED or parts[0].startswith("."):
+            return None
+        if parts[0] in NESTED_DIRS:
+            return f"{parts[0]}/{parts[1]}" if len(parts) > 1 else None
+        return parts[0]
+
+    @staticmethod
+    def category(key: str) -> str:
+        top = key.split("/", 1)[0]
+        if top in NESTED_DIRS:
+            return top
+        if top.startswith(JOB_PREFIXES):
+            return "jobs"
+        return "other"
+
+    def rebuild(self) -> int:
+        """Scan staging once. Returns total tracked bytes."""
+        start = time.monotonic()
+        with self._lock:
+            self._changes = {}
+        usage: dict[str, int] = {}
+        try:
+            with os.scandir(self.staging_dir) as it:
+                tops = [e.name for e in it]
+        except FileNotFoundError:
+            tops = []
+        for top in tops:
+            if top in NESTED_DIRS:
+                try:
+                    with os.scandir(self.staging_dir / top) as it:
+                        children = [e.name for e in it if not e.name.startswith(".")]
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                for child in children:
+                    usage[f"{top}/{child}"] = tree_stats(self.staging_dir / top / child)[1]
+            elif self.key_for(self.staging_dir / top) is not None:
+                usage[top] = tree_stats(self.staging_dir / top)[1]
+        with self._lock:
+            changes, self._changes = self._changes, None
+            for key, (size, delta) in changes.items():
+                usage[key] = (usage.get(key, 0) if size is None else size) + delta
+            self._usage = {k: v for k, v in usage.items() if v > 0}
+            self.built_at = time.time()
+            total = sum(self._usage.values())
+        logger.info("Staging space scanned: %.2f GB in %d entries (%.1fs)",
+                    total / 1024**3, len(usage), time.monotonic() - start)
+        return total
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(self._usage.values())
+
+    def available_bytes(self) -> Optional[int]:
+        if not self.quota_bytes:
+            return None
+        with self._lock:
+            return self.quota_bytes - sum(self._usage.values()) - self._reserved
+
+    def record_write(self, path: Path, nbytes: int) -> None:
+        """Account ``nbytes`` (may be negative) written under ``path``."""
+        key = self.key_for(path)
+        if key is None or not nbytes:
+            return
+        with self._lock:
+            self._set(key, self._usage.get(key, 0) + nbytes)
+            if self._changes is not None:
+                size, delta = self._changes.get(key, (None, 0))
+                self._changes[key] = (size, delta + nbytes)
+
+    def _set_measured(self, key: str, size: int) -> None:
+        """Record an absolute size for ``key``. Caller holds the lock."""
+        self._set(key, size)
+        if self._changes is not None:
+            self._changes[key] = (size, 0)
+
+    def _set(self, key: str, size: int) -> None:
+        if size > 0:
+            self._usage[key] = size
+        else:
+            self._usage.pop(key, None)
+
+    def remeasure(self, path: Path) -> None:
+        """Re-walk the entry containing ``path`` (after an external tool wrote to it)."""
+        key = self.key_for(path)
+        if key is None:
+            return
+        size = tree_stats(self.staging_dir / key)[1]
+        with self._lock:
+            self._set_measured(key, size)
+
+    def forget(self, path: Path) -> None:
+        """The entry containing ``path`` has been deleted wholesale."""
+        key = self.key_for(path)
+        if key is not None and not (self.staging_dir / key).exists():
+            with self._lock:
+                self._set_measured(key, 0)
+
+    def remove_tree(self, path: Path) -> None:
+        """Trash ``path`` and subtract what it held.
+
+        A whole entry (a draft, a job dir) is released as soon as it is in
+        ``.trash``. Part of an entry is never walked here: the reaper
+        measures it off the event loop and the bytes are released once it
+        is gone.
+        """
+        key = self.key_for(path)
+        if key is not None and path == self.staging_dir / key:
+            trash.discard(path)
+            self.forget(path)
+            return
+        trash.discard(path, on_reaped=lambda size: self.record_write(path, -size))
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        """Hold ``nbytes`` of quota for the duration of a write.
+
+        Raises StagingFull up front if they don't fit, and StagingNotReady
+        while the startup scan hasn't finished. The writer reports the
+        bytes it actually wrote via record_write(); the reservation itself is
+        released on exit either way.
+        """
+        with self._lock:
+            if self.quota_bytes:
+                if self.built_at is None:
+                    raise StagingNotReady(nbytes)
+                available = self.quota_bytes - sum(self._usage.values()) - self._reserved
+                if nbytes > available:
+                    raise StagingFull(nbytes, available)
+            self._reserved += nbytes
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reserved -= nbytes
+
+    def usage(self, top: int = 10) -> dict:
+        """Usage breakdown by category, plus the largest entries."""
+        with self._lock:
+            usage = dict(self._usage)
+            reserved = self._reserved
+        categories: dict[str, dict] = {
+            name: {"bytes": 0, "entries": 0} for name in ("drafts", "originals", "jobs", "other")
+        }
+        for key, size in usage.items():
+            bucket = categories[self.category(key)]
+            bucket["bytes"] += size
+            bucket["entries"] += 1
+        used = sum(usage.values())
+        largest = sorted(usage.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        return {
+            "quota_bytes": self.quota_bytes or None,
+            "used_bytes": used,
+            "reserved_bytes": reserved,
+            "available_bytes": (self.quota_bytes - used - reserved) if self.quota_bytes else None,
+            "categories": categories,
+            "largest": [{"path": key, "bytes": size} for key, size in largest],
+            "scanned_at": self.built_at,
+        }
+
+    def _on_draft_change(self, draft_dir: Path) -> None:
+        # draft_events listener: drop drafts that have been deleted
+        if not draft_dir.exists():
+            self.forget(draft_dir)
+
+
+# Global accountant instance
+_space: Optional[StagingSpace] = None
+
+
+def get_staging_space() -> Optional[StagingSpace]:
+    """Get the global staging accountant instance."""
+    return _space
+
+
+def init_staging_space(staging_dir: Path, quota_gb: float) -> StagingSpace:
+    """Create the global accountant. The caller runs the initial rebuild()."""
+    global _space
+    if _space is not None:
+        draft_events.remove_listener(_space._on_draft_change)
+    _space = StagingSpace(staging_dir, int(quota_gb * 1024**3))
+    draft_events.add_listener(_space._on_draft_change)
+    return _space
+
+
+def record_write(path: Path, nbytes: int) -> None:
+    if _space is not None:
+        _space.record_write(path, nbytes)
+
+
+def remeasure(path: Path) -> None:
+    if _space is not None:
+        _space.remeasure(path)
+
+
+def forget(path: Path) -> None:
+    if _space is not None:
+        _space.forget(path)
+
+
+def remove_tree(path: Path) -> None:
+    """Deferred delete (via the trash) that keeps the accountant in step."""
+    if _space is not None:
+        _space.remove_tree(path)
+    else:
+        trash.discard(path)
+
+
+@contextmanager
+def reserve(nbytes: int) -> Iterator[None]:
+    if _space is None:
+        yield
+        return
+    with _space.reserve(nbytes):
+        yield
@@ -0,0 +1,459 @@
+"""Durable queue for local finalize work (album encodes, local HLS transcodes).
+
+Finalize used to run inside the SSE generator of the request that started
+it: a client disconnect cancelled the encode halfway, and a restart left
+the draft stuck in ``finalizing`` with nothing working on it. Work is now
+a task row in SQLite (``tasks.db`` next to the Coconut job store), run by
+a fixed pool of workers in the background, and the finalize endpoints
+only subscribe to its progress.
+
+- Priorities: queued tasks run highest ``priority`` first, FIFO within a
+  priority (``PRIORITY_INTERACTIVE`` for finalize a user is waiting on,
+  ``PRIORITY_BACKGROUND`` for work nobody is watching). Background tasks
+  run on at most ``background_slots`` workers at once, so a backlog of
+  them can't hold every worker while a finalize waits.
+- Cancellation: ``cancel`` drops a queued task, or cancels a running
+  handler (which kills its ffmpeg).
+- Recovery: a task still ``running`` at startup was interrupted by a
+  restart; ``recover`` queues it again, up to ``MAX_ATTEMPTS`` runs.
+  Handlers must therefore be safe to re-run from the start.
+
+Handlers are registered per task kind with ``@handler("kind")`` and called
+as ``await fn(task, publish)``. ``publish(frame)`` broadcasts an SSE frame
+(an sse_starlette event dict) to everyone following the task; frames are
+kept in memory for replay, and the latest one is persisted on the row. A
+handler that raises fails the task; one that has already published its
+own ``error`` frame raises ``TaskFailed`` so no second frame is sent.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BACKGROUND = 0
+MAX_ATTEMPTS = 3
+ACTIVE = ("queued", "running")
+TERMINAL = ("done", "failed", "cancelled")
+POLL_SECONDS = 5.0
+FINISHED_HISTORY = 100  # finished tasks whose frames stay replayable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id           TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    priority     INTEGER NOT NULL,
+    draft_id     TEXT,
+    payload      TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    last_event   TEXT,
+    created_at   REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_queue ON tasks (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS tasks_draft ON tasks (draft_id, kind);
+"""
+
+
+@dataclass
+class Task:
+    """What a handler gets: the row's identity and payload."""
+    id: str
+    kind: str
+    payload: dict
+    priority: int
+    draft_id: Optional[str]
+    attempts: int  # including this run; > 1 means a resumed task
+    # Set by TaskQueue.cancel before the handler is cancelled, so a handler
+    # can tell a user's cancel from a shutdown (which it will be resumed after)
+    cancelled: bool = False
+
+
+class TaskFailed(Exception):
+    """Raised by a handler that has already published its ``error`` frame."""
+
+
+def error_message(frame: dict) -> Optional[str]:
+    """The message of an ``error`` frame, or None for any other frame."""
+    if frame.get("event") != "error":
+        return None
+    return json.loads(frame["data"]).get("message") or "Task failed"
+
+
+Publish = Callable[[dict], None]
+TaskHandler = Callable[[Task, Publish], Awaitable[Any]]
+
+_handlers: dict[str, TaskHandler] = {}
+
+
+def handler(kind: str) -> Callable[[TaskHandler], TaskHandler]:
+    """Register the coroutine that runs tasks of ``kind``."""
+    def register(fn: TaskHandler) -> TaskHandler:
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def _row(row: sqlite3.Row) -> dict:
+    task = dict(row)
+    task["payload"] = json.loads(task["payload"])
+    task["last_event"] = json.loads(task["last_event"]) if task["last_event"] else None
+    return task
+
+
+def _frame(event: str, data: dict) -> dict:
+    return {"event": event, "data": json.dumps(data)}
+
+
+class TaskQueue:
+    """SQLite-backed priority queue drained by a pool of asyncio workers."""
+
+    def __init__(self, db_path: Path, workers: int = 2):
+        self.db_path = db_path
+        self.worker_count = max(1, workers)
+        # Keep one worker for interactive tasks (impossible with a single worker)
+        self.background_slots = max(1, self.worker_count - 1)
+        self._background_running = 0
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA busy_timeout = 5000")
+        mode = self._conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning("Task queue %s: WAL unavailable (journal_mode=%s)", db_path, mode)
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._workers: list[asyncio.Task] = []
+        self._running: dict[str, tuple[Task, asyncio.Task]] = {}
+        self._frames: OrderedDict[str, list[dict]] = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None  # a task was queued
+        self._changed: Optional[asyncio.Event] = None  # replaced on every publish
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --- Rows ---
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return _row(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> list[dict]:
+        """Tasks, active ones first in run order, then most recently finished."""
+        where, params = ("WHERE status = ?", [status]) if status else ("", [])
+        sql = (f"SELECT * FROM tasks {where} ORDER BY "
+               "CASE status WHEN 'running' THEN 0 WHEN 'queued' THEN 1 ELSE 2 END, "
+               "CASE WHEN status IN ('queued', 'running') THEN -priority ELSE 0 END, "
+               "CASE WHEN status IN ('queued', 'running') THEN created_at ELSE -finished_at END "
+               "LIMIT ?")
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, limit]).fetchall()
+        return [_row(r) for r in rows]
+
+    def active_for(self, draft_id: str, kind: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM tasks WHERE draft_id = ? AND kind = ? AND status IN (?, ?)",
+                (draft_id, kind, *ACTIVE),
+            ).fetchone()
+        return _row(row) if row else None
+
+    def position(self, task_id: str) -> int:
+        """Queued tasks that will run before ``task_id`` (0 if it isn't queued)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT priority, created_at FROM tasks WHERE id = ? AND status = 'queued'", (task_id,)
+            ).fetchone()
+            if row is None:
+                return 0
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (row["priority"], row["priority"], row["created_at"]),
+            ).fetchone()[0]
+
+    def _set(self, task_id: str, **fields) -> None:
+        cols = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE tasks SET {cols} WHERE id = ?", (*fields.values(), task_id))
+
+    def submit(
+        self,
+        kind: str,
+        payload: dict,
+        priority: int = PRIORITY_INTERACTIVE,
+        draft_id: Optional[str] = None,
+    ) -> dict:
+        """Queue a task and return its row.
+
+        With a ``draft_id``, an already queued or running task of the same
+        kind for that draft is returned instead of queueing a second one.
+        """
+        with self._lock:
+            if draft_id is not None:
+                existing = self.active_for(draft_id, kind)
+                if existing is not None:
+                    return existing
+            task_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO tasks (id, kind, status, priority, draft_id, payload, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (task_id, kind, priority, draft_id, json.dumps(payload), time.time()),
+            )
+        self._wake()
+        return self.get(task_id)
+
+    def _claim(self) -> Optional[dict]:
+        """Mark the next queued task running and return it.
+
+        Once ``background_slots`` background tasks are running, only
+        higher-priority tasks are claimed.
+        """
+        where = "status = 'queued'"
+        if self._background_running >= self.background_slots:
+            where += f" AND priority > {PRIORITY_BACKGROUND}"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT id, priority FROM tasks WHERE {where} "
+                    "ORDER BY priority DESC, created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'running', started_at = ?, attempts = attempts + 1 "
+                        "WHERE id = ?", (time.time(), row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        if row["priority"] <= PRIORITY_BACKGROUND:
+            self._background_running += 1
+        return self.get(row["id"])
+
+    def recover(self) -> int:
+        """Re-queue tasks a restart interrupted. Returns how many were re-queued."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = 'failed', finished_at = ?, "
+                "error = 'Interrupted too many times' WHERE status = 'running' AND attempts >= ?",
+                (time.time(), MAX_ATTEMPTS),
+            )
+            return self._conn.execute(
+                "UPDATE tasks SET status = 'queued' WHERE status = 'running'"
+            ).rowcount
+
+    def cancel(self, task_id: str) -> Optional[dict]:
+        """Cancel a queued or running task. Returns its row (None if unknown)."""
+        with self._lock:
+            task = self.get(task_id)
+            if task is None or task["status"] in TERMINAL:
+                return task
+            if task["status"] == "queued":
+                self._set(task_id, status="cancelled", finished_at=time.time())
+                self._publish(task_id, _frame("cancelled", {"taskId": task_id, "message": "Cancelled"}))
+                return self.get(task_id)
+        if task_id in self._running:
+            # The worker records the cancellation once the handler unwinds
+            job, running = self._running[task_id]
+            job.cancelled = True
+            running.cancel()
+        return self.get(task_id)
+
+    # --- Progress ---
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _publish(self, task_id: str, frame: dict) -> None:
+        self._frames.setdefault(task_id, []).append(frame)
+        self._set(task_id, last_event=json.dumps(frame))
+        if self._changed is not None:
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    def _forget_finished(self) -> None:
+        finished = [tid for tid in self._frames if tid not in self._running]
+        for tid in finished[:max(0, len(finished) - FINISHED_HISTORY)]:
+            del self._frames[tid]
+
+    async def follow(self, task_id: str) -> AsyncIterator[dict]:
+        """SSE frames for a task: a ``task`` frame, then every frame it has
+        published so far and as they come, ending once it finishes.
+
+        While it waits its turn, ``queued`` frames report its position.
+        """
+        task = self.get(task_id)
+        if task is None:
+            return
+        yield _frame("task", {"taskId": task_id, "status": task["status"], "kind": task["kind"]})
+        sent = 0
+        position = None
+        while True:
+            changed = self._changed or asyncio.Event()
+            frames = self._frames.get(task_id, [])
+            for frame in frames[sent:]:
+                yield frame
+            sent = len(frames)
+            task = self.get(task_id)
+            if task is None:
+                return
+            if task["status"] in TERMINAL:
+                if sent == 0 and task["last_event"]:
+                    # Frames from before a restart are gone; the last one says how it ended
+                    yield task["last_event"]
+                return
+            if task["status"] == "queued" and self.position(task_id) != position:
+                position = self.position(task_id)
+                yield _frame("queued", {
+                    "taskId": task_id,
+                    "position": position,
+                    "message": f"Waiting for a worker ({position} ahead)" if position else "Waiting for a worker",
+                })
+            try:
+                await asyncio.wait_for(changed.wait(), POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Workers ---
+
+    async def _run(self, task: dict) -> None:
+        task_id = task["id"]
+        fn = _handlers.get(task["kind"])
+        if fn is None:
+            self._set(task_id, status="failed", finished_at=time.time(),
+                      error=f"No handler for task kind {task['kind']!r}")
+            return
+        job = Task(task_id, task["kind"], task["payload"], task["priority"],
+                   task["draft_id"], task["attempts"])
+        self._frames[task_id] = []  # a resumed task starts over
+        running = asyncio.create_task(fn(job, lambda frame: self._publish(task_id, frame)))
+        self._running[task_id] = (job, running)
+        try:
+            # wait() rather than await: cancelling the handler mustn't look
+            # like this worker being cancelled
+            await asyncio.wait({running})
+        except asyncio.CancelledError:
+            # Shutdown: stop the handler but leave the row running for recover()
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+            raise
+        finally:
+            self._running.pop(task_id, None)
+
+        if running.cancelled() or job.cancelled:
+            self._set(task_id, status="cancelled", finished_at=time.time())
+            self._publish(task_id, _frame("cancelled", {"taskId": task_id, "message": "Cancelled"}))
+        elif running.exception() is not None:
+            exc = running.exception()
+            self._set(task_id, status="failed", finished_at=time.time(), error=str(exc))
+            if isinstance(exc, TaskFailed):
+                logger.warning("Task %s (%s) failed: %s", task_id, task["kind"], exc)
+            else:
+                logger.error("Task %s (%s) failed: %s", task_id, task["kind"], exc, exc_info=exc)
+                self._publish(task_id, _frame("error", {"message": str(exc)}))
+        else:
+            self._set(task_id, status="done", finished_at=time.time())
+        self._forget_finished()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            self._wakeup.clear()
+            task = self._claim()
+            if task is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info("Task worker %d running %s %s (attempt %d)",
+                        index, task["kind"], task["id"], task["attempts"])
+            try:
+                await self._run(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Task worker %d failed on %s", index, task["id"])
+            finally:
+                if task["priority"] <= PRIORITY_BACKGROUND:
+                    self._background_running -= 1
+                    self._wake()  # a background slot is free
+            # Poke followers even if the handler never published
+            if self._changed is not None:
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+
+    def start(self) -> None:
+        """Spawn the workers. Must be called from a running event loop."""
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        for i in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        logger.info("Task queue started with %d workers", self.worker_count)
+
+    async def stop(self) -> None:
+        """Cancel the workers. Interrupted tasks are resumed by the next recover()."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE status IN (?, ?) GROUP BY status", ACTIVE
+            ).fetchall())
+        return {
+            "workers": len(self._workers),
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+        }
+
+
+# Global queue instance
+_queue: Optional[TaskQueue] = None
+
+
+def get_task_queue() -> Optional[TaskQueue]:
+    """Get the global task queue."""
+    return _queue
+
+
+def init_task_queue(db_path: Path, workers: int = 2) -> TaskQueue:
+    """Open the queue, re-queue interrupted tasks and start the workers."""
+    global _queue
+    _queue = TaskQueue(db_path, workers=workers)
+    resumed = _queue.recover()
+    if resumed:
+        logger.info("Resuming %d interrupted tasks", resumed)
+    _queue.start()
+    return _queue
+
+
+async def stop_task_queue() -> None:
+    """Stop the global task queue's workers."""
+    global _queue
+    if _queue:
+        await _queue.stop()
+        _queue.close()
+        _queue = None
@@ -1,11 +1,20 @@
 """Media transcoding - audio (FLAC to OGG) and video (to HLS)."""
 
 import asyncio
-import json
+import logging
 import shutil
+import time
+from contextlib import aclosing
+from functools import partial
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import Optional, Callable, Awaitable
+from typing import AsyncIterator, Optional, Callable, Awaitable
+
+from .analyze import probe
+from .transcode_cache import get_transcode_cache
+from .transcode_scheduler import TranscodeJob, get_transcode_scheduler
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -18,93 +27,306 @@ class TranscodeResult:
 
 
 async def probe_video(path: Path) -> Optional[dict]:
-    """Use ffprobe to get video file metadata."""
+    """ffprobe metadata for a video file (shared cache, see ``analyze.probe``)."""
     try:
-        proc = await asyncio.create_subprocess_exec(
-            "ffprobe", "-v", "quiet", "-print_format", "json",
-            "-show_format", "-show_streams", str(path),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, _ = await proc.communicate()
-        if proc.returncode != 0:
-            return None
-        return json.loads(stdout.decode())
+        return await probe(path)
     except Exception:
         return None
 
 
-async def transcode_flac_to_ogg(
-    input_path: Path,
-    output_path: Path,
-    quality: int = 6,
-    metadata: Optional[dict[str, str]] = None,
-    progress_callback: Optional[Callable[[str], Awaitable[None]]] = None
-) -> TranscodeResult:
+@dataclass
+class FfmpegProgress:
+    """One ``-progress`` report from a running ffmpeg."""
+    out_time: float  # seconds of output written so far
+    speed: Optional[float] = None  # × realtime
+    fps: Optional[float] = None
+    duration: Optional[float] = None  # expected output length, if known
+    done: bool = False
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.duration:
+            return None
+        return 100.0 if self.done else min(99.9, 100.0 * self.out_time / self.duration)
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if not self.duration or not self.speed:
+            return None
+        return max(0.0, (self.duration - self.out_time) / self.speed)
+
+    def describe(self) -> str:
+        """Short human summary, e.g. "41% · 2.3× · ~3m12s left"."""
+        parts = []
+        if self.percent is not None:
+            parts.append(f"{self.percent:.0f}%")
+        else:
+            parts.append(f"{self.out_time:.0f}s encoded")
+        if self.speed:
+            parts.append(f"{self.speed:.1f}×")
+        if self.eta_seconds is not None and not self.done:
+            minutes, seconds = divmod(int(self.eta_seconds), 60)
+            parts.append(f"~{minutes}m{seconds:02d}s left" if minutes else f"~{seconds}s left")
+        return " · ".join(parts)
+
+
+ProgressCallback = Callable[[FfmpegProgress], Awaitable[None]]
+
+
+class ProgressParser:
+    """Incremental parser for ffmpeg ``-progress`` output.
+
+    ffmpeg writes ``key=value`` lines, ending each report with
+    ``progress=continue`` (or ``progress=end``). ``feed`` returns a report
+    when one is complete.
     """
-    Transcode a FLAC file to OGG Vorbis.
 
-    Args:
-        input_path: Path to input FLAC file
-        output_path: Path for output OGG file
-        quality: OGG quality (0-10, default 6 ≈ 192kbps)
-        metadata: Optional dict of metadata tags to embed (KEY: VALUE)
-        progress_callback: Optional async callback for progress updates
+    def __init__(self, duration: Optional[float] = None):
+        self.duration = duration
+        self._fields: dict[str, str] = {}
 
-    Returns:
-        TranscodeResult with success status and output path
+    def feed(self, line: str) -> Optional[FfmpegProgress]:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        if key != "progress":
+            self._fields[key] = value.strip()
+            return None
+        fields, self._fields = self._fields, {}
+        return FfmpegProgress(
+            out_time=_parse_out_time(fields),
+            speed=_parse_float(fields.get("speed", "").rstrip("x")),
+            fps=_parse_float(fields.get("fps", "")),
+            duration=self.duration,
+            done=value.strip() == "end",
+        )
+
+
+def _parse_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None  # "N/A" until ffmpeg has a figure
+
+
+def _parse_out_time(fields: dict[str, str]) -> float:
+    # out_time_ms is microseconds too (long-standing ffmpeg quirk)
+    for key in ("out_time_us", "out_time_ms"):
+        micros = _parse_float(fields.get(key, ""))
+        if micros is not None and micros >= 0:
+            return micros / 1_000_000
+    hours, _, rest = fields.get("out_time", "").partition(":")
+    minutes, _, seconds = rest.partition(":")
+    try:
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return 0.0
+
+
+async def run_ffmpeg(
+    cmd: list[str],
+    on_progress: Optional[ProgressCallback] = None,
+    duration: Optional[float] = None,
+) -> tuple[int, bytes]:
+    """Run an ffmpeg command, returning (returncode, stderr).
+
+    With ``on_progress``, ffmpeg is run with ``-progress pipe:1`` and every
+    report is parsed and handed to the callback as it arrives; ``duration``
+    (expected output seconds) lets reports carry a percentage and ETA.
+
+    If the awaiting task is cancelled (e.g. the SSE client went away) the
+    process is killed rather than left running unattended.
     """
+    if on_progress:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE if on_progress else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    # Drain stderr alongside stdout so neither pipe fills and stalls ffmpeg
+    stderr_task = asyncio.create_task(process.stderr.read())
+    try:
+        if on_progress:
+            parser = ProgressParser(duration)
+            async for raw in process.stdout:
+                report = parser.feed(raw.decode(errors="replace"))
+                if report is None:
+                    continue
+                try:
+                    await on_progress(report)
+                except Exception:
+                    logger.exception("ffmpeg progress callback failed")
+        stderr = await stderr_task
+        await process.wait()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        stderr_task.cancel()
+        raise
+    return process.returncode, stderr
+
+
+class ProgressFeed:
+    """Relay progress from a background transcode into an async generator.
+
+    SSE generators can't yield while awaiting a transcode, so they run it
+    as a task with ``feed.put`` as its progress callback and iterate
+    ``feed.follow(task)``. Only the latest report is kept; one is yielded
+    whenever the whole percentage changes, or every ``heartbeat`` seconds
+    when there's no percentage, so an hour-long encode logs ~100 entries
+    rather than one per ffmpeg report. Closing the generator early cancels
+    the task.
+    """
+
+    def __init__(self, heartbeat: float = 15.0):
+        self.heartbeat = heartbeat
+        self._latest: Optional[FfmpegProgress] = None
+        self._changed = asyncio.Event()
+
+    async def put(self, report: FfmpegProgress) -> None:
+        self._latest = report
+        self._changed.set()
+
+    async def follow(self, task: asyncio.Task) -> AsyncIterator[FfmpegProgress]:
+        last_percent, last_at = None, 0.0
+        try:
+            while not task.done():
+                changed = asyncio.ensure_future(self._changed.wait())
+                await asyncio.wait({task, changed}, return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+                self._changed.clear()
+                report = self._latest
+                if report is None:
+                    continue
+                percent = int(report.percent) if report.percent is not None else None
+                now = time.monotonic()
+                if (percent is not None and percent != last_percent) or now - last_at >= self.heartbeat:
+                    last_percent, last_at = percent, now
+                    yield report
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+
+# Output options shared by the single- and multi-output encoders, so each
+# produces the same bytes either way. bitexact drops the random Ogg stream
+# serial and the ffmpeg version string: re-encoding the same source gives
+# the same file (and so the same CID).
+def _flac_output_args(output_path: Path) -> list[str]:
+    return [
+        "-c:a", "flac",
+        "-compression_level", "8",
+        "-fflags", "+bitexact", "-flags:a", "+bitexact",
+        str(output_path),
+    ]
+
+
+def _ogg_output_args(output_path: Path, quality: int, metadata: Optional[dict[str, str]]) -> list[str]:
+    args = [
+        "-c:a", "libvorbis",
+        "-q:a", str(quality),
+    ]
+    # -metadata applies to the next output file only
+    for key, value in (metadata or {}).items():
+        args.extend(["-metadata", f"{key}={value}"])
+    args.extend(["-fflags", "+bitexact", "-flags:a", "+bitexact", str(output_path)])
+    return args
+
+
+async def _encode(
+    input_path: Path,
+    outputs: list[Path],
+    output_args: list[str],
+    progress_callback: Optional[ProgressCallback] = None,
+    duration: Optional[float] = None,
+) -> TranscodeResult:
+    """One ffmpeg run decoding ``input_path`` into every file in ``outputs``."""
     if not input_path.exists():
         return TranscodeResult(success=False, error=f"Input file not found: {input_path}")
 
-    # Check for ffmpeg
     if not shutil.which("ffmpeg"):
         return TranscodeResult(success=False, error="ffmpeg not found")
 
-    # Ensure output directory exists
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    for path in outputs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        returncode, stderr = await run_ffmpeg(
+            ["ffmpeg", "-y", "-i", str(input_path), *output_args],
+            on_progress=progress_callback, duration=duration,
+        )
+    except Exception as e:
+        return TranscodeResult(success=False, error=str(e))
+    if returncode != 0:
+        return TranscodeResult(success=False, error=stderr.decode() if stderr else "Unknown ffmpeg error")
+    missing = [p.name for p in outputs if not p.exists()]
+    if missing:
+        return TranscodeResult(success=False, error=f"Output file not created: {', '.join(missing)}")
+    return TranscodeResult(success=True, output_path=outputs[0])
 
-    if progress_callback:
-        await progress_callback(f"Transcoding {input_path.name}")
 
-    try:
-        # Build ffmpeg command
-        cmd = [
-            "ffmpeg",
-            "-i", str(input_path),
-            "-c:a", "libvorbis",
-            "-q:a", str(quality),
-        ]
+async def encode_flac(input_path: Path, output_path: Path) -> TranscodeResult:
+    """Encode any ffmpeg-readable audio file (typically WAV) to FLAC."""
+    return await _encode(input_path, [output_path], _flac_output_args(output_path))
 
-        # Add metadata tags
-        if metadata:
-            for key, value in metadata.items():
-                cmd.extend(["-metadata", f"{key}={value}"])
 
-        cmd.extend([
-            "-y",  # Overwrite output
-            str(output_path)
-        ])
+async def transcode_wav_to_flac_and_ogg(
+    input_path: Path,
+    flac_path: Path,
+    ogg_path: Path,
+    quality: int = 6,
+    metadata: Optional[dict[str, str]] = None,
+) -> TranscodeResult:
+    """
+    Encode a WAV to FLAC (archive) and OGG Vorbis (streaming) in one pass.
 
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+    A single ffmpeg run with two outputs: the WAV is read and decoded once
+    instead of once per format. Output bytes are identical to
+    encode_flac() + transcode_flac_to_ogg() on the same input.
 
-        stdout, stderr = await process.communicate()
+    Args:
+        input_path: Path to input WAV (or any ffmpeg-readable audio)
+        flac_path: Path for the FLAC output (no extra tags)
+        ogg_path: Path for the OGG output
+        quality: OGG quality (0-10, default 6 ≈ 192kbps)
+        metadata: Optional tags for the OGG output (KEY: VALUE)
 
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "Unknown ffmpeg error"
-            return TranscodeResult(success=False, error=error_msg)
+    Returns:
+        TranscodeResult; output_path is the FLAC path
+    """
+    return await _encode(
+        input_path, [flac_path, ogg_path],
+        _flac_output_args(flac_path) + _ogg_output_args(ogg_path, quality, metadata),
+    )
 
-        if not output_path.exists():
-            return TranscodeResult(success=False, error="Output file not created")
 
-        return TranscodeResult(success=True, output_path=output_path)
+async def transcode_flac_to_ogg(
+    input_path: Path,
+    output_path: Path,
+    quality: int = 6,
+    metadata: Optional[dict[str, str]] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+    duration: Optional[float] = None,
+) -> TranscodeResult:
+    """
+    Transcode a FLAC file to OGG Vorbis.
 
-    except Exception as e:
-        return TranscodeResult(success=False, error=str(e))
+    Args:
+        input_path: Path to input FLAC file
+        output_path: Path for output OGG file
+        quality: OGG quality (0-10, default 6 ≈ 192kbps)
+        metadata: Optional dict of metadata tags to embed (KEY: VALUE)
+        progress_callback: Optional async callback, called with each
+            ffmpeg progress report while encoding
+        duration: Input length in seconds, for percentages/ETA in reports
+
+    Returns:
+        TranscodeResult with success status and output path
+    """
+    return await _encode(input_path, [output_path], _ogg_output_args(output_path, quality, metadata),
+                         progress_callback=progress_callback, duration=duration)
 
 
 async def transcode_album_directory(
@@ -135,30 +357,219 @@ async def transcode_album_directory(
     outputs = []
     errors = []
 
-    for i, flac_path in enumerate(flac_files):
-        ogg_name = flac_path.stem + ".ogg"
-        ogg_path = output_dir / ogg_name
+    # Tracks run concurrently (up to the scheduler's slot count) and are
+    # reported as they finish, not in track order
+    jobs = [
+        TranscodeJob(flac_path.name, partial(transcode_flac_to_ogg, flac_path, output_dir / f"{flac_path.stem}.ogg"))
+        for flac_path in flac_files
+    ]
+    async with aclosing(get_transcode_scheduler().as_completed(jobs)) as results:
+        done = 0
+        async for job, result in results:
+            done += 1
+            if progress_callback:
+                await progress_callback(f"Transcoded {done}/{len(flac_files)}: {job.name}")
+            if isinstance(result, Exception):
+                errors.append(f"{job.name}: {result}")
+            elif result.success and result.output_path:
+                outputs.append(result.output_path)
+            else:
+                errors.append(f"{job.name}: {result.error}")
+    outputs.sort()
 
-        if progress_callback:
-            await progress_callback(f"Transcoding {i+1}/{len(flac_files)}: {flac_path.name}")
+    success = len(outputs) > 0 and len(errors) == 0
+    return (success, outputs, errors)
 
-        result = await transcode_flac_to_ogg(flac_path, ogg_path)
 
-        if result.success and result.output_path:
-            outputs.append(result.output_path)
-        else:
-            errors.append(f"{flac_path.name}: {result.error}")
+# Same default ladder Coconut gets (services/coconut.submit_to_coconut)
+DEFAULT_HLS_QUALITIES = [720, 480]
+
+HLS_SEGMENT_SECONDS = 6
+
+# Recorded in transcode_info and part of the transcode cache key: change
+# these alongside the ffmpeg args below
+HLS_FFMPEG_SETTINGS = {
+    "video_codec": "libx264",
+    "preset": "medium",
+    "crf": 23,
+    "pix_fmt": "yuv420p",
+    "audio_codec": "aac",
+    "audio_bitrate": "128k",
+    "hls_segment_duration": HLS_SEGMENT_SECONDS,
+}
+
+
+def _h264_maxrate_kbps(height: int) -> int:
+    """Peak bitrate cap per rendition; CRF picks the rate below it."""
+    if height >= 2160:
+        return 16000
+    if height >= 1440:
+        return 9000
+    if height >= 1080:
+        return 6000
+    if height >= 720:
+        return 3000
+    if height >= 480:
+        return 1500
+    return 800
+
+
+def ladder_heights(qualities: list[int], source_height: Optional[int]) -> list[int]:
+    """Rendition heights to encode, tallest first, never upscaling the source.
+
+    If every requested height is above the source, the ladder is a single
+    rendition at the source height.
+    """
+    heights = sorted({q for q in qualities if q > 0}, reverse=True)
+    if source_height:
+        fits = [h for h in heights if h <= source_height]
+        heights = fits or [source_height - source_height % 2]
+    return heights
 
-    success = len(outputs) > 0 and len(errors) == 0
-    return (success, outputs, errors)
+
+def _hls_ladder_args(output_dir: Path, heights: list[int], has_audio: bool) -> list[str]:
+    """ffmpeg output args for an ABR ladder from one decode.
+
+    The decoded video is ``split`` once and scaled per rendition. Layout
+    matches Coconut's: ``master.m3u8`` at the top, ``<h>p/playlist.m3u8``
+    and its segments per rendition. Keyframes are forced every segment
+    length (and scene-cut keyframes disabled) so segment boundaries line
+    up across renditions and players can switch cleanly.
+    """
+    n = len(heights)
+    graph = [f"[0:v]split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    graph += [f"[s{i}]scale=-2:{h}[v{i}]" for i, h in enumerate(heights)]
+    args = ["-filter_complex", ";".join(graph)]
+    stream_map = []
+    for i, h in enumerate(heights):
+        args += ["-map", f"[v{i}]"]
+        if has_audio:
+            args += ["-map", "0:a:0"]
+        maxrate = _h264_maxrate_kbps(h)
+        args += [f"-maxrate:v:{i}", f"{maxrate}k", f"-bufsize:v:{i}", f"{maxrate * 2}k"]
+        stream_map.append(f"v:{i},a:{i},name:{h}p" if has_audio else f"v:{i},name:{h}p")
+    for h in heights:
+        (output_dir / f"{h}p").mkdir(parents=True, exist_ok=True)
+    args += [
+        # Video: H.264 for broad compatibility
+        "-c:v", "libx264",
+        "-preset", "medium",
+        "-crf", "23",
+        "-pix_fmt", "yuv420p",  # Force 8-bit — 10-bit breaks Firefox
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-sc_threshold", "0",
+        # Audio: AAC
+        "-c:a", "aac",
+        "-b:a", "128k",
+        # HLS output
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_list_size", "0",  # Keep all segments in playlist
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        "-hls_segment_filename", str(output_dir / "%v" / "segment_%03d.ts"),
+        # %v in the directory puts master.m3u8 one level up, in output_dir
+        str(output_dir / "%v" / "playlist.m3u8"),
+    ]
+    return args
+
+
+def _hls_single_args(output_dir: Path) -> list[str]:
+    """ffmpeg output args for a single rendition (master.m3u8 is the media playlist)."""
+    return [
+        # Video: H.264 for broad compatibility
+        "-c:v", "libx264",
+        "-preset", "medium",
+        "-crf", "23",
+        "-pix_fmt", "yuv420p",  # Force 8-bit — 10-bit breaks Firefox
+        # Audio: AAC
+        "-c:a", "aac",
+        "-b:a", "128k",
+        # HLS output
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_list_size", "0",  # Keep all segments in playlist
+        "-hls_segment_filename", str(output_dir / "segment_%03d.ts"),
+        str(output_dir / "master.m3u8"),
+    ]
+
+
+def _stream_info(probe: Optional[dict]) -> dict:
+    """Codec details of the first video and audio streams in an ffprobe result."""
+    streams = {}
+    for stream in (probe or {}).get("streams", []):
+        if stream["codec_type"] == "video" and "video" not in streams:
+            streams["video"] = {
+                "codec": stream.get("codec_name"),
+                "profile": stream.get("profile"),
+                "pix_fmt": stream.get("pix_fmt"),
+                "width": stream.get("width"),
+                "height": stream.get("height"),
+            }
+        elif stream["codec_type"] == "audio" and "audio" not in streams:
+            streams["audio"] = {
+                "codec": stream.get("codec_name"),
+                "sample_rate": stream.get("sample_rate"),
+                "channels": stream.get("channels"),
+            }
+    return streams
+
+
+def source_info_from_probe(source_probe: Optional[dict]) -> dict:
+    """``transcode_info["source"]`` from an ffprobe result."""
+    if not source_probe:
+        return {}
+    fmt = source_probe.get("format", {})
+    streams = _stream_info(source_probe)
+    video = streams.get("video", {})
+    audio = streams.get("audio")
+    info = {
+        "duration_seconds": float(fmt.get("duration", 0)),
+        "size_bytes": int(fmt.get("size", 0)),
+        "format": fmt.get("format_long_name"),
+        "video_codec": video.get("codec"),
+        "pix_fmt": video.get("pix_fmt"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+    }
+    if audio:
+        info["audio_codec"] = audio["codec"]
+    return info
+
+
+def _output_info(source_info: dict, heights: list[int], has_audio: bool) -> dict:
+    """Output stream details, as fixed by ``HLS_FFMPEG_SETTINGS``.
+
+    The encoder settings pin codec and pixel format, and ``scale=-2:h``
+    keeps the source aspect at an even width, so there's no need to
+    probe a segment to learn them.
+    """
+    width, height = source_info.get("width"), source_info.get("height")
+    if heights and width and height:
+        width = round(width * heights[0] / height / 2) * 2
+    if heights:
+        height = heights[0]
+    return {
+        "output_codec": "h264",
+        "output_pix_fmt": HLS_FFMPEG_SETTINGS["pix_fmt"],
+        "output_width": width,
+        "output_height": height,
+        "output_audio_codec": HLS_FFMPEG_SETTINGS["audio_codec"] if has_audio else None,
+    }
 
 
 async def transcode_video_to_hls(
     input_path: Path,
     output_dir: Path,
-    progress_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+    progress_callback: Optional[ProgressCallback] = None,
     trim_start: Optional[float] = None,
     trim_end: Optional[float] = None,
+    duration: Optional[float] = None,
+    qualities: Optional[list[int]] = None,
+    source_info: Optional[dict] = None,
+    source_sha256: Optional[str] = None,
 ) -> TranscodeResult:
     """
     Transcode a video file to HLS (HTTP Live Streaming) format.
@@ -169,7 +580,20 @@ async def transcode_video_to_hls(
     Args:
         input_path: Path to input video file
         output_dir: Directory to write HLS output (master.m3u8 + segments)
-        progress_callback: Optional async callback for progress updates
+        progress_callback: Optional async callback, called with each
+            ffmpeg progress report while encoding
+        duration: Source length in seconds (from upload analysis). Used,
+            after trimming, for percentages/ETA; probed if not given.
+        qualities: Output heights for an adaptive ladder, e.g. [1080, 720,
+            480] — one decode, one rendition per height (never above the
+            source), in Coconut's layout. None/empty: a single rendition
+            with master.m3u8 as its media playlist.
+        source_info: The source's details from upload analysis (keys as in
+            ``transcode_info["source"]``). Given, the source isn't probed
+            again.
+        source_sha256: SHA-256 of the source taken at upload (ContentFile.sha256).
+            Given, the transcode cache keys on it instead of re-reading the
+            whole source before ffmpeg starts.
 
     Returns:
         TranscodeResult with success status and output directory path
@@ -182,16 +606,41 @@ async def transcode_video_to_hls(
 
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    if progress_callback:
-        await progress_callback(f"Transcoding {input_path.name} to HLS")
-
     try:
-        # Build ffmpeg HLS command
-        # - Multiple quality renditions for adaptive streaming
-        # - 6-second segments
-        # - master playlist
+        if source_info is None:
+            source_info = source_info_from_probe(await probe_video(input_path))
+        else:
+            source_info = {k: v for k, v in source_info.items() if v is not None}
+
+        output_duration = None
+        duration = duration or source_info.get("duration_seconds")
+        if duration:
+            output_duration = (trim_end if trim_end is not None else duration) - (trim_start or 0)
+
+        heights = ladder_heights(qualities, source_info.get("height")) if qualities else []
         master_playlist = output_dir / "master.m3u8"
 
+        # Same source bytes + same output-shaping inputs → same HLS tree
+        cache = get_transcode_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = await asyncio.to_thread(
+                cache.key_for, input_path, source_sha256,
+                trim_start=trim_start, trim_end=trim_end, heights=heights,
+                ffmpeg_settings=HLS_FFMPEG_SETTINGS,
+            )
+            cached_info = await asyncio.to_thread(cache.restore, cache_key, output_dir)
+            if cached_info is not None:
+                logger.info("Transcode cache hit for %s (%s)", input_path.name, cache_key)
+                return TranscodeResult(
+                    success=True,
+                    output_path=output_dir,
+                    transcode_info={**cached_info, "cache": "hit"},
+                )
+
+        # Without source details, assume there's audio (nearly always true)
+        has_audio = "audio_codec" in source_info or "video_codec" not in source_info
+
         cmd = [
             "ffmpeg", "-y",
         ]
@@ -207,100 +656,44 @@ async def transcode_video_to_hls(
                 cmd.extend(["-to", str(trim_end - trim_start)])
             else:
                 cmd.extend(["-to", str(trim_end)])
-        cmd.extend([
-            # Video: H.264 for broad compatibility
-            "-c:v", "libx264",
-            "-preset", "medium",
-            "-crf", "23",
-            "-pix_fmt", "yuv420p",  # Force 8-bit — 10-bit breaks Firefox
-            # Audio: AAC
-            "-c:a", "aac",
-            "-b:a", "128k",
-            # HLS output
-            "-f", "hls",
-            "-hls_time", "6",
-            "-hls_list_size", "0",  # Keep all segments in playlist
-            "-hls_segment_filename", str(output_dir / "segment_%03d.ts"),
-            str(master_playlist),
-        ])
-
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        if heights:
+            cmd.extend(_hls_ladder_args(output_dir, heights, has_audio))
+        else:
+            cmd.extend(_hls_single_args(output_dir))
 
-        _, stderr = await process.communicate()
+        returncode, stderr = await run_ffmpeg(cmd, on_progress=progress_callback, duration=output_duration)
 
-        if process.returncode != 0:
+        if returncode != 0:
             error_msg = stderr.decode() if stderr else "Unknown ffmpeg error"
             return TranscodeResult(success=False, error=error_msg)
 
         if not master_playlist.exists():
             return TranscodeResult(success=False, error="master.m3u8 not created")
 
-        # Gather transcode metadata
-        segments = sorted(output_dir.glob("segment_*.ts"))
-        segment_sizes = {s.name: s.stat().st_size for s in segments}
-        total_output_size = sum(segment_sizes.values())
-
-        # Probe the first segment for output codec details
-        output_probe = await probe_video(segments[0]) if segments else None
-        output_streams = {}
-        if output_probe:
-            for stream in output_probe.get("streams", []):
-                if stream["codec_type"] == "video":
-                    output_streams["video"] = {
-                        "codec": stream.get("codec_name"),
-                        "profile": stream.get("profile"),
-                        "pix_fmt": stream.get("pix_fmt"),
-                        "width": stream.get("width"),
-                        "height": stream.get("height"),
-                    }
-                elif stream["codec_type"] == "audio":
-                    output_streams["audio"] = {
-                        "codec": stream.get("codec_name"),
-                        "sample_rate": stream.get("sample_rate"),
-                        "channels": stream.get("channels"),
-                    }
-
-        # Probe the source for input details
-        source_probe = await probe_video(input_path)
-        source_info = {}
-        if source_probe:
-            fmt = source_probe.get("format", {})
-            source_info["duration_seconds"] = float(fmt.get("duration", 0))
-            source_info["size_bytes"] = int(fmt.get("size", 0))
-            source_info["format"] = fmt.get("format_long_name")
-            for stream in source_probe.get("streams", []):
-                if stream["codec_type"] == "video":
-                    source_info["video_codec"] = stream.get("codec_name")
-                    source_info["pix_fmt"] = stream.get("pix_fmt")
-                    source_info["width"] = stream.get("width")
-                    source_info["height"] = stream.get("height")
-                elif stream["codec_type"] == "audio":
-                    source_info["audio_codec"] = stream.get("codec_name")
+        # Gather transcode metadata (per rendition for a ladder, like Coconut's)
+        variants = {}
+        for h in heights:
+            variant_segments = list((output_dir / f"{h}p").glob("segment_*.ts"))
+            variants[f"{h}p"] = {
+                "size_bytes": sum(seg.stat().st_size for seg in variant_segments),
+                "segment_count": len(variant_segments),
+            }
+        segments = sorted(output_dir.rglob("segment_*.ts"))
+        total_output_size = sum(seg.stat().st_size for seg in segments)
 
         transcode_info = {
             "method": "local-ffmpeg",
-            "output_codec": output_streams.get("video", {}).get("codec"),
-            "output_pix_fmt": output_streams.get("video", {}).get("pix_fmt"),
-            "output_width": output_streams.get("video", {}).get("width"),
-            "output_height": output_streams.get("video", {}).get("height"),
-            "output_audio_codec": output_streams.get("audio", {}).get("codec"),
+            **_output_info(source_info, heights, has_audio),
             "segment_count": len(segments),
             "total_output_size_bytes": total_output_size,
             "source": source_info,
-            "ffmpeg_settings": {
-                "video_codec": "libx264",
-                "preset": "medium",
-                "crf": 23,
-                "pix_fmt": "yuv420p",
-                "audio_codec": "aac",
-                "audio_bitrate": "128k",
-                "hls_segment_duration": 6,
-            },
+            "ffmpeg_settings": dict(HLS_FFMPEG_SETTINGS),
         }
+        if heights:
+            transcode_info["qualities"] = [f"{h}p" for h in heights]
+            transcode_info["variants"] = variants
+        if cache_key is not None:
+            await asyncio.to_thread(cache.store, cache_key, output_dir, transcode_info)
 
         return TranscodeResult(
             success=True,
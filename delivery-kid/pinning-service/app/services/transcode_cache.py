@@ -0,0 +1,202 @@
+"""Content-addressed cache of local HLS transcodes.
+
+Re-finalizing a draft after a failed pin, or re-trimming the same source,
+used to re-run the whole ffmpeg encode. Entries here are keyed by a hash
+of the source bytes plus everything that shapes the output — trim range,
+rendition heights and the encoder settings recorded in ``transcode_info``
+— so an identical request is answered by linking the cached files into
+place (``fsutil.place_file``) instead of encoding.
+
+Layout: ``staging/.transcode-cache/<key>/`` holds the HLS tree plus
+``entry.json`` (the original ``transcode_info`` and the entry's size).
+Entries are written to a temp dir and renamed into place, so a reader
+never sees half an entry. The directory's mtime is bumped on every hit
+and the least recently used entries are evicted (via the trash) once the
+cache exceeds its size cap.
+
+Cached files may be hardlinks shared with finalize output: neither side
+modifies them in place, and deleting one side leaves the other intact.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from . import trash
+from .fsutil import place_file, tree_stats
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = ".transcode-cache"
+ENTRY_FILE = "entry.json"
+CACHE_VERSION = 1  # bump when the output layout changes
+HASH_CHUNK = 4 * 1024 * 1024
+SOURCE_HASH_MEMO = 256
+
+
+def _copy_tree(src: Path, dst: Path) -> None:
+    """Recreate ``src`` under ``dst`` with place_file (links where possible)."""
+    for root, dirs, files in os.walk(src):
+        target = dst / Path(root).relative_to(src)
+        target.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            place_file(Path(root) / name, target / name)
+
+
+class TranscodeCache:
+    """Size-capped LRU of HLS output directories under one staging dir."""
+
+    def __init__(self, staging_dir: Path, max_bytes: int):
+        self.cache_dir = staging_dir / CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (path, size, mtime_ns, ino) -> sha256; hashing 40 GB once is plenty
+        self._hashes: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def source_hash(self, path: Path) -> str:
+        """SHA-256 of the file's bytes, memoised while the file is unchanged."""
+        st = path.stat()
+        ident = (str(path), st.st_size, st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            if ident in self._hashes:
+                self._hashes.move_to_end(ident)
+                return self._hashes[ident]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self._hashes[ident] = value
+            while len(self._hashes) > SOURCE_HASH_MEMO:
+                self._hashes.popitem(last=False)
+        return value
+
+    def key_for(self, source: Path, source_sha256: Optional[str] = None, **params) -> str:
+        """Cache key for transcoding ``source`` with the given output-shaping params.
+
+        ``source_sha256`` is the hash taken while the upload was saved; only
+        without it is the source read back and hashed here.
+        """
+        material = {"v": CACHE_VERSION, "source": source_sha256 or self.source_hash(source), **params}
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()[:32]
+
+    def restore(self, key: str, output_dir: Path) -> Optional[dict]:
+        """Place a cached entry's files into ``output_dir``.
+
+        Returns the cached ``transcode_info``, or None on a miss.
+        """
+        entry = self.cache_dir / key
+        try:
+            meta = json.loads((entry / ENTRY_FILE).read_text())
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        try:
+            for child in entry.iterdir():
+                if child.name == ENTRY_FILE:
+                    continue
+                if child.is_dir():
+                    _copy_tree(child, output_dir / child.name)
+                else:
+                    output_dir.mkdir(parents=True, exist_ok=True)
+                    place_file(child, output_dir / child.name)
+        except FileNotFoundError:
+            # Evicted while we were copying — treat as a miss
+            self.misses += 1
+            return None
+        os.utime(entry)
+        self.hits += 1
+        return meta["transcode_info"]
+
+    def store(self, key: str, output_dir: Path, transcode_info: dict) -> None:
+        """Add ``output_dir`` (a finished transcode) to the cache, then evict."""
+        if (self.cache_dir / key).exists():
+            return
+        tmp = self.cache_dir / f".tmp-{key}-{uuid.uuid4().hex[:8]}"
+        try:
+            _copy_tree(output_dir, tmp)
+            size = tree_stats(tmp)[1]
+            (tmp / ENTRY_FILE).write_text(json.dumps({
+                "transcode_info": transcode_info,
+                "size_bytes": size,
+                "created_at": time.time(),
+            }))
+            os.rename(tmp, self.cache_dir / key)
+        except OSError as e:
+            logger.warning("Transcode cache store for %s failed: %s", key, e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        """(last used, size, key) per entry, least recently used first."""
+        rows = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                names = [e.name for e in it if e.is_dir() and not e.name.startswith(".")]
+        except FileNotFoundError:
+            return []
+        for name in names:
+            entry = self.cache_dir / name
+            try:
+                meta = json.loads((entry / ENTRY_FILE).read_text())
+                rows.append((entry.stat().st_mtime, int(meta.get("size_bytes", 0)), name))
+            except (OSError, ValueError):
+                continue
+        rows.sort()
+        return rows
+
+    def evict(self) -> int:
+        """Drop least recently used entries until under the size cap."""
+        rows = self.entries()
+        total = sum(size for _, size, _ in rows)
+        evicted = 0
+        for _, size, name in rows:
+            if total <= self.max_bytes:
+                break
+            trash.discard(self.cache_dir / name)
+            total -= size
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            logger.info("Transcode cache evicted %d entries (%.2f GB left)", evicted, total / 1024**3)
+        return evicted
+
+    def stats(self) -> dict:
+        rows = self.entries()
+        return {
+            "entries": len(rows),
+            "size_bytes": sum(size for _, size, _ in rows),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Global cache instance
+_cache: Optional[TranscodeCache] = None
+
+
+def get_transcode_cache() -> Optional[TranscodeCache]:
+    """Get the global transcode cache (None when disabled)."""
+    return _cache
+
+
+def init_transcode_cache(staging_dir: Path, max_gb: float) -> Optional[TranscodeCache]:
+    """Create the global cache. ``max_gb=0`` disables caching."""
+    global _cache
+    _cache = TranscodeCache(staging_dir, int(max_gb * 1024**3)) if max_gb > 0 else None
+    return _cache
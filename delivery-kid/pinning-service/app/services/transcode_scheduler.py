@@ -0,0 +1,116 @@
+"""Process-wide limit on concurrent local ffmpeg jobs.
+
+Album finalize used to encode one track at a time, leaving all but one
+core idle for the length of the album. Jobs submitted here run
+concurrently up to ``slots`` (default: the machine's core count). The
+limit is shared by every request in the process, so two albums finalizing
+at once share the cores rather than each spawning a full set of encoders.
+
+``as_completed`` yields results in the order jobs finish, so callers can
+stream per-track progress. Closing it early (``contextlib.aclosing``, or
+the SSE client disconnecting) cancels the jobs that haven't finished.
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TranscodeJob:
+    """One unit of work: a label for progress events and the coroutine to run."""
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    kind: str = ""  # free-form tag for the caller, e.g. "flac" / "ogg"
+
+
+class TranscodeScheduler:
+    """Bounded concurrency for ffmpeg jobs."""
+
+    def __init__(self, slots: int = 0):
+        self.slots = slots if slots > 0 else (os.cpu_count() or 1)
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one loop; tests and scripts may run
+        # several in turn
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem = asyncio.Semaphore(self.slots)
+            self._loop = loop
+        return self._sem
+
+    async def submit(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn()`` once a slot is free."""
+        sem = self._semaphore()
+        self.waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await fn()
+        finally:
+            self.running -= 1
+            self.completed += 1
+            sem.release()
+
+    async def as_completed(self, jobs: Iterable[TranscodeJob]) -> AsyncIterator[tuple[TranscodeJob, Any]]:
+        """Run ``jobs`` and yield ``(job, result)`` pairs as each one finishes.
+
+        A job that raises yields the exception as its result rather than
+        aborting the batch.
+        """
+        tasks = {asyncio.create_task(self.submit(job.run)): job for job in jobs}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Several can finish in one wakeup; report them in submission order
+                for task in sorted(done, key=list(tasks).index):
+                    job = tasks[task]
+                    exc = task.exception()
+                    if exc is not None:
+                        logger.warning("Transcode job %s failed: %s", job.name, exc)
+                    yield job, exc if exc is not None else task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def status(self) -> dict:
+        return {
+            "slots": self.slots,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+        }
+
+
+# Global scheduler instance
+_scheduler: Optional[TranscodeScheduler] = None
+
+
+def get_transcode_scheduler() -> TranscodeScheduler:
+    """Get the global scheduler, creating a default (one slot per core) if needed."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TranscodeScheduler()
+    return _scheduler
+
+
+def init_transcode_scheduler(slots: int = 0) -> TranscodeScheduler:
+    """Initialize the global scheduler. ``slots=0`` means one per core."""
+    global _scheduler
+    _scheduler = TranscodeScheduler(slots)
+    logger.info("Transcode scheduler: %d concurrent ffmpeg jobs", _scheduler.slots)
+    return _scheduler
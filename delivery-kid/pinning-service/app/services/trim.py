@@ -0,0 +1,302 @@
+"""Trim engine: cut a video without re-encoding it.
+
+A trim used to force a full Coconut or local re-encode, even when the
+preview HLS for the draft was already pinned or the source was already
+H.264. Two fast paths, each finishing in seconds:
+
+- ``plan_playlist_trim``: for a draft whose preview HLS is ready, rewrite
+  its playlists to list only the segments inside the trim window. The
+  new directory links the existing segments by CID
+  (``ipfs.add_linked_directory``), so nothing is downloaded or encoded.
+  The cut snaps outwards to segment boundaries (6 s).
+- ``stream_copy_trim``: for a browser-friendly source (8-bit H.264, AAC or
+  MP3 audio), ``-c copy`` it into HLS from the last keyframe at or before
+  the trim start. The start snaps back to that keyframe.
+
+Both report the requested and actual window under ``trim`` in
+``transcode_info``.
+"""
+
+import asyncio
+import logging
+import posixpath
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from . import ipfs, transcode
+from .transcode import HLS_SEGMENT_SECONDS, ProgressCallback, TranscodeResult
+
+logger = logging.getLogger(__name__)
+
+STREAM_COPY_VIDEO_CODECS = {"h264"}
+STREAM_COPY_PIX_FMTS = {"yuv420p", "yuvj420p"}  # 10-bit breaks Firefox
+STREAM_COPY_AUDIO_CODECS = {None, "aac", "mp3"}
+KEYFRAME_SEARCH_SECONDS = 30.0
+
+
+def can_stream_copy(source_info: dict) -> bool:
+    """Whether the source can go into HLS as-is (see ``source_info_from_probe``)."""
+    return (
+        source_info.get("video_codec") in STREAM_COPY_VIDEO_CODECS
+        and source_info.get("pix_fmt") in STREAM_COPY_PIX_FMTS
+        and source_info.get("audio_codec") in STREAM_COPY_AUDIO_CODECS
+    )
+
+
+async def keyframe_before(path: Path, t: float) -> float:
+    """Timestamp of the last video keyframe at or before ``t`` (0.0 if none).
+
+    Reads packet flags only (no decoding), from ``KEYFRAME_SEARCH_SECONDS``
+    before ``t`` — or from the start, for sources with very long GOPs.
+    """
+    window_start = max(0.0, t - KEYFRAME_SEARCH_SECONDS)
+    while True:
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-read_intervals", f"{window_start}%{t + 0.001}",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0",
+            str(path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"Keyframe scan failed: {stderr.decode()[:200]}")
+        keyframes = []
+        for line in stdout.decode().splitlines():
+            pts, _, flags = line.partition(",")
+            if "K" in flags and pts not in ("", "N/A") and float(pts) <= t + 0.001:
+                keyframes.append(float(pts))
+        if keyframes:
+            return max(keyframes)
+        if window_start == 0.0:
+            return 0.0
+        window_start = 0.0
+
+
+async def stream_copy_trim(
+    input_path: Path,
+    output_dir: Path,
+    trim_start: Optional[float] = None,
+    trim_end: Optional[float] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> TranscodeResult:
+    """Cut ``input_path`` into single-rendition HLS without re-encoding.
+
+    Same layout as ``transcode_video_to_hls`` without a ladder
+    (master.m3u8 is the media playlist). Fails, without running ffmpeg, if
+    the source can't be stream-copied.
+    """
+    if not shutil.which("ffmpeg"):
+        return TranscodeResult(success=False, error="ffmpeg not found")
+
+    probe = await transcode.probe_video(input_path)
+    source_info = transcode.source_info_from_probe(probe)
+    if not can_stream_copy(source_info):
+        return TranscodeResult(success=False, error=(
+            f"Source can't be stream-copied ({source_info.get('video_codec')}/"
+            f"{source_info.get('pix_fmt')}/{source_info.get('audio_codec')})"
+        ))
+
+    try:
+        start = None
+        if trim_start:
+            # Packet timestamps count from the container's start time
+            offset = float(probe.get("format", {}).get("start_time") or 0)
+            start = await keyframe_before(input_path, offset + trim_start) - offset
+            logger.info("Stream-copy trim of %s from keyframe at %.3fs (asked for %.3fs)",
+                        input_path.name, start, trim_start)
+        length = trim_end - (start or 0) if trim_end is not None else None
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        cmd = ["ffmpeg", "-y"]
+        if start:
+            cmd.extend(["-ss", str(start)])
+        cmd.extend(["-i", str(input_path)])
+        if length is not None:
+            cmd.extend(["-t", str(length)])
+        cmd.extend([
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c", "copy",
+            "-f", "hls",
+            "-hls_time", str(HLS_SEGMENT_SECONDS),
+            "-hls_list_size", "0",
+            "-hls_playlist_type", "vod",
+            "-hls_segment_filename", str(output_dir / "segment_%03d.ts"),
+            str(output_dir / "master.m3u8"),
+        ])
+        if length is None and source_info.get("duration_seconds"):
+            length = source_info["duration_seconds"] - (start or 0)
+
+        returncode, stderr = await transcode.run_ffmpeg(cmd, on_progress=progress_callback, duration=length)
+        if returncode != 0:
+            return TranscodeResult(success=False, error=stderr.decode() if stderr else "Unknown ffmpeg error")
+        if not (output_dir / "master.m3u8").exists():
+            return TranscodeResult(success=False, error="master.m3u8 not created")
+
+        segments = sorted(output_dir.glob("segment_*.ts"))
+        return TranscodeResult(success=True, output_path=output_dir, transcode_info={
+            "method": "stream-copy",
+            "output_codec": source_info.get("video_codec"),
+            "output_pix_fmt": source_info.get("pix_fmt"),
+            "output_width": source_info.get("width"),
+            "output_height": source_info.get("height"),
+            "output_audio_codec": source_info.get("audio_codec"),
+            "segment_count": len(segments),
+            "total_output_size_bytes": sum(seg.stat().st_size for seg in segments),
+            "source": source_info,
+            "trim": {
+                "requested_start": trim_start,
+                "requested_end": trim_end,
+                "start": start or 0.0,
+                "end": trim_end,
+            },
+        })
+
+    except Exception as e:
+        return TranscodeResult(success=False, error=str(e))
+
+
+@dataclass
+class PlaylistTrim:
+    """A media playlist cut down to the segments inside a trim window."""
+    text: str
+    uris: list[str] = field(default_factory=list)  # segments and init maps it references
+    start: float = 0.0  # source time the kept segments start at...
+    end: float = 0.0  # ...and end at
+    segment_count: int = 0
+
+
+def _tag_uri(line: str) -> Optional[str]:
+    """The ``URI="..."`` attribute of a tag line, if it has one."""
+    marker = 'URI="'
+    if marker not in line:
+        return None
+    rest = line.split(marker, 1)[1]
+    return rest.split('"', 1)[0]
+
+
+def trim_media_playlist(text: str, trim_start: Optional[float], trim_end: Optional[float]) -> PlaylistTrim:
+    """Keep the segments of a VOD media playlist that overlap the trim window.
+
+    Raises ValueError if no segment does.
+    """
+    start, end = trim_start or 0.0, trim_end if trim_end is not None else float("inf")
+    header: list[str] = []
+    sequence = 0
+    segments: list[tuple[float, float, list[str]]] = []  # (start, end, lines)
+    pending: list[str] = []
+    duration = None
+    t = 0.0
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line == "#EXT-X-ENDLIST":
+            continue
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            pending.append(line)
+        elif not segments and not pending and (line.startswith("#EXTM3U") or line.startswith("#EXT-X-")):
+            header.append(line)
+        elif line.startswith("#"):
+            pending.append(line)
+        else:
+            if duration is None:
+                raise ValueError(f"Segment {line} has no #EXTINF")
+            segments.append((t, t + duration, pending + [line]))
+            t += duration
+            pending, duration = [], None
+
+    kept = [(i, seg) for i, seg in enumerate(segments) if seg[1] > start and seg[0] < end]
+    if not kept:
+        raise ValueError(f"No segments between {start:.1f}s and {end:.1f}s")
+
+    lines = header + [f"#EXT-X-MEDIA-SEQUENCE:{sequence + kept[0][0]}"]
+    uris = [uri for uri in map(_tag_uri, header) if uri]
+    for _, (_, _, seg_lines) in kept:
+        lines.extend(seg_lines)
+        uris.extend(uri for uri in map(_tag_uri, seg_lines[:-1]) if uri)
+        uris.append(seg_lines[-1])
+    lines.append("#EXT-X-ENDLIST")
+    return PlaylistTrim("\n".join(lines) + "\n", uris, kept[0][1][0], kept[-1][1][1], len(kept))
+
+
+def variant_uris(master: str) -> list[str]:
+    """Media playlists a master playlist points at (variants and renditions)."""
+    uris, expect_uri = [], False
+    for raw in master.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF"):
+            expect_uri = True
+        elif line.startswith("#EXT-X-MEDIA") or line.startswith("#EXT-X-I-FRAME-STREAM-INF"):
+            uri = _tag_uri(line)
+            if uri:
+                uris.append(uri)
+        elif not line.startswith("#") and expect_uri:
+            uris.append(line)
+            expect_uri = False
+    return list(dict.fromkeys(uris))
+
+
+def _resolve(playlist_path: str, uri: str) -> str:
+    """Path of ``uri`` inside the HLS directory, relative to its root."""
+    if "://" in uri or uri.startswith("/"):
+        raise ValueError(f"Can't relink absolute URI {uri}")
+    path = posixpath.normpath(posixpath.join(posixpath.dirname(playlist_path), uri))
+    if path.startswith(".."):
+        raise ValueError(f"URI {uri} points outside the HLS directory")
+    return path
+
+
+async def plan_playlist_trim(
+    cid: str, trim_start: Optional[float], trim_end: Optional[float],
+) -> tuple[dict[str, str], dict[str, bytes], dict]:
+    """Plan a trimmed copy of the HLS directory at ``cid``.
+
+    Returns ``(links, files, transcode_info)`` for
+    ``ipfs.add_linked_directory``: the kept segments to link from ``cid``,
+    the rewritten playlists, and what was done.
+    """
+    master = (await ipfs.cat(f"{cid}/master.m3u8")).decode()
+    files: dict[str, bytes] = {}
+    if "#EXTINF" in master:
+        playlists = {"master.m3u8": master}
+    else:
+        files["master.m3u8"] = master.encode()
+        playlists = {}
+        for uri in variant_uris(master):
+            path = _resolve("master.m3u8", uri)
+            playlists[path] = (await ipfs.cat(f"{cid}/{path}")).decode()
+        if not playlists:
+            raise ValueError("Master playlist lists no variants")
+
+    links: dict[str, str] = {}
+    windows = []
+    segment_count = 0
+    for path, text in playlists.items():
+        trimmed = trim_media_playlist(text, trim_start, trim_end)
+        files[path] = trimmed.text.encode()
+        for uri in trimmed.uris:
+            target = _resolve(path, uri)
+            links[target] = f"{cid}/{target}"
+        windows.append((trimmed.start, trimmed.end))
+        segment_count += trimmed.segment_count
+
+    # Renditions are segmented on the same boundaries; report the widest
+    info = {
+        "method": "playlist-trim",
+        "source_cid": cid,
+        "segment_count": segment_count,
+        "trim": {
+            "requested_start": trim_start,
+            "requested_end": trim_end,
+            "start": min(w[0] for w in windows),
+            "end": max(w[1] for w in windows),
+        },
+    }
+    return links, files, info
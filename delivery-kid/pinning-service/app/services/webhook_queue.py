@@ -0,0 +1,106 @@
+"""Background worker pool for Coconut webhook processing.
+
+Coconut expects a quick 2xx from its webhook. Downloading every HLS output
+and pinning to IPFS can take many minutes, so the webhook handler only
+records the event on the job and enqueues the job_id here; a small pool of
+workers does the heavy lifting.
+
+The queue itself is in-memory. Durability comes from the job record: the
+webhook persists ``status="received"`` (with the Coconut outputs) before
+enqueueing, and on startup every job still in ``received``/``downloading``
+is enqueued again.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[str], Awaitable[None]]
+
+
+class WebhookQueue:
+    """Deduplicating job_id queue drained by a fixed pool of asyncio workers."""
+
+    def __init__(self, handler: JobHandler, workers: int = 2):
+        self.handler = handler
+        self.worker_count = max(1, workers)
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: set[str] = set()  # queued or being processed
+        self._workers: list[asyncio.Task] = []
+
+    def start(self):
+        """Spawn the worker tasks. Must be called from a running event loop."""
+        for i in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        logger.info("Webhook queue started with %d workers", self.worker_count)
+
+    async def stop(self):
+        """Cancel the workers. Jobs still queued are picked up again on restart."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        logger.info("Webhook queue stopped (%d jobs pending)", len(self._pending))
+
+    def enqueue(self, job_id: str) -> bool:
+        """Queue a job for processing. Returns False if it is already pending."""
+        if job_id in self._pending:
+            return False
+        self._pending.add(job_id)
+        self._queue.put_nowait(job_id)
+        return True
+
+    def is_pending(self, job_id: str) -> bool:
+        return job_id in self._pending
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                logger.info("[%s] Webhook worker %d processing", job_id, index)
+                await self.handler(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[%s] Webhook worker %d failed", job_id, index)
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def join(self):
+        """Wait until every queued job has been processed."""
+        await self._queue.join()
+
+    def status(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize(),
+            "pending": sorted(self._pending),
+        }
+
+
+# Global queue instance
+_queue: Optional[WebhookQueue] = None
+
+
+def get_webhook_queue() -> Optional[WebhookQueue]:
+    """Get the global webhook queue instance."""
+    return _queue
+
+
+def init_webhook_queue(handler: JobHandler, workers: int = 2) -> WebhookQueue:
+    """Initialize and start the global webhook queue."""
+    global _queue
+    _queue = WebhookQueue(handler, workers=workers)
+    _queue.start()
+    return _queue
+
+
+async def stop_webhook_queue():
+    """Stop the global webhook queue."""
+    global _queue
+    if _queue:
+        await _queue.stop()
+        _queue = None
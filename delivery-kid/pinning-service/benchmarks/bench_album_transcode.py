@@ -0,0 +1,95 @@
+"""Wall time of album finalize's encode step, sequential vs. scheduled.
+
+Builds a fixture album of ``--tracks`` WAV files (stereo 44.1 kHz sine
+tones, ``--seconds`` long each) and encodes every track to FLAC and OGG
+through a TranscodeScheduler with one slot (the old track-at-a-time
+behaviour) and with each ``--slots`` value (default: the core count).
+Each is run two-pass (separate WAV→FLAC and WAV→OGG jobs) and one-pass
+(transcode_wav_to_flac_and_ogg, what finalize queues now).
+
+Requires ffmpeg on PATH.
+
+Usage (from delivery-kid/pinning-service):
+    python -m benchmarks.bench_album_transcode [--tracks 20] [--seconds 180] [--slots 2 4 8]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import aclosing
+from functools import partial
+from pathlib import Path
+
+from app.services import transcode
+from app.services.transcode_scheduler import TranscodeJob, TranscodeScheduler
+
+
+def make_album(root: Path, tracks: int, seconds: int) -> list[Path]:
+    wavs = []
+    for i in range(tracks):
+        path = root / f"{i + 1:02d} - Track {i + 1}.wav"
+        subprocess.run([
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"sine=frequency={220 + 20 * i}:sample_rate=44100:duration={seconds}",
+            "-ac", "2", "-c:a", "pcm_s16le", str(path),
+        ], check=True)
+        wavs.append(path)
+    return wavs
+
+
+async def encode_album(wavs: list[Path], out: Path, slots: int, one_pass: bool) -> tuple[float, float]:
+    """Returns (seconds until the first job finished, total seconds)."""
+    jobs = []
+    for wav in wavs:
+        flac, ogg = out / f"{wav.stem}.flac", out / f"{wav.stem}.ogg"
+        if one_pass:
+            jobs.append(TranscodeJob(wav.name, partial(transcode.transcode_wav_to_flac_and_ogg, wav, flac, ogg)))
+        else:
+            jobs.append(TranscodeJob(wav.name, partial(transcode.encode_flac, wav, flac)))
+            jobs.append(TranscodeJob(wav.name, partial(transcode.transcode_flac_to_ogg, wav, ogg)))
+    start = time.perf_counter()
+    first = None
+    async with aclosing(TranscodeScheduler(slots).as_completed(jobs)) as results:
+        async for job, result in results:
+            if isinstance(result, Exception) or not result.success:
+                raise RuntimeError(f"{job.name}: {getattr(result, 'error', result)}")
+            if first is None:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=20)
+    parser.add_argument("--seconds", type=int, default=180, help="Length of each fixture track")
+    parser.add_argument("--slots", type=int, nargs="*", default=[os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg not found on PATH")
+
+    root = Path(tempfile.mkdtemp())
+    try:
+        wavs = make_album(root, args.tracks, args.seconds)
+        print(f"{args.tracks} tracks × {args.seconds}s WAV → FLAC + OGG, {os.cpu_count()} cores\n")
+        print(f"{'slots':>6} {'mode':<9} {'first done':>11} {'total':>9} {'speedup':>8}")
+        baseline = None
+        for slots in [1, *[s for s in args.slots if s != 1]]:
+            for mode in ("two-pass", "one-pass"):
+                out = root / f"out-{slots}-{mode}"
+                out.mkdir()
+                first, total = asyncio.run(encode_album(wavs, out, slots, one_pass=mode == "one-pass"))
+                baseline = baseline or total
+                print(f"{slots:>6} {mode:<9} {first:>10.1f}s {total:>8.1f}s {baseline / total:>7.2f}×")
+                shutil.rmtree(out)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
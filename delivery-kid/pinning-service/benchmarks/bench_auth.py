@@ -0,0 +1,128 @@
+"""Throughput of ``require_auth``, the dependency in front of most routes.
+
+A wallet-signed client sends the same X-Signature/X-Timestamp pair on
+every poll and range request for as long as the timestamp is inside
+``max_timestamp_drift_seconds``. The wallet rows time a replayed signature
+with the signature recovery cache disabled (a secp256k1 recovery per
+request, the old behaviour) and enabled.
+
+The wiki rows time an HMAC-token request that, like the draft routes, asks
+``require_auth`` and then ``has_finalize_token``. "before" is the previous
+code: up to three ``verify_upload_token`` calls, each re-keying the HMAC
+and re-parsing the headers. "after" resolves the request's AuthContext once.
+
+Usage (from delivery-kid/pinning-service):
+    python -m benchmarks.bench_auth [--iterations 2000] [--wallets 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from starlette.requests import Request
+
+from app import auth
+from app.config import Settings
+
+
+def make_request(headers: dict) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/draft-content/bench",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+
+
+def wallet_headers(wallet) -> dict:
+    ts = int(time.time() * 1000)
+    message = encode_defunct(text=auth.create_auth_message(ts))
+    signature = "0x" + wallet.sign_message(message).signature.hex().removeprefix("0x")
+    return {"X-Signature": signature, "X-Timestamp": str(ts)}
+
+
+def wiki_headers(action: str) -> dict:
+    ts = int(time.time() * 1000)
+    return {
+        "X-Upload-Token": auth.create_upload_token("bench-secret", "Bench", ts, action=action),
+        "X-Upload-User": "Bench",
+        "X-Upload-Timestamp": str(ts),
+    }
+
+
+def legacy_verify(token: str, username: str, timestamp: int, settings: Settings, action: str) -> bool:
+    """``verify_upload_token`` as it was: a fresh keyed HMAC per call."""
+    expected = auth.create_upload_token(settings.api_key, username, timestamp, action=action)
+    if not auth.hmac.compare_digest(token, expected):
+        return False
+    return abs(int(time.time() * 1000) - timestamp) <= settings.max_timestamp_drift_seconds * 1000
+
+
+async def legacy_auth(request: Request, settings: Settings) -> str:
+    """``require_auth`` then ``has_finalize_token`` as they were (HMAC headers only)."""
+    token = request.headers.get("X-Upload-Token")
+    username = request.headers.get("X-Upload-User", "")
+    timestamp = int(request.headers.get("X-Upload-Timestamp", ""))
+    if not (legacy_verify(token, username, timestamp, settings, "upload")
+            or legacy_verify(token, username, timestamp, settings, "finalize")):
+        raise RuntimeError("bench token rejected")
+    username = request.headers.get("X-Upload-User", "")
+    timestamp = int(request.headers.get("X-Upload-Timestamp", ""))
+    legacy_verify(token, username, timestamp, settings, "finalize")
+    return f"wiki:{username}"
+
+
+async def current_auth(request: Request, settings: Settings) -> str:
+    identity = await auth.require_auth(request, settings)
+    auth.has_finalize_token(request, settings)
+    return identity
+
+
+async def time_calls(check, headers: dict, settings: Settings, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        request = make_request(headers)  # fresh per call: the context lives on the request
+        start = time.perf_counter()
+        await check(request, settings)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--wallets", type=int, default=20, help="Size of the authorized wallet list")
+    args = parser.parse_args()
+
+    signer = Account.create()
+    wallets = [Account.create().address for _ in range(args.wallets - 1)] + [signer.address]
+    settings = Settings(authorized_wallets=",".join(wallets), api_key="bench-secret")
+    cache = auth.RECOVERY_CACHE_SIZE
+    cases = [
+        ("wallet signature", wallet_headers(signer),
+         (("cache off", auth.require_auth, 0), ("cache on", auth.require_auth, cache))),
+        ("wiki upload token", wiki_headers("upload"),
+         (("before", legacy_auth, cache), ("after", current_auth, cache))),
+        ("wiki finalize token", wiki_headers("finalize"),
+         (("before", legacy_auth, cache), ("after", current_auth, cache))),
+    ]
+
+    print(f"{args.iterations} calls per row, {args.wallets} authorized wallets, times in µs\n")
+    print(f"{'request':<22} {'variant':<10} {'req/s':>9} {'p50':>8} {'p95':>8}")
+    for name, headers, variants in cases:
+        for label, check, size in variants:
+            with patch.object(auth, "RECOVERY_CACHE_SIZE", size), \
+                    patch.object(auth, "_recovery_cache", auth.OrderedDict()):
+                asyncio.run(time_calls(check, headers, settings, 1))  # warm
+                samples = asyncio.run(time_calls(check, headers, settings, args.iterations))
+            q = statistics.quantiles(samples, n=20)
+            rate = 1e6 / statistics.fmean(samples)
+            print(f"{name:<22} {label:<10} {rate:>9.0f} {q[9]:>8.1f} {q[18]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
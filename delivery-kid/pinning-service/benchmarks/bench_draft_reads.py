@@ -0,0 +1,89 @@
+"""Latency of the draft-polling and range-request auth paths.
+
+Times ``load_draft_state`` (what GET /draft-content/{id} does on every poll
+from the ReleaseDraft page) and ``_check_preview_token`` (what every range
+request from a video player or Coconut does) with the draft cache disabled
+(re-read + re-validate draft.json each time, the old behaviour) and enabled
+(one stat() per call while the file is unchanged).
+
+The draft carries a realistic 50-track file list. Point ``--staging`` at a
+directory on the CIFS mount to see the storage-box round trips; the default
+is a local temp dir, which understates the win.
+
+Usage (from delivery-kid/pinning-service):
+    python -m benchmarks.bench_draft_reads [--iterations 2000] [--staging DIR]
+"""
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Settings
+from app.models.content import ContentDraftState, ContentFile
+from app.routes import content, staging
+from app.services import draft_store
+
+
+def make_draft(staging_dir: Path, tracks: int) -> Path:
+    draft_dir = staging_dir / "drafts" / "bench-draft"
+    draft_dir.mkdir(parents=True)
+    files = [
+        ContentFile(original_filename=f"{i + 1:02d} - Track {i + 1}.flac", detected_title=f"Track {i + 1}",
+                    media_type="audio", format="FLAC", duration_seconds=241.5, sample_rate=44100,
+                    bit_depth=16, channels=2, size_bytes=31_000_000)
+        for i in range(tracks)
+    ]
+    state = ContentDraftState(draft_id="bench-draft", created_at=datetime.now(timezone.utc),
+                              uploaded_by="wiki:bench", files=files, status="uploaded",
+                              preview_token="p" * 43, metadata={"title": "Bench"})
+    content.save_draft_state(draft_dir, state)
+    return draft_dir
+
+
+def time_calls(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--staging", type=Path, default=None,
+                        help="Directory to create the bench draft in (default: temp dir)")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(dir=args.staging))
+    try:
+        draft_dir = make_draft(root, args.tracks)
+        settings = Settings(staging_dir=str(root))
+        paths = {
+            "poll (load_draft_state)": lambda: content.load_draft_state(draft_dir, readonly=True),
+            "range auth (preview_token)": lambda: staging._check_preview_token(
+                "bench-draft", "p" * 43, settings),
+        }
+
+        print(f"{args.tracks}-track draft, {args.iterations} calls per row, times in µs\n")
+        print(f"{'path':<28} {'cache':<8} {'p50':>8} {'p95':>8} {'mean':>8}")
+        for name, fn in paths.items():
+            for label, size in (("off", 0), ("on", draft_store.DRAFT_CACHE_SIZE)):
+                with patch.object(draft_store, "_cache", draft_store.DraftCache(maxsize=size)):
+                    fn()  # warm
+                    samples = time_calls(fn, args.iterations)
+                q = statistics.quantiles(samples, n=20)
+                print(f"{name:<28} {label:<8} {q[9]:>8.1f} {q[18]:>8.1f} {statistics.fmean(samples):>8.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
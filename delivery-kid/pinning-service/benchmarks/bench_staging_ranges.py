@@ -0,0 +1,142 @@
+"""Throughput of 1 MB range reads from GET /staging/drafts/{id}/{file}.
+
+Compares the previous handler (auth via preview_token — a draft.json
+check through the draft cache — or HMAC query params, then Starlette's
+FileResponse) with the current one: a signed URL checked without I/O, and
+RangedFileResponse (one stat, 1 MiB preads, no per-request ETag hashing).
+
+Requests go through httpx's in-process ASGI transport, so no server
+extensions are offered: the current handler takes its pread fallback,
+not sendfile. Under a server that offers ``http.response.zerocopy`` the
+body copy disappears too. Point ``--staging`` at the CIFS mount to see the
+storage-box round trips the old auth paid per request.
+
+Usage (from delivery-kid/pinning-service):
+    python -m benchmarks.bench_staging_ranges [--requests 500] [--concurrency 8] [--staging DIR]
+"""
+
+import argparse
+import asyncio
+import json
+import mimetypes
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.auth import create_upload_token, staging_url_query, verify_upload_token
+from app.config import Settings, get_settings
+from app.routes import staging
+
+DRAFT_ID = "bench-draft"
+FILENAME = "clip.mp4"
+RANGE_BYTES = 1024 * 1024
+
+
+def legacy_app(settings: Settings) -> FastAPI:
+    """The handler as it was: per-request auth, then FileResponse."""
+    app = FastAPI()
+
+    @app.get("/staging/drafts/{draft_id}/{filename}")
+    async def get_staging_file(
+        draft_id: str,
+        filename: str,
+        token: Optional[str] = Query(None),
+        user: Optional[str] = Query(None),
+        timestamp: Optional[str] = Query(None),
+        preview_token: Optional[str] = Query(None),
+    ):
+        authenticated = bool(preview_token) and staging._check_preview_token(draft_id, preview_token, settings)
+        if not authenticated and token and user and timestamp:
+            authenticated = verify_upload_token(token, user, int(timestamp), settings, action="upload")
+        if not authenticated:
+            raise HTTPException(status_code=401)
+        file_path = Path(settings.staging_dir) / "drafts" / draft_id / "upload" / filename
+        if not file_path.is_file():
+            raise HTTPException(status_code=404)
+        file_path.resolve().relative_to(Path(settings.staging_dir).resolve())
+        return FileResponse(path=file_path, media_type=mimetypes.guess_type(filename)[0], filename=filename)
+
+    return app
+
+
+def current_app(settings: Settings) -> FastAPI:
+    app = FastAPI()
+    app.include_router(staging.router)
+    app.dependency_overrides[get_settings] = lambda: settings
+    return app
+
+
+async def run(app: FastAPI, url: str, requests: int, concurrency: int, size: int) -> tuple[float, list[float]]:
+    """Issue ``requests`` random 1 MB range reads; returns (seconds, latencies in ms)."""
+    offsets = [random.randrange(0, size - RANGE_BYTES) for _ in range(requests)]
+    latencies: list[float] = []
+    limit = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(offset: int) -> None:
+            async with limit:
+                start = time.perf_counter()
+                resp = await client.get(url, headers={"Range": f"bytes={offset}-{offset + RANGE_BYTES - 1}"})
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert resp.status_code == 206 and len(resp.content) == RANGE_BYTES, resp.status_code
+
+        await one(0)  # warm
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(o) for o in offsets))
+        return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=64, help="Size of the staged file")
+    parser.add_argument("--staging", type=Path, default=None,
+                        help="Directory to create the bench draft in (default: temp dir)")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(dir=args.staging))
+    try:
+        upload = root / "drafts" / DRAFT_ID / "upload"
+        upload.mkdir(parents=True)
+        size = args.size_mb * 1024 * 1024
+        with open(upload / FILENAME, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(random.randbytes(1024 * 1024))
+        (root / "drafts" / DRAFT_ID / "draft.json").write_text(
+            json.dumps({"draft_type": "content", "preview_token": "p" * 43}))
+
+        settings = Settings(staging_dir=str(root), api_key="bench-secret")
+        ts = int(time.time() * 1000)
+        hmac_query = f"token={create_upload_token('bench-secret', 'Bench', ts)}&user=Bench&timestamp={ts}"
+        path = f"/staging/drafts/{DRAFT_ID}/{FILENAME}"
+        cases = [
+            ("before: preview_token", legacy_app(settings), f"{path}?preview_token={'p' * 43}"),
+            ("before: HMAC query", legacy_app(settings), f"{path}?{hmac_query}"),
+            ("after: HMAC query", current_app(settings), f"{path}?{hmac_query}"),
+            ("after: signed URL", current_app(settings), f"{path}?{staging_url_query(DRAFT_ID, settings)}"),
+        ]
+
+        print(f"{args.requests} × 1 MB range reads of a {args.size_mb} MB file, concurrency {args.concurrency}\n")
+        print(f"{'handler':<24} {'req/s':>8} {'MB/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, app, url in cases:
+            elapsed, latencies = asyncio.run(run(app, url, args.requests, args.concurrency, size))
+            latencies.sort()
+            p50, p95 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+            rate = args.requests / elapsed
+            print(f"{name:<24} {rate:>8.0f} {rate * RANGE_BYTES / 1e6:>8.0f} {p50:>8.2f} {p95:>8.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Tests for the shared ffprobe cache in analyze."""
+
+import json
+import os
+
+import pytest
+
+from app.services import analyze
+
+PROBE_JSON = {
+    "format": {"format_name": "flac", "format_long_name": "raw FLAC", "duration": "12.5", "size": "4"},
+    "streams": [{"codec_type": "audio", "codec_name": "flac", "sample_rate": "44100",
+                 "channels": 2, "bits_per_raw_sample": "24"}],
+}
+
+
+@pytest.fixture
+def fake_ffprobe(tmp_path, monkeypatch):
+    """An ffprobe on PATH that logs each run and prints a fixed result."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = tmp_path / "ffprobe.log"
+    script = bin_dir / "ffprobe"
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo run >> {log}\n"
+        f"cat <<'EOF'\n{json.dumps(PROBE_JSON)}\nEOF\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(analyze, "_probe_cache", analyze.OrderedDict())
+    monkeypatch.setattr(analyze, "_probe_runs", analyze.OrderedDict())
+    monkeypatch.setattr(analyze, "_probe_total", 0)
+    monkeypatch.setattr(analyze, "_probe_hits", 0)
+    return lambda: len(log.read_text().splitlines()) if log.exists() else 0
+
+
+@pytest.mark.asyncio
+async def test_each_file_probed_once_per_draft(tmp_path, fake_ffprobe):
+    upload = tmp_path / "drafts" / "d1" / "upload"
+    upload.mkdir(parents=True)
+    src = upload / "track.flac"
+    src.write_bytes(b"fLaC")
+
+    analysis = await analyze.analyze_audio_file(src)
+    assert analysis.success and analysis.duration_seconds == 12.5
+    media = await analyze.analyze_media_file(src)
+    assert media.success and media.media_type == "audio"
+
+    # A hardlinked copy (finalize output) is the same file
+    linked = tmp_path / "drafts" / "d1" / "track.flac"
+    os.link(src, linked)
+    assert (await analyze.probe(linked))["format"]["duration"] == "12.5"
+
+    assert fake_ffprobe() == 1
+    assert analyze.probe_stats() == {"runs": 1, "cache_hits": 2, "by_draft": {"d1": 1}}
+
+
+@pytest.mark.asyncio
+async def test_modified_file_is_probed_again(tmp_path, fake_ffprobe):
+    src = tmp_path / "clip.flac"
+    src.write_bytes(b"fLaC")
+    await analyze.probe(src)
+    src.write_bytes(b"fLaC more")
+    await analyze.probe(src)
+
+    assert fake_ffprobe() == 2
+    assert analyze.probe_stats()["by_draft"] == {"other": 2}
+
+
+@pytest.mark.asyncio
+async def test_per_draft_counts_are_bounded(tmp_path, fake_ffprobe, monkeypatch):
+    monkeypatch.setattr(analyze, "PROBE_RUNS_DRAFTS", 2)
+    for draft in ("d1", "d2", "d3"):
+        src = tmp_path / "drafts" / draft / "upload" / "track.flac"
+        src.parent.mkdir(parents=True)
+        src.write_bytes(b"fLaC")
+        await analyze.probe(src)
+
+    stats = analyze.probe_stats()
+    assert stats["runs"] == 3
+    assert stats["by_draft"] == {"d2": 1, "d3": 1}
+
+
+@pytest.mark.asyncio
+async def test_probe_failure_is_reported(tmp_path, monkeypatch, fake_ffprobe):
+    (tmp_path / "bin" / "ffprobe").write_text("#!/bin/sh\necho 'Invalid data' >&2\nexit 1\n")
+    src = tmp_path / "broken.flac"
+    src.write_bytes(b"nope")
+
+    analysis = await analyze.analyze_audio_file(src)
+    assert not analysis.success
+    assert "Invalid data" in analysis.error
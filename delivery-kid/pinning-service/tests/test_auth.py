@@ -0,0 +1,163 @@
+"""Tests for app.auth — signature recovery cache and the per-request auth context."""
+
+import time
+
+import pytest
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import auth
+from app.auth import (
+    create_auth_message, create_upload_token, has_finalize_token, match_upload_token,
+    require_auth, require_finalize_auth, verify_signature, verify_upload_token,
+)
+from app.config import Settings
+
+
+@pytest.fixture
+def wallet():
+    return Account.create()
+
+
+@pytest.fixture
+def recoveries(monkeypatch):
+    """Fresh recovery cache; returns a counter of real EC recoveries."""
+    monkeypatch.setattr(auth, "_recovery_cache", auth.OrderedDict())
+    calls = []
+    real = Account.recover_message
+
+    def counting(message, signature):
+        calls.append(signature)
+        return real(message, signature=signature)
+
+    monkeypatch.setattr(auth.Account, "recover_message", counting)
+    return calls
+
+
+def sign(wallet, timestamp: int) -> str:
+    signed = wallet.sign_message(encode_defunct(text=create_auth_message(timestamp)))
+    return "0x" + signed.signature.hex().removeprefix("0x")
+
+
+class TestRecoveryCache:
+
+    def test_replayed_signature_recovers_once(self, wallet, recoveries):
+        settings = Settings(authorized_wallets="")
+        ts = int(time.time() * 1000)
+        signature = sign(wallet, ts)
+
+        for _ in range(3):
+            result = verify_signature(signature, ts, settings)
+            assert result.valid and result.address == wallet.address
+        assert len(recoveries) == 1
+
+    def test_authorization_rechecked_on_cache_hit(self, wallet, recoveries):
+        ts = int(time.time() * 1000)
+        signature = sign(wallet, ts)
+        assert verify_signature(signature, ts, Settings(authorized_wallets=wallet.address)).valid
+
+        other = Settings(authorized_wallets="0x0000000000000000000000000000000000000001")
+        result = verify_signature(signature, ts, other)
+        assert not result.valid
+        assert "not authorized" in result.error
+        assert len(recoveries) == 1
+
+    def test_failures_and_expired_entries_are_not_reused(self, wallet, recoveries, monkeypatch):
+        settings = Settings(authorized_wallets="")
+        ts = int(time.time() * 1000)
+        assert not verify_signature("0xdeadbeef", ts, settings).valid
+        assert not verify_signature("0xdeadbeef", ts, settings).valid
+        assert len(recoveries) == 2
+
+        signature = sign(wallet, ts)
+        verify_signature(signature, ts, settings)
+        monkeypatch.setattr(auth.time, "time", lambda: ts / 1000 + auth.RECOVERY_CACHE_TTL + 1)
+        assert verify_signature(signature, ts, settings).valid
+        assert len(recoveries) == 4
+
+    def test_cache_is_bounded(self, wallet, recoveries, monkeypatch):
+        monkeypatch.setattr(auth, "RECOVERY_CACHE_SIZE", 2)
+        settings = Settings(authorized_wallets="")
+        now = int(time.time() * 1000)
+        for ts in (now, now - 1, now - 2):
+            verify_signature(sign(wallet, ts), ts, settings)
+        assert len(auth._recovery_cache) == 2
+        assert [key[1] for key in auth._recovery_cache] == [now - 1, now - 2]
+
+
+def make_request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.replace("_", "-").lower().encode(), v.encode()) for k, v in headers.items()],
+    })
+
+
+def wiki_headers(action: str, user: str = "Alice", ts: int | None = None) -> dict:
+    ts = ts if ts is not None else int(time.time() * 1000)
+    return {
+        "X_Upload_Token": create_upload_token("test-secret", user, ts, action=action),
+        "X_Upload_User": user,
+        "X_Upload_Timestamp": str(ts),
+    }
+
+
+class TestAuthContext:
+
+    @pytest.fixture
+    def settings(self):
+        return Settings(api_key="test-secret", authorized_wallets=" 0xAbC ,0xdef,, ")
+
+    def test_wallet_set_parsed_once(self, settings):
+        assert settings.authorized_wallet_set == frozenset({"0xabc", "0xdef"})
+        assert settings.authorized_wallet_set is settings.authorized_wallet_set
+        assert settings.authorized_wallet_list == ["0xabc", "0xdef"]
+
+    def test_match_reports_action(self, settings):
+        ts = int(time.time() * 1000)
+        for action in ("upload", "finalize"):
+            token = create_upload_token("test-secret", "Alice", ts, action=action)
+            assert match_upload_token(token, "Alice", ts, settings) == action
+            assert verify_upload_token(token, "Alice", ts, settings, action=action)
+        assert match_upload_token("nope", "Alice", ts, settings) is None
+        stale = ts - (settings.max_timestamp_drift_seconds + 60) * 1000
+        assert match_upload_token(create_upload_token("test-secret", "Alice", stale), "Alice", stale, settings) is None
+
+    @pytest.mark.asyncio
+    async def test_one_hmac_check_per_request(self, settings, monkeypatch):
+        calls = []
+        real = auth.match_upload_token
+
+        def counting(*args, **kwargs):
+            calls.append(args)
+            return real(*args, **kwargs)
+
+        monkeypatch.setattr(auth, "match_upload_token", counting)
+        request = make_request(**wiki_headers("finalize"))
+        assert await require_auth(request, settings) == "wiki:Alice"
+        assert await require_finalize_auth(request, settings) == "wiki:Alice"
+        assert has_finalize_token(request, settings)
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_upload_token_is_not_finalize(self, settings):
+        request = make_request(**wiki_headers("upload"))
+        assert await require_auth(request, settings) == "wiki:Alice"
+        assert not has_finalize_token(request, settings)
+        with pytest.raises(HTTPException) as exc:
+            await require_finalize_auth(request, settings)
+        assert exc.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_bad_timestamp_and_api_key(self, settings):
+        bad = make_request(X_Upload_Token="t", X_Upload_User="Alice", X_Upload_Timestamp="soon")
+        with pytest.raises(HTTPException) as exc:
+            await require_auth(bad, settings)
+        assert exc.value.detail == {"error": "Invalid upload timestamp"}
+
+        assert await require_auth(make_request(X_API_Key="test-secret"), settings) == "api-user"
+        with pytest.raises(HTTPException):
+            await require_finalize_auth(make_request(X_API_Key="wrong"), settings)
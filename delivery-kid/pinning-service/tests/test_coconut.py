@@ -4,9 +4,14 @@ import json
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
 
+import httpx
 import pytest
 
-from app.services.coconut import submit_to_coconut, save_job, load_job, list_jobs
+from app.services import coconut
+from app.services.coconut import (
+    submit_to_coconut, save_job, load_job, list_jobs,
+    download_hls_outputs, SegmentDownloadError,
+)
 
 
 class TestJobConfigBuilding:
@@ -136,6 +141,106 @@ class TestJobConfigBuilding:
                 assert output["audio"]["codec"] == "opus", f"{key} should use opus"
 
 
+def _mock_client(handler):
+    """Patch coconut's AsyncClient so requests go to an in-process handler."""
+    real_client = httpx.AsyncClient
+
+    def factory(*args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(handler)
+        return real_client(*args, **kwargs)
+
+    return patch.object(coconut.httpx, "AsyncClient", side_effect=factory)
+
+
+def _hls_handler(segment_count: int, segment_body: bytes = b"x" * 1000, fail_first: dict | None = None):
+    """Serve a master + one 720p variant with ``segment_count`` segments.
+
+    ``fail_first`` maps a segment name to how many times it should 503
+    before succeeding.
+    """
+    fail_first = dict(fail_first or {})
+    playlist = "#EXTM3U\n" + "".join(
+        f"#EXTINF:6.0,\nsegment_{i:03d}.ts\n" for i in range(segment_count)
+    ) + "#EXT-X-ENDLIST\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        name = request.url.path.rsplit("/", 1)[-1]
+        if name == "master.m3u8":
+            return httpx.Response(200, text="#EXTM3U\n720p/playlist.m3u8\n")
+        if name == "playlist.m3u8":
+            return httpx.Response(200, text=playlist)
+        if fail_first.get(name):
+            fail_first[name] -= 1
+            return httpx.Response(503)
+        return httpx.Response(200, content=segment_body)
+
+    return handler
+
+
+OUTPUTS = {
+    "hls_master": {"url": "https://cdn.example/out/master.m3u8"},
+    "hls_av1_720p": {"url": "https://cdn.example/out/720p/playlist.m3u8"},
+}
+
+
+class TestHlsDownload:
+    """Test the concurrent streaming HLS downloader."""
+
+    @pytest.mark.asyncio
+    async def test_downloads_all_segments(self, tmp_path):
+        with _mock_client(_hls_handler(25)):
+            stats = await download_hls_outputs(OUTPUTS, tmp_path, concurrency=4)
+
+        assert (tmp_path / "master.m3u8").exists()
+        assert len(list((tmp_path / "720p").glob("segment_*.ts"))) == 25
+        assert stats["720p"] == {"segments": 25, "bytes": 25_000}
+        assert not list(tmp_path.rglob("*.part"))
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_failures(self, tmp_path):
+        handler = _hls_handler(3, fail_first={"segment_001.ts": 2})
+        with _mock_client(handler), patch.object(coconut, "SEGMENT_BACKOFF_SECONDS", 0):
+            await download_hls_outputs(OUTPUTS, tmp_path)
+
+        assert (tmp_path / "720p" / "segment_001.ts").read_bytes() == b"x" * 1000
+
+    @pytest.mark.asyncio
+    async def test_persistent_failure_raises(self, tmp_path):
+        handler = _hls_handler(3, fail_first={"segment_002.ts": 100})
+        with _mock_client(handler), patch.object(coconut, "SEGMENT_BACKOFF_SECONDS", 0):
+            with pytest.raises(SegmentDownloadError):
+                await download_hls_outputs(OUTPUTS, tmp_path)
+
+    @pytest.mark.asyncio
+    async def test_short_body_is_rejected(self, tmp_path):
+        def handler(request):
+            name = request.url.path.rsplit("/", 1)[-1]
+            if name.endswith(".m3u8"):
+                return _hls_handler(1)(request)
+            # Claim more bytes than we send
+            return httpx.Response(200, content=b"abc", headers={"Content-Length": "10"})
+
+        with _mock_client(handler), patch.object(coconut, "SEGMENT_BACKOFF_SECONDS", 0):
+            with pytest.raises(SegmentDownloadError):
+                await download_hls_outputs(OUTPUTS, tmp_path)
+        assert not (tmp_path / "720p" / "segment_000.ts").exists()
+
+    @pytest.mark.asyncio
+    async def test_reports_progress_per_variant(self, tmp_path):
+        calls = []
+
+        async def progress(variant, done, total):
+            calls.append((variant, done, total))
+
+        with _mock_client(_hls_handler(20)):
+            await download_hls_outputs(OUTPUTS, tmp_path, progress_callback=progress)
+
+        assert calls[0] == ("720p", 0, 20)
+        assert calls[-1] == ("720p", 20, 20)
+        # Throttled to 10% steps, not one call per segment
+        assert len(calls) <= 11
+
+
 class TestJobPersistence:
     """Test job save/load/list operations."""
 
@@ -163,6 +268,16 @@ class TestJobPersistence:
         jobs = list_jobs(tmp_path, limit=2)
         assert len(jobs) == 2
 
+    def test_state_dir_is_threaded_through(self, tmp_path):
+        state_dir = tmp_path / "state"
+        state_dir.mkdir()
+        save_job(tmp_path, "job-1", {"id": "job-1"}, state_dir=state_dir)
+
+        assert (state_dir / "jobs.db").exists()
+        assert not (tmp_path / "jobs.db").exists()
+        assert load_job(tmp_path, "job-1", state_dir=state_dir) == {"id": "job-1"}
+        assert load_job(tmp_path, "job-1") is None
+
 
 class TestContentFinalizeRequest:
     """Test the transcoding_qualities field on ContentFinalizeRequest."""
@@ -181,3 +296,71 @@ class TestContentFinalizeRequest:
         from app.models.content import ContentFinalizeRequest
         req = ContentFinalizeRequest()
         assert req.transcoding_strategy == "auto"
+
+
+class TestWebhookQueueing:
+    """The webhook acknowledges immediately and dedupes redeliveries."""
+
+    def _client(self, tmp_path):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.config import Settings, get_settings
+        from app.routes.coconut import router
+
+        settings = Settings(staging_dir=str(tmp_path))
+        test_app = FastAPI()
+        test_app.include_router(router)
+        test_app.dependency_overrides[get_settings] = lambda: settings
+        return TestClient(test_app), settings
+
+    def test_duplicate_completion_is_ignored(self, tmp_path):
+        client, _ = self._client(tmp_path)
+        save_job(tmp_path, "job-1", {"id": "job-1", "status": "processing"})
+        event = {"event": "job.completed", "outputs": {"hls_master": {"url": "https://x/master.m3u8"}}}
+
+        with patch("app.routes.coconut._enqueue_job") as enqueue:
+            first = client.post("/webhook/coconut?job_id=job-1", json=event)
+            second = client.post("/webhook/coconut?job_id=job-1", json=event)
+
+        assert first.json() == {"received": True, "queued": True}
+        assert second.json() == {"received": True, "duplicate": True}
+        assert enqueue.call_count == 1
+        job = load_job(tmp_path, "job-1")
+        assert job["status"] == "received"
+        assert job["outputs"] == event["outputs"]
+
+    @pytest.mark.asyncio
+    async def test_worker_processes_once(self, tmp_path):
+        from app.config import Settings
+        from app.routes.coconut import process_queued_job
+
+        settings = Settings(staging_dir=str(tmp_path))
+        save_job(tmp_path, "job-2", {"id": "job-2", "status": "received", "outputs": {}})
+
+        with patch("app.routes.coconut.process_completed_job",
+                   AsyncMock(return_value="bafyhls")) as process:
+            await process_queued_job("job-2", settings)
+            await process_queued_job("job-2", settings)
+
+        assert process.await_count == 1
+        job = load_job(tmp_path, "job-2")
+        assert job["status"] == "complete"
+        assert job["hlsCid"] == "bafyhls"
+
+    @pytest.mark.asyncio
+    async def test_queue_dedupes_pending_jobs(self):
+        from app.services.webhook_queue import WebhookQueue
+
+        seen = []
+
+        async def handler(job_id):
+            seen.append(job_id)
+
+        queue = WebhookQueue(handler, workers=2)
+        queue.start()
+        assert queue.enqueue("a") is True
+        assert queue.enqueue("a") is False
+        queue.enqueue("b")
+        await queue.join()
+        await queue.stop()
+        assert sorted(seen) == ["a", "b"]
@@ -0,0 +1,130 @@
+"""Tests for app.services.draft_events — the append-only per-draft event log."""
+
+import asyncio
+import json
+import shutil
+
+import pytest
+
+from app.routes.content import _parse_draft_state, draft_events_generator, load_draft_state, save_draft_state
+from app.services import draft_events
+from app.services.draft_store import DraftStateManager
+from tests.test_draft_store import make_state
+
+
+class TestAppendAndRead:
+
+    def test_cursor_resumes_after_last_entry(self, tmp_path):
+        draft_events.append_event(tmp_path, "upload", {"phase": "init", "message": "a"})
+        cursor = draft_events.append_event(tmp_path, "finalize", {"stage": "x", "message": "b"})
+
+        entries, next_cursor = draft_events.read_events(tmp_path)
+        assert [e["message"] for e in entries] == ["a", "b"]
+        assert entries[-1]["cursor"] == cursor == next_cursor
+
+        draft_events.append_event(tmp_path, "preview", {"message": "c"})
+        entries, _ = draft_events.read_events(tmp_path, next_cursor)
+        assert [(e["log"], e["message"]) for e in entries] == [("preview", "c")]
+
+    def test_partial_trailing_line_is_left_for_next_read(self, tmp_path):
+        cursor = draft_events.append_event(tmp_path, "upload", {"message": "a"})
+        with open(draft_events.events_path(tmp_path), "ab") as f:
+            f.write(b'{"log": "upload", "mess')
+        entries, next_cursor = draft_events.read_events(tmp_path)
+        assert len(entries) == 1
+        assert next_cursor == cursor
+
+    def test_missing_draft_dir_is_not_an_error(self, tmp_path):
+        assert draft_events.append_event(tmp_path / "gone", "upload", {"message": "x"}) is None
+        assert draft_events.read_events(tmp_path / "gone", 5) == ([], 5)
+
+
+class TestTail:
+
+    def test_returns_last_n_per_log_oldest_first(self, tmp_path, monkeypatch):
+        # Small chunks so lines straddle chunk boundaries
+        monkeypatch.setattr(draft_events, "_TAIL_CHUNK", 37)
+        for i in range(30):
+            draft_events.append_event(tmp_path, "finalize", {"message": f"f{i}"})
+            if i % 3 == 0:
+                draft_events.append_event(tmp_path, "upload", {"message": f"u{i}"})
+
+        logs = draft_events.tail_events(tmp_path, {"upload": 2, "finalize": 3, "preview": 5})
+        assert [e["message"] for e in logs["finalize"]] == ["f27", "f28", "f29"]
+        assert [e["message"] for e in logs["upload"]] == ["u24", "u27"]
+        assert logs["preview"] == []
+        assert "log" not in logs["finalize"][0]
+
+
+class TestLegacyMigration:
+
+    def test_in_document_logs_move_to_event_log(self, tmp_path):
+        draft_dir = tmp_path / "drafts" / "d1"
+        draft_dir.mkdir(parents=True)
+        state = make_state()
+        data = json.loads(state.model_dump_json())
+        data["upload_log"] = [{"ts": "2024-01-01T00:00:01", "phase": "init", "message": "u"}]
+        data["finalize_log"] = [{"ts": "2024-01-01T00:00:02", "stage": "x", "message": "f"}]
+        (draft_dir / "draft.json").write_text(json.dumps(data))
+
+        loaded = load_draft_state(draft_dir)
+        assert loaded is not None
+        logs = draft_events.tail_events(draft_dir)
+        assert [e["message"] for e in logs["upload"]] == ["u"]
+        assert [e["message"] for e in logs["finalize"]] == ["f"]
+
+        # Loading rewrote draft.json without the legacy keys; loading again doesn't duplicate
+        assert "upload_log" not in json.loads((draft_dir / "draft.json").read_text())
+        load_draft_state(draft_dir)
+        assert len(draft_events.read_events(draft_dir)[0]) == 2
+
+    def test_concurrent_loads_migrate_once(self, tmp_path):
+        draft_dir = tmp_path / "drafts" / "d1"
+        draft_dir.mkdir(parents=True)
+        data = json.loads(make_state().model_dump_json())
+        data["preview_log"] = [{"ts": "2024-01-01T00:00:01", "message": "p"}]
+        (draft_dir / "draft.json").write_text(json.dumps(data))
+
+        # Two loads that both read the pre-migration payload
+        for _ in range(2):
+            assert _parse_draft_state(draft_dir, dict(data)) is not None
+        assert [e["message"] for e in draft_events.read_events(draft_dir)[0]] == ["p"]
+
+
+class FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+class TestEventStream:
+
+    @pytest.mark.asyncio
+    async def test_pushes_log_entries_status_changes_and_gone(self, tmp_path):
+        manager = DraftStateManager(tmp_path)
+        draft_dir = manager.draft_dir("d1")
+        draft_dir.mkdir(parents=True)
+        save_draft_state(draft_dir, make_state(status="uploaded", preview_status="pending"))
+        first = draft_events.append_event(draft_dir, "upload", {"message": "old"})
+
+        # Resume after the first entry, as a reconnect with Last-Event-ID would
+        stream = draft_events_generator(draft_dir, first, FakeRequest())
+        frame = await asyncio.wait_for(anext(stream), 1)
+        assert frame["event"] == "status"
+        assert json.loads(frame["data"])["preview_status"] == "pending"
+
+        draft_events.append_event(draft_dir, "preview", {"message": "encoding · 40%"})
+        frame = await asyncio.wait_for(anext(stream), 1)
+        assert frame["event"] == "preview"
+        assert json.loads(frame["data"])["message"] == "encoding · 40%"
+        assert int(frame["id"]) > first
+
+        await manager.update("d1", lambda d: d.update(preview_status="ready"))
+        frame = await asyncio.wait_for(anext(stream), 1)
+        assert (frame["event"], json.loads(frame["data"])["preview_status"]) == ("status", "ready")
+
+        shutil.rmtree(draft_dir)
+        draft_events.notify(draft_dir)
+        frame = await asyncio.wait_for(anext(stream), 1)
+        assert frame["event"] == "gone"
+        with pytest.raises(StopAsyncIteration):
+            await anext(stream)
@@ -0,0 +1,109 @@
+"""Tests for the drafts index and GET /drafts."""
+
+import json
+import shutil
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import Settings, get_settings
+from app.routes.draft_index import router
+from app.services import draft_events, draft_index
+from app.services.draft_index import init_draft_index
+from app.services.draft_store import write_draft_json
+
+
+def make_client(staging_dir) -> TestClient:
+    settings = Settings(staging_dir=str(staging_dir), api_key="test-secret", authorized_wallets="")
+    test_app = FastAPI()
+    test_app.include_router(router)
+    test_app.dependency_overrides[get_settings] = lambda: settings
+    return TestClient(test_app, headers={"X-API-Key": "test-secret"})
+
+
+def make_draft(staging_dir, draft_id, data=None, files=()):
+    draft_dir = staging_dir / "drafts" / draft_id
+    (draft_dir / "upload").mkdir(parents=True)
+    for name, size in files:
+        (draft_dir / "upload" / name).write_bytes(b"\0" * size)
+    if data is not None:
+        write_draft_json(draft_dir, data)
+    return draft_dir
+
+
+@pytest.fixture
+def staging(tmp_path):
+    make_draft(tmp_path, "content-1",
+               {"draft_type": "content", "status": "uploaded", "uploaded_by": "wiki:Alice",
+                "created_at": "2024-01-01T00:00:00+00:00"},
+               files=[("a.flac", 1000), ("b.flac", 3000)])
+    make_draft(tmp_path, "album-1",
+               {"status": "finalize_failed", "uploaded_by": "0xabc",
+                "created_at": "2024-02-01T00:00:00+00:00"},
+               files=[("c.wav", 500)])
+    make_draft(tmp_path, "stalled-1")
+    init_draft_index(tmp_path)
+    return tmp_path
+
+
+class TestListDrafts:
+
+    def test_lists_everything_with_sizes(self, staging):
+        body = make_client(staging).get("/drafts?sort=size").json()
+        assert body["total"] == 3
+        rows = {d["draft_id"]: d for d in body["drafts"]}
+        assert [d["draft_id"] for d in body["drafts"]][0] == "content-1"
+        assert rows["content-1"]["file_count"] == 2
+        assert rows["content-1"]["size_bytes"] > 4000
+        assert rows["content-1"]["owner"] == "wiki:Alice"
+        assert rows["album-1"]["draft_type"] == "album"
+        assert rows["stalled-1"]["has_draft_json"] is False
+
+    def test_filters_and_pagination(self, staging):
+        client = make_client(staging)
+        assert [d["draft_id"] for d in client.get("/drafts?has_draft_json=false").json()["drafts"]] == ["stalled-1"]
+        assert client.get("/drafts?status=finalize_failed").json()["total"] == 1
+        assert client.get("/drafts?owner=WIKI:alice").json()["drafts"][0]["draft_id"] == "content-1"
+        assert client.get("/drafts?draft_type=content").json()["total"] == 1
+        page = client.get("/drafts?sort=created&limit=1&offset=1").json()
+        assert (page["total"], [d["draft_id"] for d in page["drafts"]]) == (3, ["content-1"])
+
+    def test_tracks_changes_without_rescanning(self, staging):
+        client = make_client(staging)
+        client.get("/drafts")
+
+        write_draft_json(staging / "drafts" / "content-1",
+                         {"draft_type": "content", "status": "finalizing", "uploaded_by": "wiki:Alice"})
+        shutil.rmtree(staging / "drafts" / "album-1")
+        draft_events.notify(staging / "drafts" / "album-1")
+        # Not announced: only visible after a refresh
+        other = make_draft(staging, "other-worker")
+        (other / "draft.json").write_text(json.dumps({"draft_type": "content", "status": "uploaded"}))
+
+        body = client.get("/drafts").json()
+        rows = {d["draft_id"]: d for d in body["drafts"]}
+        assert set(rows) == {"content-1", "stalled-1"}
+        assert rows["content-1"]["status"] == "finalizing"
+        assert client.get("/drafts?refresh=true").json()["total"] == 3
+
+    def test_changes_during_rebuild_keep_their_mark(self, staging, monkeypatch):
+        real_scan = draft_index.scan_draft
+        album = staging / "drafts" / "album-1"
+
+        def scan_then_change(draft_dir):
+            summary = real_scan(draft_dir)
+            if draft_dir == album and summary.status == "finalize_failed":
+                # A write lands just after the scan passed this draft
+                write_draft_json(album, {"status": "finalizing", "uploaded_by": "0xabc"})
+            return summary
+
+        monkeypatch.setattr(draft_index, "scan_draft", scan_then_change)
+        index = draft_index.get_draft_index()
+        index.rebuild()
+        rows = {d["draft_id"]: d for d in index.query()["drafts"]}
+        assert rows["album-1"]["status"] == "finalizing"
+
+    def test_requires_finalize_auth(self, staging):
+        client = make_client(staging)
+        assert client.get("/drafts", headers={"X-API-Key": "wrong"}).status_code == 401
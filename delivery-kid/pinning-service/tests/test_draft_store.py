@@ -0,0 +1,249 @@
+"""Tests for app.services.draft_store — atomic, coalesced draft.json writes."""
+
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from app.models.content import ContentDraftState
+from app.services import draft_store
+from app.services.draft_store import (
+    SKIP,
+    DraftCache,
+    DraftStateManager,
+    DraftStateWriter,
+    write_draft_state,
+)
+from app.services.fsutil import atomic_write_text
+
+
+def make_state(**kwargs) -> ContentDraftState:
+    return ContentDraftState(
+        draft_id="aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee",
+        created_at=datetime.now(timezone.utc),
+        uploaded_by="wiki:tester",
+        **kwargs,
+    )
+
+
+class TestAtomicWrite:
+
+    def test_replaces_content_without_leaving_temp_files(self, tmp_path):
+        target = tmp_path / "draft.json"
+        target.write_text("old")
+        atomic_write_text(target, "new")
+        assert target.read_text() == "new"
+        assert [p.name for p in tmp_path.iterdir()] == ["draft.json"]
+
+    def test_failed_write_keeps_old_file(self, tmp_path, monkeypatch):
+        target = tmp_path / "draft.json"
+        target.write_text("old")
+
+        def boom(*args):
+            raise OSError("disk gone")
+
+        monkeypatch.setattr("app.services.fsutil.os.replace", boom)
+        with pytest.raises(OSError):
+            atomic_write_text(target, "new")
+        assert target.read_text() == "old"
+        assert [p.name for p in tmp_path.iterdir()] == ["draft.json"]
+
+
+class TestDraftStateWriter:
+
+    @pytest.mark.asyncio
+    async def test_coalesces_bursts_and_writes_trailing_state(self, tmp_path):
+        writer = DraftStateWriter(tmp_path, debounce=0.05)
+        state = make_state(status="finalizing")
+
+        for i in range(20):
+            state.metadata = {"frame": i}
+            await writer.save(state)
+
+        # First save writes through; the other 19 collapse into one deferred write
+        assert writer.writes == 1
+        await asyncio.sleep(0.1)
+        assert writer.writes == 2
+        assert json.loads((tmp_path / "draft.json").read_text())["metadata"] == {"frame": 19}
+
+    @pytest.mark.asyncio
+    async def test_terminal_status_flushes_immediately(self, tmp_path):
+        writer = DraftStateWriter(tmp_path, debounce=60)
+        state = make_state(status="finalizing")
+        await writer.save(state)
+        await writer.save(state)
+        assert writer.writes == 1
+
+        state.status = "finalize_failed"
+        await writer.save(state)
+        assert writer.writes == 2
+        assert json.loads((tmp_path / "draft.json").read_text())["status"] == "finalize_failed"
+
+    @pytest.mark.asyncio
+    async def test_discard_drops_pending_write(self, tmp_path):
+        writer = DraftStateWriter(tmp_path, debounce=0.05)
+        state = make_state(status="finalizing")
+        await writer.save(state)
+        state.metadata = {"late": True}
+        await writer.save(state)
+        writer.discard()
+        await asyncio.sleep(0.1)
+        assert writer.writes == 1
+        assert json.loads((tmp_path / "draft.json").read_text())["metadata"] == {}
+
+    def test_write_draft_state_roundtrip(self, tmp_path):
+        state = make_state(status="uploaded")
+        write_draft_state(tmp_path, state)
+        loaded = ContentDraftState(**json.loads((tmp_path / "draft.json").read_text()))
+        assert loaded == state
+
+    @pytest.mark.asyncio
+    async def test_field_writer_leaves_other_fields_alone(self, tmp_path):
+        state = make_state(status="uploaded", preview_status="processing")
+        write_draft_state(tmp_path, state)
+        # Someone else (the webhook) finishes the preview
+        data = json.loads((tmp_path / "draft.json").read_text())
+        data["preview_status"] = "ready"
+        (tmp_path / "draft.json").write_text(json.dumps(data))
+
+        writer = DraftStateWriter(tmp_path, fields={"status"})
+        state.status = "finalize_failed"
+        await writer.save(state)
+        on_disk = json.loads((tmp_path / "draft.json").read_text())
+        assert on_disk["status"] == "finalize_failed"
+        assert on_disk["preview_status"] == "ready"
+
+    @pytest.mark.asyncio
+    async def test_writes_run_off_the_event_loop(self, tmp_path, monkeypatch):
+        threads = []
+        real = draft_store.write_draft_json
+
+        def recording(draft_dir, data):
+            threads.append(threading.current_thread())
+            real(draft_dir, data)
+
+        monkeypatch.setattr(draft_store, "write_draft_json", recording)
+        state = make_state(status="uploading")
+        await DraftStateWriter(tmp_path).save(state)
+        await DraftStateWriter(tmp_path, fields={"status"}).save(state)
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    @pytest.mark.asyncio
+    async def test_field_writer_needs_existing_draft(self, tmp_path):
+        writer = DraftStateWriter(tmp_path, fields={"status"})
+        await writer.save(make_state(status="uploading"))
+        assert writer.writes == 0
+        assert not (tmp_path / "draft.json").exists()
+
+
+class TestDraftStateManager:
+
+    def make_draft(self, tmp_path) -> DraftStateManager:
+        manager = DraftStateManager(tmp_path)
+        manager.draft_dir("d1").mkdir(parents=True)
+        write_draft_state(manager.draft_dir("d1"), make_state(metadata={"n": 0}))
+        return manager
+
+    @pytest.mark.asyncio
+    async def test_concurrent_updates_are_not_lost(self, tmp_path):
+        manager = self.make_draft(tmp_path)
+
+        def bump(data):
+            data["metadata"]["n"] += 1
+
+        def bump_from_threads():
+            threads = [threading.Thread(target=manager.update_sync, args=("d1", bump))
+                       for _ in range(10)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        await asyncio.gather(
+            *(manager.update("d1", bump) for _ in range(40)),
+            asyncio.to_thread(bump_from_threads),
+        )
+        assert (await manager.read("d1"))["metadata"]["n"] == 50
+
+    @pytest.mark.asyncio
+    async def test_skip_and_missing_draft(self, tmp_path):
+        manager = self.make_draft(tmp_path)
+        before = (manager.draft_dir("d1") / "draft.json").stat().st_mtime_ns
+        data = await manager.update("d1", lambda d: SKIP)
+        assert data["metadata"] == {"n": 0}
+        assert (manager.draft_dir("d1") / "draft.json").stat().st_mtime_ns == before
+
+        assert await manager.update("nope", lambda d: d.update(x=1)) is None
+        assert await manager.read("nope") is None
+
+    @pytest.mark.asyncio
+    async def test_update_queues_behind_writer_flush(self, tmp_path, monkeypatch):
+        manager = self.make_draft(tmp_path)
+        draft_dir = manager.draft_dir("d1")
+        writing, release = threading.Event(), threading.Event()
+        writer = DraftStateWriter(draft_dir, fields={"status"})
+        real = writer._write
+
+        def blocked_write(payload):
+            writing.set()
+            release.wait(5)
+            return real(payload)
+
+        monkeypatch.setattr(writer, "_write", blocked_write)
+        flush = asyncio.create_task(writer.save(make_state(status="finalizing")))
+        await asyncio.to_thread(writing.wait, 5)
+
+        ran = []
+        update = asyncio.create_task(manager.update("d1", lambda d: ran.append(d["status"])))
+        await asyncio.sleep(0.05)
+        assert draft_store._lock_for(draft_dir).aio.locked()
+        assert ran == []
+
+        release.set()
+        await asyncio.gather(flush, update)
+        assert ran == ["finalizing"]
+
+
+class TestDraftCache:
+
+    @staticmethod
+    def parse(draft_dir, data):
+        return data["metadata"]
+
+    def test_hit_until_file_changes(self, tmp_path):
+        cache = DraftCache()
+        write_draft_state(tmp_path, make_state(metadata={"v": 1}))
+        assert cache.load(tmp_path, self.parse) == {"v": 1}
+        assert cache.load(tmp_path, self.parse) == {"v": 1}
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Written behind the cache's back (another worker): stat catches it
+        data = json.loads((tmp_path / "draft.json").read_text())
+        data["metadata"] = {"v": 22}
+        (tmp_path / "draft.json").write_text(json.dumps(data))
+        assert cache.load(tmp_path, self.parse) == {"v": 22}
+        assert cache.misses == 2
+
+    def test_missing_draft_and_eviction(self, tmp_path):
+        cache = DraftCache(maxsize=2)
+        assert cache.load(tmp_path / "gone", self.parse) is None
+        for name in ("a", "b", "c"):
+            (tmp_path / name).mkdir()
+            write_draft_state(tmp_path / name, make_state(metadata={"name": name}))
+            cache.load(tmp_path / name, self.parse)
+        assert cache.stats()["entries"] == 2
+        cache.load(tmp_path / "a", self.parse)
+        assert cache.misses == 4
+
+    def test_local_writes_invalidate_global_cache(self, tmp_path):
+        from app.services.draft_store import get_draft_cache
+
+        cache = get_draft_cache()
+        write_draft_state(tmp_path, make_state(metadata={"v": 1}))
+        cache.load(tmp_path, self.parse)
+        write_draft_state(tmp_path, make_state(metadata={"v": 2}))
+        assert tmp_path not in cache._entries
+        assert cache.load(tmp_path, self.parse) == {"v": 2}
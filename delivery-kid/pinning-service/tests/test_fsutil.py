@@ -0,0 +1,64 @@
+"""Tests for app.services.fsutil — tree stats and copy avoidance."""
+
+import errno
+import os
+
+import pytest
+
+from app.services import fsutil
+from app.services.fsutil import PlaceStats, place_file, tree_stats
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "upload" / "video.mp4"
+    path.parent.mkdir()
+    path.write_bytes(b"x" * 4096)
+    return path
+
+
+def no_links(*args, **kwargs):
+    raise OSError(errno.EPERM, "links not supported")
+
+
+class TestPlaceFile:
+
+    def test_hardlinks_when_possible(self, tmp_path, src):
+        stats = PlaceStats()
+        dst = tmp_path / "output.mp4"
+        assert place_file(src, dst, stats=stats) == "link"
+        assert os.path.samefile(src, dst)
+        assert (stats.bytes_saved, stats.bytes_copied) == (4096, 0)
+
+    def test_replaces_existing_destination(self, tmp_path, src):
+        dst = tmp_path / "output.mp4"
+        dst.write_bytes(b"stale")
+        place_file(src, dst)
+        assert dst.read_bytes() == src.read_bytes()
+        assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+    def test_moves_only_when_allowed(self, tmp_path, src, monkeypatch):
+        monkeypatch.setattr(fsutil.os, "link", no_links)
+        monkeypatch.setattr(fsutil, "_reflink", no_links)
+        stats = PlaceStats()
+
+        assert place_file(src, tmp_path / "copy.mp4", stats=stats) == "copy"
+        assert src.exists()
+        assert place_file(src, tmp_path / "moved.mp4", allow_move=True, stats=stats) == "rename"
+        assert not src.exists()
+
+        assert stats.methods == {"copy": 1, "rename": 1}
+        assert (stats.bytes_copied, stats.bytes_saved) == (4096, 4096)
+        assert "1 copy, 1 rename" in stats.summary()
+
+    def test_unexpected_errors_propagate(self, tmp_path, src):
+        with pytest.raises(FileNotFoundError):
+            place_file(src, tmp_path / "missing-dir" / "out.mp4")
+
+
+class TestTreeStats:
+
+    def test_hardlinked_files_count_once(self, tmp_path, src):
+        place_file(src, tmp_path / "output.mp4")
+        count, size, _ = tree_stats(tmp_path)
+        assert (count, size) == (1, 4096)
@@ -0,0 +1,222 @@
+"""Tests for app.services.jit_hls — on-the-fly HLS of staged videos."""
+
+import asyncio
+import shutil
+import threading
+
+import pytest
+
+from app.services import analyze, jit_hls, staging_space, transcode
+from app.services.staging_space import StagingFull, StagingSpace
+from tests.test_staging import make_client, make_settings
+
+DRAFT_ID = "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee"
+AUTH = {"X-API-Key": "test-secret"}
+
+HEVC_4K = {
+    "format": {"duration": "20.0", "size": str(200 * 1024 * 1024)},
+    "streams": [{"codec_type": "video", "codec_name": "hevc", "pix_fmt": "yuv420p10le",
+                 "width": 3840, "height": 2160},
+                {"codec_type": "audio", "codec_name": "pcm_s24le"}],
+}
+SMALL_H264 = {
+    "format": {"duration": "20.0", "size": str(2 * 1024 * 1024), "start_time": "0.0"},
+    "streams": [{"codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p",
+                 "width": 1280, "height": 720},
+                {"codec_type": "audio", "codec_name": "aac"}],
+}
+
+
+@pytest.fixture
+def fake_probe(monkeypatch):
+    result = {"probe": HEVC_4K}
+
+    async def probe(path):
+        return result["probe"]
+
+    monkeypatch.setattr(analyze, "probe", probe)
+    return result
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """run_ffmpeg that writes the output file (last argument) and records commands."""
+    calls = []
+
+    async def run(cmd, on_progress=None, duration=None):
+        calls.append(cmd)
+        await asyncio.sleep(0.01)
+        with open(cmd[-1], "wb") as f:
+            f.write(b"\x47" * 188)
+        return 0, b""
+
+    monkeypatch.setattr(transcode, "run_ffmpeg", run)
+    return calls
+
+
+@pytest.fixture
+def video(tmp_path):
+    draft_dir = tmp_path / "drafts" / DRAFT_ID
+    (draft_dir / "upload").mkdir(parents=True)
+    source = draft_dir / "upload" / "clip.mov"
+    source.write_bytes(b"\0" * 100)
+    st = source.stat()
+    return source, jit_hls.cache_dir_for(draft_dir, "clip.mov", st.st_size, st.st_mtime_ns)
+
+
+class TestPlaylist:
+
+    def test_fixed_and_keyframe_segments(self):
+        assert jit_hls.fixed_segments(14.0) == [(0, 6), (6, 12), (12, 14.0)]
+        keyframes = [0.0, 2.0, 4.0, 6.5, 8.0, 13.0, 19.0]
+        assert jit_hls.keyframe_segments(keyframes, 20.0) == [(0.0, 6.5), (6.5, 13.0), (13.0, 19.0), (19.0, 20.0)]
+
+    def test_playlist_carries_query(self):
+        text = jit_hls.media_playlist([(0.0, 6.5), (6.5, 8.0)], "expires=1&sig=abc")
+        lines = text.splitlines()
+        assert "#EXT-X-TARGETDURATION:7" in lines
+        assert lines[-3:] == ["#EXTINF:1.500,", "seg_00001.ts?expires=1&sig=abc", "#EXT-X-ENDLIST"]
+
+    def test_segment_names(self):
+        assert jit_hls.segment_index(jit_hls.segment_name(42)) == 42
+        assert jit_hls.segment_index("seg_x.ts") is None
+        assert jit_hls.segment_index("plan.json") is None
+
+
+class TestPackaging:
+
+    @pytest.mark.asyncio
+    async def test_hevc_is_transcoded_low_res(self, video, fake_probe):
+        source, cache_dir = video
+        packaging = await jit_hls.plan(source, cache_dir)
+        assert packaging["mode"] == "transcode"
+        assert len(packaging["segments"]) == 4
+        assert (cache_dir / jit_hls.PLAN_FILE).exists()
+
+        cmd = jit_hls.segment_command(source, cache_dir / "out.ts", packaging, 1)
+        assert cmd[cmd.index("-ss") + 1] == "6.000000"
+        assert cmd[cmd.index("-c:v") + 1] == "libx264"
+        assert "min(480,ih)" in cmd[cmd.index("-vf") + 1]
+        assert cmd[cmd.index("-output_ts_offset") + 1] == "6.000000"
+
+    @pytest.mark.asyncio
+    async def test_small_h264_is_remuxed_on_keyframes(self, video, fake_probe, monkeypatch):
+        source, cache_dir = video
+        fake_probe["probe"] = SMALL_H264
+
+        async def keyframes(path):
+            return [0.0, 5.0, 10.0, 15.0]
+
+        monkeypatch.setattr(jit_hls, "_keyframes", keyframes)
+        packaging = await jit_hls.plan(source, cache_dir)
+        assert packaging["mode"] == "remux"
+        assert packaging["segments"] == [(0.0, 10.0), (10.0, 20.0)]
+        cmd = jit_hls.segment_command(source, cache_dir / "out.ts", packaging, 1)
+        assert cmd[cmd.index("-c") + 1] == "copy"
+
+    @pytest.mark.asyncio
+    async def test_segment_encoded_once_and_next_prefetched(self, video, fake_probe, fake_ffmpeg):
+        source, cache_dir = video
+        first, again = await asyncio.gather(
+            jit_hls.segment(source, cache_dir, 0),
+            jit_hls.segment(source, cache_dir, 0),
+        )
+        assert first == again == cache_dir / "seg_00000.ts"
+        assert first.exists()
+        while jit_hls._inflight:
+            await asyncio.sleep(0.01)
+        outputs = sorted(cmd[-1] for cmd in fake_ffmpeg)
+        assert outputs == [str(cache_dir / "seg_00000.ts.tmp"), str(cache_dir / "seg_00001.ts.tmp")]
+
+        await jit_hls.segment(source, cache_dir, 1)
+        while jit_hls._inflight:
+            await asyncio.sleep(0.01)
+        assert len(fake_ffmpeg) == 3  # 1 was cached; 2 got prefetched
+        with pytest.raises(IndexError):
+            await jit_hls.segment(source, cache_dir, 4)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_plans_share_one_probe_off_the_loop(self, video, fake_probe, monkeypatch):
+        source, cache_dir = video
+        probes, writers = [], []
+        real_probe, real_write = analyze.probe, jit_hls.atomic_write_text
+
+        async def counting_probe(path):
+            probes.append(path)
+            await asyncio.sleep(0.01)
+            return await real_probe(path)
+
+        def recording_write(path, text):
+            writers.append(threading.current_thread())
+            real_write(path, text)
+
+        monkeypatch.setattr(analyze, "probe", counting_probe)
+        monkeypatch.setattr(jit_hls, "atomic_write_text", recording_write)
+        first, second = await asyncio.gather(jit_hls.plan(source, cache_dir), jit_hls.plan(source, cache_dir))
+        assert first is second
+        assert len(probes) == 1
+        assert writers and threading.main_thread() not in writers
+        assert [p.name for p in cache_dir.iterdir()] == [jit_hls.PLAN_FILE]
+        assert not jit_hls._planning
+
+    @pytest.mark.asyncio
+    async def test_segments_reserve_staging_space(self, tmp_path, video, fake_probe, fake_ffmpeg, monkeypatch):
+        source, cache_dir = video
+        packaging = await jit_hls.plan(source, cache_dir)
+        # 6 s at the transcode cap, with headroom
+        assert jit_hls.segment_estimate(packaging, 0) == int(2_500_000 * 6 / 8 * 1.5)
+
+        space = StagingSpace(tmp_path, quota_bytes=1024 * 1024)
+        space.rebuild()
+        monkeypatch.setattr(staging_space, "_space", space)
+        with pytest.raises(StagingFull):
+            await jit_hls.segment(source, cache_dir, 0)
+        while jit_hls._inflight:
+            await asyncio.sleep(0.01)
+        assert fake_ffmpeg == []
+        assert space._reserved == 0
+
+    @pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg not installed")
+    @pytest.mark.asyncio
+    async def test_real_segment(self, tmp_path):
+        src = tmp_path / "upload" / "clip.mkv"
+        src.parent.mkdir()
+        code, _ = await transcode.run_ffmpeg([
+            "ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc=duration=8:size=640x360:rate=10",
+            "-c:v", "mpeg4", str(src),
+        ])
+        assert code == 0
+        path = await jit_hls.segment(src, tmp_path / "jit", 1)
+        assert path.stat().st_size > 0
+
+
+class TestRoute:
+
+    @pytest.fixture
+    def client(self, tmp_path, video, fake_probe, fake_ffmpeg):
+        return make_client(make_settings(str(tmp_path)))
+
+    def test_playlist_and_segment(self, client):
+        base = f"/staging/drafts/{DRAFT_ID}/clip.mov/hls"
+        playlist = client.get(f"{base}/index.m3u8?preview_token=x", headers=AUTH)
+        assert playlist.status_code == 200
+        assert playlist.headers["content-type"] == "application/vnd.apple.mpegurl"
+        assert "seg_00003.ts?preview_token=x" in playlist.text
+
+        segment = client.get(f"{base}/seg_00002.ts", headers=AUTH)
+        assert segment.status_code == 200
+        assert segment.headers["content-type"] == "video/mp2t"
+        assert client.get(f"{base}/seg_00009.ts", headers=AUTH).status_code == 404
+
+    def test_rejects_non_video_and_unknown_names(self, client):
+        base = f"/staging/drafts/{DRAFT_ID}"
+        assert client.get(f"{base}/clip.mov/hls/plan.json", headers=AUTH).status_code == 404
+        assert client.get(f"{base}/song.flac/hls/index.m3u8", headers=AUTH).status_code == 404
+        assert client.get(f"{base}/clip.mov/hls/index.m3u8").status_code == 401
+
+    def test_unmeasured_staging_is_retry_later_not_full(self, client, tmp_path, monkeypatch):
+        # Startup scan still running: no rebuild() yet
+        monkeypatch.setattr(staging_space, "_space", StagingSpace(tmp_path, quota_bytes=1024**3))
+        resp = client.get(f"/staging/drafts/{DRAFT_ID}/clip.mov/hls/seg_00000.ts", headers=AUTH)
+        assert resp.status_code == 503
+        assert resp.headers["retry-after"] == "30"
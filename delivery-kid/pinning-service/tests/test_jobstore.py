@@ -0,0 +1,86 @@
+"""Tests for app.services.jobstore — SQLite job persistence and JSON import."""
+
+import json
+
+from app.services.jobstore import JobStore
+
+
+class TestJobStore:
+
+    def test_put_get_roundtrip(self, tmp_path):
+        store = JobStore(tmp_path / "jobs.db")
+        store.put("a", {"id": "a", "status": "processing", "nested": {"x": 1}})
+        assert store.get("a") == {"id": "a", "status": "processing", "nested": {"x": 1}}
+        assert store.get("missing") is None
+
+    def test_wal_mode(self, tmp_path):
+        store = JobStore(tmp_path / "jobs.db")
+        mode = store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_filters_and_pagination(self, tmp_path):
+        store = JobStore(tmp_path / "jobs.db")
+        for i in range(10):
+            store.put(f"job-{i}", {
+                "id": f"job-{i}",
+                "status": "complete" if i % 2 else "failed",
+                "identity": "wiki:alice" if i < 5 else "wiki:bob",
+                "createdAt": f"2026-01-{i + 1:02d}T00:00:00+00:00",
+            })
+
+        newest = store.list(limit=3)
+        assert [j["id"] for j in newest] == ["job-9", "job-8", "job-7"]
+        assert [j["id"] for j in store.list(limit=3, offset=3)] == ["job-6", "job-5", "job-4"]
+
+        complete = store.list(status="complete")
+        assert {j["id"] for j in complete} == {"job-1", "job-3", "job-5", "job-7", "job-9"}
+        assert store.count(status="complete", identity="wiki:alice") == 2
+        assert store.count(status={"complete", "failed"}) == 10
+
+    def test_update_is_read_modify_write(self, tmp_path):
+        store = JobStore(tmp_path / "jobs.db")
+        store.put("a", {"id": "a", "status": "processing", "createdAt": "2026-01-01"})
+
+        updated = store.update("a", lambda job: job.update(status="received"))
+        assert updated["status"] == "received"
+        assert store.get("a")["status"] == "received"
+
+        # SKIP leaves the row alone
+        store.update("a", lambda job: JobStore.SKIP)
+        assert store.get("a")["status"] == "received"
+
+        assert store.update("missing", lambda job: None) is None
+
+    def test_update_preserves_created_at(self, tmp_path):
+        store = JobStore(tmp_path / "jobs.db")
+        store.put("a", {"id": "a"})
+        store.put("b", {"id": "b"})
+        # Rewriting "a" must not make it look newer than "b"
+        store.update("a", lambda job: job.update(status="complete"))
+        assert [j["id"] for j in store.list()] == ["b", "a"]
+
+    def test_imports_legacy_json_once(self, tmp_path):
+        jobs_dir = tmp_path / "jobs"
+        jobs_dir.mkdir()
+        (jobs_dir / "old-1.json").write_text(json.dumps({"id": "old-1", "status": "complete"}))
+        (jobs_dir / "old-2.json").write_text(json.dumps({"id": "old-2", "status": "failed"}))
+        (jobs_dir / "broken.json").write_text("{not json")
+
+        store = JobStore(tmp_path / "jobs.db")
+        assert store.import_json_dir(jobs_dir) == 2
+        assert store.get("old-1")["status"] == "complete"
+
+        # Second run is a no-op even if files reappear
+        (jobs_dir / "old-3.json").write_text(json.dumps({"id": "old-3"}))
+        assert store.import_json_dir(jobs_dir) == 0
+        assert store.get("old-3") is None
+
+    def test_import_does_not_clobber_newer_rows(self, tmp_path):
+        jobs_dir = tmp_path / "jobs"
+        jobs_dir.mkdir()
+        (jobs_dir / "a.json").write_text(json.dumps({"id": "a", "status": "processing"}))
+
+        store = JobStore(tmp_path / "jobs.db")
+        store.put("a", {"id": "a", "status": "complete"})
+        store.import_json_dir(jobs_dir)
+        assert store.get("a")["status"] == "complete"
@@ -0,0 +1,197 @@
+"""Tests for app.services.media_assets — waveform peaks and thumbnail sprites."""
+
+import json
+import os
+import shutil
+from array import array
+
+import pytest
+
+from app.services import media_assets
+from app.services.media_assets import PeakAccumulator
+from tests.test_staging import make_client, make_settings
+
+DRAFT_ID = "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee"
+AUTH = {"X-API-Key": "test-secret"}
+
+
+def pcm(*samples: int) -> bytes:
+    return array("h", samples).tobytes()
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """An ffmpeg on PATH that prints two samples of PCM, or writes a sprite."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = tmp_path / "ffmpeg.log"
+    script = bin_dir / "ffmpeg"
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$*\" >> {log}\n"
+        'case "$*" in\n'
+        "  *s16le*) printf '\\000\\100\\000\\300' ;;\n"
+        '  *) for last; do :; done; printf jpg > "$last" ;;\n'
+        "esac\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return lambda: log.read_text().splitlines() if log.exists() else []
+
+
+@pytest.fixture
+def draft(tmp_path):
+    draft_dir = tmp_path / "drafts" / DRAFT_ID
+    (draft_dir / "upload").mkdir(parents=True)
+    (draft_dir / "upload" / "song.flac").write_bytes(b"\0" * 10)
+    (draft_dir / "upload" / "clip.mp4").write_bytes(b"\0" * 20)
+    (draft_dir / "draft.json").write_text(json.dumps({"files": [
+        {"original_filename": "song.flac", "media_type": "audio", "duration_seconds": 1.0},
+        {"original_filename": "clip.mp4", "media_type": "video", "duration_seconds": 30.0,
+         "width": 1920, "height": 1080, "audio_codec": "aac"},
+        {"original_filename": "cover.jpg", "media_type": "image", "duration_seconds": None},
+    ]}))
+    return draft_dir
+
+
+class TestPeaks:
+
+    def test_min_max_per_bucket(self):
+        acc = PeakAccumulator(3)
+        acc.feed(pcm(100, -32768, 5000, 32767, 0, -256, 1024))
+        peaks = array("b", acc.finish())
+        assert peaks.tolist() == [-128, 19, -1, 127, 4, 4]
+
+    def test_samples_split_across_chunks(self):
+        data = pcm(*range(-1000, 1000, 7))
+        whole = PeakAccumulator(50)
+        whole.feed(data)
+        split = PeakAccumulator(50)
+        for i in range(0, len(data), 33):  # odd sizes cut samples in half
+            split.feed(data[i:i + 33])
+        assert split.finish() == whole.finish()
+
+
+class TestThumbnails:
+
+    def test_layout(self):
+        short = media_assets.thumbnail_layout(30.0, 1920, 1080)
+        assert (short["interval"], short["count"], short["columns"], short["rows"]) == (2.0, 15, 10, 2)
+        assert (short["width"], short["height"]) == (160, 90)
+
+        long = media_assets.thumbnail_layout(3600.0, 1080, 1920)
+        assert (long["interval"], long["count"]) == (36.0, 100)
+        assert long["height"] == 284
+
+    def test_vtt_cues_point_at_tiles(self):
+        layout = media_assets.thumbnail_layout(25.0, 1920, 1080)
+        vtt = media_assets.build_vtt(layout, "thumbnails.jpg?token=t").splitlines()
+        assert vtt[0] == "WEBVTT"
+        assert vtt[2:4] == ["00:00:00.000 --> 00:00:02.000", "thumbnails.jpg?token=t#xywh=0,0,160,90"]
+        assert "thumbnails.jpg?token=t#xywh=0,90,160,90" in vtt
+        assert vtt[-2:] == ["00:00:24.000 --> 00:00:25.000", "thumbnails.jpg?token=t#xywh=320,90,160,90"]
+
+
+class TestGenerate:
+
+    @pytest.mark.asyncio
+    async def test_generates_and_reuses_assets(self, draft, fake_ffmpeg):
+        files = media_assets._media_files(draft)
+        assert [f["original_filename"] for f in files] == ["song.flac", "clip.mp4"]
+
+        index = await media_assets.generate_assets(draft, files)
+        song, clip = index["files"]["song.flac"], index["files"]["clip.mp4"]
+        assert song["waveform"]["peaks"] == 1
+        assert array("b", (draft / "assets" / "song.flac.peaks").read_bytes()).tolist() == [-64, 64]
+        assert "thumbnails" not in song
+        assert clip["thumbnails"]["count"] == 15
+        assert (draft / "assets" / "clip.mp4.sprite.jpg").read_bytes() == b"jpg"
+        assert media_assets.load_index(draft) == index
+        runs = len(fake_ffmpeg())
+        assert runs == 3
+
+        # Unchanged sources aren't redone; replaced ones are, removed ones pruned
+        (draft / "upload" / "song.flac").write_bytes(b"\0" * 11)
+        index = await media_assets.generate_assets(draft, files[:1])
+        assert len(fake_ffmpeg()) == runs + 1
+        assert list(index["files"]) == ["song.flac"]
+        assert not (draft / "assets" / "clip.mp4.sprite.jpg").exists()
+
+    @pytest.mark.asyncio
+    async def test_failure_is_recorded_per_file(self, draft, tmp_path, monkeypatch):
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        (bin_dir / "ffmpeg").write_text("#!/bin/sh\necho broken >&2\nexit 1\n")
+        (bin_dir / "ffmpeg").chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+        index = await media_assets.generate_assets(draft, media_assets._media_files(draft))
+        assert "broken" in index["files"]["song.flac"]["error"]
+        assert "broken" in index["files"]["clip.mp4"]["error"]
+
+    @pytest.mark.asyncio
+    async def test_deleted_draft_is_not_recreated(self, draft, monkeypatch):
+        files = media_assets._media_files(draft)
+
+        async def delete_draft(source, out, duration):
+            shutil.rmtree(draft)
+            raise OSError("gone")
+
+        monkeypatch.setattr(media_assets, "compute_waveform", delete_draft)
+        index = await media_assets.generate_assets(draft, files)
+        assert list(index["files"]) == ["song.flac"]
+        assert not draft.exists()
+
+        assert await media_assets.generate_assets(draft, files) == {"files": {}}
+        assert not draft.exists()
+
+    @pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg not installed")
+    @pytest.mark.asyncio
+    async def test_real_sprite(self, tmp_path):
+        from app.services import transcode
+        src = tmp_path / "clip.mp4"
+        code, _ = await transcode.run_ffmpeg([
+            "ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc=duration=10:size=320x180:rate=10",
+            "-c:v", "libx264", "-g", "20", "-pix_fmt", "yuv420p", str(src),
+        ])
+        assert code == 0
+        layout = media_assets.thumbnail_layout(10.0, 320, 180)
+        result = await media_assets.compute_thumbnails(src, tmp_path / "sprite.jpg", layout)
+        assert result["bytes"] > 0
+
+
+class TestAssetRoutes:
+
+    @pytest.fixture
+    def client(self, draft, fake_ffmpeg, tmp_path):
+        import asyncio
+        asyncio.run(media_assets.generate_assets(draft, media_assets._media_files(draft)))
+        return make_client(make_settings(str(tmp_path)))
+
+    def test_index_and_files(self, client):
+        index = client.get(f"/staging/drafts/{DRAFT_ID}/assets", headers=AUTH).json()
+        assert set(index["files"]) == {"song.flac", "clip.mp4"}
+
+        peaks = client.get(f"/staging/drafts/{DRAFT_ID}/assets/song.flac/peaks", headers=AUTH)
+        assert peaks.status_code == 200
+        assert peaks.headers["content-type"] == "application/octet-stream"
+        assert peaks.content == array("b", [-64, 64]).tobytes()
+
+        sprite = client.get(f"/staging/drafts/{DRAFT_ID}/assets/clip.mp4/thumbnails.jpg", headers=AUTH)
+        assert sprite.headers["content-type"] == "image/jpeg"
+
+    def test_vtt_carries_query_auth_to_sprite(self, client, draft):
+        data = json.loads((draft / "draft.json").read_text())
+        (draft / "draft.json").write_text(json.dumps({**data, "preview_token": "tok"}))
+        resp = client.get(f"/staging/drafts/{DRAFT_ID}/assets/clip.mp4/thumbnails.vtt?preview_token=tok")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/vtt")
+        assert "thumbnails.jpg?preview_token=tok#xywh=0,0,160,90" in resp.text
+
+    def test_missing_unknown_and_unauthenticated(self, client):
+        base = f"/staging/drafts/{DRAFT_ID}/assets"
+        assert client.get(f"{base}/song.flac/thumbnails.vtt", headers=AUTH).status_code == 404
+        assert client.get(f"{base}/other.flac/peaks", headers=AUTH).status_code == 404
+        assert client.get(f"{base}/song.flac/draft.json", headers=AUTH).status_code == 404
+        assert client.get(f"{base}/song.flac/peaks").status_code == 401
+        assert client.get(base).status_code == 401
@@ -124,3 +124,134 @@ class TestStagingEndpoint:
             f"?token=badtoken&user=TestUser&timestamp=1234567890000",
         )
         assert resp.status_code == 401
+
+    def test_preview_token_auth_follows_draft_json(self, staging_dir):
+        """preview_token is checked via the draft cache; a rewrite must be seen."""
+        import json
+
+        tmp_path, draft_id = staging_dir
+        client = make_client(make_settings(str(tmp_path)))
+        draft_json = tmp_path / "drafts" / draft_id / "draft.json"
+        draft_json.write_text(json.dumps({"draft_type": "content", "preview_token": "tok-1"}))
+        url = f"/staging/drafts/{draft_id}/test-video.mp4?preview_token="
+
+        assert client.get(url + "tok-1").status_code == 200
+        assert client.get(url + "tok-1").status_code == 200
+        assert client.get(url + "wrong").status_code == 401
+
+        draft_json.write_text(json.dumps({"draft_type": "content", "preview_token": "tok-22"}))
+        assert client.get(url + "tok-1").status_code == 401
+        assert client.get(url + "tok-22").status_code == 200
+
+
+class TestSignedUrls:
+
+    def test_sign_then_fetch_without_other_auth(self, staging_dir):
+        tmp_path, draft_id = staging_dir
+        client = make_client(make_settings(str(tmp_path)))
+        assert client.post(f"/staging/drafts/{draft_id}/sign").status_code == 401
+
+        signed = client.post(f"/staging/drafts/{draft_id}/sign", headers=_auth_headers()).json()
+        assert signed["expires"] % 300 == 0
+        resp = client.get(f"/staging/drafts/{draft_id}/test-video.mp4?{signed['query']}")
+        assert resp.status_code == 200
+        assert resp.headers["cache-control"].startswith("private, max-age=")
+
+    def test_signature_is_scoped_and_expires(self, staging_dir):
+        import time
+
+        from app.auth import sign_staging_url
+
+        tmp_path, draft_id = staging_dir
+        client = make_client(make_settings(str(tmp_path)))
+        url = f"/staging/drafts/{draft_id}/test-video.mp4"
+
+        past = int(time.time()) - 1
+        sig = sign_staging_url("test-secret", draft_id, past)
+        assert client.get(f"{url}?expires={past}&sig={sig}").status_code == 401
+
+        future = int(time.time()) + 600
+        other = sign_staging_url("test-secret", "some-other-draft", future)
+        assert client.get(f"{url}?expires={future}&sig={other}").status_code == 401
+        sig = sign_staging_url("test-secret", draft_id, future)
+        assert client.get(f"{url}?expires={future + 1}&sig={sig}").status_code == 401
+        assert client.get(f"{url}?expires={future}&sig={sig}").status_code == 200
+
+    def test_non_ascii_credentials_are_rejected(self, staging_dir):
+        import time
+
+        tmp_path, draft_id = staging_dir
+        client = make_client(make_settings(str(tmp_path)))
+        url = f"/staging/drafts/{draft_id}/test-video.mp4"
+        future = int(time.time()) + 600
+        ts = int(time.time() * 1000)
+
+        assert client.get(url, params={"expires": future, "sig": "é" * 64}).status_code == 401
+        assert client.get(url, params={"token": "é" * 64, "user": "TestUser", "timestamp": ts}).status_code == 401
+
+
+class TestRanges:
+
+    @pytest.fixture
+    def client(self, staging_dir):
+        tmp_path, draft_id = staging_dir
+        (tmp_path / "drafts" / draft_id / "upload" / "test-video.mp4").write_bytes(bytes(range(256)) * 4)
+        return make_client(make_settings(str(tmp_path))), f"/staging/drafts/{draft_id}/test-video.mp4"
+
+    def test_single_range(self, client):
+        client, url = client
+        resp = client.get(url, headers={**_auth_headers(), "Range": "bytes=10-19"})
+        assert resp.status_code == 206
+        assert resp.headers["content-range"] == "bytes 10-19/1024"
+        assert resp.content == bytes(range(10, 20))
+
+        tail = client.get(url, headers={**_auth_headers(), "Range": "bytes=-6"})
+        assert tail.content == bytes(range(250, 256))
+        open_ended = client.get(url, headers={**_auth_headers(), "Range": "bytes=1000-"})
+        assert open_ended.headers["content-range"] == "bytes 1000-1023/1024"
+
+    def test_unsatisfiable_and_ignored_ranges(self, client):
+        client, url = client
+        past = client.get(url, headers={**_auth_headers(), "Range": "bytes=2000-"})
+        assert past.status_code == 416
+        assert past.headers["content-range"] == "bytes */1024"
+        multi = client.get(url, headers={**_auth_headers(), "Range": "bytes=0-1,5-6"})
+        assert multi.status_code == 200
+        assert len(multi.content) == 1024
+
+    def test_conditional_requests(self, client):
+        client, url = client
+        first = client.get(url, headers=_auth_headers())
+        etag, modified = first.headers["etag"], first.headers["last-modified"]
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        assert client.get(url, headers={**_auth_headers(), "If-None-Match": etag}).status_code == 304
+        assert client.get(url, headers={**_auth_headers(), "If-Modified-Since": modified}).status_code == 304
+        assert client.get(url, headers={**_auth_headers(), "If-None-Match": '"other"'}).status_code == 200
+
+        fresh = client.get(url, headers={**_auth_headers(), "Range": "bytes=0-3", "If-Range": etag})
+        assert fresh.status_code == 206
+        stale = client.get(url, headers={**_auth_headers(), "Range": "bytes=0-3", "If-Range": '"old"'})
+        assert stale.status_code == 200
+        assert len(stale.content) == 1024
+
+
+@pytest.mark.asyncio
+async def test_zerocopy_extension_used_when_offered(tmp_path):
+    """Servers offering http.response.zerocopy get the file handle, not bytes."""
+    from app.services.ranged_file import RangedFileResponse
+
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"x" * 100)
+    sent = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopy":
+            message = {**message, "file": message["file"].name}
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(b"range", b"bytes=10-59")],
+             "extensions": {"http.response.zerocopy": {}}}
+    await RangedFileResponse(path, path.stat())(scope, None, send)
+    assert sent[0]["status"] == 206
+    assert sent[1] == {"type": "http.response.zerocopy", "file": str(path), "offset": 10, "count": 50}
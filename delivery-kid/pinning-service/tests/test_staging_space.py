@@ -0,0 +1,154 @@
+"""Tests for app.services.staging_space — the staging quota accountant."""
+
+import asyncio
+import shutil
+
+import pytest
+
+from app.services import draft_events, staging_space, trash
+from app.services.staging_space import StagingFull, StagingNotReady, StagingSpace, init_staging_space
+from tests.test_staging import make_client, make_settings
+
+
+def write(path, nbytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * nbytes)
+
+
+@pytest.fixture
+def staging(tmp_path):
+    write(tmp_path / "drafts" / "d1" / "upload" / "a.flac", 1000)
+    write(tmp_path / "drafts" / "d1" / "draft.json", 24)
+    write(tmp_path / "originals" / "d0" / "a.wav", 500)
+    write(tmp_path / "hls-job1" / "720p" / "seg0.ts", 300)
+    write(tmp_path / "seeding" / "bafy" / "big.flac", 10_000)
+    return tmp_path
+
+
+class TestAccounting:
+
+    def test_rebuild_breaks_down_by_category(self, staging):
+        space = StagingSpace(staging, quota_bytes=0)
+        assert space.rebuild() == 1824
+        usage = space.usage()
+        assert usage["categories"]["drafts"] == {"bytes": 1024, "entries": 1}
+        assert usage["categories"]["originals"]["bytes"] == 500
+        assert usage["categories"]["jobs"]["bytes"] == 300
+        assert usage["largest"][0] == {"path": "drafts/d1", "bytes": 1024}
+        assert usage["available_bytes"] is None
+
+    def test_incremental_updates(self, staging):
+        space = StagingSpace(staging, quota_bytes=0)
+        space.rebuild()
+
+        write(staging / "drafts" / "d1" / "upload" / "b.flac", 76)
+        space.record_write(staging / "drafts" / "d1" / "upload" / "b.flac", 76)
+        assert space.used_bytes == 1900
+
+        space.remove_tree(staging / "drafts" / "d1" / "upload")
+        assert space.usage()["categories"]["drafts"]["bytes"] == 24
+
+        shutil.rmtree(staging / "hls-job1")
+        space.forget(staging / "hls-job1")
+        assert space.usage()["categories"]["jobs"]["entries"] == 0
+
+        # ffmpeg-style external write, picked up by remeasure
+        write(staging / "originals" / "d0" / "b.wav", 100)
+        space.remeasure(staging / "originals" / "d0")
+        assert space.usage()["categories"]["originals"]["bytes"] == 600
+
+        # Paths outside staging (and seeding/) are ignored
+        space.record_write(staging.parent / "elsewhere", 10**9)
+        space.record_write(staging / "seeding" / "x", 10**9)
+        assert space.used_bytes == 624
+
+    def test_deleted_drafts_are_dropped_via_draft_events(self, staging):
+        space = init_staging_space(staging, quota_gb=0)
+        space.rebuild()
+        shutil.rmtree(staging / "drafts" / "d1")
+        draft_events.notify(staging / "drafts" / "d1")
+        assert space.usage()["categories"]["drafts"]["entries"] == 0
+
+
+    def test_partial_remove_is_released_by_the_reaper(self, staging, monkeypatch):
+        space = StagingSpace(staging, quota_bytes=0)
+        space.rebuild()
+        reaper = trash.Trash(staging)
+        monkeypatch.setattr(trash, "_trash", reaper)
+        monkeypatch.setattr(staging_space, "tree_stats", lambda path: pytest.fail("walked inline"))
+
+        space.remove_tree(staging / "drafts" / "d1" / "upload")
+        assert not (staging / "drafts" / "d1" / "upload").exists()
+        assert space.used_bytes == 1824  # not yet reaped
+        asyncio.run(reaper.reap())
+        assert space.usage()["categories"]["drafts"]["bytes"] == 24
+
+
+class TestQuota:
+
+    def test_reserve_rejects_before_writing(self, staging):
+        space = StagingSpace(staging, quota_bytes=2000)
+        space.rebuild()  # 1824 used
+
+        with space.reserve(100):
+            # Reserved bytes count against concurrent uploads
+            with pytest.raises(StagingFull):
+                with space.reserve(100):
+                    pass
+        with space.reserve(176):
+            pass
+        with pytest.raises(StagingFull) as exc:
+            with space.reserve(177):
+                pass
+        assert exc.value.available == 176
+        assert space.usage()["reserved_bytes"] == 0
+
+
+    def test_reserve_refuses_until_first_scan(self, staging):
+        space = StagingSpace(staging, quota_bytes=500)  # 1824 already on disk
+        with pytest.raises(StagingNotReady):
+            with space.reserve(400):
+                pass
+        space.rebuild()
+        with pytest.raises(StagingFull) as exc:
+            with space.reserve(400):
+                pass
+        assert not isinstance(exc.value, StagingNotReady)
+
+    def test_changes_during_scan_are_merged(self, staging, monkeypatch):
+        space = StagingSpace(staging, quota_bytes=0)
+        real_tree_stats = staging_space.tree_stats
+
+        def scan_with_concurrent_writes(path):
+            result = real_tree_stats(path)
+            if path == staging / "drafts" / "d1":
+                # An upload lands in d1 after the scan measured it ...
+                space.record_write(path / "upload" / "b.flac", 76)
+                # ... and a job dir is deleted before the scan reaches it
+                shutil.rmtree(staging / "hls-job1")
+                space.forget(staging / "hls-job1")
+            return result
+
+        monkeypatch.setattr(staging_space, "tree_stats", scan_with_concurrent_writes)
+        assert space.rebuild() == 1824 + 76 - 300
+        assert space.usage()["largest"][0] == {"path": "drafts/d1", "bytes": 1100}
+        assert space.usage()["categories"]["jobs"]["entries"] == 0
+
+
+class TestUsageEndpoint:
+
+    def test_reports_usage_against_quota(self, staging):
+        space = init_staging_space(staging, quota_gb=1)
+        space.rebuild()
+        client = make_client(make_settings(str(staging)))
+        resp = client.get("/staging/usage", headers={"X-API-Key": "test-secret"})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["used_bytes"] == 1824
+        assert body["available_bytes"] == 1024**3 - 1824
+
+    def test_503_before_init(self, staging, monkeypatch):
+        monkeypatch.setattr(staging_space, "_space", None)
+        client = make_client(make_settings(str(staging)))
+        resp = client.get("/staging/usage", headers={"X-API-Key": "test-secret"})
+        assert resp.status_code == 503
@@ -0,0 +1,251 @@
+"""Tests for app.services.task_queue — durable finalize task queue."""
+
+import asyncio
+import json
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.routes.tasks import router
+from app.services import task_queue
+from app.services.task_queue import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, TaskQueue
+from tests.test_staging import make_settings
+
+AUTH = {"X-API-Key": "test-secret"}
+
+
+@pytest.fixture
+def kinds(monkeypatch):
+    """Isolated handler registry; returns it for tests to fill."""
+    registry = {}
+    monkeypatch.setattr(task_queue, "_handlers", registry)
+    return registry
+
+
+async def wait_for_status(queue, task_id, status, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if queue.get(task_id)["status"] == status:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{task_id} is {queue.get(task_id)['status']}, not {status}")
+
+
+class TestTaskQueue:
+
+    @pytest.mark.asyncio
+    async def test_priority_then_fifo(self, tmp_path, kinds):
+        ran = []
+
+        async def record(task, publish):
+            ran.append(task.payload["n"])
+
+        kinds["record"] = record
+        queue = TaskQueue(tmp_path / "tasks.db", workers=1)
+        queue.submit("record", {"n": 1}, priority=PRIORITY_BACKGROUND)
+        queue.submit("record", {"n": 2}, priority=PRIORITY_BACKGROUND)
+        last = queue.submit("record", {"n": 3}, priority=PRIORITY_INTERACTIVE)
+        assert queue.position(last["id"]) == 0
+
+        queue.start()
+        try:
+            for task in queue.list():
+                await wait_for_status(queue, task["id"], "done")
+        finally:
+            await queue.stop()
+        assert ran == [3, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_background_tasks_leave_a_worker_free(self, tmp_path, kinds):
+        release = asyncio.Event()
+
+        async def slow(task, publish):
+            await release.wait()
+
+        async def quick(task, publish):
+            pass
+
+        kinds["slow"] = slow
+        kinds["quick"] = quick
+        queue = TaskQueue(tmp_path / "tasks.db", workers=2)
+        first = queue.submit("slow", {}, priority=PRIORITY_BACKGROUND)
+        second = queue.submit("slow", {}, priority=PRIORITY_BACKGROUND)
+        queue.start()
+        try:
+            await wait_for_status(queue, first["id"], "running")
+            await asyncio.sleep(0.05)
+            assert queue.get(second["id"])["status"] == "queued"
+
+            urgent = queue.submit("quick", {}, priority=PRIORITY_INTERACTIVE)
+            await wait_for_status(queue, urgent["id"], "done")
+
+            release.set()
+            await wait_for_status(queue, second["id"], "done")
+        finally:
+            await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_follow_streams_frames_until_done(self, tmp_path, kinds):
+        release = asyncio.Event()
+
+        async def steps(task, publish):
+            publish({"event": "progress", "data": json.dumps({"progress": 50})})
+            await release.wait()
+            publish({"event": "complete", "data": json.dumps({"cid": "bafy"})})
+
+        kinds["steps"] = steps
+        queue = TaskQueue(tmp_path / "tasks.db", workers=1)
+        task = queue.submit("steps", {})
+        queue.start()
+        try:
+            frames = []
+            async for frame in queue.follow(task["id"]):
+                frames.append(frame)
+                if frame["event"] == "progress":
+                    release.set()
+        finally:
+            await queue.stop()
+        # Followed before a worker picked it up, so it was queued at first
+        assert [f["event"] for f in frames] == ["task", "queued", "progress", "complete"]
+        assert queue.get(task["id"])["last_event"]["event"] == "complete"
+
+    def test_one_active_task_per_draft(self, tmp_path, kinds):
+        queue = TaskQueue(tmp_path / "tasks.db")
+        first = queue.submit("finalize", {"try": 1}, draft_id="d1")
+        again = queue.submit("finalize", {"try": 2}, draft_id="d1")
+        other = queue.submit("finalize", {}, draft_id="d2")
+        assert again["id"] == first["id"]
+        assert again["payload"] == {"try": 1}
+        assert other["id"] != first["id"]
+
+    @pytest.mark.asyncio
+    async def test_cancel_queued_and_running(self, tmp_path, kinds):
+        started = asyncio.Event()
+        seen = {}
+
+        async def forever(task, publish):
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                seen["cancelled"] = task.cancelled
+                raise
+
+        kinds["forever"] = forever
+        queue = TaskQueue(tmp_path / "tasks.db", workers=1)
+        running = queue.submit("forever", {})
+        waiting = queue.submit("forever", {})
+        queue.start()
+        try:
+            await asyncio.wait_for(started.wait(), 5)
+            assert queue.cancel(waiting["id"])["status"] == "cancelled"
+            queue.cancel(running["id"])
+            await wait_for_status(queue, running["id"], "cancelled")
+        finally:
+            await queue.stop()
+        assert seen == {"cancelled": True}
+        assert queue.get(running["id"])["last_event"]["event"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_shutdown_leaves_task_for_recover(self, tmp_path, kinds):
+        started = asyncio.Event()
+        attempts = []
+
+        async def resumable(task, publish):
+            attempts.append((task.attempts, task.cancelled))
+            if task.attempts == 1:
+                started.set()
+                await asyncio.sleep(3600)
+
+        kinds["resumable"] = resumable
+        db = tmp_path / "tasks.db"
+        queue = TaskQueue(db, workers=1)
+        task = queue.submit("resumable", {})
+        queue.start()
+        await asyncio.wait_for(started.wait(), 5)
+        await queue.stop()
+        queue.close()
+        assert TaskQueue(db).get(task["id"])["status"] == "running"
+
+        restarted = TaskQueue(db, workers=1)
+        assert restarted.recover() == 1
+        restarted.start()
+        try:
+            await wait_for_status(restarted, task["id"], "done")
+        finally:
+            await restarted.stop()
+        assert attempts == [(1, False), (2, False)]
+
+    def test_recover_gives_up_after_max_attempts(self, tmp_path, kinds):
+        queue = TaskQueue(tmp_path / "tasks.db")
+        task = queue.submit("flaky", {})
+        queue._set(task["id"], status="running", attempts=task_queue.MAX_ATTEMPTS)
+        assert queue.recover() == 0
+        assert queue.get(task["id"])["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_handler_error_fails_the_task(self, tmp_path, kinds):
+        async def broken(task, publish):
+            raise RuntimeError("disk full")
+
+        kinds["broken"] = broken
+        queue = TaskQueue(tmp_path / "tasks.db", workers=1)
+        task = queue.submit("broken", {})
+        unknown = queue.submit("nobody-handles-this", {})
+        queue.start()
+        try:
+            await wait_for_status(queue, task["id"], "failed")
+            await wait_for_status(queue, unknown["id"], "failed")
+        finally:
+            await queue.stop()
+        assert queue.get(task["id"])["error"] == "disk full"
+
+    @pytest.mark.asyncio
+    async def test_handler_error_frame_fails_the_task(self, tmp_path, kinds):
+        async def reports(task, publish):
+            frame = {"event": "error", "data": json.dumps({"message": "pin failed"})}
+            publish(frame)
+            raise task_queue.TaskFailed(task_queue.error_message(frame))
+
+        kinds["reports"] = reports
+        queue = TaskQueue(tmp_path / "tasks.db", workers=1)
+        task = queue.submit("reports", {})
+        queue.start()
+        try:
+            frames = [frame async for frame in queue.follow(task["id"])]
+        finally:
+            await queue.stop()
+        row = queue.get(task["id"])
+        assert (row["status"], row["error"]) == ("failed", "pin failed")
+        assert [f["event"] for f in frames] == ["task", "queued", "error"]  # no second error frame
+
+
+class TestTaskRoutes:
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        test_app = FastAPI()
+        test_app.include_router(router)
+        test_app.dependency_overrides[get_settings] = lambda: make_settings(str(tmp_path))
+        return TestClient(test_app)
+
+    def test_503_without_queue(self, client, monkeypatch):
+        monkeypatch.setattr(task_queue, "_queue", None)
+        assert client.get("/tasks", headers=AUTH).status_code == 503
+
+    def test_status_and_cancel(self, client, tmp_path, kinds, monkeypatch):
+        queue = TaskQueue(tmp_path / "tasks.db")
+        monkeypatch.setattr(task_queue, "_queue", queue)
+        task = queue.submit("album-finalize", {"draft_id": "d1"}, draft_id="d1")
+
+        listing = client.get("/tasks", headers=AUTH).json()
+        assert listing["queued"] == 1
+        assert [t["id"] for t in listing["tasks"]] == [task["id"]]
+        assert client.get(f"/tasks/{task['id']}", headers=AUTH).json()["status"] == "queued"
+
+        cancelled = client.delete(f"/tasks/{task['id']}", headers=AUTH)
+        assert cancelled.json()["status"] == "cancelled"
+        assert client.get("/tasks/nope", headers=AUTH).status_code == 404
+        assert client.get(f"/tasks/{task['id']}", headers={}).status_code == 401
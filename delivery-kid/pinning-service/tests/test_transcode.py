@@ -0,0 +1,224 @@
+"""Tests for app.services.transcode."""
+
+import asyncio
+import shutil
+import struct
+import wave
+
+import pytest
+
+from app.services import transcode
+
+needs_ffmpeg = pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg not installed")
+
+TAGS = {"ARTIST": "Justin Holmes", "TITLE": "Blue Ridge Cabin Home", "TRACKNUMBER": "01"}
+
+
+@pytest.fixture
+def wav(tmp_path):
+    path = tmp_path / "track.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(b"".join(struct.pack("<hh", (i * 37) % 20000 - 10000, (i * 53) % 20000 - 10000)
+                               for i in range(44100 * 2)))
+    return path
+
+
+class TestWavFanOut:
+
+    @pytest.mark.asyncio
+    async def test_one_ffmpeg_run_with_per_output_tags(self, tmp_path, wav, monkeypatch):
+        calls = []
+
+        async def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            for arg in cmd:
+                if arg.endswith((".flac", ".ogg")):
+                    (tmp_path / arg).touch()
+            return 0, b""
+        monkeypatch.setattr(transcode, "run_ffmpeg", fake_run)
+        monkeypatch.setattr(transcode.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+
+        flac, ogg = tmp_path / "out" / "01.flac", tmp_path / "out" / "01.ogg"
+        result = await transcode.transcode_wav_to_flac_and_ogg(wav, flac, ogg, metadata=TAGS)
+
+        assert result.success and result.output_path == flac
+        (cmd,) = calls
+        assert cmd.count("-i") == 1
+        flac_at, ogg_at = cmd.index(str(flac)), cmd.index(str(ogg))
+        # Tags are output options of the OGG only
+        assert flac_at < cmd.index("TITLE=Blue Ridge Cabin Home") < ogg_at
+        assert "-metadata" not in cmd[:flac_at]
+
+    @needs_ffmpeg
+    @pytest.mark.asyncio
+    async def test_outputs_match_two_pass_byte_for_byte(self, tmp_path, wav):
+        two = tmp_path / "two-pass"
+        assert (await transcode.encode_flac(wav, two / "t.flac")).success
+        assert (await transcode.transcode_flac_to_ogg(wav, two / "t.ogg", metadata=TAGS)).success
+
+        one = tmp_path / "one-pass"
+        result = await transcode.transcode_wav_to_flac_and_ogg(wav, one / "t.flac", one / "t.ogg", metadata=TAGS)
+        assert result.success, result.error
+
+        assert (one / "t.flac").read_bytes() == (two / "t.flac").read_bytes()
+        assert (one / "t.ogg").read_bytes() == (two / "t.ogg").read_bytes()
+
+    @pytest.mark.asyncio
+    async def test_missing_input(self, tmp_path):
+        result = await transcode.transcode_wav_to_flac_and_ogg(
+            tmp_path / "nope.wav", tmp_path / "a.flac", tmp_path / "a.ogg")
+        assert not result.success
+        assert "not found" in result.error
+
+
+class TestProgress:
+
+    def test_parser_emits_one_report_per_block(self):
+        parser = transcode.ProgressParser(duration=120.0)
+        lines = [
+            "frame=240", "fps=47.9", "out_time_us=30000000", "out_time_ms=30000000",
+            "out_time=00:00:30.000000", "speed=2.00x", "progress=continue",
+            "fps=0.0", "out_time_us=N/A", "out_time=00:01:30.500000", "speed=N/A", "progress=end",
+        ]
+        reports = [r for r in map(parser.feed, lines) if r is not None]
+
+        first, last = reports
+        assert (first.out_time, first.speed, first.fps) == (30.0, 2.0, 47.9)
+        assert first.percent == 25.0
+        assert first.eta_seconds == 45.0
+        assert first.describe() == "25% · 2.0× · ~45s left"
+        # Falls back to the HH:MM:SS field; N/A speed is None
+        assert (last.out_time, last.speed, last.done, last.percent) == (90.5, None, True, 100.0)
+
+    def test_without_duration_reports_encoded_time(self):
+        report = transcode.FfmpegProgress(out_time=200.0, speed=1.5)
+        assert report.percent is None and report.eta_seconds is None
+        assert report.describe() == "200s encoded · 1.5×"
+
+    @pytest.mark.asyncio
+    async def test_run_ffmpeg_streams_reports_and_keeps_stderr(self, tmp_path):
+        fake = tmp_path / "ffmpeg"
+        fake.write_text(
+            "#!/bin/sh\n"
+            "[ \"$1\" = -progress ] && [ \"$2\" = pipe:1 ] || exit 9\n"
+            "echo 'out_time_us=5000000'; echo 'speed=1x'; echo 'progress=continue'\n"
+            "echo 'out_time_us=10000000'; echo 'speed=1x'; echo 'progress=end'\n"
+            "echo 'encoder noise' >&2\n"
+        )
+        fake.chmod(0o755)
+        reports = []
+
+        async def collect(report):
+            reports.append(report)
+
+        returncode, stderr = await transcode.run_ffmpeg([str(fake), "-i", "x"], on_progress=collect, duration=10)
+        assert returncode == 0
+        assert stderr == b"encoder noise\n"
+        assert [(r.percent, r.done) for r in reports] == [(50.0, False), (100.0, True)]
+
+    @pytest.mark.asyncio
+    async def test_feed_throttles_to_whole_percent_changes(self):
+        feed = transcode.ProgressFeed(heartbeat=3600)
+
+        async def encode():
+            for tenths in range(0, 31):
+                await feed.put(transcode.FfmpegProgress(out_time=tenths / 10, duration=100.0))
+                await asyncio.sleep(0.001)
+            return "done"
+
+        task = asyncio.create_task(encode())
+        seen = [int(r.percent) async for r in feed.follow(task)]
+        assert seen == sorted(set(seen))
+        assert set(seen) <= {0, 1, 2, 3}
+        assert await task == "done"
+
+
+class TestHlsLadder:
+
+    def test_ladder_never_upscales(self):
+        assert transcode.ladder_heights([480, 1080, 720, 720], 1080) == [1080, 720, 480]
+        assert transcode.ladder_heights([1080, 720, 480], 720) == [720, 480]
+        assert transcode.ladder_heights([2160, 1080], 541) == [540]
+        assert transcode.ladder_heights([720, 480], None) == [720, 480]
+
+    @pytest.mark.asyncio
+    async def test_one_decode_split_into_coconut_layout(self, tmp_path, monkeypatch):
+        src = tmp_path / "source.mov"
+        src.write_bytes(b"\0")
+        out = tmp_path / "hls"
+        calls = []
+
+        async def fake_probe(path):
+            if path == src:
+                return {"format": {"duration": "300.0", "size": "1"},
+                        "streams": [{"codec_type": "video", "codec_name": "prores", "height": 1080, "width": 1920},
+                                    {"codec_type": "audio", "codec_name": "pcm_s24le"}]}
+            return {"streams": [{"codec_type": "video", "codec_name": "h264", "height": 720}]}
+
+        async def fake_run(cmd, on_progress=None, duration=None):
+            calls.append((cmd, duration))
+            (out / "master.m3u8").write_text("#EXTM3U\n")
+            for h in (720, 480):
+                (out / f"{h}p" / "playlist.m3u8").write_text("#EXTM3U\n")
+                (out / f"{h}p" / "segment_000.ts").write_bytes(b"\0" * h)
+            return 0, b""
+
+        monkeypatch.setattr(transcode, "probe_video", fake_probe)
+        monkeypatch.setattr(transcode, "run_ffmpeg", fake_run)
+        monkeypatch.setattr(transcode.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+
+        result = await transcode.transcode_video_to_hls(src, out, trim_start=60, qualities=[720, 480])
+        assert result.success, result.error
+
+        (cmd, duration), = calls
+        assert duration == 240.0
+        assert cmd.count("-i") == 1
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert graph == "[0:v]split=2[s0][s1];[s0]scale=-2:720[v0];[s1]scale=-2:480[v1]"
+        assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,a:0,name:720p v:1,a:1,name:480p"
+        assert cmd[cmd.index("-master_pl_name") + 1] == "master.m3u8"
+        assert cmd[-1] == str(out / "%v" / "playlist.m3u8")
+
+        info = result.transcode_info
+        assert info["qualities"] == ["720p", "480p"]
+        assert info["variants"]["480p"] == {"size_bytes": 480, "segment_count": 1}
+        assert info["output_height"] == 720
+        assert info["output_width"] == 1280
+        assert info["output_audio_codec"] == "aac"
+
+    @pytest.mark.asyncio
+    async def test_upload_analysis_skips_probes(self, tmp_path, monkeypatch):
+        src = tmp_path / "source.mov"
+        src.write_bytes(b"\0")
+        out = tmp_path / "hls"
+
+        async def no_probe(path):
+            raise AssertionError(f"probed {path}")
+
+        async def fake_run(cmd, on_progress=None, duration=None):
+            (out / "master.m3u8").write_text("#EXTM3U\n")
+            (out / "segment_000.ts").write_bytes(b"\0")
+            return 0, b""
+
+        monkeypatch.setattr(transcode, "probe_video", no_probe)
+        monkeypatch.setattr(transcode, "run_ffmpeg", fake_run)
+        monkeypatch.setattr(transcode.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+
+        source = {"duration_seconds": 10.0, "video_codec": "vp9", "width": 640,
+                  "height": 360, "audio_codec": None}
+        result = await transcode.transcode_video_to_hls(src, out, source_info=source)
+        assert result.success, result.error
+
+        info = result.transcode_info
+        assert info["source"] == {"duration_seconds": 10.0, "video_codec": "vp9", "width": 640, "height": 360}
+        assert (info["output_width"], info["output_height"]) == (640, 360)
+        assert info["output_audio_codec"] is None
+
+    def test_silent_source_maps_video_only(self, tmp_path):
+        args = transcode._hls_ladder_args(tmp_path, [480], has_audio=False)
+        assert "0:a:0" not in args
+        assert args[args.index("-var_stream_map") + 1] == "v:0,name:480p"
+        assert (tmp_path / "480p").is_dir()
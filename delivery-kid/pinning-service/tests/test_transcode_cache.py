@@ -0,0 +1,118 @@
+"""Tests for app.services.transcode_cache."""
+
+import hashlib
+import os
+
+import pytest
+
+from app.services import transcode, transcode_cache
+from app.services.transcode_cache import TranscodeCache
+
+
+def make_hls(out, tag=b"x"):
+    (out / "720p").mkdir(parents=True)
+    (out / "master.m3u8").write_text("#EXTM3U\n")
+    (out / "720p" / "playlist.m3u8").write_text("#EXTM3U\n")
+    (out / "720p" / "segment_000.ts").write_bytes(tag * 1000)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "drafts" / "d1" / "upload" / "source.mov"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"video" * 1000)
+    return path
+
+
+class TestCache:
+
+    def test_round_trip_links_into_place(self, tmp_path, source):
+        cache = TranscodeCache(tmp_path, max_bytes=10**9)
+        key = cache.key_for(source, trim_start=None, trim_end=None, heights=[720])
+        out = tmp_path / "drafts" / "d1" / "output" / "hls"
+        make_hls(out)
+
+        assert cache.restore(key, tmp_path / "elsewhere") is None
+        cache.store(key, out, {"method": "local-ffmpeg"})
+
+        again = tmp_path / "drafts" / "d2" / "output" / "hls"
+        assert cache.restore(key, again) == {"method": "local-ffmpeg"}
+        assert (again / "720p" / "segment_000.ts").read_bytes() == b"x" * 1000
+        assert os.path.samefile(again / "master.m3u8", cache.cache_dir / key / "master.m3u8")
+        assert not (again / "entry.json").exists()
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_key_covers_source_bytes_and_output_params(self, tmp_path, source):
+        cache = TranscodeCache(tmp_path, max_bytes=10**9)
+        base = cache.key_for(source, trim_start=None, heights=[720, 480])
+        assert cache.key_for(source, trim_start=None, heights=[720, 480]) == base
+        assert cache.key_for(source, trim_start=5.0, heights=[720, 480]) != base
+        assert cache.key_for(source, trim_start=None, heights=[720]) != base
+
+        # Same bytes under another name hit; changed bytes don't
+        copy = tmp_path / "copy.mov"
+        copy.write_bytes(source.read_bytes())
+        assert cache.key_for(copy, trim_start=None, heights=[720, 480]) == base
+        source.write_bytes(b"other" * 1000)
+        assert cache.key_for(source, trim_start=None, heights=[720, 480]) != base
+
+    def test_upload_hash_skips_reading_the_source(self, tmp_path, source, monkeypatch):
+        cache = TranscodeCache(tmp_path, max_bytes=10**9)
+        base = cache.key_for(source, heights=[720])
+        digest = hashlib.sha256(source.read_bytes()).hexdigest()
+        monkeypatch.setattr(cache, "source_hash", lambda path: pytest.fail("source re-read"))
+        assert cache.key_for(source, digest, heights=[720]) == base
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = TranscodeCache(tmp_path, max_bytes=2500)
+        for i, key in enumerate(("a", "b", "c")):
+            out = tmp_path / f"out-{key}"
+            make_hls(out)
+            cache.store(key, out, {})
+            os.utime(cache.cache_dir / key, (1000 + i, 1000 + i))
+        # 3 × ~1.1 KB > 2.5 KB: "a" went when "c" arrived
+
+        assert [key for _, _, key in cache.entries()] == ["b", "c"]
+        cache.restore("b", tmp_path / "hit")  # b is now most recent
+        make_hls(tmp_path / "out-d")
+        cache.store("d", tmp_path / "out-d", {})
+        assert sorted(key for _, _, key in cache.entries()) == ["b", "d"]
+        assert cache.evictions == 2
+
+
+class TestTranscodeVideoToHls:
+
+    @pytest.mark.asyncio
+    async def test_second_identical_transcode_skips_ffmpeg(self, tmp_path, source, monkeypatch):
+        runs = []
+
+        async def fake_probe(path):
+            return {"format": {"duration": "10"}, "streams": [{"codec_type": "video", "height": 1080}]}
+
+        async def fake_run(cmd, on_progress=None, duration=None):
+            runs.append(cmd)
+            out = tmp_path / f"run{len(runs)}"
+            make_hls(out)
+            target = cmd[-1].replace("/%v/playlist.m3u8", "")
+            for p in out.rglob("*"):
+                dest = type(out)(target) / p.relative_to(out)
+                if p.is_dir():
+                    dest.mkdir(parents=True, exist_ok=True)
+                else:
+                    dest.write_bytes(p.read_bytes())
+            return 0, b""
+
+        monkeypatch.setattr(transcode, "probe_video", fake_probe)
+        monkeypatch.setattr(transcode, "run_ffmpeg", fake_run)
+        monkeypatch.setattr(transcode.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+        monkeypatch.setattr(transcode_cache, "_cache", TranscodeCache(tmp_path, max_bytes=10**9))
+
+        first = await transcode.transcode_video_to_hls(source, tmp_path / "o1", qualities=[720])
+        second = await transcode.transcode_video_to_hls(source, tmp_path / "o2", qualities=[720])
+        trimmed = await transcode.transcode_video_to_hls(source, tmp_path / "o3", qualities=[720], trim_start=2)
+
+        assert first.success and second.success and trimmed.success
+        assert len(runs) == 2
+        assert second.transcode_info["cache"] == "hit"
+        assert second.transcode_info["qualities"] == first.transcode_info["qualities"]
+        assert (tmp_path / "o2" / "720p" / "segment_000.ts").exists()
@@ -0,0 +1,102 @@
+"""Tests for app.services.transcode_scheduler."""
+
+import asyncio
+import sys
+from contextlib import aclosing
+
+import pytest
+
+from app.services import transcode
+from app.services.transcode_scheduler import TranscodeJob, TranscodeScheduler
+
+
+class Tracker:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    def job(self, name, delay):
+        async def run():
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.active -= 1
+            return name
+        return TranscodeJob(name, run)
+
+
+class TestScheduler:
+
+    @pytest.mark.asyncio
+    async def test_runs_up_to_slots_at_once_and_yields_as_finished(self):
+        tracker = Tracker()
+        scheduler = TranscodeScheduler(slots=2)
+        jobs = [tracker.job("slow", 0.15), tracker.job("fast", 0.01), tracker.job("third", 0.01)]
+
+        async with aclosing(scheduler.as_completed(jobs)) as results:
+            order = [job.name async for job, _ in results]
+
+        assert order == ["fast", "third", "slow"]
+        assert tracker.peak == 2
+        assert scheduler.status() == {"slots": 2, "running": 0, "waiting": 0, "completed": 3}
+
+    @pytest.mark.asyncio
+    async def test_failures_are_yielded_not_raised(self):
+        async def boom():
+            raise ValueError("bad input")
+        async def ok():
+            return "done"
+
+        scheduler = TranscodeScheduler(slots=1)
+        async with aclosing(scheduler.as_completed([TranscodeJob("a", boom), TranscodeJob("b", ok)])) as results:
+            out = {job.name: result async for job, result in results}
+        assert isinstance(out["a"], ValueError)
+        assert out["b"] == "done"
+
+    @pytest.mark.asyncio
+    async def test_closing_early_cancels_unfinished_jobs(self):
+        cancelled = []
+
+        def job(name, delay):
+            async def run():
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    cancelled.append(name)
+                    raise
+            return TranscodeJob(name, run)
+
+        scheduler = TranscodeScheduler(slots=2)
+        async with aclosing(scheduler.as_completed([job("a", 0), job("b", 10), job("c", 10)])) as results:
+            async for first, _ in results:
+                break
+        assert first.name == "a"
+        assert sorted(cancelled) == ["b", "c"]
+        assert scheduler.running == 0
+
+    def test_default_is_one_slot_per_core(self, monkeypatch):
+        monkeypatch.setattr("os.cpu_count", lambda: 6)
+        assert TranscodeScheduler().slots == 6
+
+
+class TestRunFfmpeg:
+
+    @pytest.mark.asyncio
+    async def test_cancellation_kills_the_process(self, monkeypatch):
+        procs = []
+        real_exec = asyncio.create_subprocess_exec
+
+        async def spy(*args, **kwargs):
+            proc = await real_exec(*args, **kwargs)
+            procs.append(proc)
+            return proc
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", spy)
+
+        task = asyncio.create_task(transcode.run_ffmpeg([sys.executable, "-c", "import time; time.sleep(30)"]))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert procs[0].returncode is not None
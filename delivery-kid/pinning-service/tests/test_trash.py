@@ -0,0 +1,99 @@
+"""Tests for app.services.trash — rename-then-reap deletion."""
+
+import asyncio
+
+import pytest
+
+from app.services import trash as trash_mod
+from app.services.trash import Trash
+
+
+def make_tree(path, files=3):
+    path.mkdir(parents=True)
+    for i in range(files):
+        (path / f"f{i}").write_bytes(b"\0" * 100)
+
+
+class TestDiscard:
+
+    def test_rename_is_immediate_reap_is_later(self, tmp_path):
+        draft_dir = tmp_path / "drafts" / "d1"
+        make_tree(draft_dir)
+        trash = Trash(tmp_path)
+
+        trash.discard(draft_dir)
+        assert not draft_dir.exists()
+        assert len(trash.pending()) == 1
+
+        assert asyncio.run(trash.reap()) == 1
+        assert trash.pending() == []
+        assert (trash.reaped, trash.reaped_bytes) == (1, 300)
+
+    def test_on_reaped_reports_size_after_delete(self, tmp_path):
+        make_tree(tmp_path / "drafts" / "d1" / "upload")
+        trash = Trash(tmp_path)
+        released = []
+        trash.discard(tmp_path / "drafts" / "d1" / "upload", on_reaped=released.append)
+        assert released == []
+        asyncio.run(trash.reap())
+        assert released == [300]
+
+    def test_same_name_twice_does_not_collide(self, tmp_path):
+        trash = Trash(tmp_path)
+        for _ in range(2):
+            make_tree(tmp_path / "drafts" / "d1")
+            trash.discard(tmp_path / "drafts" / "d1")
+        assert len(trash.pending()) == 2
+
+    def test_missing_path_is_a_no_op(self, tmp_path):
+        Trash(tmp_path).discard(tmp_path / "nope")
+        assert not (tmp_path / ".trash").exists()
+
+    def test_without_reaper_deletes_inline(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(trash_mod, "_trash", None)
+        make_tree(tmp_path / "d1")
+        trash_mod.discard(tmp_path / "d1")
+        assert not (tmp_path / "d1").exists()
+        assert not (tmp_path / ".trash").exists()
+
+
+class TestReaper:
+
+    @pytest.mark.asyncio
+    async def test_failures_back_off_and_are_counted(self, tmp_path, monkeypatch):
+        make_tree(tmp_path / "d1")
+        trash = Trash(tmp_path)
+        trash.discard(tmp_path / "d1")
+
+        def boom(path, *a, **kw):
+            raise RuntimeError("rmtree did not complete")
+        monkeypatch.setattr(trash_mod, "safe_rmtree", boom)
+        assert await trash.reap() == 0
+        assert trash.failures == 1
+        assert "rmtree did not complete" in trash.last_error
+
+        # Backed off: an immediate second pass doesn't retry
+        monkeypatch.undo()
+        assert await trash.reap() == 0
+        assert trash.failures == 1
+        assert len(trash.pending()) == 1
+
+    @pytest.mark.asyncio
+    async def test_running_reaper_is_woken_by_discard(self, tmp_path):
+        # Left over from a previous run
+        (tmp_path / ".trash").mkdir()
+        make_tree(tmp_path / ".trash" / "old.abcd1234")
+        trash = Trash(tmp_path)
+        trash.start(interval=3600)
+        try:
+            make_tree(tmp_path / "d1")
+            await asyncio.sleep(0.05)
+            trash.discard(tmp_path / "d1")
+            for _ in range(500):
+                if not trash.pending():
+                    break
+                await asyncio.sleep(0.01)
+            assert trash.pending() == []
+            assert trash.status()["reaped"] == 2
+        finally:
+            await trash.stop()
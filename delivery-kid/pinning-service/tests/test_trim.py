@@ -0,0 +1,248 @@
+"""Tests for app.services.trim — playlist trims and stream-copy trims."""
+
+import shutil
+
+import pytest
+
+from app.services import ipfs, transcode, trim
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:6
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-MEDIA-SEQUENCE:0
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:6.000,
+segment_000.m4s
+#EXTINF:6.000,
+segment_001.m4s
+#EXTINF:6.000,
+segment_002.m4s
+#EXTINF:6.000,
+segment_003.m4s
+#EXTINF:2.500,
+segment_004.m4s
+#EXT-X-ENDLIST
+"""
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720,CODECS="av01.0.08M.08,opus"
+720p/playlist.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=1000000,RESOLUTION=854x480,CODECS="av01.0.04M.08,opus"
+480p/playlist.m3u8
+"""
+
+
+class TestPlaylistTrim:
+
+    def test_keeps_overlapping_segments(self):
+        cut = trim.trim_media_playlist(MEDIA, 7.5, 13.0)
+        assert cut.uris == ["init.mp4", "segment_001.m4s", "segment_002.m4s"]
+        assert (cut.start, cut.end, cut.segment_count) == (6.0, 18.0, 2)
+        lines = cut.text.splitlines()
+        assert lines[:4] == ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-TARGETDURATION:6", "#EXT-X-PLAYLIST-TYPE:VOD"]
+        assert "#EXT-X-MEDIA-SEQUENCE:1" in lines
+        assert lines[-1] == "#EXT-X-ENDLIST"
+        assert "segment_000.m4s" not in lines
+
+    def test_open_ended_window(self):
+        assert trim.trim_media_playlist(MEDIA, 20.0, None).uris[1:] == ["segment_003.m4s", "segment_004.m4s"]
+        assert trim.trim_media_playlist(MEDIA, None, 5.0).uris[1:] == ["segment_000.m4s"]
+
+    def test_window_past_the_end(self):
+        with pytest.raises(ValueError):
+            trim.trim_media_playlist(MEDIA, 60.0, 70.0)
+
+    def test_variant_uris(self):
+        assert trim.variant_uris(MASTER) == ["720p/playlist.m3u8", "480p/playlist.m3u8"]
+
+    @pytest.mark.asyncio
+    async def test_plan_links_kept_segments_by_cid(self, monkeypatch):
+        async def fake_cat(path):
+            return (MASTER if path.endswith("master.m3u8") else MEDIA).encode()
+
+        monkeypatch.setattr(ipfs, "cat", fake_cat)
+        links, files, info = await trim.plan_playlist_trim("bafyPreview", 7.5, 13.0)
+
+        assert set(files) == {"master.m3u8", "720p/playlist.m3u8", "480p/playlist.m3u8"}
+        assert files["master.m3u8"] == MASTER.encode()
+        assert links["720p/segment_001.m4s"] == "bafyPreview/720p/segment_001.m4s"
+        assert links["480p/init.mp4"] == "bafyPreview/480p/init.mp4"
+        assert len(links) == 6
+        assert info["trim"] == {"requested_start": 7.5, "requested_end": 13.0, "start": 6.0, "end": 18.0}
+        assert info["segment_count"] == 4
+
+    @pytest.mark.asyncio
+    async def test_absolute_segment_uris_are_refused(self, monkeypatch):
+        async def fake_cat(path):
+            return MEDIA.replace("segment_001.m4s", "https://cdn.example/segment_001.m4s").encode()
+
+        monkeypatch.setattr(ipfs, "cat", fake_cat)
+        with pytest.raises(ValueError):
+            await trim.plan_playlist_trim("bafyPreview", 7.5, 13.0)
+
+
+class TestStreamCopy:
+
+    def test_eligibility(self):
+        assert trim.can_stream_copy({"video_codec": "h264", "pix_fmt": "yuv420p", "audio_codec": "aac"})
+        assert trim.can_stream_copy({"video_codec": "h264", "pix_fmt": "yuv420p"})
+        assert not trim.can_stream_copy({"video_codec": "h264", "pix_fmt": "yuv420p10le", "audio_codec": "aac"})
+        assert not trim.can_stream_copy({"video_codec": "prores", "pix_fmt": "yuv422p10le"})
+        assert not trim.can_stream_copy({"video_codec": "h264", "pix_fmt": "yuv420p", "audio_codec": "pcm_s16le"})
+
+    @pytest.mark.asyncio
+    async def test_starts_at_keyframe_before_trim(self, tmp_path, monkeypatch):
+        src = tmp_path / "clip.mp4"
+        src.write_bytes(b"\0")
+        out = tmp_path / "hls"
+        calls = []
+
+        async def fake_probe(path):
+            return {"format": {"duration": "60.0", "start_time": "0.000000"},
+                    "streams": [{"codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p",
+                                 "width": 1920, "height": 1080},
+                                {"codec_type": "audio", "codec_name": "aac"}]}
+
+        async def fake_keyframe(path, t):
+            return 8.0
+
+        async def fake_run(cmd, on_progress=None, duration=None):
+            calls.append((cmd, duration))
+            (out / "master.m3u8").write_text("#EXTM3U\n")
+            (out / "segment_000.ts").write_bytes(b"\0" * 10)
+            return 0, b""
+
+        monkeypatch.setattr(transcode, "probe_video", fake_probe)
+        monkeypatch.setattr(trim, "keyframe_before", fake_keyframe)
+        monkeypatch.setattr(transcode, "run_ffmpeg", fake_run)
+        monkeypatch.setattr(trim.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+
+        result = await trim.stream_copy_trim(src, out, trim_start=10.0, trim_end=20.0)
+        assert result.success, result.error
+
+        (cmd, duration), = calls
+        assert cmd[cmd.index("-ss") + 1] == "8.0"
+        assert cmd[cmd.index("-t") + 1] == "12.0"
+        assert cmd[cmd.index("-c") + 1] == "copy"
+        assert duration == 12.0
+        info = result.transcode_info
+        assert info["method"] == "stream-copy"
+        assert info["trim"]["start"] == 8.0
+        assert info["output_codec"] == "h264"
+
+    @pytest.mark.asyncio
+    async def test_refuses_sources_needing_a_reencode(self, tmp_path, monkeypatch):
+        async def fake_probe(path):
+            return {"format": {}, "streams": [{"codec_type": "video", "codec_name": "hevc", "pix_fmt": "yuv420p"}]}
+
+        async def no_run(cmd, **kwargs):
+            raise AssertionError("ffmpeg ran")
+
+        monkeypatch.setattr(transcode, "probe_video", fake_probe)
+        monkeypatch.setattr(transcode, "run_ffmpeg", no_run)
+        monkeypatch.setattr(trim.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+
+        result = await trim.stream_copy_trim(tmp_path / "clip.mkv", tmp_path / "hls", trim_start=1.0)
+        assert not result.success
+        assert "hevc" in result.error
+
+    @pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg not installed")
+    @pytest.mark.asyncio
+    async def test_real_keyframe_scan(self, tmp_path):
+        src = tmp_path / "gop.mp4"
+        code, _ = await transcode.run_ffmpeg([
+            "ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc=duration=10:size=160x120:rate=10",
+            "-c:v", "libx264", "-g", "20", "-pix_fmt", "yuv420p", str(src),
+        ])
+        assert code == 0
+        assert await trim.keyframe_before(src, 5.5) == pytest.approx(4.0, abs=0.1)
+
+
+class TestFinalizeStreamCopy:
+
+    @pytest.fixture
+    def draft(self, tmp_path):
+        from datetime import datetime, timezone
+
+        from app.config import Settings
+        from app.models.content import ContentDraftState, ContentFile
+
+        draft_dir = tmp_path / "drafts" / "d1"
+        (draft_dir / "upload").mkdir(parents=True)
+        (draft_dir / "upload" / "clip.mp4").write_bytes(b"\0" * 100)
+        state = ContentDraftState(
+            draft_id="d1", created_at=datetime.now(timezone.utc), uploaded_by="wiki:tester",
+            files=[ContentFile(original_filename="clip.mp4", detected_title="clip", media_type="video",
+                               format="MP4", size_bytes=100, duration_seconds=30.0, height=720)],
+        )
+        return draft_dir, state, Settings(staging_dir=str(tmp_path), coconut_api_key="")
+
+    @pytest.fixture
+    def encoders(self, monkeypatch):
+        calls = []
+
+        async def probe(path):
+            return {"streams": [{"codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p"},
+                                {"codec_type": "audio", "codec_name": "aac"}], "format": {}}
+
+        async def copy(src, out, **kwargs):
+            calls.append("copy")
+            out.mkdir(parents=True)
+            return transcode.TranscodeResult(success=False, error="no keyframe")
+
+        async def encode(src, out, **kwargs):
+            calls.append(("encode", kwargs["qualities"]))
+            out.mkdir(parents=True, exist_ok=True)
+            return transcode.TranscodeResult(success=True, output_path=out, transcode_info={})
+
+        async def pin(path):
+            return ipfs.PinResult(success=True, cid="bafyout")
+
+        monkeypatch.setattr(transcode, "probe_video", probe)
+        monkeypatch.setattr(trim, "stream_copy_trim", copy)
+        monkeypatch.setattr(transcode, "transcode_video_to_hls", encode)
+        monkeypatch.setattr(ipfs, "add_directory", pin)
+        return calls
+
+    async def finalize(self, draft, **request):
+        from app.models.content import ContentFinalizeRequest
+        from app.routes.content import finalize_sse_generator
+
+        draft_dir, state, settings = draft
+        req = ContentFinalizeRequest(transcoding_strategy="local", trim_start_seconds=5.0, **request)
+        return [frame["event"] async for frame in finalize_sse_generator("d1", req, draft_dir, state, settings)]
+
+    @pytest.mark.asyncio
+    async def test_failed_copy_falls_back_to_transcode(self, draft, encoders):
+        events = await self.finalize(draft)
+        assert events[-1] == "complete"
+        assert encoders == ["copy", ("encode", transcode.DEFAULT_HLS_QUALITIES)]
+
+    @pytest.mark.asyncio
+    async def test_requested_ladder_skips_copy(self, draft, encoders):
+        events = await self.finalize(draft, transcoding_qualities=[720, 360])
+        assert events[-1] == "complete"
+        assert encoders == [("encode", [720, 360])]
+
+    @pytest.mark.asyncio
+    async def test_failed_finalize_fails_its_task(self, draft, encoders, monkeypatch):
+        from app.routes import content
+        from app.services import task_queue
+        from app.services.draft_store import write_draft_state
+
+        draft_dir, state, settings = draft
+        write_draft_state(draft_dir, state)
+
+        async def pin(path):
+            return ipfs.PinResult(success=False, error="node offline")
+
+        monkeypatch.setattr(ipfs, "add_directory", pin)
+        monkeypatch.setattr(content, "get_settings", lambda: settings)
+        task = task_queue.Task("t1", content.FINALIZE_TASK, {
+            "draft_id": "d1", "request": {"transcoding_strategy": "local", "trim_start_seconds": 5.0},
+        }, task_queue.PRIORITY_INTERACTIVE, "d1", 1)
+        frames = []
+        with pytest.raises(task_queue.TaskFailed):
+            await content.run_finalize_task(task, frames.append)
+        assert frames[-1]["event"] == "error"
@@ -29,6 +29,7 @@ Usage: maybelle/scripts/audit-storage.py
 """
 
 import json
+import os
 import subprocess
 import sys
 import urllib.parse
@@ -40,6 +41,7 @@ import yaml
 
 
 DK_HOST = "root@delivery-kid.cryptograss.live"
+DK_API = "https://delivery-kid.cryptograss.live"
 MAYBELLE_HOST = "root@maybelle.cryptograss.live"
 WIKI_API = "https://pickipedia.xyz/api.php"
 
@@ -121,8 +123,47 @@ def fetch_seeding_dirs() -> list[str]:
     return [line.strip() for line in out.splitlines() if line.strip()]
 
 
+def fetch_staging_drafts_api(api_key: str) -> Optional[list[dict]]:
+    """Page through delivery-kid's GET /drafts index. None on failure."""
+    drafts = []
+    offset = 0
+    try:
+        while True:
+            # Rescan once on the first page so the index reflects every worker
+            params = {"limit": "1000", "offset": str(offset), "refresh": str(offset == 0).lower()}
+            req = urllib.request.Request(
+                f"{DK_API}/drafts?{urllib.parse.urlencode(params)}",
+                headers={"X-API-Key": api_key},
+            )
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                page = json.loads(resp.read().decode())
+            for d in page["drafts"]:
+                drafts.append({
+                    "id": d["draft_id"],
+                    "has_draft_json": d["has_draft_json"],
+                    "upload_files": d["file_count"],
+                    "size_kb": d["size_bytes"] // 1024,
+                    "mtime": int(d["updated_at"]),
+                })
+            offset += len(page["drafts"])
+            if not page["drafts"] or offset >= page["total"]:
+                return drafts
+    except Exception as e:
+        print(f"  [GET {DK_API}/drafts failed: {e}; falling back to ssh]", file=sys.stderr)
+        return None
+
+
 def fetch_staging_drafts() -> list[dict]:
-    """Return [{id, has_draft_json, upload_files, size_kb, mtime}, ...]."""
+    """Return [{id, has_draft_json, upload_files, size_kb, mtime}, ...].
+
+    Uses delivery-kid's drafts index when DELIVERY_KID_API_KEY is set (one
+    HTTP call), otherwise walks the staging dir over SSH.
+    """
+    api_key = os.environ.get("DELIVERY_KID_API_KEY")
+    if api_key:
+        drafts = fetch_staging_drafts_api(api_key)
+        if drafts is not None:
+            return drafts
     script = r"""
 cd /mnt/storage-box/staging/drafts 2>/dev/null || exit 0
 for d in */; do